@@ -3,7 +3,7 @@ from django import forms
 from django.utils.html import mark_safe, format_html
 from adminsortable2.admin import SortableAdminBase, SortableAdminMixin, SortableInlineAdminMixin, SortableStackedInline
 
-from .models import Author, Article, ArticleAuthorOrder, ArticleContent, ReferenceLink, AnalyzedSegment
+from .models import Author, Article, ArticleAuthorOrder, ArticleContent, ReferenceLink, AnalyzedSegment, IdentifierMapping, BulkIngestionJob, ArticleSourceRecord, ContentBlob, CitationCrawlJob, CitationCrawlNode
 
 
 class ArticleAuthorOrderInline(admin.TabularInline):
@@ -15,13 +15,33 @@ class ArticleAuthorOrderInline(admin.TabularInline):
     autocomplete_fields = ['author']
 
 
+class ArticleContentInlineForm(forms.ModelForm):
+    # content - свойство модели (данные лежат в сжатом ContentBlob), поэтому поле формы объявлено явно
+    content = forms.CharField(label="Содержимое", widget=forms.Textarea(attrs={'rows': 6, 'cols': 90}), required=False, strip=False)
+
+    class Meta:
+        model = ArticleContent
+        fields = ['source_api_name', 'format_type', 'content']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.fields['content'].initial = self.instance.content
+
+    def save(self, commit=True):
+        if 'content' in self.changed_data or not self.instance.pk:
+            self.instance.content = self.cleaned_data.get('content', '')
+        return super().save(commit)
+
+
 class ArticleContentInline(admin.StackedInline):
     """
     Позволяет просматривать и добавлять сырой контент прямо на странице статьи.
     """
     model = ArticleContent
+    form = ArticleContentInlineForm
     extra = 0
-    readonly_fields = ('retrieved_at',) # Это поле заполняется автоматически
+    readonly_fields = ('blob', 'retrieved_at',) # Эти поля заполняются автоматически
     classes = ['collapse']
 
 
@@ -100,7 +120,7 @@ class ArticleAdmin(SortableAdminBase, admin.ModelAdmin):
     )
     list_filter = ('publication_date', 'primary_source_api', 'is_manually_added_full_text', 'user')
     search_fields = ('title', 'doi', 'pubmed_id', 'pmc_id', 'arxiv_id', 'abstract', 'authors__full_name')
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('created_at', 'updated_at', 'pdf_sha256')
     autocomplete_fields = ['user'] # Если пользователей много
     inlines = [ArticleAuthorOrderInline, ArticleContentInline, ReferenceLinkInline]
     form = ArticleAdminForm
@@ -119,7 +139,7 @@ class ArticleAdmin(SortableAdminBase, admin.ModelAdmin):
             'fields': ('cleaned_text_for_llm', 'is_manually_added_full_text')
         }),
         ('PDF Файл', {
-            'fields': ('pdf_file', 'pdf_text')
+            'fields': ('pdf_file', 'pdf_sha256', 'pdf_text')
         }),
         ('Метаданные Публикации', {
             'fields': ('publication_date', 'journal_name')
@@ -154,4 +174,54 @@ class ArticleAdmin(SortableAdminBase, admin.ModelAdmin):
 @admin.register(AnalyzedSegment)
 class AnalyzedSegmentAdmin(admin.ModelAdmin):
     list_display = ['id', 'article', 'section_key', 'created_at']
-    search_fields = ['article']
\ No newline at end of file
+    search_fields = ['article']
+
+
+@admin.register(IdentifierMapping)
+class IdentifierMappingAdmin(admin.ModelAdmin):
+    list_display = ['doi', 'pubmed_id', 'pmc_id', 'arxiv_id', 'openalex_id', 'resolved_by', 'checked_at']
+    search_fields = ['doi', 'pubmed_id', 'pmc_id', 'arxiv_id', 'openalex_id']
+    readonly_fields = ['checked_at']
+
+
+@admin.register(ArticleSourceRecord)
+class ArticleSourceRecordAdmin(admin.ModelAdmin):
+    list_display = ['article', 'source_api_name', 'fetched_at']
+    list_filter = ['source_api_name']
+    search_fields = ['article__title', 'article__doi']
+    raw_id_fields = ['article']
+    readonly_fields = ['fetched_at']
+
+
+@admin.register(BulkIngestionJob)
+class BulkIngestionJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'source_name', 'status', 'total_submitted', 'created_count', 'existing_count', 'enriched_count', 'not_found_count', 'created_at', 'finished_at']
+    list_filter = ['status']
+    search_fields = ['source_name', 'user__username']
+    readonly_fields = ['celery_task_id', 'created_at', 'updated_at', 'finished_at']
+
+
+@admin.register(CitationCrawlJob)
+class CitationCrawlJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'root_article', 'status', 'max_depth', 'max_articles', 'current_depth', 'scheduled_count', 'fetched_count', 'stop_reason', 'created_at', 'finished_at']
+    list_filter = ['status', 'stop_reason']
+    search_fields = ['root_article__title', 'root_article__doi', 'user__username']
+    raw_id_fields = ['root_article']
+    readonly_fields = ['source_requests', 'celery_task_id', 'created_at', 'updated_at', 'finished_at']
+
+
+@admin.register(CitationCrawlNode)
+class CitationCrawlNodeAdmin(admin.ModelAdmin):
+    list_display = ['doi', 'job', 'depth', 'citation_count', 'status', 'expanded', 'article']
+    list_filter = ['status', 'depth']
+    search_fields = ['doi']
+    raw_id_fields = ['job', 'parent_article', 'article']
+
+
+@admin.register(ContentBlob)
+class ContentBlobAdmin(admin.ModelAdmin):
+    list_display = ['sha256', 'codec', 'size', 'compressed_size', 'storage_name', 'created_at']
+    list_filter = ['codec']
+    search_fields = ['sha256']
+    exclude = ['data']
+    readonly_fields = ['sha256', 'codec', 'size', 'compressed_size', 'storage_name', 'created_at']
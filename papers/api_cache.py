@@ -0,0 +1,209 @@
+"""
+Кэш ответов внешних API с метаданными (CrossRef, PubMed, Europe PMC, S2, OpenAlex и т.д.).
+
+Ответы хранятся в отдельном кэше Django (settings.CACHES['api_responses'], Redis) по ключу
+из нормализованного URL и параметров запроса. Для каждого источника задан свой срок свежести
+(settings.API_RESPONSE_CACHE_TTLS); после его истечения запись не удаляется сразу, а используется
+для условного запроса (If-None-Match / If-Modified-Since): ответ 304 продлевает запись без
+повторной загрузки тела. Ответ 404 хранится не дольше API_RESPONSE_CACHE_NOT_FOUND_TTL.
+Счетчики hit/miss/revalidated ведутся по каждому источнику.
+"""
+import time
+import zlib
+import hashlib
+import logging
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from django.conf import settings
+from django.core.cache import caches
+
+from .http_client import http_get
+from .rate_limit import raise_if_rate_limited
+
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = 'api_responses'
+KEY_PREFIX = 'apicache'
+STAT_NAMES = ('hit', 'miss', 'revalidated', 'bypass')
+# Параметры, не влияющие на содержимое ответа (контакты/ключи), в ключ кэша не входят
+IGNORED_PARAMS = {'api_key', 'email', 'mailto', 'tool'}
+# Кэшируем успешные ответы и "не найдено", чтобы повторно не спрашивать отсутствующие записи
+CACHEABLE_STATUS_CODES = {200, 404}
+NOT_FOUND_STATUS_CODE = 404
+
+
+def _get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _normalized_url(url: str, params: dict = None) -> str:
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)]
+    for k, v in (params or {}).items():
+        if isinstance(v, (list, tuple)):
+            query.extend((k, str(item)) for item in v)
+        elif v is not None:
+            query.append((k, str(v)))
+    query = sorted((k, v) for k, v in query if k not in IGNORED_PARAMS)
+    return f"{parts.scheme.lower()}://{parts.netloc.lower()}{parts.path}?{urlencode(query)}"
+
+
+def make_cache_key(api_name: str, url: str, params: dict = None) -> str:
+    digest = hashlib.sha256(_normalized_url(url, params).encode('utf-8')).hexdigest()
+    return f"{KEY_PREFIX}:{api_name}:{digest}"
+
+
+def _record_stat(api_name: str, stat: str):
+    cache = _get_cache()
+    key = f"{KEY_PREFIX}:stats:{api_name}:{stat}"
+    try:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+    except Exception as e:
+        logger.debug(f"API cache stats update failed for {key}: {e}")
+
+
+def get_cache_stats() -> dict:
+    """Счетчики кэша по источникам: {api_name: {'hit': n, 'miss': n, 'revalidated': n, 'bypass': n, 'hit_ratio': x}}."""
+    cache = _get_cache()
+    api_names = list(getattr(settings, 'API_RESPONSE_CACHE_TTLS', {}).keys())
+    keys = [f"{KEY_PREFIX}:stats:{api}:{stat}" for api in api_names for stat in STAT_NAMES]
+    try:
+        values = cache.get_many(keys)
+    except Exception as e:
+        logger.warning(f"API cache stats unavailable: {e}")
+        values = {}
+    stats = {}
+    for api in api_names:
+        counters = {stat: int(values.get(f"{KEY_PREFIX}:stats:{api}:{stat}", 0)) for stat in STAT_NAMES}
+        served_locally = counters['hit'] + counters['revalidated']
+        total = served_locally + counters['miss']
+        counters['hit_ratio'] = round(served_locally / total, 3) if total else None
+        stats[api] = counters
+    return stats
+
+
+def _entry_to_response(entry: dict) -> requests.Response:
+    """Восстанавливает requests.Response из записи кэша, чтобы вызывающий код не отличал его от сетевого."""
+    response = requests.Response()
+    response.status_code = entry['status_code']
+    response._content = zlib.decompress(entry['body'])
+    response.headers = CaseInsensitiveDict(entry['headers'])
+    response.url = entry['url']
+    response.encoding = entry.get('encoding')
+    response.reason = 'OK' if entry['status_code'] == 200 else 'Not Found'
+    return response
+
+
+def _response_to_entry(response: requests.Response) -> dict:
+    kept_headers = {
+        name: response.headers[name]
+        for name in ('Content-Type', 'ETag', 'Last-Modified')
+        if name in response.headers
+    }
+    return {
+        'status_code': response.status_code,
+        'body': zlib.compress(response.content),
+        'headers': kept_headers,
+        'url': response.url,
+        'encoding': response.encoding,
+        'stored_at': time.time(),
+    }
+
+
+def _entry_ttls(status_code: int, ttl: int) -> tuple[int, int]:
+    """
+    (срок свежести, срок хранения) записи. "Не найдено" живет коротко (API_RESPONSE_CACHE_NOT_FOUND_TTL):
+    запись может появиться в источнике вскоре после публикации, а условный запрос для 404 обычно невозможен.
+    """
+    stale_ttl = getattr(settings, 'API_RESPONSE_CACHE_STALE_TTL', 30 * 24 * 3600)
+    if status_code == NOT_FOUND_STATUS_CODE:
+        not_found_ttl = min(ttl, getattr(settings, 'API_RESPONSE_CACHE_NOT_FOUND_TTL', 3600))
+        return not_found_ttl, not_found_ttl
+    return ttl, stale_ttl
+
+
+def cached_get(api_name: str, url: str, params: dict = None, headers: dict = None, throttle=None, **kwargs) -> requests.Response:
+    """
+    GET через кэш ответов. throttle - необязательная функция (например, получение токена
+    ограничителя частоты), вызывается только перед реальным сетевым запросом.
+    Возвращает requests.Response (из кэша или из сети); на ответ 429 выбрасывает RateLimitExceeded.
+    """
+    ttl = getattr(settings, 'API_RESPONSE_CACHE_TTLS', {}).get(api_name)
+    if not ttl or not getattr(settings, 'API_RESPONSE_CACHE_ENABLED', True):
+        _record_stat(api_name, 'bypass')
+        if throttle:
+            throttle()
+        response = http_get(url, params=params, headers=headers, **kwargs)
+        raise_if_rate_limited(api_name, response)
+        return response
+
+    cache = _get_cache()
+    cache_key = make_cache_key(api_name, url, params)
+    try:
+        entry = cache.get(cache_key)
+    except Exception as e:
+        logger.warning(f"API cache read failed for {api_name}: {e}")
+        entry = None
+
+    if entry and time.time() - entry['stored_at'] < _entry_ttls(entry['status_code'], ttl)[0]:
+        _record_stat(api_name, 'hit')
+        return _entry_to_response(entry)
+
+    request_headers = dict(headers or {})
+    if entry:
+        # Запись устарела: пробуем условный запрос, чтобы не скачивать тело заново
+        if entry['headers'].get('ETag'):
+            request_headers['If-None-Match'] = entry['headers']['ETag']
+        if entry['headers'].get('Last-Modified'):
+            request_headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+
+    if throttle:
+        throttle()
+    response = http_get(url, params=params, headers=request_headers, **kwargs)
+    raise_if_rate_limited(api_name, response)
+
+    if response.status_code == 304 and entry:
+        entry['stored_at'] = time.time()
+        try:
+            cache.set(cache_key, entry, timeout=_entry_ttls(entry['status_code'], ttl)[1])
+        except Exception as e:
+            logger.warning(f"API cache write failed for {api_name}: {e}")
+        _record_stat(api_name, 'revalidated')
+        return _entry_to_response(entry)
+
+    _record_stat(api_name, 'miss')
+    if response.status_code in CACHEABLE_STATUS_CODES:
+        try:
+            cache.set(cache_key, _response_to_entry(response), timeout=_entry_ttls(response.status_code, ttl)[1])
+        except Exception as e:
+            logger.warning(f"API cache write failed for {api_name}: {e}")
+    return response
+
+
+def store_response(api_name: str, url: str, params: dict, content: str, content_type: str = 'text/xml') -> bool:
+    """
+    Записывает в кэш ответ, полученный не этим запросом, а пакетным (например, одна статья из
+    PubmedArticleSet), чтобы последующий одиночный cached_get с теми же url/params был попаданием.
+    Возвращает False, если кэш для источника отключен или недоступен.
+    """
+    if not getattr(settings, 'API_RESPONSE_CACHE_TTLS', {}).get(api_name) or not getattr(settings, 'API_RESPONSE_CACHE_ENABLED', True):
+        return False
+    entry = {
+        'status_code': 200,
+        'body': zlib.compress(content.encode('utf-8')),
+        'headers': {'Content-Type': content_type},
+        'url': url,
+        'encoding': 'utf-8',
+        'stored_at': time.time(),
+    }
+    try:
+        _get_cache().set(make_cache_key(api_name, url, params), entry, timeout=getattr(settings, 'API_RESPONSE_CACHE_STALE_TTL', 30 * 24 * 3600))
+    except Exception as e:
+        logger.warning(f"API cache write failed for {api_name}: {e}")
+        return False
+    return True
+
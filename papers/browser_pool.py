@@ -0,0 +1,181 @@
+"""
+Пул браузеров Playwright для загрузки PDF, которые не отдаются обычным HTTP-запросом.
+
+Chromium запускается один раз и переиспользуется между задачами: вместо запуска браузера
+(1-3 сек и сотни МБ) на каждую загрузку download_pdf берет из пула готовый контекст.
+Число открытых контекстов ограничено (PDF_BROWSER_POOL_MAX_CONTEXTS), браузер перезапускается
+после PDF_BROWSER_MAX_DOWNLOADS загрузок (Chromium со временем накапливает память) и после падения.
+Sync API Playwright привязан к потоку, в котором запущен, поэтому пул свой у каждого потока
+процесса воркера; после fork пул создается заново - браузер родителя дочернему процессу не принадлежит.
+Sync API не работает в гринлетах gevent, поэтому задачи, скачивающие PDF, маршрутизируются в prefork-очередь
+pdf-browser, а browser_context() в процессе, пропатченном gevent, сразу выбрасывает BrowserUnavailable.
+"""
+import os
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from playwright.sync_api import sync_playwright, Error as PlaywrightError
+
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_OPTIONS = {
+    'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.127 Safari/537.36', # Chrome User-Agent
+    'java_script_enabled': True,
+    'viewport': {'width': 1920, 'height': 1080},
+    'locale': 'en-US',
+    'permissions': ['geolocation'],
+    'accept_downloads': True,
+}
+# Дополнительные заголовки, которые могут помочь
+EXTRA_HTTP_HEADERS = {
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Sec-Fetch-Dest": "document",
+    "Sec-Fetch-Mode": "navigate",
+    "Sec-Fetch-Site": "none",
+    "Sec-Fetch-User": "?1",
+    "Upgrade-Insecure-Requests": "1",
+    "DNT": "1", # Do Not Track
+}
+
+
+class BrowserPoolExhausted(Exception):
+    """Все контексты пула заняты."""
+
+
+class BrowserUnavailable(Exception):
+    """Браузер нельзя запустить в текущем процессе воркера (пул gevent)."""
+
+
+class BrowserPool:
+    """Один Chromium и ограниченный набор его контекстов; используется из одного потока."""
+
+    def __init__(self, max_contexts: int, max_downloads: int):
+        self.max_contexts = max_contexts
+        self.max_downloads = max_downloads
+        self._pid = os.getpid()
+        self._playwright = None
+        self._browser = None
+        self._idle_contexts = []
+        self._busy_contexts = 0
+        self._downloads = 0
+
+    def _ensure_browser(self):
+        if self._browser is not None and self._browser.is_connected():
+            return self._browser
+        if self._browser is not None:
+            logger.warning("Playwright browser disconnected, relaunching")
+            self._discard_browser()
+        if self._playwright is None:
+            self._playwright = sync_playwright().start()
+        self._browser = self._playwright.chromium.launch(headless=True)
+        self._downloads = 0
+        logger.debug(f"Playwright browser launched for process {os.getpid()}")
+        return self._browser
+
+    def _new_context(self, browser):
+        context = browser.new_context(**CONTEXT_OPTIONS)
+        context.set_extra_http_headers(EXTRA_HTTP_HEADERS)
+        return context
+
+    @staticmethod
+    def _close_quietly(closable):
+        try:
+            closable.close()
+        except Exception as e: # Браузер мог уже упасть - закрывать нечего
+            logger.debug(f"Playwright object was not closed cleanly: {e}")
+
+    def _discard_browser(self):
+        for context in self._idle_contexts:
+            self._close_quietly(context)
+        self._idle_contexts = []
+        if self._browser is not None:
+            self._close_quietly(self._browser)
+        self._browser = None
+
+    @contextmanager
+    def context(self):
+        """
+        Выдает контекст браузера на одну загрузку. После успешной загрузки контекст возвращается в пул
+        (cookies сайта сохраняются, что помогает при повторных загрузках с того же издательства);
+        после ошибки Playwright контекст закрывается, а упавший браузер будет перезапущен при следующем запросе.
+        """
+        browser = self._ensure_browser()
+        if self._idle_contexts:
+            context = self._idle_contexts.pop()
+        elif self._busy_contexts + len(self._idle_contexts) < self.max_contexts:
+            context = self._new_context(browser)
+        else:
+            raise BrowserPoolExhausted(f"All {self.max_contexts} browser contexts are busy")
+
+        self._busy_contexts += 1
+        reusable = True
+        try:
+            yield context
+        except PlaywrightError:
+            reusable = False
+            raise
+        finally:
+            self._busy_contexts -= 1
+            self._downloads += 1
+            for page in context.pages: # Страницы не переживают загрузку, контекст возвращается пустым
+                self._close_quietly(page)
+            if reusable and browser.is_connected() and browser is self._browser:
+                self._idle_contexts.append(context)
+            else:
+                self._close_quietly(context)
+            if self._downloads >= self.max_downloads and not self._busy_contexts:
+                logger.debug(f"Recycling Playwright browser after {self._downloads} downloads")
+                self._discard_browser()
+
+    def close(self):
+        if os.getpid() != self._pid: # Унаследованный после fork пул закрывает только процесс-владелец
+            return
+        self._discard_browser()
+        if self._playwright is not None:
+            try:
+                self._playwright.stop()
+            except Exception as e:
+                logger.debug(f"Playwright driver was not stopped cleanly: {e}")
+            self._playwright = None
+
+
+_local = threading.local()
+
+
+def get_browser_pool() -> BrowserPool:
+    """Возвращает пул браузеров текущего потока (создает его при первом обращении или после fork)."""
+    pid = os.getpid()
+    pool = getattr(_local, 'pool', None)
+    if pool is None or getattr(_local, 'pid', None) != pid:
+        pool = BrowserPool(
+            max_contexts=getattr(settings, 'PDF_BROWSER_POOL_MAX_CONTEXTS', 2),
+            max_downloads=getattr(settings, 'PDF_BROWSER_MAX_DOWNLOADS', 50),
+        )
+        _local.pool = pool
+        _local.pid = pid
+        atexit.register(pool.close)
+    return pool
+
+
+def _is_gevent_patched() -> bool:
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('threading')
+
+
+@contextmanager
+def browser_context():
+    """Контекст браузера на одну загрузку PDF из пула текущего потока."""
+    if _is_gevent_patched():
+        raise BrowserUnavailable(
+            "Playwright sync API does not run under gevent; route PDF-downloading tasks to the pdf-browser queue"
+        )
+    with get_browser_pool().context() as context:
+        yield context
@@ -0,0 +1,94 @@
+"""
+Хранилище сырого контента статей (JATS XML, JSON-ответы API и т.д.) для ArticleContent.
+
+Содержимое сжимается (zstd, если установлен пакет zstandard, иначе zlib) и дедуплицируется
+по SHA-256 исходных байт: одинаковые ответы разных статей/источников хранятся один раз
+(модель ContentBlob). Небольшие блоки лежат прямо в БД, а начиная с
+settings.CONTENT_STORE_OFFLOAD_MIN_BYTES (размер после сжатия) выносятся в файловое хранилище
+Django (default_storage: локальный MEDIA_ROOT или объектное хранилище) по пути из хеша.
+Кодек записывается вместе с данными, поэтому смена кодека не ломает чтение старых записей.
+"""
+import zlib
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+try:
+    import zstandard
+except ImportError: # Без zstandard пишем zlib; уже сжатые zstd блоки без пакета прочитать нельзя
+    zstandard = None
+
+
+logger = logging.getLogger(__name__)
+
+CODEC_ZSTD = 'zstd'
+CODEC_ZLIB = 'zlib'
+STORAGE_PREFIX = 'content_blobs'
+
+
+class ContentStoreError(Exception):
+    """Содержимое блока не удалось прочитать или распаковать."""
+
+
+def default_codec() -> str:
+    return CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def compress(data: bytes, codec: str = None) -> tuple:
+    """Сжимает данные; возвращает (codec, сжатые байты)."""
+    codec = codec or default_codec()
+    if codec == CODEC_ZSTD:
+        level = getattr(settings, 'CONTENT_STORE_ZSTD_LEVEL', 10)
+        return codec, zstandard.ZstdCompressor(level=level).compress(data)
+    return CODEC_ZLIB, zlib.compress(data, 6)
+
+
+def decompress(codec: str, data: bytes) -> bytes:
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ContentStoreError("Блок сжат zstd, но пакет zstandard не установлен.")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(data)
+    raise ContentStoreError(f"Неизвестный кодек блока: {codec}")
+
+
+def should_offload(compressed_size: int) -> bool:
+    """Выносить ли блок из БД в файловое хранилище (None в настройке - всегда хранить в БД)."""
+    threshold = getattr(settings, 'CONTENT_STORE_OFFLOAD_MIN_BYTES', None)
+    return threshold is not None and compressed_size >= threshold
+
+
+def storage_name_for(sha256: str, codec: str) -> str:
+    # Двухуровневое разбиение по хешу, чтобы не держать все файлы в одном каталоге
+    return f"{STORAGE_PREFIX}/{sha256[:2]}/{sha256[2:4]}/{sha256}.{codec}"
+
+
+def write_to_storage(sha256: str, codec: str, data: bytes) -> str:
+    """Записывает сжатый блок в default_storage; одинаковый хеш - один и тот же файл."""
+    name = storage_name_for(sha256, codec)
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(data))
+    return name
+
+
+def read_from_storage(name: str) -> bytes:
+    try:
+        with default_storage.open(name, 'rb') as f:
+            return f.read()
+    except OSError as e:
+        raise ContentStoreError(f"Не удалось прочитать блок {name}: {e}") from e
+
+
+def delete_from_storage(name: str):
+    try:
+        default_storage.delete(name)
+    except OSError as e:
+        logger.warning(f"Content blob file {name} was not deleted: {e}")
@@ -2,12 +2,29 @@ from asgiref.sync import sync_to_async, async_to_sync
 from channels.layers import get_channel_layer
 import xml.etree.ElementTree as ET # Для парсинга XML
 import re
+import io
+import csv
+import json
 import requests
-import tempfile
+import hashlib
 import logging
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError, Error as PlaywrightError
-
-from .models import Article, Author, ArticleContent, ArticleAuthorOrder, ReferenceLink
+from collections import OrderedDict
+from functools import partial
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.db import IntegrityError
+from django.db.models import Q
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError, Error as PlaywrightError
+
+from .http_client import http_get
+from .browser_pool import browser_context
+from .api_cache import cached_get
+from .rate_limit import wait_for_token, raise_if_rate_limited
+from .models import Article, Author, ArticleContent, ArticleAuthorOrder, ReferenceLink, IdentifierMapping
 
 
 logger = logging.getLogger(__name__)
@@ -78,6 +95,8 @@ def send_user_notification(user_id, task_id, identifier_value, status, message,
 #     channel_layer.group_send(group_name, {"type": "send.notification", "payload": payload})
 
 
+# Парсеры авторов возвращают список полных имен в порядке авторства;
+# записи Author создаются пакетно в set_article_authors / get_author_ids.
 def parse_crossref_authors(authors_data):
     parsed_authors = []
     if not authors_data:
@@ -90,10 +109,9 @@ def parse_crossref_authors(authors_data):
             name_parts.append(author_info['family'])
         full_name = " ".join(name_parts).strip()
         if full_name:
-            author, _ = Author.objects.get_or_create(full_name=full_name)
-            parsed_authors.append({'author_obj': author, 'sequence': author_info.get('sequence', 'first')})
+            parsed_authors.append({'full_name': full_name, 'sequence': author_info.get('sequence', 'first')})
     parsed_authors.sort(key=lambda x: 0 if x['sequence'] == 'first' else 1)
-    return [item['author_obj'] for item in parsed_authors]
+    return [item['full_name'] for item in parsed_authors]
 
 
 def parse_europepmc_authors(authors_data_list):
@@ -106,8 +124,7 @@ def parse_europepmc_authors(authors_data_list):
                 if isinstance(author_entry, dict) and 'fullName' in author_entry:
                     full_name = author_entry['fullName'].strip()
                     if full_name:
-                        author, _ = Author.objects.get_or_create(full_name=full_name)
-                        parsed_authors.append(author)
+                        parsed_authors.append(full_name)
     return parsed_authors
 
 
@@ -119,8 +136,7 @@ def parse_s2_authors(authors_data_list):
         if isinstance(author_info, dict) and author_info.get('name'):
             full_name = author_info['name'].strip()
             if full_name:
-                author, _ = Author.objects.get_or_create(full_name=full_name)
-                parsed_authors.append(author)
+                parsed_authors.append(full_name)
     return parsed_authors
 
 
@@ -131,8 +147,7 @@ def parse_arxiv_authors(entry_element):
         if name_el is not None and name_el.text:
             full_name = name_el.text.strip()
             if full_name:
-                author, _ = Author.objects.get_or_create(full_name=full_name)
-                parsed_authors.append(author)
+                parsed_authors.append(full_name)
     return parsed_authors
 
 
@@ -148,8 +163,7 @@ def parse_pubmed_authors(author_list_node):
         if last_name_el is not None and last_name_el.text: name_parts.append(last_name_el.text.strip())
         full_name = " ".join(name_parts).strip()
         if full_name:
-            author, _ = Author.objects.get_or_create(full_name=full_name)
-            parsed_authors.append(author)
+            parsed_authors.append(full_name)
     return parsed_authors
 
 
@@ -164,11 +178,151 @@ def parse_rxiv_authors(authors_data_list):
                 parts = [p.strip() for p in full_name.split(',', 1)]
                 if len(parts) == 2:
                     full_name = f"{parts[1]} {parts[0]}"
-            author, _ = Author.objects.get_or_create(full_name=full_name)
-            parsed_authors.append(author)
+            parsed_authors.append(full_name)
     return parsed_authors
 
 
+# --- Авторы: пакетное сохранение вместо Author.objects.get_or_create на каждое имя ---
+AUTHOR_ID_CACHE_SIZE = getattr(settings, 'AUTHOR_ID_CACHE_SIZE', 20000)
+AUTHOR_NAME_MAX_LENGTH = Author._meta.get_field('full_name').max_length
+_author_id_cache = OrderedDict() # LRU: полное имя -> Author.id в пределах процесса воркера
+
+
+@receiver(post_delete, sender=Author)
+def _evict_deleted_author(sender, instance, **kwargs):
+    _author_id_cache.pop(instance.full_name, None)
+
+
+def _clean_author_names(names) -> list:
+    """Обрезает имена до длины поля и убирает повторы (автор не может дважды входить в статью), сохраняя порядок."""
+    cleaned = []
+    for name in names or []:
+        name = (name or '').strip()[:AUTHOR_NAME_MAX_LENGTH]
+        if name and name not in cleaned:
+            cleaned.append(name)
+    return cleaned
+
+
+def get_author_ids(names) -> dict:
+    """
+    Возвращает {полное имя: Author.id}, создавая отсутствующих авторов: имена, которых нет в LRU-кэше процесса,
+    вставляются одним bulk_create(ignore_conflicts=True) и дочитываются одним запросом IN.
+    """
+    names = _clean_author_names(names)
+    author_ids, missing = {}, []
+    for name in names:
+        if name in _author_id_cache:
+            _author_id_cache.move_to_end(name)
+            author_ids[name] = _author_id_cache[name]
+        else:
+            missing.append(name)
+    if missing:
+        # ignore_conflicts: имя могло быть создано параллельной задачей
+        Author.objects.bulk_create([Author(full_name=name) for name in missing], ignore_conflicts=True)
+        for name, author_id in Author.objects.filter(full_name__in=missing).values_list('full_name', 'id'):
+            author_ids[name] = author_id
+            _author_id_cache[name] = author_id
+        while len(_author_id_cache) > AUTHOR_ID_CACHE_SIZE:
+            _author_id_cache.popitem(last=False)
+    return author_ids
+
+
+def set_article_authors(article, names) -> int:
+    """Заменяет список авторов статьи: одно удаление и один bulk_create ArticleAuthorOrder. Возвращает число авторов."""
+    author_ids = get_author_ids(names)
+    orders = [
+        ArticleAuthorOrder(article=article, author_id=author_ids[name], order=order)
+        for order, name in enumerate(name for name in _clean_author_names(names) if name in author_ids)
+    ]
+    article.articleauthororder_set.all().delete()
+    ArticleAuthorOrder.objects.bulk_create(orders)
+    return len(orders)
+
+
+REFERENCE_UPSERT_FIELDS = ['raw_reference_text', 'manual_data_json', 'jats_ref_id', 'target_article_doi', 'status', 'order', 'updated_at']
+
+
+def upsert_article_references(article, parsed_references) -> list:
+    """
+    Сохраняет ссылки из parse_references_from_jats для статьи. Существующие ссылки читаются одним запросом
+    и сопоставляются в памяти (по jats_ref_id, затем DOI, затем исходному тексту), после чего выполняются
+    один bulk_create и один bulk_update. Статус сбрасывается на поиск статьи только при новом/измененном DOI;
+    order - позиция ссылки в parsed_references, поэтому передавать нужно полный список литературы.
+    Возвращает [(ref_data, ReferenceLink, created), ...] в порядке parsed_references (без пропущенных ссылок).
+    """
+    by_jats_id, by_doi, by_text = {}, {}, {}
+    for link in ReferenceLink.objects.filter(source_article=article):
+        if link.jats_ref_id:
+            by_jats_id.setdefault(link.jats_ref_id, link)
+        if link.target_article_doi:
+            by_doi.setdefault(link.target_article_doi, link)
+        if link.raw_reference_text:
+            by_text.setdefault(link.raw_reference_text, link)
+
+    now = timezone.now()
+    matched_ids = set()
+    results, to_create, to_update = [], [], []
+    for position, ref_data in enumerate(parsed_references):
+        ref_doi = ref_data.get('doi')
+        ref_raw_text = ref_data.get('raw_text')
+        jats_ref_id = ref_data.get('jats_ref_id')
+        # Нам нужен хотя бы какой-то идентификатор для ссылки (DOI, текст или внутренний ID)
+        if not (ref_doi or ref_raw_text or jats_ref_id):
+            continue
+
+        manual_data = {
+            'jats_ref_id': jats_ref_id,
+            'title': ref_data.get('title'),
+            'year': ref_data.get('year'),
+            'authors_str': ref_data.get('authors_str'),
+            'journal_title': ref_data.get('journal_title'),
+            'doi_from_source': ref_doi # DOI, извлеченный из JATS
+        }
+        manual_data = {k: v for k, v in manual_data.items() if v is not None} or None
+
+        link = None
+        for index, key in ((by_jats_id, jats_ref_id), (by_doi, ref_doi), (by_text, ref_raw_text)):
+            candidate = index.get(key) if key else None
+            if candidate is not None and candidate.id not in matched_ids:
+                link = candidate
+                break
+
+        if link is None:
+            link = ReferenceLink(
+                source_article=article,
+                raw_reference_text=ref_raw_text,
+                manual_data_json=manual_data,
+                jats_ref_id=jats_ref_id,
+                target_article_doi=ref_doi,
+                status=ReferenceLink.StatusChoices.DOI_PROVIDED_NEEDS_LOOKUP if ref_doi else ReferenceLink.StatusChoices.PENDING_DOI_INPUT,
+                order=position,
+            )
+            to_create.append(link)
+            results.append((ref_data, link, True))
+            continue
+
+        matched_ids.add(link.id)
+        values = {'raw_reference_text': ref_raw_text, 'manual_data_json': manual_data, 'jats_ref_id': jats_ref_id, 'order': position}
+        if ref_doi and ref_doi != link.target_article_doi:
+            values['target_article_doi'] = ref_doi
+            values['status'] = ReferenceLink.StatusChoices.DOI_PROVIDED_NEEDS_LOOKUP
+        changed = False
+        for field_name, value in values.items():
+            if getattr(link, field_name) != value:
+                setattr(link, field_name, value)
+                changed = True
+        if changed:
+            link.updated_at = now # bulk_update не обновляет auto_now поля
+            to_update.append(link)
+        results.append((ref_data, link, False))
+
+    if to_create:
+        ReferenceLink.objects.bulk_create(to_create, batch_size=500)
+    if to_update:
+        ReferenceLink.objects.bulk_update(to_update, REFERENCE_UPSERT_FIELDS, batch_size=500)
+    return results
+
+
 # def extract_text_from_jats_xml(xml_string: str, include_abstract: bool = False) -> str:
 #     """
 #     Улучшенное извлечение текста из JATS XML с сохранением структуры секций.
@@ -580,8 +734,7 @@ def parse_openalex_authors(authorships_data: list) -> list:
             if isinstance(author_info, dict) and author_info.get('display_name'):
                 full_name = author_info['display_name'].strip()
                 if full_name:
-                    author, _ = Author.objects.get_or_create(full_name=full_name)
-                    parsed_authors.append(author)
+                    parsed_authors.append(full_name)
     return parsed_authors
 
 
@@ -693,10 +846,771 @@ def parse_references_from_jats(xml_string: str) -> list:
     return references
 
 
-def download_pdf(pdf_url: str, identifier_value: str) -> str | None:
-    file_content = None
+NCBI_IDCONV_URL = 'https://www.ncbi.nlm.nih.gov/pmc/utils/idconv/v1.0/'
+
+
+def fetch_ncbi_id_mappings(identifiers: list, id_type: str) -> dict:
+    """
+    Запрос к NCBI PMC ID Converter: сопоставление DOI <-> PMID <-> PMCID.
+    id_type: 'doi', 'pmid' или 'pmcid' (все идентификаторы в запросе одного типа, до 200 штук).
+    Возвращает словарь {исходный_идентификатор: {'doi': ..., 'pmid': ..., 'pmcid': ...}}
+    только для найденных записей. Сетевые ошибки и RateLimitExceeded пробрасываются вызывающему коду.
+    """
+    mappings = {}
+    identifiers = [str(i).strip() for i in identifiers if i]
+    if not identifiers:
+        return mappings
+
+    params = {
+        'ids': ','.join(identifiers),
+        'idtype': id_type,
+        'format': 'json',
+        'versions': 'no',
+        'tool': 'ScientificPapersApp',
+        'email': getattr(settings, 'APP_EMAIL', ''),
+    }
+    if getattr(settings, 'NCBI_API_KEY', None):
+        params['api_key'] = settings.NCBI_API_KEY
+
+    wait_for_token(settings.API_SOURCE_NAMES['PUBMED']) # Общий лимит NCBI
+    response = http_get(NCBI_IDCONV_URL, params=params, timeout=30)
+    raise_if_rate_limited(settings.API_SOURCE_NAMES['PUBMED'], response)
+    response.raise_for_status()
+    data = response.json()
+
+    for record in data.get('records', []):
+        if record.get('status') == 'error':
+            continue
+        requested_id = str(record.get('requested-id') or '').strip()
+        if not requested_id:
+            continue
+        mappings[requested_id.lower() if id_type == 'doi' else requested_id] = {
+            'doi': record['doi'].lower() if record.get('doi') else None,
+            'pmid': str(record['pmid']) if record.get('pmid') else None,
+            'pmcid': record.get('pmcid'),
+        }
+    return mappings
+
+
+OPENALEX_WORKS_URL = 'https://api.openalex.org/works'
+IDENTIFIER_KEYS = ('doi', 'pubmed_id', 'pmc_id', 'arxiv_id', 'openalex_id')
+UNIQUE_IDENTIFIER_KEYS = ('doi', 'pubmed_id', 'pmc_id', 'arxiv_id') # Уникальны в IdentifierMapping
+
+
+def fetch_openalex_id_mappings(identifiers: list, id_type: str) -> dict:
+    """
+    Пакетное сопоставление идентификаторов через OpenAlex (filter=doi:a|b|c, до 50 значений).
+    id_type: 'doi' или 'pmid'. Возвращает {исходный_идентификатор: {'doi', 'pmid', 'pmcid', 'openalex_id'}}.
+    """
+    mappings = {}
+    identifiers = [str(i).strip() for i in identifiers if i]
+    if not identifiers:
+        return mappings
+
+    params = {
+        'filter': f"{id_type}:{'|'.join(identifiers)}",
+        'select': 'id,doi,ids',
+        'per-page': 50,
+        'mailto': getattr(settings, 'APP_EMAIL', ''),
+    }
+    wait_for_token(settings.API_SOURCE_NAMES['OPENALEX'])
+    response = http_get(OPENALEX_WORKS_URL, params=params, timeout=30)
+    raise_if_rate_limited(settings.API_SOURCE_NAMES['OPENALEX'], response)
+    response.raise_for_status()
+    data = response.json()
+
+    for work in data.get('results', []):
+        ids = work.get('ids') or {}
+        doi = (ids.get('doi') or work.get('doi') or '').replace('https://doi.org/', '').lower() or None
+        pmid = (ids.get('pmid') or '').rstrip('/').split('/')[-1] or None
+        pmcid = (ids.get('pmcid') or '').rstrip('/').split('/')[-1] or None
+        if pmcid and not pmcid.upper().startswith('PMC'):
+            pmcid = f"PMC{pmcid}"
+        record = {
+            'doi': doi,
+            'pmid': pmid,
+            'pmcid': pmcid,
+            'openalex_id': (ids.get('openalex') or work.get('id') or '').replace('https://openalex.org/', '') or None,
+        }
+        requested_id = doi if id_type == 'doi' else pmid
+        if requested_id:
+            mappings[requested_id] = record
+    return mappings
+
+
+def normalize_identifier_record(record: dict) -> dict:
+    """Приводит набор идентификаторов к каноничному виду (DOI в нижнем регистре, PMCID с префиксом PMC и т.д.)."""
+    normalized = {key: None for key in IDENTIFIER_KEYS}
+    for key in IDENTIFIER_KEYS:
+        value = record.get(key)
+        if value is None or not str(value).strip():
+            continue
+        value = str(value).strip()
+        if key == 'doi':
+            value = value.replace('https://doi.org/', '').lower()
+        elif key == 'pmc_id':
+            value = value.upper() if value.upper().startswith('PMC') else f"PMC{value}"
+        elif key == 'arxiv_id':
+            value = re.sub(r'v\d+$', '', value.replace('arXiv:', '').strip())
+        normalized[key] = value
+    return normalized
+
+
+def _merge_identifier_values(target: dict, source: dict) -> bool:
+    """Дополняет пустые идентификаторы target значениями из source. Возвращает True, если что-то добавлено."""
+    changed = False
+    for key in IDENTIFIER_KEYS:
+        if not target.get(key) and source.get(key):
+            target[key] = source[key]
+            changed = True
+    return changed
+
+
+def _load_identifier_mappings(records: list) -> dict:
+    """Одним запросом загружает записи IdentifierMapping для идентификаторов records; возвращает {(поле, значение): запись}."""
+    lookup_q = Q()
+    for key in UNIQUE_IDENTIFIER_KEYS:
+        values = {r[key] for r in records if r.get(key)}
+        if values:
+            lookup_q |= Q(**{f'{key}__in': values})
+    mapping_index = {}
+    if lookup_q:
+        for mapping in IdentifierMapping.objects.filter(lookup_q):
+            for key in UNIQUE_IDENTIFIER_KEYS:
+                value = getattr(mapping, key)
+                if value:
+                    mapping_index[(key, value)] = mapping
+    return mapping_index
+
+
+def _merge_resolved_by(resolved_by: str, sources) -> str | None:
+    merged = set(filter(None, (resolved_by or '').split(','))) | set(filter(None, sources))
+    return ','.join(sorted(merged)) or None
+
+
+def resolve_identifiers_batch(records: list, use_external: bool = True) -> list:
+    """
+    Этап разрешения идентификаторов для множества статей за минимальное число запросов.
+    records: список словарей с любыми из ключей doi / pubmed_id / pmc_id / arxiv_id / openalex_id.
+    Порядок: локальная таблица IdentifierMapping -> пакетный NCBI ID Converter (до 200 ID за запрос)
+    -> пакетный OpenAlex filter (до 50 ID за запрос). Результат сохраняется в IdentifierMapping,
+    свежие записи (IDENTIFIER_MAPPING_TTL_DAYS) повторно во внешние API не запрашиваются.
+    Возвращает список дополненных словарей в том же порядке. Если все внешние запросы по записи
+    завершились ошибкой, в ней выставлен флаг 'external_lookup_failed': отсутствие идентификатора
+    в этом случае означает "неизвестно", а не "не найдено", и вызывающий код может повторить попытку.
+    """
+    resolved = [normalize_identifier_record(r) for r in records]
+    if not resolved:
+        return resolved
+
+    ttl = timedelta(days=getattr(settings, 'IDENTIFIER_MAPPING_TTL_DAYS', 30))
+    fresh_after = timezone.now() - ttl
+
+    # --- 1. Локальная таблица сопоставлений (один запрос) ---
+    mapping_index = _load_identifier_mappings(resolved)
+
+    record_mappings = [None] * len(resolved)
+    needs_external = []
+    for idx, record in enumerate(resolved):
+        for key in UNIQUE_IDENTIFIER_KEYS:
+            mapping = mapping_index.get((key, record.get(key)))
+            if mapping:
+                record_mappings[idx] = mapping
+                _merge_identifier_values(record, mapping.as_dict())
+                break
+        mapping = record_mappings[idx]
+        if mapping is None or mapping.checked_at < fresh_after:
+            needs_external.append(idx)
+
+    if not use_external or not needs_external:
+        return resolved
+
+    resolved_by = {idx: set() for idx in needs_external}
+    failed, answered = set(), set() # Записи с ошибкой хотя бы одного запроса / с хотя бы одним ответом
+
+    # --- 2. NCBI ID Converter: DOI/PMID/PMCID (статьи, представленные в PMC) ---
+    for id_type, key in (('doi', 'doi'), ('pmid', 'pubmed_id'), ('pmcid', 'pmc_id')):
+        pending = [idx for idx in needs_external
+                   if resolved[idx].get(key) and not (resolved[idx].get('doi') and resolved[idx].get('pubmed_id') and resolved[idx].get('pmc_id'))]
+        for start in range(0, len(pending), 200):
+            chunk = pending[start:start + 200]
+            try:
+                ncbi_mappings = fetch_ncbi_id_mappings([resolved[idx][key] for idx in chunk], id_type)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                logger.warning(f"NCBI ID Converter batch lookup failed ({id_type}, {len(chunk)} ids): {e}")
+                failed.update(chunk)
+                continue
+            answered.update(chunk)
+            for idx in chunk:
+                found = ncbi_mappings.get(resolved[idx][key])
+                if found and _merge_identifier_values(resolved[idx], {'doi': found['doi'], 'pubmed_id': found['pmid'], 'pmc_id': found['pmcid']}):
+                    resolved_by[idx].add('ncbi_idconv')
+
+    # --- 3. OpenAlex ids: покрывает статьи вне PMC (PMID/DOI) и дает OpenAlex ID ---
+    for id_type, key in (('doi', 'doi'), ('pmid', 'pubmed_id')):
+        pending = [idx for idx in needs_external
+                   if resolved[idx].get(key) and not (resolved[idx].get('doi') and resolved[idx].get('pubmed_id') and resolved[idx].get('openalex_id'))]
+        for start in range(0, len(pending), 50):
+            chunk = pending[start:start + 50]
+            try:
+                openalex_mappings = fetch_openalex_id_mappings([resolved[idx][key] for idx in chunk], id_type)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                logger.warning(f"OpenAlex batch id lookup failed ({id_type}, {len(chunk)} ids): {e}")
+                failed.update(chunk)
+                continue
+            answered.update(chunk)
+            for idx in chunk:
+                found = openalex_mappings.get(resolved[idx][key])
+                if found and _merge_identifier_values(resolved[idx], {'doi': found['doi'], 'pubmed_id': found['pmid'], 'pmc_id': found['pmcid'], 'openalex_id': found['openalex_id']}):
+                    resolved_by[idx].add('openalex')
+
+    # --- 4. Сохранение сопоставлений (в т.ч. "пустых", чтобы не запрашивать их повторно до истечения TTL) ---
+    now = timezone.now()
+    to_create, to_update = [], []
+    additions = [] # (запись, поле, значение) для существующих записей; пишутся после проверки уникальности
+    created_index = {} # Одинаковые идентификаторы внутри пакета -> одна новая запись
+    for idx in needs_external:
+        if idx in failed:
+            continue
+        mapping = record_mappings[idx]
+        if mapping is None:
+            key_value = next(((key, resolved[idx][key]) for key in IDENTIFIER_KEYS if resolved[idx].get(key)), None)
+            mapping = created_index.get(key_value)
+            if mapping is None:
+                mapping = IdentifierMapping(**resolved[idx])
+                to_create.append(mapping)
+                if key_value:
+                    created_index[key_value] = mapping
+            record_mappings[idx] = mapping
+        else:
+            additions.extend((mapping, key, resolved[idx][key]) for key in IDENTIFIER_KEYS if resolved[idx].get(key) and not getattr(mapping, key))
+            to_update.append(mapping)
+        mapping.resolved_by = _merge_resolved_by(mapping.resolved_by, resolved_by[idx])
+        mapping.checked_at = now
+
+    if to_create:
+        # Запись с тем же идентификатором мог только что вставить параллельный конвейер: такие строки
+        # пропускаются, а сохраненные записи перечитываются и дополняются как существующие
+        IdentifierMapping.objects.bulk_create(to_create, ignore_conflicts=True)
+        stored_index = _load_identifier_mappings([m.as_dict() for m in to_create])
+        for mapping in to_create:
+            stored = next((stored_index[(key, getattr(mapping, key))] for key in UNIQUE_IDENTIFIER_KEYS if (key, getattr(mapping, key)) in stored_index), None)
+            if stored is None or stored.as_dict() == mapping.as_dict():
+                continue
+            additions.extend((stored, key, getattr(mapping, key)) for key in IDENTIFIER_KEYS if getattr(mapping, key) and not getattr(stored, key))
+            stored.resolved_by = _merge_resolved_by(stored.resolved_by, (mapping.resolved_by or '').split(','))
+            stored.checked_at = now
+            to_update.append(stored)
+
+    if additions:
+        # Значение, уже записанное в другой строке (другая статья или гонка), не переносим - иначе нарушим уникальность
+        taken = {}
+        for key in UNIQUE_IDENTIFIER_KEYS:
+            values = {value for _, field, value in additions if field == key}
+            taken[key] = dict(IdentifierMapping.objects.filter(**{f'{key}__in': values}).values_list(key, 'pk')) if values else {}
+        for mapping, key, value in additions:
+            owner_pk = taken.get(key, {}).get(value)
+            if owner_pk is not None and owner_pk != mapping.pk:
+                continue
+            if getattr(mapping, key) is None:
+                setattr(mapping, key, value)
+                if key in taken:
+                    taken[key][value] = mapping.pk
+
+    if to_update:
+        # bulk_update не применяет auto_now, поэтому checked_at выставлен вручную выше
+        try:
+            IdentifierMapping.objects.bulk_update(list({m.pk: m for m in to_update}.values()), list(IDENTIFIER_KEYS) + ['resolved_by', 'checked_at'])
+        except IntegrityError as e:
+            # Значение заняли между проверкой и записью; таблица - лишь кэш, результат разрешения от этого не зависит
+            logger.warning(f"Identifier mappings were not updated due to a concurrent write: {e}")
+
+    for idx in failed - answered:
+        resolved[idx]['external_lookup_failed'] = True
+    return resolved
+
+
+# --- Разбор списков идентификаторов для массовой загрузки ---
+# Тип идентификатора -> поле модели Article
+IDENTIFIER_TYPE_FIELDS = {
+    'DOI': 'doi',
+    'PMID': 'pubmed_id',
+    'PMCID': 'pmc_id',
+    'ARXIV': 'arxiv_id',
+}
+# Названия колонок CSV / ключей JSONL, которые распознаются как идентификаторы
+IDENTIFIER_COLUMN_ALIASES = {
+    'doi': 'DOI',
+    'pmid': 'PMID', 'pubmed_id': 'PMID', 'pubmed': 'PMID',
+    'pmcid': 'PMCID', 'pmc_id': 'PMCID', 'pmc': 'PMCID',
+    'arxiv': 'ARXIV', 'arxiv_id': 'ARXIV',
+}
+DOI_RE = re.compile(r'^10\.\d{4,9}/\S+$')
+ARXIV_NEW_RE = re.compile(r'^\d{4}\.\d{4,5}(v\d+)?$')
+ARXIV_OLD_RE = re.compile(r'^[a-z\-]+(\.[a-z]{2})?/\d{7}(v\d+)?$', re.IGNORECASE)
+
+
+def normalize_typed_identifier(value: str, identifier_type: str = None) -> tuple | None:
+    """
+    Приводит идентификатор к каноничному виду и определяет его тип, если он не указан.
+    Возвращает (тип, значение) или None, если строку не удалось распознать.
+    """
+    value = (value or '').strip().strip('"\'')
+    if not value:
+        return None
+    identifier_type = (identifier_type or '').strip().upper() or None
+    lowered = value.lower()
+    for prefix in ('https://doi.org/', 'http://doi.org/', 'https://dx.doi.org/', 'http://dx.doi.org/', 'doi:'):
+        if lowered.startswith(prefix):
+            value, lowered = value[len(prefix):].strip(), lowered[len(prefix):].strip()
+            identifier_type = identifier_type or 'DOI'
+            break
+    if lowered.startswith('arxiv:'):
+        value, identifier_type = value[len('arxiv:'):].strip(), identifier_type or 'ARXIV'
+    elif lowered.startswith('pmid:'):
+        value, identifier_type = value[len('pmid:'):].strip(), identifier_type or 'PMID'
+
+    if identifier_type is None:
+        if DOI_RE.match(value):
+            identifier_type = 'DOI'
+        elif value.isdigit():
+            identifier_type = 'PMID'
+        elif re.match(r'^PMC\d+$', value, re.IGNORECASE):
+            identifier_type = 'PMCID'
+        elif ARXIV_NEW_RE.match(value) or ARXIV_OLD_RE.match(value):
+            identifier_type = 'ARXIV'
+        else:
+            return None
+
+    if identifier_type == 'DOI':
+        value = value.lower()
+        return ('DOI', value) if DOI_RE.match(value) and ',' not in value else None
+    if identifier_type == 'PMID':
+        return ('PMID', value) if value.isdigit() else None
+    if identifier_type == 'PMCID':
+        digits = value[3:] if value.upper().startswith('PMC') else value
+        return ('PMCID', f"PMC{digits}") if digits.isdigit() else None
+    if identifier_type == 'ARXIV':
+        value = re.sub(r'v\d+$', '', value)
+        return ('ARXIV', value) if ARXIV_NEW_RE.match(value) or ARXIV_OLD_RE.match(value) else None
+    return None
+
+
+def _identifier_from_record(record) -> tuple | None:
+    """Идентификатор из элемента JSON/JSONL: строка, {'identifier': ..., 'type': ...} или {'doi': ...} / {'pmid': ...}."""
+    if isinstance(record, (str, int)):
+        return normalize_typed_identifier(str(record))
+    if not isinstance(record, dict):
+        return None
+    if record.get('identifier') or record.get('value'):
+        return normalize_typed_identifier(str(record.get('identifier') or record.get('value')), record.get('type'))
+    for key, value in record.items():
+        identifier_type = IDENTIFIER_COLUMN_ALIASES.get(str(key).strip().lower())
+        if identifier_type and value:
+            parsed = normalize_typed_identifier(str(value), identifier_type)
+            if parsed:
+                return parsed
+    return None
+
+
+def parse_identifier_records(records: list) -> tuple[list, list, int]:
+    """
+    Разбирает список записей (строки или словари) в уникальные идентификаторы.
+    Возвращает (entries, invalid, duplicates): entries - [{'type': 'DOI', 'value': ...}, ...] в исходном порядке.
+    """
+    entries, invalid, seen = [], [], set()
+    duplicates = 0
+    for record in records:
+        parsed = _identifier_from_record(record)
+        if not parsed:
+            if str(record).strip():
+                invalid.append(str(record)[:255])
+            continue
+        if parsed in seen:
+            duplicates += 1
+            continue
+        seen.add(parsed)
+        entries.append({'type': parsed[0], 'value': parsed[1]})
+    return entries, invalid, duplicates
+
+
+def parse_bulk_identifiers(content: str, filename: str = '') -> tuple[list, list, int]:
+    """
+    Разбирает загруженный список идентификаторов: JSONL (.jsonl/.ndjson), CSV (.csv/.tsv,
+    колонки doi/pmid/pmcid/arxiv или identifier+type) или простой текст по одному ID в строке.
+    Возвращает то же, что parse_identifier_records.
+    """
+    filename = (filename or '').lower()
+    lines = [line for line in content.splitlines() if line.strip()]
+    if not lines:
+        return [], [], 0
+
+    if filename.endswith(('.jsonl', '.ndjson')) or lines[0].lstrip().startswith(('{', '"')):
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                records.append(line)
+        return parse_identifier_records(records)
+
+    if filename.endswith(('.csv', '.tsv')) or any(sep in lines[0] for sep in (',', ';', '\t')):
+        try:
+            dialect = csv.Sniffer().sniff(lines[0], delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel_tab if filename.endswith('.tsv') else csv.excel
+        header = [col.strip().lower() for col in next(csv.reader([lines[0]], dialect))]
+        if 'identifier' in header or any(col in IDENTIFIER_COLUMN_ALIASES for col in header):
+            reader = csv.DictReader(io.StringIO('\n'.join(lines)), dialect=dialect)
+            records = [{str(k).strip().lower(): (v or '').strip() for k, v in row.items() if k} for row in reader]
+        else: # Без заголовка: идентификатор в первой колонке
+            records = [row[0] for row in csv.reader(lines, dialect) if row]
+        return parse_identifier_records(records)
+
+    return parse_identifier_records(lines)
+
+
+# --- Нормализация записей источников (общая для одиночных и пакетных задач) ---
+def normalize_crossref_work(api_data: dict) -> dict:
+    """Извлекает из записи CrossRef /works поля статьи: title, abstract, publication_date, journal_name, идентификаторы, authors."""
+    title_list = api_data.get('title')
+    title = ", ".join(title_list).strip() if title_list and isinstance(title_list, list) else None
+
+    abstract_raw = api_data.get('abstract')
+    abstract = abstract_raw.replace('<i>', '').replace('</i>', '').strip() if abstract_raw else None
+
+    publication_date = None
+    pub_date_data = api_data.get('published-print') or api_data.get('published-online') or api_data.get('created')
+    if pub_date_data and pub_date_data.get('date-parts') and isinstance(pub_date_data['date-parts'], list) and pub_date_data['date-parts'][0]:
+        date_parts = pub_date_data['date-parts'][0]
+        if isinstance(date_parts, list) and date_parts:
+            try:
+                publication_date = timezone.datetime(
+                    year=int(date_parts[0]),
+                    month=int(date_parts[1]) if len(date_parts) > 1 else 1,
+                    day=int(date_parts[2]) if len(date_parts) > 2 else 1
+                ).date()
+            except (ValueError, TypeError, IndexError):
+                pass
+
+    journal_list = api_data.get('container-title')
+    journal_name = ", ".join(journal_list).strip() if journal_list and isinstance(journal_list, list) else None
+
+    return {
+        'title': title or None,
+        'abstract': abstract or None,
+        'publication_date': publication_date,
+        'journal_name': journal_name or None,
+        'doi': api_data['DOI'].lower() if api_data.get('DOI') else None,
+        'pubmed_id': str(api_data['PMID']) if api_data.get('PMID') else None,
+        'authors': parse_crossref_authors(api_data.get('author')),
+    }
+
+
+def normalize_europepmc_result(api_article_data: dict) -> dict:
+    """Извлекает из результата поиска Europe PMC (resultType=core) поля статьи."""
+    publication_date = None
+    if api_article_data.get('firstPublicationDate'):
+        try:
+            publication_date = timezone.datetime.strptime(api_article_data['firstPublicationDate'], '%Y-%m-%d').date()
+        except ValueError:
+            pass
+
+    journal_name = None
+    journal_info = api_article_data.get('journalInfo')
+    if journal_info and isinstance(journal_info, dict):
+        journal_details = journal_info.get('journal')
+        if journal_details and isinstance(journal_details, dict) and journal_details.get('title'):
+            journal_name = journal_details['title']
+
+    return {
+        'title': api_article_data.get('title'),
+        'abstract': api_article_data.get('abstractText'),
+        'publication_date': publication_date,
+        'journal_name': journal_name,
+        'doi': api_article_data['doi'].lower() if api_article_data.get('doi') else None,
+        'pubmed_id': api_article_data.get('pmid'),
+        'pmc_id': api_article_data.get('pmcid'),
+        'authors': parse_europepmc_authors(api_article_data.get('authorList', {}).get('author')),
+    }
+
+
+# Поля работы OpenAlex, которые мы сохраняем (select= сокращает ответ пакетных запросов)
+OPENALEX_SELECT_FIELDS = 'id,doi,ids,display_name,title,abstract_inverted_index,publication_date,primary_location,authorships,open_access'
+
+
+def normalize_openalex_work(api_data: dict) -> dict:
+    """Извлекает из работы OpenAlex поля статьи, включая OA-информацию (best_oa_url, oa_status)."""
+    abstract = None
+    abstract_inverted_index = api_data.get('abstract_inverted_index')
+    if isinstance(abstract_inverted_index, dict) and abstract_inverted_index:
+        # Длину абстракта считаем по максимальной позиции слова в инвертированном индексе
+        max_pos = max(
+            (max(positions) for positions in abstract_inverted_index.values() if isinstance(positions, list) and positions),
+            default=-1
+        )
+        if max_pos >= 0:
+            abstract = reconstruct_abstract_from_inverted_index(abstract_inverted_index, max_pos + 1)
+
+    doi = (api_data.get('doi') or '').replace('https://doi.org/', '').lower() or None
+    ids = api_data.get('ids') or {}
+    pmid = (ids.get('pmid') or '').rstrip('/').split('/')[-1] or None
+
+    publication_date = None
+    if api_data.get('publication_date'):
+        try:
+            publication_date = timezone.datetime.strptime(api_data['publication_date'], '%Y-%m-%d').date()
+        except ValueError:
+            pass
+
+    journal_name = None
+    host_venue = api_data.get('host_venue') # Старый формат ответа
+    if host_venue and isinstance(host_venue, dict):
+        journal_name = host_venue.get('display_name') or host_venue.get('publisher')
+    if not journal_name:
+        source = (api_data.get('primary_location') or {}).get('source') or {}
+        journal_name = source.get('display_name')
+
+    open_access = api_data.get('open_access') or {}
+    return {
+        'title': api_data.get('display_name') or api_data.get('title'),
+        'abstract': abstract,
+        'publication_date': publication_date,
+        'journal_name': journal_name,
+        'doi': doi,
+        'pubmed_id': pmid,
+        'openalex_id': (api_data.get('id') or '').replace('https://openalex.org/', '') or None,
+        'best_oa_url': open_access.get('oa_url'),
+        'oa_status': open_access.get('oa_status'),
+        'authors': parse_openalex_authors(api_data.get('authorships')),
+    }
+
+
+# Semantic Scholar Graph API: поля статьи без вложенных списков references/citations
+# (они запрашиваются отдельно и постранично через fetch_s2_linked_papers)
+S2_GRAPH_API_URL = "https://api.semanticscholar.org/graph/v1"
+S2_PAPER_FIELDS = 'externalIds,url,title,abstract,venue,year,referenceCount,citationCount,influentialCitationCount,isOpenAccess,openAccessPdf,fieldsOfStudy,publicationTypes,publicationDate,journal,authors,tldr'
+S2_LINKED_PAPER_FIELDS = 'paperId,externalIds,title,year,venue,citationCount'
+S2_LINK_KINDS = {'citations': 'citingPaper', 'references': 'citedPaper'}
+
+
+def s2_paper_id_for_article(article) -> str | None:
+    """Идентификатор статьи для S2 Graph API (DOI:..., ARXIV:..., PMID:...) или None."""
+    if article.doi:
+        return f"DOI:{article.doi}"
+    if article.arxiv_id:
+        return f"ARXIV:{article.arxiv_id}"
+    if article.pubmed_id:
+        return f"PMID:{article.pubmed_id}"
+    return None
+
+
+def normalize_s2_paper(api_data: dict) -> dict:
+    """Извлекает из ответа S2 /paper/{id} (или элемента /paper/batch) поля статьи."""
+    publication_date = None
+    if api_data.get('publicationDate'):
+        try:
+            publication_date = timezone.datetime.strptime(api_data['publicationDate'], '%Y-%m-%d').date()
+        except (ValueError, TypeError):
+            pass
+
+    journal_info = api_data.get('journal')
+    journal_name = journal_info.get('name') if isinstance(journal_info, dict) and journal_info.get('name') else api_data.get('venue') or None
+
+    ext_ids = api_data.get('externalIds') or {}
+    open_access_pdf = api_data.get('openAccessPdf')
+    tldr = api_data.get('tldr')
+    return {
+        'title': api_data.get('title'),
+        'abstract': api_data.get('abstract'),
+        'publication_date': publication_date,
+        'journal_name': journal_name,
+        'doi': ext_ids.get('DOI').lower() if ext_ids.get('DOI') else None,
+        'arxiv_id': ext_ids.get('ArXiv'),
+        'pubmed_id': ext_ids.get('PubMed'),
+        'best_oa_pdf_url': open_access_pdf.get('url') if isinstance(open_access_pdf, dict) else None,
+        'tldr': tldr.get('text') if isinstance(tldr, dict) else None,
+        'authors': parse_s2_authors(api_data.get('authors')),
+    }
+
+
+def fetch_s2_linked_papers(s2_paper_id: str, kind: str, offset: int = 0, limit: int = 100) -> dict:
+    """
+    Одна страница цитирующих (kind='citations') или цитируемых (kind='references') статей из S2
+    (/paper/{id}/citations|references). Возвращает {'offset', 'next', 'results': [{paper_id, title, year, venue,
+    citation_count, doi}]}. Ответы кэшируются; при исчерпании лимита частоты выбрасывается RateLimitExceeded.
+    """
+    current_api_name = settings.API_SOURCE_NAMES['SEMANTICSCHOLAR']
+    params = {'fields': S2_LINKED_PAPER_FIELDS, 'offset': offset, 'limit': limit}
+    response = cached_get(
+        current_api_name, f"{S2_GRAPH_API_URL}/paper/{s2_paper_id.replace(' ', '%20')}/{kind}", params=params,
+        timeout=30, throttle=lambda: wait_for_token(current_api_name)
+    )
+    if response.status_code == 404:
+        return {'offset': offset, 'next': None, 'results': []}
+    response.raise_for_status()
+    data = response.json()
+
+    results = []
+    for item in data.get('data') or []:
+        paper = item.get(S2_LINK_KINDS[kind]) or {}
+        if not paper.get('paperId') and not paper.get('title'):
+            continue
+        doi = (paper.get('externalIds') or {}).get('DOI')
+        results.append({
+            'paper_id': paper.get('paperId'),
+            'title': paper.get('title'),
+            'year': paper.get('year'),
+            'venue': paper.get('venue') or None,
+            'citation_count': paper.get('citationCount'),
+            'doi': doi.lower() if doi else None,
+        })
+    return {'offset': data.get('offset', offset), 'next': data.get('next'), 'results': results}
+
+
+PUBMED_MONTH_MAP = {'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6, 'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12}
+
+
+def normalize_pubmed_article(pubmed_article_node) -> dict:
+    """
+    Извлекает поля статьи из элемента PubmedArticle (ответ EFetch db=pubmed).
+    Дополнительно возвращает mesh_terms. Если тега Article нет - ValueError.
+    """
+    article_node = pubmed_article_node.find('.//Article')
+    if article_node is None:
+        raise ValueError("Тег Article не найден в PubmedArticle.")
+
+    title_el = article_node.find('.//ArticleTitle')
+    title = title_el.text.strip() if title_el is not None and title_el.text else None
+
+    abstract_text_parts = []
+    for abst_text_node in article_node.findall('.//AbstractText'):
+        if abst_text_node.text:
+            label = abst_text_node.get('Label')
+            if label:
+                abstract_text_parts.append(f"{label.upper()}: {abst_text_node.text.strip()}")
+            else:
+                abstract_text_parts.append(abst_text_node.text.strip())
+    abstract = "\n\n".join(abstract_text_parts) if abstract_text_parts else None # Разделяем параграфы абстракта
+
+    journal_name = None
+    journal_title_el = article_node.find('.//Journal/Title')
+    if journal_title_el is not None and journal_title_el.text:
+        journal_name = journal_title_el.text.strip()
+
+    publication_date = None
+    pubdate_node = article_node.find('.//Journal/JournalIssue/PubDate')
+    if pubdate_node is not None:
+        year_el, month_el, day_el = pubdate_node.find('./Year'), pubdate_node.find('./Month'), pubdate_node.find('./Day')
+        if year_el is not None and year_el.text:
+            try:
+                month_str = month_el.text if month_el is not None and month_el.text else "1"
+                day_str = day_el.text if day_el is not None and day_el.text else "1"
+                month = int(month_str) if month_str.isdigit() else PUBMED_MONTH_MAP.get(month_str.lower()[:3], 1)
+                publication_date = timezone.datetime(int(year_el.text), month, int(day_str)).date()
+            except (ValueError, TypeError):
+                pass
+
+    pmid_el = pubmed_article_node.find('./MedlineCitation/PMID')
+    # ВАЖНО: PMCID и DOI берем из PubmedData основной статьи, а не из списка ссылок
+    pmcid_node = pubmed_article_node.find("./PubmedData/ArticleIdList/ArticleId[@IdType='pmc']")
+    doi_node = pubmed_article_node.find("./PubmedData/ArticleIdList/ArticleId[@IdType='doi']")
+
+    mesh_terms = []
+    for desc_el in pubmed_article_node.findall('.//MeshHeadingList/MeshHeading/DescriptorName'):
+        if desc_el.text:
+            mesh_terms.append(desc_el.text.strip())
+
+    return {
+        'title': title,
+        'abstract': abstract,
+        'publication_date': publication_date,
+        'journal_name': journal_name,
+        'doi': doi_node.text.strip().lower() if doi_node is not None and doi_node.text else None,
+        'pubmed_id': pmid_el.text.strip() if pmid_el is not None and pmid_el.text else None,
+        'pmc_id': pmcid_node.text.strip() if pmcid_node is not None and pmcid_node.text else None,
+        'mesh_terms': mesh_terms,
+        'authors': parse_pubmed_authors(article_node.find('.//AuthorList')),
+    }
+
+
+def split_pubmed_article_set(xml_text: str) -> dict:
+    """Разбивает ответ EFetch db=pubmed на статьи: {PMID: элемент PubmedArticle}."""
+    articles = {}
+    root = ET.fromstring(xml_text)
+    for pubmed_article_node in root.findall('./PubmedArticle'):
+        pmid_el = pubmed_article_node.find('./MedlineCitation/PMID')
+        if pmid_el is not None and pmid_el.text:
+            articles[pmid_el.text.strip()] = pubmed_article_node
+    return articles
+
+
+# Чтобы при сериализации отдельной статьи JATS сохранялись привычные префиксы (а не ns0:, ns1:)
+for _prefix, _uri in (('xlink', 'http://www.w3.org/1999/xlink'), ('mml', 'http://www.w3.org/1998/Math/MathML'), ('ali', 'http://www.niso.org/schemas/ali/1.0/')):
+    ET.register_namespace(_prefix, _uri)
+
+
+def split_pmc_article_set(xml_text: str) -> dict:
+    """Разбивает ответ EFetch db=pmc (pmc-articleset) на полные тексты: {PMCID: JATS XML одной статьи}."""
+    articles = {}
+    root = ET.fromstring(xml_text)
+    for article_el in root.findall('./article'):
+        pmcid = None
+        for id_el in article_el.findall('./front/article-meta/article-id'):
+            if id_el.get('pub-id-type') in ('pmc', 'pmcid') and id_el.text:
+                pmcid = id_el.text.strip()
+                break
+        if pmcid:
+            pmcid = pmcid.upper() if pmcid.upper().startswith('PMC') else f"PMC{pmcid}"
+            articles[pmcid] = ET.tostring(article_el, encoding='unicode')
+    return articles
+
+
+PDF_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class PdfTooLargeError(Exception):
+    """PDF больше settings.PDF_DOWNLOAD_MAX_BYTES."""
+
+
+def _stream_to_pdf_file(chunks, max_bytes: int) -> TemporaryUploadedFile:
+    """
+    Пишет поток байт во временный файл (FILE_UPLOAD_TEMP_DIR), считая SHA-256 по ходу записи.
+    Возвращает TemporaryUploadedFile с атрибутами size и sha256: FileSystemStorage.save перемещает такой файл
+    на место без копирования, а после закрытия/сборки мусора временный файл удаляется сам.
+    """
+    pdf_file = TemporaryUploadedFile('article.pdf', 'application/pdf', 0, None)
+    sha256 = hashlib.sha256()
+    size = 0
+    try:
+        for chunk in chunks:
+            if not chunk:
+                continue
+            size += len(chunk)
+            if size > max_bytes:
+                raise PdfTooLargeError(f"PDF exceeds {max_bytes} bytes")
+            sha256.update(chunk)
+            pdf_file.write(chunk)
+    except BaseException:
+        pdf_file.close()
+        raise
+    pdf_file.flush()
+    pdf_file.seek(0)
+    pdf_file.size = size
+    pdf_file.sha256 = sha256.hexdigest()
+    return pdf_file
+
+
+def download_pdf(pdf_url: str, identifier_value: str) -> TemporaryUploadedFile | None:
+    """
+    Скачивает PDF (requests, при неудаче - через браузер Playwright) потоково во временный файл,
+    не держа весь файл в памяти. Файлы больше settings.PDF_DOWNLOAD_MAX_BYTES не скачиваются.
+    Возвращает файл с атрибутами size и sha256 (см. _stream_to_pdf_file) или None.
+    """
+    pdf_file = None
     content_type = None
     response = None
+    max_bytes = getattr(settings, 'PDF_DOWNLOAD_MAX_BYTES', 100 * 1024 * 1024)
     logger.info(f"*** Start Download PDF from URL: {pdf_url} for identifier: {identifier_value}")
 
     try:
@@ -707,46 +1621,32 @@ def download_pdf(pdf_url: str, identifier_value: str) -> str | None:
             "DNT": "1",
             "Upgrade-Insecure-Requests": "1"
         }
-        response = requests.get(pdf_url, timeout=60, headers=headers, stream=True, allow_redirects=True) # разрешены редиректы
+        response = http_get(pdf_url, timeout=60, headers=headers, stream=True, allow_redirects=True) # разрешены редиректы
         print(f'****** response: {response}')
         if response.status_code == 200:
             content_type = response.headers.get('content-type', '').lower()
             print(f'****** content_type: {content_type}')
             if 'application/pdf' in content_type:
-                file_content = response.content
+                declared_size = int(response.headers.get('content-length') or 0)
+                if declared_size > max_bytes:
+                    raise PdfTooLargeError(f"Content-Length {declared_size} exceeds {max_bytes} bytes")
+                pdf_file = _stream_to_pdf_file(response.iter_content(chunk_size=PDF_DOWNLOAD_CHUNK_SIZE), max_bytes)
                 logger.info(f"*** (REQUESTS) Download PDF from URL: {pdf_url} for identifier: {identifier_value}")
-                # print(f'****** (REQUESTS) file_content: {file_content}')
+    except PdfTooLargeError as e:
+        # Через браузер пришел бы тот же файл - не пробуем
+        logger.warning(f"*** (REQUESTS) PDF from URL: {pdf_url} for identifier: {identifier_value} is too large: {e}")
+        return None
     except Exception as e:
         logger.error(f"*** (REQUESTS) Error download PDF from URL: {pdf_url} for identifier: {identifier_value} \nErro msg: {e}")
+    finally:
+        # stream=True: без close() непрочитанный ответ (например, HTML вместо PDF) не вернет соединение в пул
+        if response is not None:
+            response.close()
 
-    if not file_content:
+    if not pdf_file:
         try:
-            with sync_playwright() as p:
-                browser = p.chromium.launch(headless=True)
-                context = browser.new_context(
-                    # user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:100.0) Gecko/20100101 Firefox/100.0', # Firefox User-Agent
-                    user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.127 Safari/537.36', # Chrome User-Agent
-                    java_script_enabled=True,
-                    viewport={'width': 1920, 'height': 1080},
-                    locale='en-US',
-                    # color_scheme='light', # Можно попробовать 'dark' или 'light'
-                    # timezone_id='America/New_York', # Для большей маскировки
-                    permissions=['geolocation'], # Явно запрещаем геолокацию, если не нужна
-                    # bypass_csp=True, # Использовать с ОСТОРОЖНОСТЬЮ, может нарушить работу сайта или быть обнаруженным
-                    accept_downloads=True,
-                )
-                # Дополнительные заголовки, которые могут помочь
-                context.set_extra_http_headers({
-                    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9",
-                    "Accept-Language": "en-US,en;q=0.9",
-                    "Sec-Fetch-Dest": "document",
-                    "Sec-Fetch-Mode": "navigate",
-                    "Sec-Fetch-Site": "none", # или "cross-site", если переход с Unpaywall
-                    "Sec-Fetch-User": "?1",
-                    "Upgrade-Insecure-Requests": "1",
-                    "DNT": "1", # Do Not Track
-                })
-
+            # Контекст берется из долгоживущего браузера процесса, а не из нового запуска Chromium
+            with browser_context() as context:
                 page = context.new_page()
 
                 # Ждём загрузку после перехода
@@ -756,16 +1656,17 @@ def download_pdf(pdf_url: str, identifier_value: str) -> str | None:
                     # page.wait_for_timeout(5000)
                 download = download_info.value
 
-                # file_content = download.read()
-                with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-                    download.save_as(tmp_file.name)
-                    tmp_file.seek(0)
-                    file_content = tmp_file.read()
+                try:
+                    # Браузер локальный: читаем его файл загрузки частями, без полной копии в памяти
+                    with open(download.path(), 'rb') as downloaded:
+                        pdf_file = _stream_to_pdf_file(iter(partial(downloaded.read, PDF_DOWNLOAD_CHUNK_SIZE), b''), max_bytes)
+                finally:
+                    # Контекст живет дольше загрузки: удаляем его копию файла, иначе они копятся до закрытия контекста
+                    download.delete()
 
                 # page.wait_for_timeout(2000)
                 logger.info(f"*** (PLAYWRIGHT) Download PDF from URL: {pdf_url} for identifier: {identifier_value}")
-                browser.close()
         except Exception as e:
             logger.error(f"*** (PLAYWRIGHT) Error download PDF from URL: {pdf_url} for identifier: {identifier_value} \nErro msg: {e}")
 
-    return file_content
\ No newline at end of file
+    return pdf_file
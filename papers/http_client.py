@@ -0,0 +1,90 @@
+"""
+Общий HTTP-клиент для задач получения данных из внешних API.
+
+Одна requests.Session на процесс воркера: соединения (TCP+TLS) переиспользуются между задачами
+за счет keep-alive, для каждого API-хоста монтируется отдельный адаптер со своим размером пула,
+а сетевые ошибки и ответы 5xx повторяются на уровне urllib3 с короткой экспоненциальной задержкой.
+Ответ 429 не повторяется здесь: Retry-After сервера может быть сколь угодно долгим, поэтому он
+возвращается вызывающему коду, и задача перепланирует себя через countdown (rate_limit.raise_if_rate_limited).
+Сессия создается лениво и пересоздается после fork,
+поэтому prefork-воркеры Celery не делят сокеты родительского процесса.
+"""
+import os
+import threading
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+# Размеры пулов соединений по умолчанию для хостов, к которым обращаются задачи
+DEFAULT_HOST_POOL_SIZES = {
+    'api.crossref.org': 20,
+    'api.openalex.org': 20,
+    'api.semanticscholar.org': 10,
+    'eutils.ncbi.nlm.nih.gov': 10,
+    'www.ncbi.nlm.nih.gov': 10,
+    'pmc.ncbi.nlm.nih.gov': 10,
+    'www.ebi.ac.uk': 10,
+    'api.unpaywall.org': 10,
+    'export.arxiv.org': 4,
+    'api.biorxiv.org': 4,
+}
+
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def _build_retry() -> Retry:
+    return Retry(
+        total=getattr(settings, 'HTTP_CLIENT_MAX_RETRIES', 3),
+        backoff_factor=getattr(settings, 'HTTP_CLIENT_BACKOFF_FACTOR', 0.5),
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(['GET', 'HEAD']), # POST (MarkItDown) не повторяем автоматически
+        respect_retry_after_header=False, # Не спим в слоте воркера столько, сколько попросит сервер
+        raise_on_status=False, # После исчерпания попыток возвращаем ответ, raise_for_status решает задача
+    )
+
+
+def _build_session() -> requests.Session:
+    session = requests.Session()
+    default_pool_size = getattr(settings, 'HTTP_CLIENT_POOL_MAXSIZE', 10)
+    default_adapter = HTTPAdapter(pool_connections=10, pool_maxsize=default_pool_size, max_retries=_build_retry())
+    session.mount('https://', default_adapter)
+    session.mount('http://', default_adapter)
+
+    host_pool_sizes = {**DEFAULT_HOST_POOL_SIZES, **getattr(settings, 'HTTP_CLIENT_HOST_POOL_SIZES', {})}
+    for host, pool_size in host_pool_sizes.items():
+        # Отдельный адаптер на хост: пул одного медленного API не вытесняет соединения других
+        session.mount(f'https://{host}/', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=_build_retry()))
+    return session
+
+
+def get_session() -> requests.Session:
+    """Возвращает общую сессию текущего процесса (создает ее при первом обращении или после fork)."""
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = _build_session()
+                _session_pid = pid
+                logger.debug(f"HTTP session pool created for process {pid}")
+    return _session
+
+
+def http_get(url: str, **kwargs) -> requests.Response:
+    """requests.get через общий пул соединений процесса."""
+    return get_session().get(url, **kwargs)
+
+
+def http_post(url: str, **kwargs) -> requests.Response:
+    """requests.post через общий пул соединений процесса."""
+    return get_session().post(url, **kwargs)
@@ -0,0 +1,42 @@
+import os
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Запускает воркер Celery для одной очереди с параметрами из settings.CELERY_WORKER_PROFILES "
+        "(пул, concurrency, prefetch). Дополнительные аргументы после '--' передаются celery worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('queue', help="Имя очереди, например metadata-io")
+        parser.add_argument('--concurrency', type=int, help="Переопределить число процессов/гринлетов профиля")
+        parser.add_argument('--loglevel', default='info')
+        parser.add_argument('extra', nargs='*', help="Аргументы для celery worker (после '--')")
+
+    def handle(self, *args, **options):
+        profiles = getattr(settings, 'CELERY_WORKER_PROFILES', {})
+        queue = options['queue']
+        if queue not in profiles:
+            raise CommandError(f"Нет профиля воркера для очереди '{queue}'. Доступны: {', '.join(profiles)}")
+        profile = profiles[queue]
+
+        argv = [
+            sys.executable, '-m', 'celery', '-A', 'scientific_papers_project', 'worker',
+            '-Q', queue,
+            '-n', f'{queue}@%h',
+            '-P', profile.get('pool', 'prefork'),
+            f"--prefetch-multiplier={profile.get('prefetch_multiplier', 1)}",
+            f"--loglevel={options['loglevel']}",
+        ]
+        concurrency = options['concurrency'] or profile.get('concurrency')
+        if concurrency:
+            argv.append(f'--concurrency={concurrency}')
+        argv.extend(options['extra'])
+
+        self.stdout.write(' '.join(argv[1:]))
+        # Запуск в новом процессе celery: пул gevent должен пропатчить стандартную библиотеку до импорта Django
+        os.execv(sys.executable, argv)
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-17 03:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('papers', '0013_article_pdf_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdentifierMapping',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doi', models.CharField(blank=True, db_index=True, max_length=255, null=True, verbose_name='DOI')),
+                ('pubmed_id', models.CharField(blank=True, db_index=True, max_length=50, null=True, verbose_name='PubMed ID')),
+                ('pmc_id', models.CharField(blank=True, db_index=True, max_length=50, null=True, verbose_name='PubMed Central (PMC) ID')),
+                ('arxiv_id', models.CharField(blank=True, db_index=True, max_length=50, null=True, verbose_name='arXiv ID')),
+                ('openalex_id', models.CharField(blank=True, max_length=50, null=True, verbose_name='OpenAlex ID')),
+                ('resolved_by', models.CharField(blank=True, help_text="Через какие сервисы было получено сопоставление, например 'ncbi_idconv,openalex'", max_length=100, null=True, verbose_name='Источник сопоставления')),
+                ('checked_at', models.DateTimeField(auto_now=True, help_text='Когда сопоставление последний раз запрашивалось у внешних сервисов.', verbose_name='Дата последней проверки')),
+            ],
+            options={
+                'verbose_name': 'Сопоставление идентификаторов',
+                'verbose_name_plural': 'Сопоставления идентификаторов',
+                'ordering': ['-checked_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.1 on 2026-10-17 04:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('papers', '0014_identifiermapping'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BulkIngestionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_name', models.CharField(blank=True, help_text="Имя загруженного файла или 'request' для списка, переданного в теле запроса.", max_length=255, verbose_name='Источник списка')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает запуска'), ('running', 'Выполняется'), ('completed', 'Завершено'), ('failed', 'Ошибка')], db_index=True, default='pending', max_length=20, verbose_name='Статус')),
+                ('identifiers', models.JSONField(default=list, help_text="Разобранный и дедуплицированный список [{'type': 'DOI', 'value': '10.1000/xyz'}, ...]", verbose_name='Идентификаторы')),
+                ('invalid_identifiers', models.JSONField(blank=True, default=list, verbose_name='Нераспознанные строки')),
+                ('article_ids', models.JSONField(blank=True, default=list, verbose_name='ID созданных статей')),
+                ('total_submitted', models.PositiveIntegerField(default=0, verbose_name='Передано идентификаторов')),
+                ('existing_count', models.PositiveIntegerField(default=0, verbose_name='Уже были в БД')),
+                ('duplicate_count', models.PositiveIntegerField(default=0, verbose_name='Дубликаты в списке')),
+                ('created_count', models.PositiveIntegerField(default=0, verbose_name='Создано статей')),
+                ('enriched_count', models.PositiveIntegerField(default=0, verbose_name='Получены метаданные')),
+                ('not_found_count', models.PositiveIntegerField(default=0, verbose_name='Не найдено в источниках')),
+                ('total_batches', models.PositiveIntegerField(default=0, verbose_name='Всего пакетов')),
+                ('completed_batches', models.PositiveIntegerField(default=0, verbose_name='Обработано пакетов')),
+                ('failed_batches', models.PositiveIntegerField(default=0, verbose_name='Пакетов с ошибкой')),
+                ('celery_task_id', models.CharField(blank=True, max_length=255, null=True, verbose_name='ID задачи Celery')),
+                ('error_message', models.TextField(blank=True, null=True, verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата завершения')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bulk_ingestion_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Задание массовой загрузки',
+                'verbose_name_plural': 'Задания массовой загрузки',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.1 on 2026-10-17 04:17
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('papers', '0015_bulkingestionjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleSourceRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_api_name', models.CharField(max_length=100, verbose_name='Название API источника')),
+                ('record', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Нормализованная запись')),
+                ('fetched_at', models.DateTimeField(auto_now=True, verbose_name='Дата и время получения')),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='source_records', to='papers.article', verbose_name='Статья')),
+            ],
+            options={
+                'verbose_name': 'Запись источника для статьи',
+                'verbose_name_plural': 'Записи источников для статей',
+                'unique_together': {('article', 'source_api_name')},
+            },
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.1 on 2026-10-17 06:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from papers import content_store
+
+
+def move_content_to_blobs(apps, schema_editor):
+    """Переносит ArticleContent.content в сжатые ContentBlob (одинаковое содержимое - один блок)."""
+    ArticleContent = apps.get_model('papers', 'ArticleContent')
+    ContentBlob = apps.get_model('papers', 'ContentBlob')
+    for item in ArticleContent.objects.filter(blob__isnull=True).only('id', 'content').iterator(chunk_size=200):
+        raw = (item.content or '').encode('utf-8')
+        sha256 = content_store.content_hash(raw)
+        blob = ContentBlob.objects.filter(sha256=sha256).only('id').first()
+        if blob is None:
+            codec, compressed = content_store.compress(raw)
+            blob = ContentBlob(sha256=sha256, codec=codec, size=len(raw), compressed_size=len(compressed))
+            if content_store.should_offload(len(compressed)):
+                blob.storage_name = content_store.write_to_storage(sha256, codec, compressed)
+            else:
+                blob.data = compressed
+            blob.save()
+        ArticleContent.objects.filter(id=item.id).update(blob=blob)
+
+
+def restore_content_from_blobs(apps, schema_editor):
+    ArticleContent = apps.get_model('papers', 'ArticleContent')
+    for item in ArticleContent.objects.select_related('blob').iterator(chunk_size=200):
+        blob = item.blob
+        data = content_store.read_from_storage(blob.storage_name) if blob.storage_name else blob.data
+        text = content_store.decompress(blob.codec, bytes(data or b'')).decode('utf-8')
+        ArticleContent.objects.filter(id=item.id).update(content=text)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('papers', '0016_articlesourcerecord'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True, verbose_name='SHA-256 содержимого')),
+                ('codec', models.CharField(max_length=16, verbose_name='Кодек сжатия')),
+                ('size', models.PositiveBigIntegerField(verbose_name='Исходный размер, байт')),
+                ('compressed_size', models.PositiveBigIntegerField(verbose_name='Размер после сжатия, байт')),
+                ('data', models.BinaryField(blank=True, null=True, verbose_name='Сжатые данные')),
+                ('storage_name', models.CharField(blank=True, help_text='Путь в файловом хранилище, если блок вынесен из БД', max_length=500, null=True, verbose_name='Файл в хранилище')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Блок сжатого контента',
+                'verbose_name_plural': 'Блоки сжатого контента',
+            },
+        ),
+        migrations.AddField(
+            model_name='articlecontent',
+            name='blob',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='article_contents', to='papers.contentblob', verbose_name='Сжатое содержимое'),
+        ),
+        # Nullable на время переноса, чтобы откат мог заново добавить колонку к существующим строкам
+        migrations.AlterField(
+            model_name='articlecontent',
+            name='content',
+            field=models.TextField(blank=True, null=True, verbose_name='Содержимое'),
+        ),
+        migrations.RunPython(move_content_to_blobs, restore_content_from_blobs),
+        migrations.RemoveField(
+            model_name='articlecontent',
+            name='content',
+        ),
+        migrations.AlterField(
+            model_name='articlecontent',
+            name='blob',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='article_contents', to='papers.contentblob', verbose_name='Сжатое содержимое'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.1 on 2026-10-17 04:27
+
+from django.db import migrations, models
+
+
+def copy_jats_ref_ids(apps, schema_editor):
+    """Заполняет jats_ref_id из manual_data_json['jats_ref_id'] существующих ссылок."""
+    ReferenceLink = apps.get_model('papers', 'ReferenceLink')
+    batch = []
+    for ref in ReferenceLink.objects.filter(manual_data_json__isnull=False).only('id', 'manual_data_json').iterator(chunk_size=1000):
+        jats_ref_id = ref.manual_data_json.get('jats_ref_id') if isinstance(ref.manual_data_json, dict) else None
+        if jats_ref_id:
+            ref.jats_ref_id = str(jats_ref_id)[:255]
+            batch.append(ref)
+        if len(batch) >= 1000:
+            ReferenceLink.objects.bulk_update(batch, ['jats_ref_id'])
+            batch = []
+    if batch:
+        ReferenceLink.objects.bulk_update(batch, ['jats_ref_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('papers', '0017_contentblob_articlecontent_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='referencelink',
+            name='jats_ref_id',
+            field=models.CharField(blank=True, help_text='Атрибут id тега <ref> в JATS XML исходной статьи; уникален в пределах статьи и связывает текст со ссылкой.', max_length=255, null=True, verbose_name='ID ссылки в JATS'),
+        ),
+        migrations.RunPython(copy_jats_ref_ids, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='referencelink',
+            index=models.Index(fields=['source_article', 'jats_ref_id'], name='papers_ref_article_jats_idx'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.1 on 2026-10-17 04:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('papers', '0018_referencelink_jats_ref_id'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CitationCrawlJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает запуска'), ('running', 'Выполняется'), ('completed', 'Завершено'), ('failed', 'Ошибка')], db_index=True, default='pending', max_length=20, verbose_name='Статус')),
+                ('max_depth', models.PositiveSmallIntegerField(default=1, verbose_name='Максимальная глубина')),
+                ('max_articles', models.PositiveIntegerField(default=100, verbose_name='Максимум статей')),
+                ('source_budgets', models.JSONField(blank=True, default=dict, help_text='{имя источника: максимум запросов}; источник без записи не ограничен, 0 - не использовать.', verbose_name='Бюджет запросов по источникам')),
+                ('source_requests', models.JSONField(blank=True, default=dict, verbose_name='Израсходовано запросов')),
+                ('current_depth', models.PositiveSmallIntegerField(default=0, verbose_name='Текущая глубина')),
+                ('discovered_count', models.PositiveIntegerField(default=0, verbose_name='Найдено статей')),
+                ('scheduled_count', models.PositiveIntegerField(default=0, verbose_name='Взято в обработку')),
+                ('fetched_count', models.PositiveIntegerField(default=0, verbose_name='Получены метаданные')),
+                ('not_found_count', models.PositiveIntegerField(default=0, verbose_name='Не найдено в источниках')),
+                ('stop_reason', models.CharField(blank=True, choices=[('frontier_exhausted', 'Все найденные статьи обработаны'), ('max_articles', 'Достигнут лимит статей'), ('budget_exhausted', 'Исчерпан бюджет запросов к источникам')], max_length=30, null=True, verbose_name='Причина остановки')),
+                ('celery_task_id', models.CharField(blank=True, max_length=255, null=True, verbose_name='ID задачи Celery')),
+                ('error_message', models.TextField(blank=True, null=True, verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата завершения')),
+                ('root_article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='citation_crawl_jobs', to='papers.article', verbose_name='Корневая статья')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='citation_crawl_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Задание обхода цитирований',
+                'verbose_name_plural': 'Задания обхода цитирований',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CitationCrawlNode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doi', models.CharField(max_length=255, verbose_name='DOI')),
+                ('depth', models.PositiveSmallIntegerField(verbose_name='Глубина')),
+                ('citation_count', models.PositiveIntegerField(blank=True, help_text='По данным Semantic Scholar на момент обнаружения; определяет порядок загрузки внутри уровня.', null=True, verbose_name='Число цитирований')),
+                ('status', models.CharField(choices=[('queued', 'В очереди'), ('scheduled', 'Загружается'), ('fetched', 'Загружена'), ('not_found', 'Не найдена в источниках'), ('skipped', 'Пропущена (лимит)')], default='queued', max_length=20, verbose_name='Статус')),
+                ('expanded', models.BooleanField(default=False, verbose_name='Список литературы обработан')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('article', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='citation_crawl_nodes', to='papers.article', verbose_name='Статья')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='nodes', to='papers.citationcrawljob', verbose_name='Задание обхода')),
+                ('parent_article', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='papers.article', verbose_name='Цитирующая статья')),
+            ],
+            options={
+                'verbose_name': 'Узел обхода цитирований',
+                'verbose_name_plural': 'Узлы обхода цитирований',
+                'ordering': ['depth', '-citation_count'],
+                'indexes': [models.Index(fields=['job', 'status', 'depth'], name='papers_crawl_node_queue_idx')],
+                'constraints': [models.UniqueConstraint(fields=('job', 'doi'), name='papers_crawl_node_job_doi_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-17 04:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('papers', '0019_citationcrawljob_citationcrawlnode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='pdf_sha256',
+            field=models.CharField(blank=True, db_index=True, help_text='Хеш содержимого PDF; по нему находятся статьи с тем же файлом и готовым pdf_text', max_length=64, null=True, verbose_name='SHA-256 PDF файла'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.1 on 2026-10-17 05:01
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def drop_duplicate_mappings(apps, schema_editor):
+    """Оставляет по каждому идентификатору самую свежую запись сопоставления (таблица - кэш, остальные не нужны)."""
+    IdentifierMapping = apps.get_model('papers', 'IdentifierMapping')
+    for key in ('doi', 'pubmed_id', 'pmc_id', 'arxiv_id'):
+        duplicated = (
+            IdentifierMapping.objects.filter(**{f'{key}__isnull': False})
+            .values(key).annotate(rows=Count('id')).filter(rows__gt=1).values_list(key, flat=True)
+        )
+        for value in list(duplicated):
+            stale_ids = list(
+                IdentifierMapping.objects.filter(**{key: value}).order_by('-checked_at', '-id').values_list('id', flat=True)[1:]
+            )
+            IdentifierMapping.objects.filter(id__in=stale_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('papers', '0020_article_pdf_sha256'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='identifiermapping',
+            name='arxiv_id',
+            field=models.CharField(blank=True, max_length=50, null=True, verbose_name='arXiv ID'),
+        ),
+        migrations.AlterField(
+            model_name='identifiermapping',
+            name='doi',
+            field=models.CharField(blank=True, max_length=255, null=True, verbose_name='DOI'),
+        ),
+        migrations.AlterField(
+            model_name='identifiermapping',
+            name='pmc_id',
+            field=models.CharField(blank=True, max_length=50, null=True, verbose_name='PubMed Central (PMC) ID'),
+        ),
+        migrations.AlterField(
+            model_name='identifiermapping',
+            name='pubmed_id',
+            field=models.CharField(blank=True, max_length=50, null=True, verbose_name='PubMed ID'),
+        ),
+        migrations.RunPython(drop_duplicate_mappings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='identifiermapping',
+            constraint=models.UniqueConstraint(condition=models.Q(('doi__isnull', False)), fields=('doi',), name='papers_idmap_doi_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='identifiermapping',
+            constraint=models.UniqueConstraint(condition=models.Q(('pubmed_id__isnull', False)), fields=('pubmed_id',), name='papers_idmap_pubmed_id_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='identifiermapping',
+            constraint=models.UniqueConstraint(condition=models.Q(('pmc_id__isnull', False)), fields=('pmc_id',), name='papers_idmap_pmc_id_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='identifiermapping',
+            constraint=models.UniqueConstraint(condition=models.Q(('arxiv_id__isnull', False)), fields=('arxiv_id',), name='papers_idmap_arxiv_id_uniq'),
+        ),
+    ]
@@ -1,6 +1,15 @@
-from django.db import models
+import json
+import hashlib
+
+from django.db import models, transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.core.serializers.json import DjangoJSONEncoder
 from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
+from django_cleanup import cleanup
+
+from . import content_store
 
 
 class Author(models.Model):
@@ -17,6 +26,35 @@ class Author(models.Model):
         ordering = ['full_name']
 
 
+# Текстовые колонки Article, которые могут занимать мегабайты; в списках и связях их не загружаем
+ARTICLE_HEAVY_FIELDS = ('abstract', 'cleaned_text_for_llm', 'pdf_text', 'structured_content')
+
+PDF_STORE_PREFIX = 'articles_pdf'
+
+
+def pdf_store_name(sha256: str) -> str:
+    """Путь PDF в хранилище по хешу содержимого: одинаковый PDF разных статей - один файл."""
+    return f"{PDF_STORE_PREFIX}/{sha256[:2]}/{sha256}.pdf"
+
+
+def article_heavy_fields(prefix: str = '') -> list:
+    """Имена тяжелых полей Article для defer() через связь, например article_heavy_fields('resolved_article__')."""
+    return [f"{prefix}{name}" for name in ARTICLE_HEAVY_FIELDS]
+
+
+class ArticleQuerySet(models.QuerySet):
+    """Пресеты загрузки полей Article: полные строки нужны только там, где действительно читается текст."""
+
+    def light(self):
+        """Все поля, кроме тяжелых текстов (при обращении к ним Django догрузит значение отдельным запросом)."""
+        return self.defer(*ARTICLE_HEAVY_FIELDS)
+
+    def titles(self):
+        """Минимум для ссылок и подписей: id, владелец, название и идентификаторы."""
+        return self.only('id', 'user_id', 'title', 'doi', 'pubmed_id', 'updated_at')
+
+
+@cleanup.ignore # PDF хранятся по хешу и бывают общими для нескольких статей; файлы удаляет release_pdf_file
 class Article(models.Model):
     """Основная модель для хранения научной статьи и ее метаданных."""
     user = models.ForeignKey(
@@ -74,6 +112,14 @@ class Article(models.Model):
         null=True,
         blank=True,
     )
+    pdf_sha256 = models.CharField(
+        _("SHA-256 PDF файла"),
+        max_length=64,
+        null=True,
+        blank=True,
+        db_index=True,
+        help_text=_("Хеш содержимого PDF; по нему находятся статьи с тем же файлом и готовым pdf_text")
+    )
 
     # --- Источник основной записи ---
     primary_source_api = models.CharField(
@@ -132,6 +178,8 @@ class Article(models.Model):
     created_at = models.DateTimeField(_("Дата создания"), auto_now_add=True)
     updated_at = models.DateTimeField(_("Дата обновления"), auto_now=True)
 
+    objects = ArticleQuerySet.as_manager()
+
     class Meta:
         verbose_name = _("Научная статья")
         verbose_name_plural = _("Научные статьи")
@@ -198,29 +246,73 @@ class Article(models.Model):
         # if not self.cleaned_text_for_llm and self.abstract: # Если после всего текста нет, а абстракт есть
             # self.cleaned_text_for_llm = self.abstract
 
+    @staticmethod
+    def _hash_structured_content(value) -> str:
+        return hashlib.sha1(json.dumps(value, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')).hexdigest()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Запоминаем хеш structured_content при загрузке, чтобы save() не перечитывал строку для сравнения
+        instance = super().from_db(db, field_names, values)
+        deferred_fields = instance.get_deferred_fields()
+        if 'structured_content' not in deferred_fields:
+            instance._loaded_structured_content_hash = cls._hash_structured_content(instance.structured_content)
+        if 'pdf_file' not in deferred_fields:
+            # Имя файла при загрузке: после замены PDF старый файл освобождается (см. save)
+            instance._loaded_pdf_file_name = instance.pdf_file.name or None
+        return instance
+
+    def structured_content_changed(self) -> bool:
+        """True, если structured_content изменен после загрузки из БД (для новых объектов - всегда)."""
+        loaded_hash = getattr(self, '_loaded_structured_content_hash', None)
+        return loaded_hash is None or loaded_hash != self._hash_structured_content(self.structured_content)
+
     def save(self, *args, **kwargs):
-        # Автоматически регенерируем cleaned_text_for_llm, если structured_content изменился
-        # или если cleaned_text_for_llm пуст, а structured_content есть.
-        # Это можно сделать более избирательно, если отслеживать изменения structured_content.
-        # Для простоты, пока будем делать это при каждом save, если structured_content есть.
-        if self.structured_content:
-            # Проверяем, изменилось ли structured_content (если объект уже в БД)
-            if self.pk:
-                try:
-                    old_version = Article.objects.get(pk=self.pk)
-                    if old_version.structured_content != self.structured_content or \
-                        (not self.cleaned_text_for_llm and self.structured_content):
-                            self.regenerate_cleaned_text_from_structured()
-                except Article.DoesNotExist:
-                    self.regenerate_cleaned_text_from_structured() # Для нового объекта
-            else: # Новый объект
+        # Регенерируем cleaned_text_for_llm, если structured_content изменился после загрузки
+        # или если cleaned_text_for_llm пуст, а structured_content есть. Отложенные (defer/only) поля
+        # не трогаем, чтобы не вызвать их загрузку.
+        update_fields = kwargs.get('update_fields')
+        deferred_fields = self.get_deferred_fields()
+        if 'structured_content' not in deferred_fields and (update_fields is None or 'structured_content' in update_fields):
+            cleaned_text_missing = 'cleaned_text_for_llm' not in deferred_fields and not self.cleaned_text_for_llm
+            if self.structured_content and (self.structured_content_changed() or cleaned_text_missing):
                 self.regenerate_cleaned_text_from_structured()
+                if update_fields is not None and 'cleaned_text_for_llm' not in update_fields:
+                    kwargs['update_fields'] = list(update_fields) + ['cleaned_text_for_llm']
+        loaded_pdf_name = getattr(self, '_loaded_pdf_file_name', None)
+        pdf_name = (self.pdf_file.name or None) if 'pdf_file' not in deferred_fields else loaded_pdf_name
+        if pdf_name != loaded_pdf_name and 'pdf_sha256' not in deferred_fields and self.pdf_sha256 \
+                and pdf_name != pdf_store_name(self.pdf_sha256):
+            # PDF заменен не через хранилище по хешу (например, загружен в админке) - хеш больше не соответствует файлу
+            self.pdf_sha256 = None
+            if update_fields is not None and 'pdf_sha256' not in kwargs['update_fields']:
+                kwargs['update_fields'] = list(kwargs['update_fields']) + ['pdf_sha256']
         super().save(*args, **kwargs)
+        if 'structured_content' not in deferred_fields:
+            self._loaded_structured_content_hash = self._hash_structured_content(self.structured_content)
+        if loaded_pdf_name and pdf_name != loaded_pdf_name:
+            transaction.on_commit(lambda: release_pdf_file(loaded_pdf_name))
+        if 'pdf_file' not in deferred_fields:
+            self._loaded_pdf_file_name = pdf_name
 
     def __str__(self):
         return self.title[:100] # Возвращаем первые 100 символов названия
 
 
+def release_pdf_file(name: str):
+    """Удаляет PDF из хранилища, если на него больше не ссылается ни одна статья."""
+    if name and not Article.objects.filter(pdf_file=name).exists():
+        Article._meta.get_field('pdf_file').storage.delete(name)
+
+
+@receiver(post_delete, sender=Article)
+def _release_article_pdf_file(sender, instance, **kwargs):
+    pdf_name = instance.__dict__.get('pdf_file') # Без обращения к отложенному полю
+    pdf_name = getattr(pdf_name, 'name', pdf_name)
+    if pdf_name:
+        transaction.on_commit(lambda: release_pdf_file(pdf_name))
+
+
 class ArticleAuthorOrder(models.Model):
     """Промежуточная модель для связи Article и Author с указанием порядка."""
     article = models.ForeignKey(Article, on_delete=models.CASCADE)
@@ -237,8 +329,75 @@ class ArticleAuthorOrder(models.Model):
         ]
 
 
+class ContentBlob(models.Model):
+    """
+    Сжатое содержимое ArticleContent, дедуплицированное по SHA-256 исходных байт.
+    Данные лежат в data либо, для крупных блоков, в файловом хранилище (storage_name); см. content_store.
+    """
+    sha256 = models.CharField(_("SHA-256 содержимого"), max_length=64, unique=True)
+    codec = models.CharField(_("Кодек сжатия"), max_length=16)
+    size = models.PositiveBigIntegerField(_("Исходный размер, байт"))
+    compressed_size = models.PositiveBigIntegerField(_("Размер после сжатия, байт"))
+    data = models.BinaryField(_("Сжатые данные"), null=True, blank=True)
+    storage_name = models.CharField(
+        _("Файл в хранилище"),
+        max_length=500, null=True, blank=True,
+        help_text=_("Путь в файловом хранилище, если блок вынесен из БД")
+    )
+    created_at = models.DateTimeField(_("Дата создания"), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Блок сжатого контента")
+        verbose_name_plural = _("Блоки сжатого контента")
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.codec}, {self.size} -> {self.compressed_size})"
+
+    @classmethod
+    def store(cls, text: str) -> 'ContentBlob':
+        """Возвращает блок с этим содержимым, создавая его (сжатие + при необходимости вынос в хранилище) только для новых данных."""
+        raw = (text or '').encode('utf-8')
+        sha256 = content_store.content_hash(raw)
+        existing = cls.objects.defer('data').filter(sha256=sha256).first()
+        if existing:
+            return existing
+        codec, compressed = content_store.compress(raw)
+        defaults = {'codec': codec, 'size': len(raw), 'compressed_size': len(compressed)}
+        if content_store.should_offload(len(compressed)):
+            defaults['storage_name'] = content_store.write_to_storage(sha256, codec, compressed)
+        else:
+            defaults['data'] = compressed
+        blob, created = cls.objects.get_or_create(sha256=sha256, defaults=defaults)
+        return blob
+
+    def read_bytes(self) -> bytes:
+        data = content_store.read_from_storage(self.storage_name) if self.storage_name else self.data
+        return content_store.decompress(self.codec, bytes(data or b''))
+
+    def read_text(self) -> str:
+        return self.read_bytes().decode('utf-8')
+
+
+@receiver(post_delete, sender=ContentBlob)
+def _delete_content_blob_file(sender, instance, **kwargs):
+    if instance.storage_name:
+        content_store.delete_from_storage(instance.storage_name)
+
+
+class ArticleContentQuerySet(models.QuerySet):
+
+    def with_blob_meta(self):
+        """Подтягивает метаданные блока (размер, хеш) без самих сжатых данных."""
+        return self.select_related('blob').defer('blob__data')
+
+
 class ArticleContent(models.Model):
-    """Хранение "сырого" контента статьи из различных API и в различных форматах."""
+    """
+    Хранение "сырого" контента статьи из различных API и в различных форматах.
+    Само содержимое лежит в ContentBlob (сжатое, общее для одинаковых ответов); атрибут content
+    читает и записывает его прозрачно, поэтому ArticleContent.objects.update_or_create(defaults={'content': ...})
+    работает как раньше.
+    """
     article = models.ForeignKey(
         Article,
         related_name='contents',
@@ -255,18 +414,75 @@ class ArticleContent(models.Model):
         max_length=50,
         help_text=_("Например, 'json_metadata', 'xml_fulltext_jats', 'abstract_text', 'references_list_json'")
     )
-    content = models.TextField(_("Содержимое")) # Используем TextField; для JSON можно использовать JSONField, если СУБД поддерживает
+    blob = models.ForeignKey(
+        ContentBlob,
+        related_name='article_contents',
+        on_delete=models.PROTECT, # Блок может использоваться несколькими записями; сироты удаляет prune_orphan_content_blobs_task
+        verbose_name=_("Сжатое содержимое")
+    )
     retrieved_at = models.DateTimeField(_("Дата и время загрузки"), auto_now_add=True)
 
+    objects = ArticleContentQuerySet.as_manager()
+
+    _content_cache = None
+    _content_changed = False
+
     def __str__(self):
         return f"{self.article.title[:30]}... - {self.source_api_name} ({self.format_type})"
 
+    @property
+    def content(self) -> str:
+        """Распакованное содержимое; читается из ContentBlob при первом обращении."""
+        if self._content_cache is None and self.blob_id:
+            self._content_cache = self.blob.read_text()
+        return self._content_cache or ''
+
+    @content.setter
+    def content(self, value):
+        # Как и TextField, приводим нестроковые значения (например, список MeSH-терминов) к строке
+        self._content_cache = '' if value is None else str(value)
+        self._content_changed = True
+
+    def save(self, *args, **kwargs):
+        if self._content_changed:
+            self.blob = ContentBlob.store(self._content_cache)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'blob' not in update_fields:
+                kwargs['update_fields'] = list(update_fields) + ['blob']
+        super().save(*args, **kwargs)
+        self._content_changed = False
+
     class Meta:
         verbose_name = _("Контент статьи из источника")
         verbose_name_plural = _("Контент статей из источников")
         unique_together = ('article', 'source_api_name', 'format_type') # Для одной статьи, один тип контента от одного API
 
 
+class ArticleSourceRecord(models.Model):
+    """
+    Нормализованные метаданные статьи от одного источника (title, abstract, даты, идентификаторы, авторы),
+    сохраненные задачей источника в конвейере. Статья обновляется один раз на этапе консолидации,
+    который объединяет записи всех источников по API_SOURCE_OVERALL_PRIORITY.
+    """
+    article = models.ForeignKey(
+        Article,
+        related_name='source_records',
+        on_delete=models.CASCADE,
+        verbose_name=_("Статья")
+    )
+    source_api_name = models.CharField(_("Название API источника"), max_length=100)
+    record = models.JSONField(_("Нормализованная запись"), default=dict, encoder=DjangoJSONEncoder)
+    fetched_at = models.DateTimeField(_("Дата и время получения"), auto_now=True)
+
+    def __str__(self):
+        return f"ArticleID:{self.article_id} - {self.source_api_name}"
+
+    class Meta:
+        verbose_name = _("Запись источника для статьи")
+        verbose_name_plural = _("Записи источников для статей")
+        unique_together = ('article', 'source_api_name')
+
+
 class ReferenceLink(models.Model):
     """Модель для хранения ссылок (references) внутри статьи и их связи с другими статьями в БД."""
 
@@ -317,6 +533,13 @@ class ReferenceLink(models.Model):
         blank=True,
         help_text=_("JSON с метаданными цитируемой статьи, если она добавляется вручную (title, authors, year, etc.).")
     )
+    jats_ref_id = models.CharField(
+        _("ID ссылки в JATS"),
+        max_length=255,
+        null=True,
+        blank=True,
+        help_text=_("Атрибут id тега <ref> в JATS XML исходной статьи; уникален в пределах статьи и связывает текст со ссылкой.")
+    )
     status = models.CharField(
         _("Статус ссылки"),
         max_length=50, # Убедитесь, что длина достаточна для новых значений
@@ -342,6 +565,9 @@ class ReferenceLink(models.Model):
         ordering = ['order'] # ordering = ['-created_at']
         verbose_name = _("Библиографическая ссылка")
         verbose_name_plural = _("Библиографические ссылки")
+        indexes = [
+            models.Index(fields=['source_article', 'jats_ref_id'], name='papers_ref_article_jats_idx'),
+        ]
 
     def __str__(self):
         if self.resolved_article:
@@ -414,3 +640,286 @@ class AnalyzedSegment(models.Model):
     def __str__(self):
         section_info = f"Секция: {self.section_key}" if self.section_key else "Общий текст"
         return f"Сегмент из '{self.article.title[:30]}...' ({section_info}): '{self.segment_text[:50]}...'"
+
+
+class IdentifierMapping(models.Model):
+    """
+    Локальная таблица соответствия идентификаторов публикаций (DOI / PMID / PMCID / arXiv / OpenAlex).
+    Служит кэшем этапа разрешения идентификаторов, чтобы не обращаться к внешним API повторно
+    для статей, которые уже встречались (например, в списках литературы других статей).
+    """
+    doi = models.CharField(_("DOI"), max_length=255, null=True, blank=True)
+    pubmed_id = models.CharField(_("PubMed ID"), max_length=50, null=True, blank=True)
+    pmc_id = models.CharField(_("PubMed Central (PMC) ID"), max_length=50, null=True, blank=True)
+    arxiv_id = models.CharField(_("arXiv ID"), max_length=50, null=True, blank=True)
+    openalex_id = models.CharField(_("OpenAlex ID"), max_length=50, null=True, blank=True)
+    resolved_by = models.CharField(
+        _("Источник сопоставления"),
+        max_length=100,
+        null=True,
+        blank=True,
+        help_text=_("Через какие сервисы было получено сопоставление, например 'ncbi_idconv,openalex'")
+    )
+    checked_at = models.DateTimeField(
+        _("Дата последней проверки"),
+        auto_now=True,
+        help_text=_("Когда сопоставление последний раз запрашивалось у внешних сервисов.")
+    )
+
+    class Meta:
+        verbose_name = _("Сопоставление идентификаторов")
+        verbose_name_plural = _("Сопоставления идентификаторов")
+        ordering = ['-checked_at']
+        constraints = [
+            # Одна запись на идентификатор: параллельные конвейеры не создают дубликатов (индекс служит и для поиска)
+            models.UniqueConstraint(fields=[key], condition=models.Q(**{f'{key}__isnull': False}), name=f'papers_idmap_{key}_uniq')
+            for key in ('doi', 'pubmed_id', 'pmc_id', 'arxiv_id')
+        ]
+
+    def as_dict(self):
+        return {
+            'doi': self.doi,
+            'pubmed_id': self.pubmed_id,
+            'pmc_id': self.pmc_id,
+            'arxiv_id': self.arxiv_id,
+            'openalex_id': self.openalex_id,
+        }
+
+    def __str__(self):
+        parts = [f"{k}={v}" for k, v in self.as_dict().items() if v]
+        return ", ".join(parts) or f"IdentifierMapping {self.id}"
+
+
+class BulkIngestionJob(models.Model):
+    """
+    Задание массовой загрузки статей по списку идентификаторов (DOI / PMID / PMCID / arXiv).
+    Идентификаторы сверяются с уже существующими статьями, новые статьи создаются пакетно,
+    а метаданные запрашиваются пакетными запросами к источникам вместо отдельного конвейера на статью.
+    """
+
+    class StatusChoices(models.TextChoices):
+        PENDING = 'pending', _('Ожидает запуска')
+        RUNNING = 'running', _('Выполняется')
+        COMPLETED = 'completed', _('Завершено')
+        FAILED = 'failed', _('Ошибка')
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='bulk_ingestion_jobs',
+        verbose_name=_("Пользователь")
+    )
+    source_name = models.CharField(
+        _("Источник списка"),
+        max_length=255,
+        blank=True,
+        help_text=_("Имя загруженного файла или 'request' для списка, переданного в теле запроса.")
+    )
+    status = models.CharField(
+        _("Статус"),
+        max_length=20,
+        choices=StatusChoices.choices,
+        default=StatusChoices.PENDING,
+        db_index=True
+    )
+    identifiers = models.JSONField(
+        _("Идентификаторы"),
+        default=list,
+        help_text=_("Разобранный и дедуплицированный список [{'type': 'DOI', 'value': '10.1000/xyz'}, ...]")
+    )
+    invalid_identifiers = models.JSONField(
+        _("Нераспознанные строки"),
+        default=list,
+        blank=True
+    )
+    article_ids = models.JSONField(
+        _("ID созданных статей"),
+        default=list,
+        blank=True
+    )
+    total_submitted = models.PositiveIntegerField(_("Передано идентификаторов"), default=0)
+    existing_count = models.PositiveIntegerField(_("Уже были в БД"), default=0)
+    duplicate_count = models.PositiveIntegerField(_("Дубликаты в списке"), default=0)
+    created_count = models.PositiveIntegerField(_("Создано статей"), default=0)
+    enriched_count = models.PositiveIntegerField(_("Получены метаданные"), default=0)
+    not_found_count = models.PositiveIntegerField(_("Не найдено в источниках"), default=0)
+    total_batches = models.PositiveIntegerField(_("Всего пакетов"), default=0)
+    completed_batches = models.PositiveIntegerField(_("Обработано пакетов"), default=0)
+    failed_batches = models.PositiveIntegerField(_("Пакетов с ошибкой"), default=0)
+    celery_task_id = models.CharField(_("ID задачи Celery"), max_length=255, null=True, blank=True)
+    error_message = models.TextField(_("Ошибка"), null=True, blank=True)
+    created_at = models.DateTimeField(_("Дата создания"), auto_now_add=True)
+    updated_at = models.DateTimeField(_("Дата обновления"), auto_now=True)
+    finished_at = models.DateTimeField(_("Дата завершения"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("Задание массовой загрузки")
+        verbose_name_plural = _("Задания массовой загрузки")
+        ordering = ['-created_at']
+
+    @property
+    def progress_percent(self) -> int:
+        if self.status == self.StatusChoices.COMPLETED:
+            return 100
+        if not self.total_batches:
+            return 0
+        return min(99, int((self.completed_batches + self.failed_batches) * 100 / self.total_batches))
+
+    def __str__(self):
+        return f"Массовая загрузка #{self.id} ({self.get_status_display()}): {self.total_submitted} ID"
+
+
+class CitationCrawlJob(models.Model):
+    """
+    Задание обхода цитирований: от корневой статьи в ширину по спискам литературы (граница обхода -
+    CitationCrawlNode) с ограничениями по глубине, числу статей и числу запросов к каждому источнику.
+    На каждом уровне первыми загружаются наиболее цитируемые статьи.
+    """
+
+    class StatusChoices(models.TextChoices):
+        PENDING = 'pending', _('Ожидает запуска')
+        RUNNING = 'running', _('Выполняется')
+        COMPLETED = 'completed', _('Завершено')
+        FAILED = 'failed', _('Ошибка')
+
+    class StopReasonChoices(models.TextChoices):
+        FRONTIER_EXHAUSTED = 'frontier_exhausted', _('Все найденные статьи обработаны')
+        MAX_ARTICLES = 'max_articles', _('Достигнут лимит статей')
+        BUDGET_EXHAUSTED = 'budget_exhausted', _('Исчерпан бюджет запросов к источникам')
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='citation_crawl_jobs',
+        verbose_name=_("Пользователь")
+    )
+    root_article = models.ForeignKey(
+        Article,
+        on_delete=models.CASCADE,
+        related_name='citation_crawl_jobs',
+        verbose_name=_("Корневая статья")
+    )
+    status = models.CharField(
+        _("Статус"),
+        max_length=20,
+        choices=StatusChoices.choices,
+        default=StatusChoices.PENDING,
+        db_index=True
+    )
+    max_depth = models.PositiveSmallIntegerField(_("Максимальная глубина"), default=1)
+    max_articles = models.PositiveIntegerField(_("Максимум статей"), default=100)
+    source_budgets = models.JSONField(
+        _("Бюджет запросов по источникам"),
+        default=dict,
+        blank=True,
+        help_text=_("{имя источника: максимум запросов}; источник без записи не ограничен, 0 - не использовать.")
+    )
+    source_requests = models.JSONField(
+        _("Израсходовано запросов"),
+        default=dict,
+        blank=True
+    )
+    current_depth = models.PositiveSmallIntegerField(_("Текущая глубина"), default=0)
+    discovered_count = models.PositiveIntegerField(_("Найдено статей"), default=0)
+    scheduled_count = models.PositiveIntegerField(_("Взято в обработку"), default=0)
+    fetched_count = models.PositiveIntegerField(_("Получены метаданные"), default=0)
+    not_found_count = models.PositiveIntegerField(_("Не найдено в источниках"), default=0)
+    stop_reason = models.CharField(
+        _("Причина остановки"),
+        max_length=30,
+        choices=StopReasonChoices.choices,
+        null=True,
+        blank=True
+    )
+    celery_task_id = models.CharField(_("ID задачи Celery"), max_length=255, null=True, blank=True)
+    error_message = models.TextField(_("Ошибка"), null=True, blank=True)
+    created_at = models.DateTimeField(_("Дата создания"), auto_now_add=True)
+    updated_at = models.DateTimeField(_("Дата обновления"), auto_now=True)
+    finished_at = models.DateTimeField(_("Дата завершения"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("Задание обхода цитирований")
+        verbose_name_plural = _("Задания обхода цитирований")
+        ordering = ['-created_at']
+
+    @property
+    def progress_percent(self) -> int:
+        if self.status == self.StatusChoices.COMPLETED:
+            return 100
+        if not self.max_articles:
+            return 0
+        return min(99, int(self.scheduled_count * 100 / self.max_articles))
+
+    def remaining_budget(self, source_name: str):
+        """Сколько запросов к источнику еще можно сделать (None - без ограничения)."""
+        budget = (self.source_budgets or {}).get(source_name)
+        if budget is None:
+            return None
+        return max(0, budget - (self.source_requests or {}).get(source_name, 0))
+
+    def __str__(self):
+        return f"Обход цитирований #{self.id} ({self.get_status_display()}): статья {self.root_article_id}, глубина {self.max_depth}"
+
+
+class CitationCrawlNode(models.Model):
+    """Статья на границе обхода цитирований: DOI, найденный на глубине depth, и ее очередь/результат."""
+
+    class StatusChoices(models.TextChoices):
+        QUEUED = 'queued', _('В очереди')
+        SCHEDULED = 'scheduled', _('Загружается')
+        FETCHED = 'fetched', _('Загружена')
+        NOT_FOUND = 'not_found', _('Не найдена в источниках')
+        SKIPPED = 'skipped', _('Пропущена (лимит)')
+
+    job = models.ForeignKey(
+        CitationCrawlJob,
+        on_delete=models.CASCADE,
+        related_name='nodes',
+        verbose_name=_("Задание обхода")
+    )
+    doi = models.CharField(_("DOI"), max_length=255)
+    depth = models.PositiveSmallIntegerField(_("Глубина"))
+    citation_count = models.PositiveIntegerField(
+        _("Число цитирований"),
+        null=True,
+        blank=True,
+        help_text=_("По данным Semantic Scholar на момент обнаружения; определяет порядок загрузки внутри уровня.")
+    )
+    parent_article = models.ForeignKey(
+        Article,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name=_("Цитирующая статья")
+    )
+    article = models.ForeignKey(
+        Article,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='citation_crawl_nodes',
+        verbose_name=_("Статья")
+    )
+    status = models.CharField(
+        _("Статус"),
+        max_length=20,
+        choices=StatusChoices.choices,
+        default=StatusChoices.QUEUED
+    )
+    expanded = models.BooleanField(_("Список литературы обработан"), default=False)
+    created_at = models.DateTimeField(_("Дата создания"), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Узел обхода цитирований")
+        verbose_name_plural = _("Узлы обхода цитирований")
+        ordering = ['depth', '-citation_count']
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'doi'], name='papers_crawl_node_job_doi_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['job', 'status', 'depth'], name='papers_crawl_node_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.doi} (глубина {self.depth}, {self.get_status_display()})"
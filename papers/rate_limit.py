@@ -0,0 +1,137 @@
+"""
+Распределенный ограничитель частоты запросов к внешним API (token bucket в Redis).
+
+Для каждого API (ключи - значения settings.API_SOURCE_NAMES) в Redis хранится "ведро" токенов,
+которое пополняется со скоростью settings.API_RATE_LIMITS[api] запросов в секунду. Списание токена
+выполняется атомарно Lua-скриптом, поэтому лимит соблюдается суммарно всеми воркерами Celery.
+
+Если токена нет, короткое ожидание (до RATE_LIMIT_MAX_INLINE_WAIT) выполняется на месте,
+а при более долгом выбрасывается RateLimitExceeded с retry_after - задача должна перепланировать
+себя через countdown, а не занимать слот воркера сном.
+"""
+import time
+import logging
+from email.utils import parsedate_to_datetime
+
+import redis
+from django.conf import settings
+
+from .redis_client import get_redis_client
+
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1] - ключ ведра; ARGV: скорость (токенов/сек), емкость, текущее время (сек), запрошено токенов.
+# Возвращает время ожидания в секундах строкой ("0" - токен списан).
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local requested = tonumber(ARGV[4])
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1])
+local ts = tonumber(bucket[2])
+if tokens == nil or ts == nil then
+    tokens = capacity
+    ts = now
+end
+
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= requested then
+    tokens = tokens - requested
+else
+    wait = (requested - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return tostring(wait)
+"""
+
+KEY_PREFIX = 'ratelimit:bucket:'
+
+_script = None
+_script_client = None
+
+
+class RateLimitExceeded(Exception):
+    """Токен для API не получен в пределах допустимого ожидания; задачу нужно повторить через retry_after секунд."""
+
+    def __init__(self, api_name: str, retry_after: float):
+        self.api_name = api_name
+        self.retry_after = retry_after
+        super().__init__(f"Rate limit for {api_name}: retry after {retry_after:.2f}s")
+
+
+def _get_script():
+    global _script, _script_client
+    redis_url = getattr(settings, 'RATE_LIMIT_REDIS_URL', None) or settings.CELERY_BROKER_URL
+    client = get_redis_client(redis_url)
+    if _script is None or _script_client is not client: # Новый клиент после fork
+        _script = client.register_script(TOKEN_BUCKET_SCRIPT)
+        _script_client = client
+    return _script
+
+
+def acquire(api_name: str, tokens: int = 1) -> float:
+    """
+    Пытается списать токен для api_name. Возвращает 0, если токен получен,
+    иначе - через сколько секунд он появится. Для API без настроенного лимита всегда 0.
+    При недоступности Redis лимитер пропускает запрос (fail-open), чтобы не останавливать конвейер.
+    """
+    rate = getattr(settings, 'API_RATE_LIMITS', {}).get(api_name)
+    if not rate:
+        return 0.0
+    capacity = max(1.0, float(rate)) # Допускаем всплеск не более чем на секунду запросов
+    try:
+        wait = _get_script()(keys=[f"{KEY_PREFIX}{api_name}"], args=[rate, capacity, time.time(), tokens])
+        return float(wait)
+    except redis.exceptions.RedisError as e:
+        logger.warning(f"Rate limiter unavailable for {api_name}, request is not throttled: {e}")
+        return 0.0
+
+
+def wait_for_token(api_name: str, max_inline_wait: float = None) -> None:
+    """
+    Получает токен для api_name. Короткое ожидание выполняется на месте, а если токен появится
+    позже чем через max_inline_wait секунд - выбрасывает RateLimitExceeded.
+    """
+    if max_inline_wait is None:
+        max_inline_wait = getattr(settings, 'RATE_LIMIT_MAX_INLINE_WAIT', 0.5)
+    waited = 0.0
+    while True:
+        wait = acquire(api_name)
+        if wait <= 0:
+            return
+        if waited + wait > max_inline_wait:
+            raise RateLimitExceeded(api_name, wait)
+        time.sleep(wait)
+        waited += wait
+
+
+def retry_after_seconds(response, default: float = None) -> float:
+    """Значение заголовка Retry-After (секунды или HTTP-дата) в секундах; без заголовка - default."""
+    if default is None:
+        default = getattr(settings, 'RATE_LIMIT_DEFAULT_RETRY_AFTER', 30)
+    value = (response.headers.get('Retry-After') or '').strip()
+    if not value:
+        return float(default)
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return float(default)
+    return max(0.0, min(seconds, getattr(settings, 'RATE_LIMIT_MAX_RETRY_AFTER', 600)))
+
+
+def raise_if_rate_limited(api_name: str, response) -> None:
+    """
+    Ответ 429 от API превращает в RateLimitExceeded с retry_after из заголовка Retry-After,
+    чтобы задача перепланировала себя через countdown, а не ждала в слоте воркера.
+    """
+    if response.status_code == 429:
+        raise RateLimitExceeded(api_name, retry_after_seconds(response))
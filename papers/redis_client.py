@@ -0,0 +1,33 @@
+"""
+Общий клиент Redis для координации между воркерами (ограничитель частоты, очереди пакетных запросов).
+
+Клиент создается лениво, один на процесс и URL, и пересоздается после fork,
+чтобы prefork-воркеры Celery не делили соединения родительского процесса.
+"""
+import os
+import threading
+
+import redis
+from django.conf import settings
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_redis_client(url: str = None) -> redis.Redis:
+    """Возвращает клиент Redis текущего процесса для url (по умолчанию COORDINATION_REDIS_URL или брокер Celery)."""
+    url = url or getattr(settings, 'COORDINATION_REDIS_URL', None) or settings.CELERY_BROKER_URL
+    pid = os.getpid()
+    client_key = (pid, url)
+    client = _clients.get(client_key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(client_key)
+            if client is None:
+                # Клиенты родительского процесса после fork не используются
+                for stale_key in [key for key in _clients if key[0] != pid]:
+                    _clients.pop(stale_key, None)
+                client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+                _clients[client_key] = client
+    return client
@@ -1,5 +1,6 @@
+from django.urls import reverse
 from rest_framework import serializers
-from .models import Author, Article, ArticleAuthorOrder, ArticleContent, ReferenceLink, User, AnalyzedSegment
+from .models import Author, Article, ArticleAuthorOrder, ArticleContent, ReferenceLink, User, AnalyzedSegment, BulkIngestionJob, CitationCrawlJob, CitationCrawlNode
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -17,12 +18,28 @@ class AuthorSerializer(serializers.ModelSerializer):
 
 
 class ArticleContentSerializer(serializers.ModelSerializer):
-    """Сериализатор для модели ArticleContent."""
+    """
+    Сериализатор для модели ArticleContent. Само содержимое в ответ не включается (только размер, хеш
+    и ссылка download_url на эндпоинт raw); при создании/изменении принимается в поле content.
+    """
+    content = serializers.CharField(write_only=True, allow_blank=True, trim_whitespace=False)
+    content_size = serializers.IntegerField(source='blob.size', read_only=True)
+    content_sha256 = serializers.CharField(source='blob.sha256', read_only=True)
+    download_url = serializers.SerializerMethodField()
+
     class Meta:
         model = ArticleContent
-        fields = ['id', 'article', 'source_api_name', 'format_type', 'content', 'retrieved_at']
+        fields = [
+            'id', 'article', 'source_api_name', 'format_type', 'content',
+            'content_size', 'content_sha256', 'download_url', 'retrieved_at'
+        ]
         read_only_fields = ('retrieved_at',)
 
+    def get_download_url(self, obj):
+        url = reverse('articlecontent-raw', kwargs={'pk': obj.pk})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
 
 # class ReferenceLinkSerializer(serializers.ModelSerializer):
 #     source_article_title = serializers.StringRelatedField(source='source_article.title', read_only=True) # Убрал source_article как ID
@@ -72,19 +89,20 @@ class ArticleContentSerializer(serializers.ModelSerializer):
 class ReferenceLinkSerializer(serializers.ModelSerializer):
     source_article_title = serializers.StringRelatedField(source='source_article.title', read_only=True)
     resolved_article_title = serializers.StringRelatedField(source='resolved_article.title', read_only=True)
-    source_article = serializers.PrimaryKeyRelatedField(queryset=Article.objects.all())
+    source_article = serializers.PrimaryKeyRelatedField(queryset=Article.objects.light())
 
     class Meta:
         model = ReferenceLink
         fields = [
             'id', 'source_article', 'source_article_title', 'raw_reference_text',
             'target_article_doi', 'resolved_article', 'resolved_article_title',
-            'manual_data_json', 'status', 'log_messages', 'created_at', 'updated_at'
+            'manual_data_json', 'jats_ref_id', 'status', 'log_messages', 'created_at', 'updated_at'
         ]
         read_only_fields = (
             'created_at', 'updated_at',
             'source_article_title', 'resolved_article_title',
             'resolved_article', # resolved_article по-прежнему обновляется только системой
+            'jats_ref_id', # Заполняется при разборе JATS XML
             'log_messages'
         )
 
@@ -123,12 +141,52 @@ class ArticleAuthorOrderSerializer(serializers.ModelSerializer):
         fields = ['author_id', 'author_name', 'order']
 
 
+def article_sub_resource_links(article, request=None) -> dict:
+    """URL постраничных подресурсов статьи (ссылки, сырой контент, сегменты)."""
+    links = {}
+    for name in ('references', 'contents', 'segments'):
+        url = reverse(f'article-{name}', kwargs={'pk': article.pk})
+        links[name] = request.build_absolute_uri(url) if request else url
+    return links
+
+
+class ArticleListSerializer(serializers.ModelSerializer):
+    """Компактное представление статьи для списка: метаданные, авторы строкой и ссылки на подресурсы."""
+    authors = serializers.SerializerMethodField()
+    links = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Article
+        fields = [
+            'id', 'title', 'doi', 'pubmed_id', 'arxiv_id', 'journal_name', 'publication_date',
+            'primary_source_api', 'oa_status', 'is_user_initiated', 'authors', 'links', 'updated_at'
+        ]
+        read_only_fields = fields
+
+    def get_authors(self, obj):
+        # articleauthororder_set предзагружен во ViewSet вместе с author
+        return [author_order.author.full_name for author_order in obj.articleauthororder_set.all()]
+
+    def get_links(self, obj):
+        return article_sub_resource_links(obj, self.context.get('request'))
+
+
 class ArticleSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор статьи. Набор полей можно сузить через context['selected_fields']
+    (его формирует ArticleViewSet из параметров ?fields= и ?expand=).
+    """
+    # Тяжелые тексты и вложенные списки: в списке статей отдаются только по ?expand=
+    EXPANDABLE_FIELDS = ('abstract', 'cleaned_text_for_llm', 'structured_content', 'contents', 'references_made')
+    # Вложенные коллекции вынесены в постраничные подресурсы (links); целиком - только по ?expand=
+    COLLECTION_FIELDS = ('contents', 'references_made')
+
     user = UserSerializer(read_only=True)
     user_id = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), source='user', write_only=True, required=False)
     article_authors = ArticleAuthorOrderSerializer(source='articleauthororder_set', many=True, required=False)
     contents = ArticleContentSerializer(many=True, read_only=True)
     references_made = ReferenceLinkSerializer(many=True, read_only=True)
+    links = serializers.SerializerMethodField()
     # structured_content по умолчанию будет доступен для записи, т.к. это JSONField
     # cleaned_text_for_llm будет только для чтения, т.к. генерируется на бэкенде
 
@@ -142,11 +200,36 @@ class ArticleSerializer(serializers.ModelSerializer):
             'is_user_initiated',
             'structured_content',
             'article_authors',
-            'contents', 'references_made',
+            'contents', 'references_made', 'links',
             'created_at', 'updated_at'
         ]
         read_only_fields = ('created_at', 'updated_at', 'user', 'cleaned_text_for_llm')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        selected_fields = self.context.get('selected_fields')
+        if selected_fields is not None:
+            for field_name in set(self.fields) - set(selected_fields):
+                self.fields.pop(field_name)
+
+    @classmethod
+    def resolve_selected_fields(cls, fields_param: str = None, expand_param: str = None, omit_expandable: bool = False) -> list:
+        """
+        Список отдаваемых полей по параметрам запроса. fields_param ("id,title,doi") задает точный набор
+        (id выдается всегда), expand_param добавляет к нему поля из EXPANDABLE_FIELDS. Без fields_param
+        отдаются все поля, кроме COLLECTION_FIELDS и (если omit_expandable=True) EXPANDABLE_FIELDS,
+        не запрошенных через expand.
+        """
+        expand = {name.strip() for name in (expand_param or '').split(',') if name.strip()}
+        if fields_param:
+            requested = {name.strip() for name in fields_param.split(',') if name.strip()} | expand | {'id'}
+            return [name for name in cls.Meta.fields if name in requested]
+        omitted = set(cls.COLLECTION_FIELDS) | (set(cls.EXPANDABLE_FIELDS) if omit_expandable else set())
+        return [name for name in cls.Meta.fields if name not in omitted or name in expand]
+
+    def get_links(self, obj):
+        return article_sub_resource_links(obj, self.context.get('request'))
+
     def update(self, instance, validated_data):
         # Стандартное обновление полей, включая structured_content, если оно есть в validated_data
         # authors_data нужно обработать до super().update, если он не обрабатывает вложенные M2M по умолчанию
@@ -215,7 +298,7 @@ class AnalyzedSegmentSerializer(serializers.ModelSerializer):
     )
     # article также должен быть PrimaryKeyRelatedField при создании/обновлении, если не вложенный URL
     article_id = serializers.PrimaryKeyRelatedField(
-        queryset=Article.objects.all(),
+        queryset=Article.objects.light(),
         source='article', # Указываем, что это поле 'article' в модели
         write_only=True # Только для записи, для чтения будет вложенная информация или ничего
     )
@@ -259,3 +342,42 @@ class AnalyzedSegmentSerializer(serializers.ModelSerializer):
         if cited_references_data is not None: # Если передали пустой список - очистим, если передали данные - установим
             instance.cited_references.set(cited_references_data)
         return instance
+
+
+class BulkIngestionJobSerializer(serializers.ModelSerializer):
+    """Сериализатор задания массовой загрузки (прогресс и итоговые счетчики, без полного списка идентификаторов)."""
+    progress_percent = serializers.IntegerField(read_only=True)
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+
+    class Meta:
+        model = BulkIngestionJob
+        fields = [
+            'id', 'source_name', 'status', 'status_display', 'progress_percent',
+            'total_submitted', 'existing_count', 'duplicate_count', 'created_count',
+            'enriched_count', 'not_found_count', 'total_batches', 'completed_batches', 'failed_batches',
+            'invalid_identifiers', 'error_message', 'celery_task_id', 'created_at', 'updated_at', 'finished_at'
+        ]
+        read_only_fields = fields
+
+
+class CitationCrawlJobSerializer(serializers.ModelSerializer):
+    """Сериализатор задания обхода цитирований (параметры, расход бюджета и итоговые счетчики)."""
+    progress_percent = serializers.IntegerField(read_only=True)
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+
+    class Meta:
+        model = CitationCrawlJob
+        fields = [
+            'id', 'root_article', 'status', 'status_display', 'progress_percent',
+            'max_depth', 'max_articles', 'source_budgets', 'source_requests', 'current_depth',
+            'discovered_count', 'scheduled_count', 'fetched_count', 'not_found_count',
+            'stop_reason', 'error_message', 'celery_task_id', 'created_at', 'updated_at', 'finished_at'
+        ]
+        read_only_fields = fields
+
+
+class CitationCrawlNodeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CitationCrawlNode
+        fields = ['id', 'doi', 'depth', 'citation_count', 'parent_article', 'article', 'status', 'expanded', 'created_at']
+        read_only_fields = fields
@@ -1,39 +1,59 @@
 import re
 import os
 import json
+import random
+import redis
 import requests
-import time # Для NCBI E-utils rate limiting
+import time
+from functools import partial
 import xml.etree.ElementTree as ET # Для парсинга XML
 from openai import OpenAI
 
-from celery import shared_task
+from celery import shared_task, chain, chord, group
+from celery.exceptions import Retry
 from django.utils import timezone
-from django.core.files.base import ContentFile
 from django.db import transaction, utils as db_utils # utils для OperationalError
+from django.db.models import F, Q, Min, Value, Prefetch
+from django.db.models.functions import Coalesce, NullIf, Substr
 # from asgiref.sync import async_to_sync
 # from channels.layers import get_channel_layer
 from django.contrib.auth.models import User
 from django.conf import settings # Для доступа к API_SOURCE_...
 
-from .models import Article, Author, ArticleContent, ArticleAuthorOrder, ReferenceLink, AnalyzedSegment
+from .models import Article, ArticleContent, ContentBlob, pdf_store_name, release_pdf_file, ArticleSourceRecord, ReferenceLink, AnalyzedSegment, BulkIngestionJob, CitationCrawlJob, CitationCrawlNode, article_heavy_fields
+from .http_client import http_post
+from .api_cache import cached_get, store_response
+from .redis_client import get_redis_client
+from .rate_limit import wait_for_token, raise_if_rate_limited, RateLimitExceeded
 from .helpers import (
     send_user_notification,
-    parse_crossref_authors,
-    parse_europepmc_authors,
-    parse_s2_authors,
     parse_arxiv_authors,
-    parse_pubmed_authors,
     parse_rxiv_authors,
     # extract_text_from_jats_xml,
     # extract_text_from_bioc_json,
     parse_references_from_jats,
-    reconstruct_abstract_from_inverted_index,
-    parse_openalex_authors,
+    upsert_article_references,
+    set_article_authors,
+    get_author_ids,
+    normalize_openalex_work,
+    normalize_s2_paper,
+    S2_GRAPH_API_URL,
+    S2_PAPER_FIELDS,
+    s2_paper_id_for_article,
+    OPENALEX_SELECT_FIELDS,
     extract_structured_text_from_jats,
     # extract_structured_text_from_bioc,
     # sanitize_for_json_serialization,
     # get_pmc_pdf,
     download_pdf,
+    resolve_identifiers_batch,
+    normalize_crossref_work,
+    normalize_europepmc_result,
+    IDENTIFIER_TYPE_FIELDS,
+    normalize_pubmed_article,
+    split_pubmed_article_set,
+    split_pmc_article_set,
+    fetch_s2_linked_papers,
 )
 
 
@@ -51,11 +71,42 @@ PIPELINE_DISPATCHER_SOURCE_NAME = 'PipelineDispatcher'
 # Пространства имен для arXiv Atom XML
 ARXIV_NS = {'atom': 'http://www.w3.org/2005/Atom', 'arxiv': 'http://arxiv.org/schemas/atom'}
 
+# Сколько раз задача может быть перепланирована из-за ограничения частоты сверх своих max_retries
+RATE_LIMIT_MAX_RESCHEDULES = getattr(settings, 'RATE_LIMIT_MAX_RESCHEDULES', 20)
+
 USER_AGENT_LIST = [
     'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36', # Linux, Chrome
 ]
 
 
+def _rate_limit_retry(task, exc: RateLimitExceeded):
+    """
+    Перепланирует задачу через countdown до появления токена (с разбросом, чтобы отложенные
+    задачи не проснулись одновременно) вместо сна в слоте воркера.
+    """
+    countdown = exc.retry_after + random.uniform(0, max(1.0, exc.retry_after))
+    return task.retry(exc=exc, countdown=countdown, max_retries=(task.max_retries or 0) + RATE_LIMIT_MAX_RESCHEDULES)
+
+
+def _wait_for_api_token(task, api_name: str):
+    """Берет токен ограничителя частоты для api_name перед запросом; при долгом ожидании перепланирует задачу."""
+    try:
+        wait_for_token(api_name)
+    except RateLimitExceeded as exc:
+        raise _rate_limit_retry(task, exc)
+
+
+def _cached_api_get(task, api_name: str, url: str, **kwargs):
+    """
+    cached_get с токеном ограничителя частоты перед сетевым запросом. И долгое ожидание токена,
+    и ответ 429 от API перепланируют задачу через countdown.
+    """
+    try:
+        return cached_get(api_name, url, throttle=partial(wait_for_token, api_name), **kwargs)
+    except RateLimitExceeded as exc:
+        raise _rate_limit_retry(task, exc)
+
+
 # --- Диспетчерская задача ---
 @shared_task(bind=True)
 def process_article_pipeline_task(
@@ -135,231 +186,800 @@ def process_article_pipeline_task(
         else:
             send_user_notification(user_id, pipeline_task_id, pipeline_display_name, 'PIPELINE_PROGRESS', f'Найдена существующая статья ID {article.id} (user_initiated={article.is_user_initiated}). Обновление...', source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
 
-        # Обновляем effective_doi_for_subtasks, если он был найден/установлен в статье
-        if not effective_doi_for_subtasks and article.doi:
-            effective_doi_for_subtasks = article.doi
-
     except Exception as e:
         send_user_notification(user_id, pipeline_task_id, pipeline_display_name, 'PIPELINE_FAILURE', f'Ошибка при создании/получении статьи: {str(e)}', source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
         return {'status': 'error', 'message': f'Error accessing article entry: {str(e)}'}
 
     article_id_for_subtasks = article.id # Стабильный ID статьи для всех подзадач
 
-    send_user_notification(user_id, pipeline_task_id, pipeline_display_name, 'PIPELINE_PROGRESS', 'Запуск получения данных из источников...', progress_percent=5, source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
-
-    # --- Шаг 2: Вызов задачи для CrossRef ---
-    if effective_doi_for_subtasks:
-        try:
-            # Обработка ссылок включается только если это не обработка уже существующей ссылки (т.е. "корневой" вызов)
-            should_process_refs_in_crossref = (originating_reference_link_id is None)
-            # should_process_refs_in_crossref = True if originating_reference_link_id is None else False
-
-            crossref_task_sig = fetch_data_from_crossref_task.s(
-                doi=effective_doi_for_subtasks,
+    # --- Шаг 2: Граф задач конвейера ---
+    # Сначала разрешаем идентификаторы статьи (DOI/PMID/PMCID), затем параллельно запускаем
+    # обогащение из всех источников (chord) уже с полным набором идентификаторов,
+    # и в конце выполняем финализацию (сводка, сегментация) один раз.
+    try:
+        pipeline_workflow = chain(
+            resolve_article_identifiers_task.si(
+                article_id=article_id_for_subtasks,
+                user_id=user_id,
+                originating_reference_link_id=originating_reference_link_id,
+                pipeline_task_id=pipeline_task_id,
+            ),
+            launch_enrichment_stage_task.s(
+                article_id=article_id_for_subtasks,
+                identifier_value=identifier_value,
+                identifier_type=identifier_type,
                 user_id=user_id,
-                process_references=should_process_refs_in_crossref,
                 originating_reference_link_id=originating_reference_link_id,
-                article_id_to_update=article_id_for_subtasks,
+                pipeline_task_id=pipeline_task_id,
+            ),
+        ).on_error(
+            # Если этап до chord упал, финализация все равно выполняется (и освобождает ожидающие ссылки)
+            article_pipeline_error_task.s(
+                article_id=article_id_for_subtasks,
+                user_id=user_id,
+                originating_reference_link_id=originating_reference_link_id,
+                pipeline_task_id=pipeline_task_id,
             )
-            crossref_task_id_val = crossref_task_sig.apply_async().id
-            send_user_notification(user_id, pipeline_task_id, effective_doi_for_subtasks, 'SUBTASK_STARTED', f'Задача CrossRef запущена (ID: {crossref_task_id_val}).', progress_percent=10, source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
-        except Exception as e_crossref:
-            send_user_notification(user_id, pipeline_task_id, effective_doi_for_subtasks, 'PIPELINE_ERROR', f'Не удалось запустить задачу CrossRef: {str(e_crossref)}', source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
+        )
+        pipeline_workflow.apply_async()
+    except Exception as e:
+        send_user_notification(user_id, pipeline_task_id, pipeline_display_name, 'PIPELINE_FAILURE', f'Не удалось запустить граф задач конвейера: {str(e)}', source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
+        return {'status': 'error', 'message': f'Failed to start pipeline workflow: {str(e)}', 'article_id': article_id_for_subtasks}
+
+    send_user_notification(user_id, pipeline_task_id, pipeline_display_name, 'PIPELINE_PROGRESS', 'Запущен этап разрешения идентификаторов статьи...', progress_percent=5, source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
+    return {'status': 'success', 'message': 'Конвейер задач запущен.', 'pipeline_task_id': pipeline_task_id, 'article_id': article_id_for_subtasks}
+
+
+def _apply_resolved_identifiers(article_ids: list) -> dict:
+    """
+    Разрешает идентификаторы для набора статей одним пакетом (resolve_identifiers_batch)
+    и дописывает недостающие DOI/PMID/PMCID в статьи одним bulk_update.
+    Возвращает {article_id: {'identifiers': {...}, 'updated_fields': [...], 'conflicts': [...]}}.
+    """
+    identifier_fields = ('doi', 'pubmed_id', 'pmc_id', 'arxiv_id')
+    articles = list(Article.objects.filter(id__in=article_ids).only('id', *identifier_fields))
+    if not articles:
+        return {}
+
+    resolved_records = resolve_identifiers_batch([
+        {field: getattr(article, field) for field in identifier_fields} for article in articles
+    ])
+
+    # Идентификаторы уникальны: заранее одним запросом на поле выясняем, какие значения уже заняты
+    candidate_values = {field: set() for field in identifier_fields}
+    for article, record in zip(articles, resolved_records):
+        for field in identifier_fields:
+            if record.get(field) and not getattr(article, field):
+                candidate_values[field].add(record[field])
+    taken_values = {
+        field: dict(Article.objects.filter(**{f'{field}__in': values}).values_list(field, 'id')) if values else {}
+        for field, values in candidate_values.items()
+    }
+
+    results = {}
+    articles_to_update = []
+    updated_field_names = set()
+    for article, record in zip(articles, resolved_records):
+        updated_fields, conflicts = [], []
+        for field in identifier_fields:
+            new_value = record.get(field)
+            if not new_value or getattr(article, field):
+                continue
+            owner_id = taken_values[field].get(new_value)
+            if owner_id is not None and owner_id != article.id:
+                conflicts.append(f'{field}={new_value}')
+                continue
+            setattr(article, field, new_value)
+            taken_values[field][new_value] = article.id
+            updated_fields.append(field)
+        if updated_fields:
+            articles_to_update.append(article)
+            updated_field_names.update(updated_fields)
+        results[article.id] = {
+            'identifiers': {field: getattr(article, field) for field in identifier_fields},
+            'updated_fields': updated_fields,
+            'conflicts': conflicts,
+        }
+
+    if articles_to_update:
+        now = timezone.now()
+        for article in articles_to_update:
+            article.updated_at = now # bulk_update не применяет auto_now
+        Article.objects.bulk_update(articles_to_update, sorted(updated_field_names) + ['updated_at'])
+    return results
+
+
+@shared_task(bind=True)
+def resolve_article_identifiers_task(
+    self,
+    article_id: int,
+    user_id: int = None,
+    originating_reference_link_id: int = None,
+    pipeline_task_id: str = None):
+    """
+    Этап конвейера: дополняет недостающие идентификаторы статьи (DOI, PMID, PMCID)
+    через локальную таблицу сопоставлений, NCBI ID Converter и OpenAlex до запуска задач источников.
+    Ошибки не прерывают конвейер: обогащение запускается с теми идентификаторами, что уже есть.
+    """
+    notification_task_id = pipeline_task_id or self.request.id
+    display_identifier = f"ArticleID:{article_id}"
+
+    try:
+        article_result = _apply_resolved_identifiers([article_id]).get(article_id)
+    except RateLimitExceeded as exc:
+        raise _rate_limit_retry(self, exc)
+    except Exception as exc:
+        # Сеть, БД или IntegrityError, если параллельная запись заняла идентификатор между проверкой и bulk_update
+        send_user_notification(user_id, notification_task_id, display_identifier, 'PIPELINE_ERROR', f'Ошибка разрешения идентификаторов: {str(exc)}. Источники будут запрошены по уже известным идентификаторам.', source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
+        return {'status': 'error', 'message': f'Identifier resolution failed: {str(exc)}', 'article_id': article_id}
+    if not article_result:
+        send_user_notification(user_id, notification_task_id, display_identifier, 'PIPELINE_FAILURE', 'Статья для разрешения идентификаторов не найдена.', source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
+        return {'status': 'error', 'message': 'Article not found.', 'article_id': article_id}
+
+    for conflict in article_result['conflicts']:
+        send_user_notification(user_id, notification_task_id, display_identifier, 'PIPELINE_INFO', f'{conflict} уже принадлежит другой статье, пропуск.', source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
+
+    resolved_identifiers = article_result['identifiers']
+    resolved_display = ', '.join(f'{k}={v}' for k, v in resolved_identifiers.items() if v) or 'нет'
+    send_user_notification(user_id, notification_task_id, display_identifier, 'PIPELINE_PROGRESS', f'Идентификаторы статьи: {resolved_display}.', progress_percent=10, article_id=article_id, source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
+    return {'status': 'success', 'article_id': article_id, 'updated_fields': article_result['updated_fields'], 'identifiers': resolved_identifiers}
+
+
+@shared_task(bind=True)
+def resolve_identifiers_batch_task(self, article_ids: list, user_id: int = None):
+    """
+    Пакетное разрешение идентификаторов для множества статей (например, при массовой загрузке
+    или обработке списка литературы): несколько пакетных запросов вместо 3+ запросов на статью.
+    """
+    task_id = self.request.id
+    display_identifier = f"Articles:{len(article_ids)}"
+    try:
+        results = _apply_resolved_identifiers(article_ids)
+    except RateLimitExceeded as exc:
+        raise _rate_limit_retry(self, exc)
+    updated_count = sum(1 for r in results.values() if r['updated_fields'])
+    message = f'Идентификаторы разрешены для {len(results)} статей, дополнено: {updated_count}.'
+    send_user_notification(user_id, task_id, display_identifier, 'SUCCESS', message, progress_percent=100, source_api=PIPELINE_DISPATCHER_SOURCE_NAME)
+    return {'status': 'success', 'message': message, 'results': {str(k): v for k, v in results.items()}}
+
+
+def _build_enrichment_signatures(article, identifier_value, identifier_type, user_id, originating_reference_link_id):
+    """
+    Формирует подписи задач источников по актуальным идентификаторам статьи.
+    Возвращает список кортежей (название источника, отображаемый идентификатор, подпись задачи)
+    и список сообщений о пропущенных источниках.
+    """
+    identifier_type_upper = identifier_type.upper()
+    signatures = []
+    skipped_messages = []
+    common_kwargs = {
+        'user_id': user_id,
+        'originating_reference_link_id': originating_reference_link_id,
+        'article_id_to_update': article.id,
+        # Метаданные пишутся в ArticleSourceRecord и объединяются один раз при финализации конвейера
+        'consolidate': True,
+    }
+
+    # CrossRef
+    if article.doi:
+        signatures.append(('CrossRef', article.doi, fetch_data_from_crossref_task.s(
+            doi=article.doi,
+            # Обработка ссылок включается только для "корневого" вызова
+            process_references=(originating_reference_link_id is None),
+            **common_kwargs,
+        )))
     else:
-        send_user_notification(user_id, pipeline_task_id, pipeline_display_name, 'PIPELINE_INFO', 'DOI не определен для вызова CrossRef, пропуск.', source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
+        skipped_messages.append('DOI не определен для вызова CrossRef, пропуск.')
 
-    # --- Шаг 3: Вызов задачи для Semantic Scholar ---
-    s2_identifier_val = None
-    s2_id_type_val = None
+    # Semantic Scholar
     if article.doi:
-        s2_identifier_val = article.doi; s2_id_type_val = 'DOI'
+        s2_identifier_val, s2_id_type_val = article.doi, 'DOI'
     elif article.arxiv_id:
-        s2_identifier_val = article.arxiv_id; s2_id_type_val = 'ARXIV'
+        s2_identifier_val, s2_id_type_val = article.arxiv_id, 'ARXIV'
     elif identifier_type_upper == 'ARXIV':
-        s2_identifier_val = identifier_value; s2_id_type_val = 'ARXIV'
-
-    if s2_identifier_val and s2_id_type_val:
-        try:
-            s2_task_sig = fetch_data_from_s2_task.s(
-                identifier_value=s2_identifier_val,
-                identifier_type=s2_id_type_val,
-                user_id=user_id,
-                originating_reference_link_id=originating_reference_link_id,
-                article_id_to_update=article_id_for_subtasks,
-            )
-            s2_task_id_val = s2_task_sig.apply_async().id
-            send_user_notification(user_id, pipeline_task_id, f"{s2_id_type_val}:{s2_identifier_val}", 'SUBTASK_STARTED', f'Задача Semantic Scholar запущена (ID: {s2_task_id_val}).', progress_percent=30, source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
-        except Exception as e_s2:
-            send_user_notification(user_id, pipeline_task_id, pipeline_display_name, 'PIPELINE_ERROR', f'Не удалось запустить задачу Semantic Scholar: {str(e_s2)}', source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
+        s2_identifier_val, s2_id_type_val = identifier_value, 'ARXIV'
     else:
-        send_user_notification(user_id, pipeline_task_id, pipeline_display_name, 'PIPELINE_INFO', 'Нет подходящего идентификатора для Semantic Scholar.', source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
-
-    # --- Шаг 4: Задача для arXiv ---
-    # Вызываем, если исходный идентификатор был ARXIV, или если у статьи есть arxiv_id
-    arxiv_id_for_task = None
-    if identifier_type_upper == 'ARXIV':
-        arxiv_id_for_task = identifier_value # Используем исходный, он может быть с версией
-    elif article.arxiv_id:
-        arxiv_id_for_task = article.arxiv_id # Используем тот, что в статье
+        s2_identifier_val, s2_id_type_val = None, None
+    if s2_identifier_val:
+        signatures.append(('Semantic Scholar', f"{s2_id_type_val}:{s2_identifier_val}", fetch_data_from_s2_task.s(
+            identifier_value=s2_identifier_val, identifier_type=s2_id_type_val, **common_kwargs,
+        )))
+    else:
+        skipped_messages.append('Нет подходящего идентификатора для Semantic Scholar.')
 
+    # arXiv: исходный идентификатор может быть с версией, поэтому предпочитаем его
+    arxiv_id_for_task = identifier_value if identifier_type_upper == 'ARXIV' else article.arxiv_id
     if arxiv_id_for_task:
-        try:
-            # Передаем article.id как article_id_to_update, чтобы задача знала, какую запись обновлять
-            arxiv_task_sig = fetch_data_from_arxiv_task.s(
-                arxiv_id_value=arxiv_id_for_task,
-                user_id=user_id,
-                originating_reference_link_id=originating_reference_link_id,
-                article_id_to_update=article_id_for_subtasks, # ID существующей статьи
-            )
-            arxiv_task_id_val = arxiv_task_sig.apply_async().id
-            send_user_notification(user_id, pipeline_task_id, f"ARXIV:{arxiv_id_for_task}", 'SUBTASK_STARTED', f'Задача arXiv запущена (ID: {arxiv_task_id_val}).', progress_percent=40, source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
-        except Exception as e_arxiv:
-            send_user_notification(user_id, pipeline_task_id, f"ARXIV:{arxiv_id_for_task}", 'PIPELINE_ERROR', f'Не удалось запустить задачу arXiv: {str(e_arxiv)}', source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
+        signatures.append(('arXiv', f"ARXIV:{arxiv_id_for_task}", fetch_data_from_arxiv_task.s(
+            arxiv_id_value=arxiv_id_for_task, **common_kwargs,
+        )))
     else:
-        send_user_notification(user_id, pipeline_task_id, pipeline_display_name, 'PIPELINE_INFO', 'Нет arXiv ID для запуска задачи arXiv.', source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
+        skipped_messages.append('Нет arXiv ID для запуска задачи arXiv.')
 
-    # --- Шаг 5: Вызов задачи для Unpaywall (если есть DOI у статьи) ---
-    # Используем DOI, который у нас есть для статьи (мог быть обновлен предыдущими задачами, но мы не ждем их)
-    # `effective_doi_for_subtasks` - это DOI, с которым мы вошли в конвейер (если type=DOI)
-    # `article.doi` - это DOI, который есть у статьи в БД на данный момент (после get_or_create)
-    final_doi_for_unpaywall_lookup = article.doi if article.doi else effective_doi_for_subtasks
+    # Unpaywall
+    if article.doi:
+        signatures.append(('Unpaywall', article.doi, fetch_data_from_unpaywall_task.s(
+            doi=article.doi, article_id=article.id, user_id=user_id,
+        )))
+    else:
+        skipped_messages.append('DOI не определен для Unpaywall, пропуск.')
 
-    if final_doi_for_unpaywall_lookup:
-        try:
-            unpaywall_task_sig = fetch_data_from_unpaywall_task.s(
-                doi=final_doi_for_unpaywall_lookup,
-                article_id=article_id_for_subtasks,
-                user_id=user_id
-            )
-            unpaywall_task_id_val = unpaywall_task_sig.apply_async().id
-            send_user_notification(user_id, pipeline_task_id, final_doi_for_unpaywall_lookup, 'SUBTASK_STARTED', f'Задача Unpaywall запущена (ID: {unpaywall_task_id_val}).', progress_percent=50, source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
-        except Exception as e_unpaywall:
-            send_user_notification(user_id, pipeline_task_id, final_doi_for_unpaywall_lookup, 'PIPELINE_ERROR', f'Не удалось запустить задачу Unpaywall: {str(e_unpaywall)}', source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
+    # OpenAlex
+    if article.doi:
+        oa_identifier_val, oa_id_type_val = article.doi, 'DOI'
+    elif article.pubmed_id:
+        oa_identifier_val, oa_id_type_val = article.pubmed_id, 'PMID'
+    else:
+        oa_identifier_val, oa_id_type_val = None, None
+    if oa_identifier_val:
+        signatures.append(('OpenAlex', f"{oa_id_type_val}:{oa_identifier_val}", fetch_data_from_openalex_task.s(
+            identifier_value=oa_identifier_val, identifier_type=oa_id_type_val, **common_kwargs,
+        )))
     else:
-        send_user_notification(user_id, pipeline_task_id, pipeline_display_name, 'PIPELINE_INFO', 'DOI не определен для Unpaywall, пропуск.', source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
+        skipped_messages.append('Нет подходящего идентификатора для OpenAlex.')
 
-    # --- Шаг 6: Задача для OpenAlex ---
-    # Вызываем, используя лучший доступный идентификатор для OpenAlex (DOI, PMID)
-    oa_identifier_val = None
-    oa_id_type_val = None
+    # PubMed
+    if article.pubmed_id:
+        pubmed_identifier_val, pubmed_id_type_val = article.pubmed_id, 'PMID'
+    elif article.doi:
+        pubmed_identifier_val, pubmed_id_type_val = article.doi, 'DOI'
+    else:
+        pubmed_identifier_val, pubmed_id_type_val = None, None
+    if pubmed_identifier_val:
+        signatures.append(('PubMed', f"{pubmed_id_type_val}:{pubmed_identifier_val}", fetch_data_from_pubmed_task.s(
+            identifier_value=pubmed_identifier_val, identifier_type=pubmed_id_type_val, **common_kwargs,
+        )))
+    else:
+        skipped_messages.append('Нет подходящего идентификатора для PubMed.')
 
-    # article должен быть уже определен здесь после get_or_create
+    # Europe PMC
     if article.doi:
-        oa_identifier_val = article.doi
-        oa_id_type_val = 'DOI'
+        epmc_identifier_val, epmc_id_type_val = article.doi, 'DOI'
     elif article.pubmed_id:
-        oa_identifier_val = article.pubmed_id
-        oa_id_type_val = 'PMID'
-    elif article.arxiv_id: # OpenAlex может работать с arXiv ID, но обычно через DOI/PMID надежнее для /works/ endpoint
-        pass # Пока не используем arXiv ID для прямого запроса к OpenAlex /works/{ID}, если нет DOI/PMID
-
-    # Если исходный идентификатор был одним из тех, что OpenAlex принимает напрямую
-    elif identifier_type.upper() in ['DOI', 'PMID']:
-        oa_identifier_val = identifier_value
-        oa_id_type_val = identifier_type
+        epmc_identifier_val, epmc_id_type_val = article.pubmed_id, 'PMID'
+    else:
+        epmc_identifier_val, epmc_id_type_val = None, None
+    if epmc_identifier_val:
+        signatures.append(('Europe PMC', f"{epmc_id_type_val}:{epmc_identifier_val}", fetch_data_from_europepmc_task.s(
+            identifier_value=epmc_identifier_val, identifier_type=epmc_id_type_val, **common_kwargs,
+        )))
+    else:
+        skipped_messages.append('Нет подходящего идентификатора для Europe PMC.')
 
-    if oa_identifier_val and oa_id_type_val:
-        try:
-            openalex_task_sig = fetch_data_from_openalex_task.s(
-                identifier_value=oa_identifier_val,
-                identifier_type=oa_id_type_val,
-                user_id=user_id,
-                originating_reference_link_id=originating_reference_link_id,
-                article_id_to_update=article_id_for_subtasks
-            )
-            openalex_task_id_val = openalex_task_sig.apply_async().id
-            send_user_notification(user_id, pipeline_task_id, f"{oa_id_type_val}:{oa_identifier_val}", 'SUBTASK_STARTED', f'Задача OpenAlex запущена (ID: {openalex_task_id_val}).', progress_percent=85, source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
-        except Exception as e_oa:
-            send_user_notification(user_id, pipeline_task_id, pipeline_display_name, 'PIPELINE_ERROR', f'Не удалось запустить задачу OpenAlex: {str(e_oa)}', source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
+    # bioRxiv/medRxiv: характерный префикс DOI 10.1101/
+    if article.doi and article.doi.startswith("10.1101/"):
+        signatures.append(('Rxiv (bio/medRxiv)', article.doi, fetch_data_from_rxiv_task.s(
+            doi=article.doi, **common_kwargs,
+        )))
     else:
-        send_user_notification(user_id, pipeline_task_id, pipeline_display_name, 'PIPELINE_INFO', 'Нет подходящего идентификатора для OpenAlex.', source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
+        skipped_messages.append('DOI не похож на bioRxiv/medRxiv или отсутствует, пропуск задачи Rxiv.')
 
-    # --- Шаг 7: Задача для PubMed ---
-    # Вызываем, если есть PMID у статьи, или если исходный идентификатор был PMID, или если есть DOI (для поиска PMID)
-    pubmed_identifier_val = None
-    pubmed_id_type_val = None
+    return signatures, skipped_messages
 
-    if article.pubmed_id:
-        pubmed_identifier_val = article.pubmed_id
-        pubmed_id_type_val = 'PMID'
-    elif article.doi: # Если есть DOI, PubMed задача сможет найти PMID
-        pubmed_identifier_val = article.doi
-        pubmed_id_type_val = 'DOI'
-    elif identifier_type.upper() == 'PMID': # Если исходный был PMID
-        pubmed_identifier_val = identifier_value
-        pubmed_id_type_val = 'PMID'
-
-    if pubmed_identifier_val and pubmed_id_type_val:
-        try:
-            pubmed_task_sig = fetch_data_from_pubmed_task.s(
-                identifier_value=pubmed_identifier_val,
-                identifier_type=pubmed_id_type_val,
+
+@shared_task(bind=True)
+def launch_enrichment_stage_task(
+    self,
+    resolution_result: dict,
+    article_id: int,
+    identifier_value: str,
+    identifier_type: str,
+    user_id: int,
+    originating_reference_link_id: int = None,
+    pipeline_task_id: str = None):
+    """
+    Этап конвейера: по разрешенным идентификаторам запускает chord из задач источников
+    и задачу финализации, которая выполнится после завершения всех источников.
+    """
+    notification_task_id = pipeline_task_id or self.request.id
+    pipeline_display_name = f"{identifier_type.upper()}:{identifier_value}"
+
+    try:
+        article = Article.objects.only('id', 'doi', 'pubmed_id', 'pmc_id', 'arxiv_id').get(id=article_id)
+    except Article.DoesNotExist:
+        send_user_notification(user_id, notification_task_id, pipeline_display_name, 'PIPELINE_FAILURE', f'Статья ID {article_id} не найдена для запуска источников.', source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
+        return {'status': 'error', 'message': 'Article not found.', 'article_id': article_id}
+
+    signatures, skipped_messages = _build_enrichment_signatures(
+        article, identifier_value, identifier_type, user_id, originating_reference_link_id
+    )
+    for skipped_message in skipped_messages:
+        send_user_notification(user_id, notification_task_id, pipeline_display_name, 'PIPELINE_INFO', skipped_message, source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
+    if any(label == 'PubMed' for label, _, _ in signatures):
+        # Идентификаторы попадают в общую очередь, и первая запущенная задача PubMed заберет их одним EFetch
+        _queue_pubmed_prefetch(article.pubmed_id, article.pmc_id)
+    if any(label == 'OpenAlex' for label, _, _ in signatures):
+        _queue_openalex_prefetch(article.doi, article.pubmed_id)
+    for label, s2_paper_id, _ in signatures:
+        if label == 'Semantic Scholar':
+            _queue_batch_prefetch(S2_PENDING_IDS_KEY, [s2_paper_id])
+
+    finalize_kwargs = {
+        'article_id': article.id,
+        'user_id': user_id,
+        'originating_reference_link_id': originating_reference_link_id,
+        'pipeline_task_id': notification_task_id,
+    }
+
+    if not signatures:
+        return _finalize_article_pipeline([], **finalize_kwargs)
+
+    for source_label, source_display, signature in signatures:
+        # freeze() назначает ID задачи заранее, чтобы сообщить его пользователю до отправки chord
+        subtask_id = signature.freeze().id
+        send_user_notification(user_id, notification_task_id, source_display, 'SUBTASK_STARTED', f'Задача {source_label} запущена (ID: {subtask_id}).', progress_percent=20, source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
+
+    finalize_sig = finalize_article_pipeline_task.s(**finalize_kwargs).on_error(
+        article_pipeline_error_task.s(**finalize_kwargs)
+    )
+    chord(group(signature for _, _, signature in signatures))(finalize_sig)
+
+    return {'status': 'success', 'message': f'Запущено задач источников: {len(signatures)}.', 'article_id': article.id}
+
+
+def _finalize_article_pipeline(subtask_results, article_id, user_id, originating_reference_link_id=None, pipeline_task_id=None):
+    """
+    Общая логика финализации конвейера: консолидация записей источников в статью,
+    сводка по источникам и однократный запуск сегментации.
+    """
+    results = [r for r in (subtask_results or []) if isinstance(r, dict)]
+    status_counts = {}
+    for result in results:
+        status_counts[result.get('status', 'unknown')] = status_counts.get(result.get('status', 'unknown'), 0) + 1
+    summary = ', '.join(f'{k}: {v}' for k, v in sorted(status_counts.items())) or 'нет результатов'
+    display_identifier = f"ArticleID:{article_id}"
+
+    try:
+        for conflict in consolidate_article_sources(article_id) or []:
+            send_user_notification(user_id, pipeline_task_id, display_identifier, 'PIPELINE_INFO', f'{conflict} уже принадлежит другой статье, пропуск.', source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
+    except Article.DoesNotExist:
+        pass # Обрабатывается ниже
+    except db_utils.IntegrityError as e:
+        # Идентификатор заняла другая статья уже после проверки (параллельная запись)
+        send_user_notification(user_id, pipeline_task_id, display_identifier, 'PIPELINE_ERROR', f'Ошибка объединения данных источников: {str(e)[:200]}', source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
+
+    try:
+        article = Article.objects.only('id', 'title', 'is_user_initiated', 'doi', 'primary_source_api').get(id=article_id)
+    except Article.DoesNotExist:
+        send_user_notification(user_id, pipeline_task_id, display_identifier, 'PIPELINE_FAILURE', 'Статья не найдена при финализации конвейера.', source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
+        return {'status': 'error', 'message': 'Article not found.', 'article_id': article_id}
+
+    # Все ссылки других статей, ждавшие этот DOI, получают результат этого же конвейера
+    resolved_waiting_count = _resolve_waiting_references(article)
+    if resolved_waiting_count:
+        send_user_notification(user_id, pipeline_task_id, display_identifier, 'INFO', f'Обновлено ссылок, ожидавших эту статью: {resolved_waiting_count}.', source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
+
+    # Сегментация запускается один раз после всех источников, а не каждым источником с полным текстом
+    segmentation_started = False
+    if article.is_user_initiated and ArticleContent.objects.filter(
+        article=article,
+        format_type__in=['pmc_fulltext_xml', 'rxiv_jats_xml_fulltext', 'xml_jats_fulltext']
+    ).exists():
+        process_full_text_and_create_segments_task.delay(article_id=article.id, user_id=user_id)
+        segmentation_started = True
+        send_user_notification(user_id, pipeline_task_id, display_identifier, 'INFO', 'Поставлена задача на автоматическое связывание текста и ссылок.', source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
+
+    final_message = f'Конвейер обработки завершен для статьи ID {article.id} ({summary}).'
+    send_user_notification(user_id, pipeline_task_id, display_identifier, 'PIPELINE_COMPLETE', final_message, progress_percent=100, article_id=article.id, source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
+    return {'status': 'success', 'message': final_message, 'article_id': article.id, 'source_statuses': status_counts, 'segmentation_started': segmentation_started}
+
+
+@shared_task(bind=True)
+def finalize_article_pipeline_task(
+    self,
+    subtask_results: list,
+    article_id: int,
+    user_id: int,
+    originating_reference_link_id: int = None,
+    pipeline_task_id: str = None):
+    """Финальный шаг chord: вызывается после завершения всех задач источников."""
+    return _finalize_article_pipeline(
+        subtask_results, article_id, user_id,
+        originating_reference_link_id=originating_reference_link_id,
+        pipeline_task_id=pipeline_task_id or self.request.id,
+    )
+
+
+@shared_task
+def article_pipeline_error_task(request, exc, traceback, article_id: int, user_id: int, originating_reference_link_id: int = None, pipeline_task_id: str = None):
+    """
+    Обработчик ошибки конвейера: если упал этап разрешения идентификаторов/запуска источников
+    или одна из задач источников в chord (например, исчерпала повторы), финализация все равно
+    выполняется по тем данным, что успели сохраниться.
+    """
+    send_user_notification(user_id, pipeline_task_id, f"ArticleID:{article_id}", 'PIPELINE_ERROR', f'Задача конвейера завершилась с ошибкой: {exc}', source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
+    return _finalize_article_pipeline(
+        [], article_id, user_id,
+        originating_reference_link_id=originating_reference_link_id,
+        pipeline_task_id=pipeline_task_id,
+    )
+
+
+# --- Загрузка цитируемых статей: один конвейер на DOI ---
+# Ключ "DOI в работе" (SET NX EX) и множество ID ссылок, ожидающих результата по этому DOI
+REFERENCE_CRAWL_INFLIGHT_KEY = 'crawl:inflight:doi:{doi}'
+REFERENCE_CRAWL_WAITING_KEY = 'crawl:waiting:doi:{doi}'
+
+
+def schedule_reference_crawl(ref_links, user_id: int) -> dict:
+    """
+    Ставит в очередь загрузку цитируемых статей по DOI ссылок так, чтобы каждый DOI загружался один раз:
+    - ссылки на DOI, статья по которому уже есть и обогащена, связываются сразу (один bulk_update);
+    - остальные получают статус "идет загрузка", а после коммита транзакции для каждого DOI
+      конвейер запускает только тот, кто первым занял ключ crawl:inflight:doi:<doi>.
+      ID всех ожидающих ссылок пишутся в crawl:waiting:doi:<doi> и связываются при финализации конвейера.
+    Возвращает {'linked': число связанных сразу, 'queued_dois': число DOI, ожидающих загрузки}.
+    """
+    refs_by_doi = {}
+    for link in ref_links:
+        if not link.target_article_doi:
+            continue
+        if link.resolved_article_id and link.status == ReferenceLink.StatusChoices.ARTICLE_LINKED:
+            continue
+        refs_by_doi.setdefault(link.target_article_doi.strip().lower(), []).append(link)
+    if not refs_by_doi:
+        return {'linked': 0, 'queued_dois': 0}
+
+    # DOI статей хранятся в нижнем регистре, но старые записи могли сохранить исходное написание
+    lookup_dois = set(refs_by_doi) | {link.target_article_doi for links in refs_by_doi.values() for link in links}
+    enriched_articles = Article.objects.filter(doi__in=lookup_dois, primary_source_api__isnull=False).values_list('doi', 'id')
+
+    now = timezone.now()
+    links_to_update = []
+    linked_count = 0
+    for article_doi, article_id in enriched_articles:
+        for link in refs_by_doi.pop(article_doi.lower(), []):
+            link.resolved_article_id = article_id
+            link.status = ReferenceLink.StatusChoices.ARTICLE_LINKED
+            link.updated_at = now
+            links_to_update.append(link)
+            linked_count += 1
+    for links in refs_by_doi.values():
+        for link in links:
+            link.status = ReferenceLink.StatusChoices.ARTICLE_FETCH_IN_PROGRESS
+            link.updated_at = now
+            links_to_update.append(link)
+    if links_to_update:
+        ReferenceLink.objects.bulk_update(links_to_update, ['resolved_article', 'status', 'updated_at'], batch_size=500)
+
+    if refs_by_doi:
+        # Новые ссылки должны быть видны финализации другого конвейера, поэтому регистрация - после коммита
+        waiting_ids = {doi: [link.id for link in links] for doi, links in refs_by_doi.items()}
+        transaction.on_commit(partial(_dispatch_reference_crawl, waiting_ids, user_id))
+    return {'linked': linked_count, 'queued_dois': len(refs_by_doi)}
+
+
+def _dispatch_reference_crawl(waiting_ids: dict, user_id: int):
+    """Регистрирует ожидающие ссылки и запускает конвейер для DOI, которые еще никем не загружаются."""
+    ttl = getattr(settings, 'REFERENCE_CRAWL_INFLIGHT_TTL', 2 * 3600)
+    dois = list(waiting_ids)
+    try:
+        with get_redis_client().pipeline() as pipe:
+            for doi in dois:
+                pipe.set(REFERENCE_CRAWL_INFLIGHT_KEY.format(doi=doi), user_id or 0, nx=True, ex=ttl)
+                pipe.sadd(REFERENCE_CRAWL_WAITING_KEY.format(doi=doi), *waiting_ids[doi])
+                pipe.expire(REFERENCE_CRAWL_WAITING_KEY.format(doi=doi), ttl)
+            acquired = pipe.execute()[::3]
+    except redis.exceptions.RedisError:
+        acquired = [True] * len(dois) # Без реестра каждый DOI запускается этим вызовом, как раньше
+
+    for doi, is_first in zip(dois, acquired):
+        if is_first:
+            process_article_pipeline_task.delay(
+                identifier_value=doi,
+                identifier_type='DOI',
                 user_id=user_id,
-                originating_reference_link_id=originating_reference_link_id,
-                article_id_to_update=article_id_for_subtasks
+                originating_reference_link_id=waiting_ids[doi][0]
             )
-            pubmed_task_id_val = pubmed_task_sig.apply_async().id
-            send_user_notification(user_id, pipeline_task_id, f"{pubmed_id_type_val}:{pubmed_identifier_val}", 'SUBTASK_STARTED', f'Задача PubMed запущена (ID: {pubmed_task_id_val}).', progress_percent=60, source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
-        except Exception as e_pubmed:
-            send_user_notification(user_id, pipeline_task_id, pipeline_display_name, 'PIPELINE_ERROR', f'Не удалось запустить задачу PubMed: {str(e_pubmed)}', source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
-    else:
-        send_user_notification(user_id, pipeline_task_id, pipeline_display_name, 'PIPELINE_INFO', 'Нет подходящего идентификатора для PubMed.', source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
-
-    # --- Шаг 8: Вызов задачи для Europe PMC ---
-    # Используем идентификаторы из объекта 'article', который мог быть обновлен CrossRef (если бы он выполнялся синхронно)
-    # При асинхронном запуске, лучше передавать идентификаторы явно или использовать Celery chains.
-    # Пока что, для параллельного запуска, используем то, что есть в 'article' на момент этого шага.
-    # article.refresh_from_db() # Ненадежно в полностью асинхронном потоке без ожидания
-
-    epmc_identifier_val = None
-    epmc_id_type_val = None
-    # Пытаемся получить актуальные данные из объекта article, который у нас есть
-    if article.doi: # Предпочитаем DOI для EPMC, если есть
-        epmc_identifier_val = article.doi
-        epmc_id_type_val = 'DOI'
-    elif article.pubmed_id:
-        epmc_identifier_val = article.pubmed_id
-        epmc_id_type_val = 'PMID'
-    elif identifier_type_upper == 'PMID': # Если исходный был PMID и DOI не появился
-         epmc_identifier_val = identifier_value
-         epmc_id_type_val = 'PMID'
 
-    if epmc_identifier_val and epmc_id_type_val:
+
+def _resolve_waiting_references(article) -> int:
+    """
+    Завершает ожидание по DOI статьи: освобождает ключ "в работе" и одним UPDATE связывает со статьей
+    все ссылки, ждавшие этот DOI (или помечает их как не найденные, если ни один источник статью не дал).
+    Возвращает число обновленных ссылок.
+    """
+    if not article.doi:
+        return 0
+    doi = article.doi.lower()
+    waiting_ids = []
+    try:
+        with get_redis_client().pipeline() as pipe:
+            pipe.smembers(REFERENCE_CRAWL_WAITING_KEY.format(doi=doi))
+            pipe.delete(REFERENCE_CRAWL_WAITING_KEY.format(doi=doi), REFERENCE_CRAWL_INFLIGHT_KEY.format(doi=doi))
+            waiting_ids = [int(value) for value in pipe.execute()[0]]
+    except redis.exceptions.RedisError:
+        pass # Ссылки с тем же DOI в статусе "идет загрузка" найдутся и без реестра
+
+    waiting_links = ReferenceLink.objects.filter(
+        Q(id__in=waiting_ids) | Q(target_article_doi__in={doi, article.doi}, status=ReferenceLink.StatusChoices.ARTICLE_FETCH_IN_PROGRESS),
+        resolved_article__isnull=True,
+    )
+    if article.primary_source_api:
+        return waiting_links.update(resolved_article=article, status=ReferenceLink.StatusChoices.ARTICLE_LINKED, updated_at=timezone.now())
+    return waiting_links.update(status=ReferenceLink.StatusChoices.ARTICLE_NOT_FOUND, updated_at=timezone.now())
+
+
+ARTICLE_IDENTIFIER_FIELDS = ('doi', 'pubmed_id', 'pmc_id', 'arxiv_id')
+
+
+def _taken_identifier_values(article_records: list) -> dict:
+    """
+    Какие идентификаторы, которые записи источников допишут статьям, уже есть в базе (одним запросом на поле).
+    article_records: [(статья, запись)]. Возвращает {поле: {значение: id статьи-владельца}}.
+    """
+    candidate_values = {field: set() for field in ARTICLE_IDENTIFIER_FIELDS}
+    for article, record in article_records:
+        for field in ARTICLE_IDENTIFIER_FIELDS:
+            if record.get(field) and not getattr(article, field):
+                candidate_values[field].add(record[field])
+    return {
+        field: dict(Article.objects.filter(**{f'{field}__in': values}).values_list(field, 'id')) if values else {}
+        for field, values in candidate_values.items()
+    }
+
+
+def _apply_source_record(article, current_api_name: str, record: dict, created: bool = False, taken_identifiers: dict = None, conflicts: list = None) -> bool:
+    """
+    Применяет нормализованную запись источника (normalize_crossref_work, normalize_openalex_work, ...)
+    к статье с учетом API_SOURCE_OVERALL_PRIORITY: источник не ниже по приоритету перезаписывает метаданные,
+    остальные только заполняют пустые поля. Идентификаторы дописываются, только если их еще нет у статьи
+    и они не принадлежат другой статье (taken_identifiers из _taken_identifier_values; если не передан -
+    проверяется здесь же); пропущенные добавляются в conflicts как 'поле=значение'.
+    Статья не сохраняется. Возвращает can_fully_overwrite.
+    """
+    priority_list = getattr(settings, 'API_SOURCE_OVERALL_PRIORITY', [])
+    try:
+        current_api_priority = priority_list.index(current_api_name)
+    except ValueError:
+        current_api_priority = float('inf')
+    article_primary_source_priority = float('inf')
+    if article.primary_source_api:
         try:
-            epmc_task_sig = fetch_data_from_europepmc_task.s(
-                identifier_value=epmc_identifier_val,
-                identifier_type=epmc_id_type_val,
-                user_id=user_id,
-                originating_reference_link_id=originating_reference_link_id,
-                article_id_to_update=article_id_for_subtasks,
-            )
-            epmc_task_id_val = epmc_task_sig.apply_async().id
-            send_user_notification(user_id, pipeline_task_id, f"{epmc_id_type_val}:{epmc_identifier_val}", 'SUBTASK_STARTED', f'Задача Europe PMC запущена (ID: {epmc_task_id_val}).', progress_percent=20, source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
-        except Exception as e_epmc:
-             send_user_notification(user_id, pipeline_task_id, pipeline_display_name, 'PIPELINE_ERROR', f'Не удалось запустить задачу Europe PMC: {str(e_epmc)}', source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
-    else:
-        send_user_notification(user_id, pipeline_task_id, pipeline_display_name, 'PIPELINE_INFO', 'Нет подходящего идентификатора для Europe PMC.', source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
+            article_primary_source_priority = priority_list.index(article.primary_source_api)
+        except ValueError:
+            pass
+    can_fully_overwrite = (created or not article.primary_source_api or current_api_priority <= article_primary_source_priority)
+
+    if can_fully_overwrite:
+        article.primary_source_api = current_api_name
+    for field in ('title', 'abstract', 'publication_date', 'journal_name', 'best_oa_url', 'oa_status', 'best_oa_pdf_url'):
+        if record.get(field) and (can_fully_overwrite or not getattr(article, field)):
+            setattr(article, field, record[field])
+    if taken_identifiers is None:
+        taken_identifiers = _taken_identifier_values([(article, record)])
+    for field in ARTICLE_IDENTIFIER_FIELDS:
+        new_value = record.get(field)
+        if not new_value or getattr(article, field):
+            continue
+        owner_id = taken_identifiers[field].get(new_value)
+        if owner_id is not None and owner_id != article.id:
+            if conflicts is not None:
+                conflicts.append(f'{field}={new_value}')
+            continue
+        setattr(article, field, new_value)
+        taken_identifiers[field][new_value] = article.id
+
+    authors = record.get('authors')
+    if authors and (can_fully_overwrite or not article.authors.exists()):
+        set_article_authors(article, authors)
+    return can_fully_overwrite
+
+
+# Поля статьи, которые задачи источников пишут напрямую (полный текст, PDF), а не через запись источника
+SOURCE_DIRECT_FIELDS = ('structured_content', 'cleaned_text_for_llm', 'pdf_file', 'pdf_text')
+PDF_CONVERSION_SOURCE_NAME = 'MarkItDown'
+
+
+def _source_field_state(article, field: str):
+    value = getattr(article, field)
+    return value.name if field == 'pdf_file' else value # FieldFile сравниваем по имени файла
+
+
+def _get_article_for_source(article_id: int, owner, consolidate: bool = False):
+    """
+    Статья, переданная задаче источника для обновления. В режиме консолидации строка не блокируется:
+    метаданные уходят в ArticleSourceRecord, а для SOURCE_DIRECT_FIELDS запоминается исходное состояние,
+    чтобы _save_source_article записал только поля, измененные самой задачей.
+    """
+    queryset = Article.objects.all() if consolidate else Article.objects.select_for_update()
+    article = queryset.get(id=article_id, user=owner)
+    if consolidate:
+        article._source_direct_snapshot = {field: _source_field_state(article, field) for field in SOURCE_DIRECT_FIELDS}
+    return article
+
+
+def _handle_source_record(article, current_api_name: str, record: dict, created: bool = False) -> bool:
+    """
+    Для статьи, полученной в режиме консолидации, сохраняет нормализованную запись источника в ArticleSourceRecord
+    (статья будет обновлена в consolidate_article_sources) и возвращает False. Иначе применяет запись сразу
+    через _apply_source_record и возвращает can_fully_overwrite.
+    """
+    if getattr(article, '_source_direct_snapshot', None) is None:
+        return _apply_source_record(article, current_api_name, record, created=created)
+    ArticleSourceRecord.objects.update_or_create(
+        article=article, source_api_name=current_api_name, defaults={'record': record}
+    )
+    return False
+
+
+def _save_source_article(article):
+    """Сохраняет статью задачи источника; в режиме консолидации - только измененные задачей SOURCE_DIRECT_FIELDS."""
+    snapshot = getattr(article, '_source_direct_snapshot', None)
+    if snapshot is None:
+        article.save()
+        return
+    # cleaned_text_for_llm Article.save() сам добавит в update_fields, если пересоберет его из structured_content
+    changed_fields = [field for field in SOURCE_DIRECT_FIELDS if _source_field_state(article, field) != snapshot[field]]
+    if changed_fields:
+        article.save(update_fields=changed_fields + ['updated_at'])
+
+
+def _article_pdf_present(**identifiers) -> bool:
+    """
+    Есть ли уже PDF у статьи с любым из переданных идентификаторов (id, doi, pubmed_id, arxiv_id...):
+    тогда задача источника не скачивает его повторно (переобработка, второй источник той же статьи).
+    """
+    lookup = Q()
+    for field, value in identifiers.items():
+        if value:
+            lookup |= Q(**{field: value})
+    if not lookup:
+        return False
+    return Article.objects.filter(lookup).exclude(Q(pdf_file='') | Q(pdf_file__isnull=True)).exists()
+
+
+def _attach_article_pdf(article_id: int, pdf_file):
+    """
+    Кладет скачанный PDF (временный файл из download_pdf) в хранилище по хешу содержимого и привязывает его
+    к статье одним условным UPDATE вне транзакции. Если такой PDF уже хранится (другая статья, другой источник),
+    файл не записывается повторно. Возвращает имя файла или None, если у статьи уже есть PDF.
+    exists() и save() не атомарны: если тот же PDF параллельно записал другой воркер, хранилище сохранит
+    копию под другим именем - ее удаляем и используем файл с каноническим именем по хешу.
+    """
+    pdf_storage = Article._meta.get_field('pdf_file').storage
+    without_pdf = Q(pdf_file='') | Q(pdf_file__isnull=True)
+    if not Article.objects.filter(without_pdf, id=article_id).exists():
+        return None
+    stored_name = pdf_store_name(pdf_file.sha256)
+    if not pdf_storage.exists(stored_name):
+        saved_name = pdf_storage.save(stored_name, pdf_file)
+        if saved_name != stored_name:
+            pdf_storage.delete(saved_name)
+    if not Article.objects.filter(without_pdf, id=article_id).update(pdf_file=stored_name, pdf_sha256=pdf_file.sha256, updated_at=timezone.now()):
+        release_pdf_file(stored_name)
+        return None
+    return stored_name
+
+
+def _store_source_pdf(article_id: int, pdf_file, user_id: int, notify):
+    """
+    Этап задачи источника после фиксации транзакции: сохраняет PDF без блокировки строки статьи.
+    Если тот же PDF (по SHA-256) уже сконвертирован для другой статьи, его pdf_text переиспользуется,
+    иначе конвертация ставится в convert_pdf_task (своя очередь), и задача источника ее не ждет.
+    notify(status, message) - send_user_notification с уже подставленными параметрами задачи.
+    """
+    try:
+        stored_name = _attach_article_pdf(article_id, pdf_file)
+        if not stored_name:
+            return
+        known_pdf_text = (
+            Article.objects.filter(pdf_sha256=pdf_file.sha256, pdf_text__gt='').exclude(id=article_id)
+            .values_list('pdf_text', flat=True).first()
+        )
+        if known_pdf_text:
+            Article.objects.filter(id=article_id).update(pdf_text=known_pdf_text, updated_at=timezone.now())
+            notify('INFO', f'PDF файл: {stored_name} уже был сконвертирован для другой статьи, текст переиспользован.')
+            return
+        transaction.on_commit(partial(convert_pdf_task.delay, article_id=article_id, user_id=user_id))
+        notify('INFO', f'PDF файл: {stored_name} сохранен, конвертация в текст поставлена в очередь.')
+    except Exception as err:
+        notify('FAILURE', f'Ошибка сохранения PDF файла {pdf_file.sha256}: {str(err)}.')
+    finally:
+        pdf_file.close() # Удаляет временный файл, если он не был перенесен в хранилище
+
+
+def _convert_pdf_with_markitdown(stored_name: str, service_url: str):
+    """Отправляет сохраненный PDF в сервис MarkItDown; возвращает markdown_text (или None)."""
+    pdf_storage = Article._meta.get_field('pdf_file').storage
+    with pdf_storage.open(stored_name, 'rb') as pdf_file_content_stream:
+        files = {'file': (os.path.basename(stored_name), pdf_file_content_stream, 'application/pdf')}
+        response = http_post(service_url, files=files, timeout=getattr(settings, 'MARKITDOWN_TIMEOUT', 310))
+    response.raise_for_status()
+    return response.json().get('markdown_text')
+
+
+@shared_task(bind=True, max_retries=4)
+def convert_pdf_task(self, article_id: int, user_id: int = None):
+    """
+    Конвертирует сохраненный PDF статьи в текст сервисом MarkItDown и записывает результат только в pdf_text
+    (для всех статей с тем же PDF). Адреса сервиса - settings.MARKITDOWN_SERVICE_URLS: попытки распределяются
+    по ним по кругу, при недоступности всех задача повторяется с экспоненциальной задержкой.
+    """
+    task_id = self.request.id
+    current_api_name = PDF_CONVERSION_SOURCE_NAME
+    display_identifier = f"ArticleID:{article_id}"
 
-    # --- Шаг 9: Вызов задачи для bioRxiv/medRxiv (Rxiv) ---
-    rxiv_doi_to_check = article.doi if article.doi else effective_doi_for_subtasks # Используем лучший доступный DOI
-    if rxiv_doi_to_check and rxiv_doi_to_check.startswith("10.1101/"): # Характерный префикс для Rxiv
+    article = Article.objects.filter(id=article_id).only('id', 'pdf_file', 'pdf_sha256', 'pdf_text').first()
+    if not article or not article.pdf_file:
+        return {'status': 'skipped', 'message': 'Article has no PDF file.', 'article_id': article_id}
+    if article.pdf_text:
+        return {'status': 'skipped', 'message': 'PDF text already present.', 'article_id': article_id}
+
+    stored_name = article.pdf_file.name
+    service_urls = list(getattr(settings, 'MARKITDOWN_SERVICE_URLS', None) or ['http://localhost:8181/convert-document/'])
+    offset = (article_id + self.request.retries) % len(service_urls) # Разные статьи и повторы - на разные экземпляры
+    last_exc = None
+    extracted_markitdown_text = None
+    for service_url in service_urls[offset:] + service_urls[:offset]:
+        send_user_notification(user_id, task_id, display_identifier, 'PROGRESS', f'MarkItDown: Начало конвертации PDF файла: {stored_name} ({service_url})...', source_api=current_api_name)
         try:
-            rxiv_task_sig = fetch_data_from_rxiv_task.s(
-                doi=rxiv_doi_to_check,
-                user_id=user_id,
-                originating_reference_link_id=originating_reference_link_id,
-                article_id_to_update=article_id_for_subtasks
-            )
-            rxiv_task_id_val = rxiv_task_sig.apply_async().id
-            send_user_notification(user_id, pipeline_task_id, rxiv_doi_to_check, 'SUBTASK_STARTED', f'Задача Rxiv (bio/medRxiv) запущена (ID: {rxiv_task_id_val}).', progress_percent=70, source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
-        except Exception as e_rxiv:
-            send_user_notification(user_id, pipeline_task_id, rxiv_doi_to_check, 'PIPELINE_ERROR', f'Не удалось запустить задачу Rxiv: {str(e_rxiv)}', source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
-    else:
-        send_user_notification(user_id, pipeline_task_id, pipeline_display_name, 'PIPELINE_INFO', 'DOI не похож на bioRxiv/medRxiv или отсутствует, пропуск задачи Rxiv.', source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
+            extracted_markitdown_text = _convert_pdf_with_markitdown(stored_name, service_url)
+            last_exc = None
+            break
+        except requests.exceptions.HTTPError as exc:
+            if exc.response is not None and exc.response.status_code < 500:
+                # Сервис отверг сам файл - повтор не поможет
+                send_user_notification(user_id, task_id, display_identifier, 'FAILURE', f'MarkItDown: PDF файл: {stored_name} не принят сервисом: {str(exc)}.', source_api=current_api_name)
+                return {'status': 'error', 'message': f'MarkItDown rejected PDF: {str(exc)}', 'article_id': article_id}
+            last_exc = exc
+        except requests.exceptions.RequestException as exc:
+            last_exc = exc
+        except OSError as exc:
+            send_user_notification(user_id, task_id, display_identifier, 'FAILURE', f'MarkItDown: PDF файл: {stored_name} не удалось прочитать: {str(exc)}.', source_api=current_api_name)
+            return {'status': 'error', 'message': f'PDF file read error: {str(exc)}', 'article_id': article_id}
+
+    if last_exc is not None:
+        countdown = getattr(settings, 'MARKITDOWN_RETRY_BACKOFF', 30) * (2 ** self.request.retries)
+        send_user_notification(user_id, task_id, display_identifier, 'RETRYING', f'MarkItDown: Ошибка Сети/API: {str(last_exc)}. Повтор через {countdown} сек...', source_api=current_api_name)
+        raise self.retry(exc=last_exc, countdown=countdown)
+
+    if not extracted_markitdown_text:
+        send_user_notification(user_id, task_id, display_identifier, 'INFO', f'MarkItDown: для PDF файла: {stored_name} не вернул текст.', source_api=current_api_name)
+        return {'status': 'not_found', 'message': 'MarkItDown returned no text.', 'article_id': article_id}
+
+    # Текст пишется, только если PDF статьи не заменили за время конвертации; статьи с тем же PDF получают его же
+    same_pdf = Q(id=article_id, pdf_file=stored_name)
+    if article.pdf_sha256:
+        same_pdf |= Q(pdf_sha256=article.pdf_sha256) & (Q(pdf_text__isnull=True) | Q(pdf_text=''))
+    updated_count = Article.objects.filter(same_pdf).update(pdf_text=extracted_markitdown_text, updated_at=timezone.now())
+    message = f'MarkItDown: для PDF файла: {stored_name} вернул текст длиной: {len(extracted_markitdown_text)}.'
+    send_user_notification(user_id, task_id, display_identifier, 'SUCCESS', message, article_id=article_id, source_api=current_api_name)
+    return {'status': 'success', 'message': message, 'article_id': article_id, 'updated_articles': updated_count}
+
+
+def _merge_source_records(records: dict) -> tuple:
+    """
+    Объединяет записи источников {source_api_name: record}: каждое поле берется из самого приоритетного
+    (по API_SOURCE_OVERALL_PRIORITY) источника, где оно заполнено. Возвращает (самый приоритетный источник, запись).
+    """
+    priority_list = getattr(settings, 'API_SOURCE_OVERALL_PRIORITY', [])
+    ordered_sources = sorted(records, key=lambda name: priority_list.index(name) if name in priority_list else len(priority_list))
+    merged = {}
+    for source_name in ordered_sources:
+        for field, value in (records[source_name] or {}).items():
+            if value and not merged.get(field):
+                merged[field] = value
+    return (ordered_sources[0] if ordered_sources else None), merged
 
-    # Финальное уведомление от диспетчера (progress_percent=100)
-    send_user_notification(user_id, pipeline_task_id, pipeline_display_name, 'PIPELINE_COMPLETE', 'Конвейер обработки завершил постановку всех задач.', progress_percent=100, source_api=PIPELINE_DISPATCHER_SOURCE_NAME, originating_reference_link_id=originating_reference_link_id)
-    return {'status': 'success', 'message': 'Конвейер задач запущен.', 'pipeline_task_id': pipeline_task_id, 'article_id': article_id_for_subtasks}
+
+def consolidate_article_sources(article_id: int) -> list | None:
+    """
+    Этап консолидации: объединяет ArticleSourceRecord всех источников и записывает статью один раз
+    (одна блокировка строки, один save, авторы переписываются один раз). Идентификаторы, уже принадлежащие
+    другой статье, пропускаются, а остальные метаданные все равно сохраняются.
+    Возвращает список пропущенных идентификаторов ('поле=значение') или None, если записей нет.
+    """
+    conflicts = []
+    with transaction.atomic():
+        article = Article.objects.select_for_update().get(id=article_id)
+        records = dict(ArticleSourceRecord.objects.filter(article=article).values_list('source_api_name', 'record'))
+        if not records:
+            return None
+        top_source_name, merged_record = _merge_source_records(records)
+        _apply_source_record(article, top_source_name, merged_record, conflicts=conflicts)
+        article.save()
+    return conflicts
 
 
 # Запрос к CrossRef для поиска DOI для цитируемой ссылки
@@ -420,7 +1040,7 @@ def find_doi_for_reference_task(self, reference_link_id: int, user_id: int):
 
     try:
         send_user_notification(user_id, task_id, display_identifier, 'PROGRESS', f'Запрос к CrossRef для поиска DOI: "{bibliographic_query[:50]}..."', progress_percent=30, source_api=FIND_DOI_TASK_SOURCE_NAME, originating_reference_link_id=reference_link_id)
-        response = requests.get(api_url, params=params, headers=headers, timeout=30)
+        response = _cached_api_get(self, settings.API_SOURCE_NAMES['CROSSREF'], api_url, params=params, headers=headers, timeout=30)
         response.raise_for_status()
         data = response.json()
     except requests.exceptions.RequestException as exc:
@@ -465,7 +1085,8 @@ def fetch_data_from_crossref_task(
     user_id: int = None,
     process_references: bool = False,
     originating_reference_link_id: int = None,
-    article_id_to_update: int = None): # Параметр для обновления существующей статьи
+    article_id_to_update: int = None, # Параметр для обновления существующей статьи
+    consolidate: bool = False):
 
     task_id = self.request.id
     current_api_name = settings.API_SOURCE_NAMES['CROSSREF']
@@ -498,7 +1119,7 @@ def fetch_data_from_crossref_task(
 
     try:
         send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', f'Запрос: {api_url}', progress_percent=10, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
-        response = requests.get(api_url, headers=headers, timeout=30)
+        response = _cached_api_get(self, current_api_name, api_url, headers=headers, timeout=30)
         response.raise_for_status()
         data = response.json()
         api_data = data.get('message', {}) # основные данные от API
@@ -525,7 +1146,7 @@ def fetch_data_from_crossref_task(
 
             if article_id_to_update: # Если передан ID для обновления
                 try:
-                    article = Article.objects.select_for_update().get(id=article_id_to_update, user=article_owner)
+                    article = _get_article_for_source(article_id_to_update, article_owner, consolidate)
                 except Article.DoesNotExist:
                     send_user_notification(user_id, task_id, query_display_name, 'WARNING', f'Статья ID {article_id_to_update} (для обновления) не найдена/не принадлежит пользователю. Попытка найти по DOI.', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
 
@@ -549,75 +1170,17 @@ def fetch_data_from_crossref_task(
 
             if not article.user and article_owner : article.user = article_owner
 
-            # --- Применение логики приоритетов ---
-            priority_list = getattr(settings, 'API_SOURCE_OVERALL_PRIORITY', [])
-            try: current_api_priority = priority_list.index(current_api_name)
-            except ValueError: current_api_priority = float('inf')
-            article_primary_source_priority = float('inf')
-            if article.primary_source_api:
-                try: article_primary_source_priority = priority_list.index(article.primary_source_api)
-                except ValueError: pass
-            can_fully_overwrite = (created or not article.primary_source_api or current_api_priority <= article_primary_source_priority)
-
-            if can_fully_overwrite:
-                article.primary_source_api = current_api_name
-
-            # Извлечение данных из api_data
-            api_title_list = api_data.get('title')
-            extracted_api_title = ", ".join(api_title_list).strip() if api_title_list and isinstance(api_title_list, list) and api_title_list else None
-
-            api_abstract_raw = api_data.get('abstract')
-            extracted_api_abstract = api_abstract_raw.replace('<i>', '').replace('</i>', '').strip() if api_abstract_raw else None
-
-            api_pub_date_data = api_data.get('published-print') or api_data.get('published-online') or api_data.get('created')
-            extracted_api_parsed_date = None
-            if api_pub_date_data and api_pub_date_data.get('date-parts') and isinstance(api_pub_date_data['date-parts'], list) and api_pub_date_data['date-parts'][0]:
-                date_parts = api_pub_date_data['date-parts'][0]
-                if isinstance(date_parts, list) and date_parts:
-                    try:
-                        extracted_api_parsed_date = timezone.datetime(
-                            year=int(date_parts[0]),
-                            month=int(date_parts[1]) if len(date_parts) > 1 else 1,
-                            day=int(date_parts[2]) if len(date_parts) > 2 else 1
-                        ).date()
-                    except (ValueError, TypeError, IndexError):
-                        pass
-
-            api_journal_list = api_data.get('container-title')
-            extracted_api_journal_name = ", ".join(api_journal_list).strip() if api_journal_list and isinstance(api_journal_list, list) and api_journal_list else None
-
-            extracted_api_authors = parse_crossref_authors(api_data.get('author'))
-
-            # Обновление полей с учетом приоритетов
-            if extracted_api_title and (can_fully_overwrite or not article.title):
-                article.title = extracted_api_title
-            if extracted_api_abstract and (can_fully_overwrite or not article.abstract):
-                article.abstract = extracted_api_abstract
-            if extracted_api_parsed_date and (can_fully_overwrite or not article.publication_date):
-                article.publication_date = extracted_api_parsed_date
-            if extracted_api_journal_name and (can_fully_overwrite or not article.journal_name):
-                article.journal_name = extracted_api_journal_name
-
+            # Извлечение данных из api_data и обновление полей с учетом приоритетов
+            _handle_source_record(article, current_api_name, normalize_crossref_work(api_data), created=created)
             if not article.doi:
                 article.doi = api_doi_from_response # Убедимся, что DOI установлен
 
-            # Обновление других идентификаторов, если CrossRef их вернул (пример для PMID)
-            # CrossRef может возвращать ID других систем в поле 'alternative-id' или через другие поля
-            if 'PMID' in api_data and api_data['PMID'] and not article.pubmed_id:
-                 article.pubmed_id = str(api_data['PMID']) # Убедимся, что это строка
-
-            if extracted_api_authors:
-                if can_fully_overwrite or not article.authors.exists():
-                    article.articleauthororder_set.all().delete()
-                    for order, author_obj in enumerate(extracted_api_authors):
-                        ArticleAuthorOrder.objects.create(article=article, author=author_obj, order=order)
-
             # if extracted_api_abstract and (not article.cleaned_text_for_llm or \
             #     len(extracted_api_abstract) > len(article.cleaned_text_for_llm or "") + 50 or \
             #     (can_fully_overwrite and article.primary_source_api == current_api_name)):
             #         article.cleaned_text_for_llm = extracted_api_abstract
 
-            article.save()
+            _save_source_article(article)
             send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', f'Статья {current_api_name} сохранена.', progress_percent=50, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
 
             ArticleContent.objects.update_or_create(
@@ -659,7 +1222,8 @@ def fetch_data_from_arxiv_task(
     arxiv_id_value: str,
     article_id_to_update: int = None, # Используем этот ID для обновления, если он есть
     user_id: int = None,
-    originating_reference_link_id: int = None):
+    originating_reference_link_id: int = None,
+    consolidate: bool = False):
 
     task_id = self.request.id
     clean_arxiv_id = arxiv_id_value.replace('arXiv:', '').split('v')[0].strip()
@@ -676,7 +1240,7 @@ def fetch_data_from_arxiv_task(
     try:
         # запрос к API arXiv, получение xml_content
         send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', f'Запрос к {api_url}', progress_percent=20, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
-        response = requests.get(api_url, timeout=30)
+        response = _cached_api_get(self, current_api_name, api_url, timeout=30)
         response.raise_for_status()
         xml_content = response.text
     except requests.exceptions.RequestException as exc:
@@ -705,10 +1269,32 @@ def fetch_data_from_arxiv_task(
             api_pdf_link = link_el.get('href')
             break
 
-    if api_pdf_link:
+    # Извлечение данных из XML <entry> - до транзакции, чтобы она держала блокировку только на время записи
+    arxiv_title_el = entry.find('atom:title', ARXIV_NS)
+    api_title = arxiv_title_el.text.strip().replace('\n', ' ').replace('  ', ' ') if arxiv_title_el is not None and arxiv_title_el.text else None
+    arxiv_summary_el = entry.find('atom:summary', ARXIV_NS)
+    api_abstract = arxiv_summary_el.text.strip().replace('\n', ' ') if arxiv_summary_el is not None and arxiv_summary_el.text else None
+    arxiv_published_el = entry.find('atom:published', ARXIV_NS)
+    arxiv_updated_el = entry.find('atom:updated', ARXIV_NS)
+    api_publication_date_str = arxiv_updated_el.text if arxiv_updated_el is not None and arxiv_updated_el.text else (arxiv_published_el.text if arxiv_published_el is not None and arxiv_published_el.text else None)
+    api_parsed_publication_date = None
+    if api_publication_date_str:
+        try:
+            api_parsed_publication_date = timezone.datetime.strptime(api_publication_date_str, '%Y-%m-%dT%H:%M:%SZ').date()
+        except ValueError:
+            pass
+    arxiv_doi_el = entry.find('arxiv:doi', ARXIV_NS)
+    api_doi = arxiv_doi_el.text.strip().lower() if arxiv_doi_el is not None and arxiv_doi_el.text else None
+    api_parsed_authors = parse_arxiv_authors(entry)
+    raw_xml_entry_string = ET.tostring(entry, encoding='unicode')
+
+    pdf_to_save = None
+    if api_pdf_link and _article_pdf_present(id=article_id_to_update, doi=api_doi, arxiv_id=clean_arxiv_id):
+        send_user_notification(user_id, task_id, query_display_name, 'INFO', f'PDF файл для: {arxiv_id_value} уже загружен, повторная загрузка пропущена.', source_api=current_api_name)
+    elif api_pdf_link:
         send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', f'Для: {arxiv_id_value} найден PDF URL: {api_pdf_link}. Начало получния PDF файла...', source_api=current_api_name)
+        _wait_for_api_token(self, current_api_name)
         try:
-            time.sleep(5)
             pdf_to_save = download_pdf(api_pdf_link, arxiv_id_value)
             if pdf_to_save:
                 send_user_notification(user_id, task_id, query_display_name, 'INFO', f'PDF файл для: {arxiv_id_value} успешно получен из: {api_pdf_link}.', source_api=current_api_name)
@@ -727,36 +1313,13 @@ def fetch_data_from_arxiv_task(
                     send_user_notification(user_id, task_id, query_display_name, 'FAILURE', f'Пользователь ID {user_id} не найден.', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
                     return {'status': 'error', 'message': f'User with ID {user_id} not found.'}
 
-            # Извлечение данных из XML <entry>
-            arxiv_title_el = entry.find('atom:title', ARXIV_NS)
-            api_title = arxiv_title_el.text.strip().replace('\n', ' ').replace('  ', ' ') if arxiv_title_el is not None and arxiv_title_el.text else None
-            arxiv_summary_el = entry.find('atom:summary', ARXIV_NS)
-            api_abstract = arxiv_summary_el.text.strip().replace('\n', ' ') if arxiv_summary_el is not None and arxiv_summary_el.text else None
-            arxiv_published_el = entry.find('atom:published', ARXIV_NS)
-            arxiv_updated_el = entry.find('atom:updated', ARXIV_NS)
-            api_publication_date_str = arxiv_updated_el.text if arxiv_updated_el is not None and arxiv_updated_el.text else (arxiv_published_el.text if arxiv_published_el is not None and arxiv_published_el.text else None)
-            api_parsed_publication_date = None
-            if api_publication_date_str:
-                try:
-                    api_parsed_publication_date = timezone.datetime.strptime(api_publication_date_str, '%Y-%m-%dT%H:%M:%SZ').date()
-                except ValueError:
-                    pass
-            arxiv_doi_el = entry.find('arxiv:doi', ARXIV_NS)
-            api_doi = arxiv_doi_el.text.strip().lower() if arxiv_doi_el is not None and arxiv_doi_el.text else None
-            # api_pdf_link = None
-            # for link_el in entry.findall('atom:link', ARXIV_NS):
-            #     if link_el.get('title') == 'pdf' and link_el.get('href'):
-            #         api_pdf_link = link_el.get('href')
-            #         break
-            api_parsed_authors = parse_arxiv_authors(entry)
-
             # --- Логика поиска или создания статьи ---
             article = None
             created = False
 
             if article_id_to_update: # Если диспетчер передал ID существующей статьи
                 try:
-                    article = Article.objects.select_for_update().get(id=article_id_to_update, user=article_owner)
+                    article = _get_article_for_source(article_id_to_update, article_owner, consolidate)
                 except Article.DoesNotExist:
                      send_user_notification(user_id, task_id, query_display_name, 'WARNING', f'Статья ID {article_id_to_update} (переданная для обновления) не найдена или не принадлежит пользователю.', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
 
@@ -786,40 +1349,16 @@ def fetch_data_from_arxiv_task(
                  return {'status': 'error', 'message': 'Could not identify or create article entry for arXiv.'}
 
             # --- Применение логики приоритетов ---
-            priority_list = getattr(settings, 'API_SOURCE_OVERALL_PRIORITY', [])
-            try:
-                current_api_priority = priority_list.index(current_api_name)
-            except ValueError:
-                current_api_priority = float('inf')
-            article_primary_source_priority = float('inf')
-            if article.primary_source_api:
-                try:
-                    article_primary_source_priority = priority_list.index(article.primary_source_api)
-                except ValueError:
-                    pass
-
-            can_fully_overwrite = (created or not article.primary_source_api or current_api_priority <= article_primary_source_priority)
-
-            if can_fully_overwrite:
-                article.primary_source_api = current_api_name
-
-            if api_title and (can_fully_overwrite or not article.title):
-                article.title = api_title
-            if api_abstract and (can_fully_overwrite or not article.abstract):
-                article.abstract = api_abstract
-            if api_parsed_publication_date and (can_fully_overwrite or not article.publication_date):
-                article.publication_date = api_parsed_publication_date
-
-            if not article.arxiv_id:
-                article.arxiv_id = clean_arxiv_id # Гарантируем, что arXiv ID установлен
-            if api_doi and (not article.doi or (can_fully_overwrite and article.doi != api_doi)):
-                article.doi = api_doi # Обновляем DOI если можем или его нет
-
-            if api_parsed_authors:
-                if can_fully_overwrite or not article.authors.exists():
-                    article.articleauthororder_set.all().delete()
-                    for order, author_obj in enumerate(api_parsed_authors):
-                        ArticleAuthorOrder.objects.create(article=article, author=author_obj, order=order)
+            arxiv_record = {
+                'title': api_title,
+                'abstract': api_abstract,
+                'publication_date': api_parsed_publication_date,
+                'doi': api_doi,
+                'arxiv_id': clean_arxiv_id,
+                'best_oa_pdf_url': api_pdf_link,
+                'authors': api_parsed_authors,
+            }
+            can_fully_overwrite = _handle_source_record(article, current_api_name, arxiv_record, created=created)
 
             # if api_abstract and (not article.cleaned_text_for_llm or len(api_abstract) > len(article.cleaned_text_for_llm or "")):
             #     article.cleaned_text_for_llm = api_abstract
@@ -832,38 +1371,10 @@ def fetch_data_from_arxiv_task(
                     defaults={'content': api_pdf_link}
                 )
 
-                if pdf_to_save and not article.pdf_file:
-                    extracted_markitdown_text = None
-                    try:
-                        pdf_file_name = f"article_{clean_arxiv_id}_{timezone.now().strftime('%Y%m%d%H%M%S')}.pdf"
-                        article.pdf_file.save(pdf_file_name, ContentFile(pdf_to_save), save=False)
-                        markitdown_service_url = 'http://localhost:8181/convert-document/'
-                        pdf_file_path = article.pdf_file.path
-                        if pdf_file_path:
-                            send_user_notification(user_id, task_id, query_display_name, 'INFO', f'MarkItDown: Начало конвертации: {api_pdf_link} PDF файла: {pdf_file_path} в текст...', source_api=current_api_name)
-                            with open(pdf_file_path, 'rb') as pdf_file_content_stream:
-                                files = {'file': (os.path.basename(pdf_file_path), pdf_file_content_stream, 'application/pdf')}
-                                time.sleep(1)
-                                response = requests.post(markitdown_service_url, files=files, timeout=310)
-                                response.raise_for_status()
-                                data = response.json()
-                                extracted_markitdown_text = data.get("markdown_text")
-                                # source_version_info = data.get("source_tool", "markitdown_service_1.0")
-                                if extracted_markitdown_text:
-                                    send_user_notification(user_id, task_id, query_display_name, 'SUCCESS', f'MarkItDown: {api_pdf_link} для PDF файла: {pdf_file_path} верунл текст длинной: {len(extracted_markitdown_text)}.', source_api=current_api_name)
-                                    article.pdf_text = extracted_markitdown_text
-                                else:
-                                    send_user_notification(user_id, task_id, query_display_name, 'INFO', f'MarkItDown: {api_pdf_link} для PDF файла: {pdf_file_path} не вернул текст. Ответ: {data}', source_api=current_api_name)
-                    except requests.exceptions.RequestException as exc:
-                        send_user_notification(user_id, task_id, query_display_name, 'RETRYING', f'MarkItDown: {api_pdf_link} для PDF файла: {pdf_file_path}. Ошибка Сети/API: {str(exc)}. Повтор...', source_api=current_api_name, riginating_reference_link_id=originating_reference_link_id)
-                    except Exception as err:
-                        send_user_notification(user_id, task_id, query_display_name, 'FAILURE', f'MarkItDown: {api_pdf_link} для PDF файла: {pdf_file_path}. Ошибка: {str(err)}.', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
-
-            article.save()
+            _save_source_article(article)
 
             send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', 'Статья arXiv сохранена в БД.', progress_percent=70, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
 
-            raw_xml_entry_string = ET.tostring(entry, encoding='unicode')
             ArticleContent.objects.update_or_create(
                 article=article, source_api_name=current_api_name, format_type='xml_atom_entry',
                 defaults={'content': raw_xml_entry_string}
@@ -881,9 +1392,13 @@ def fetch_data_from_arxiv_task(
                 except Exception as e_ref:
                     send_user_notification(user_id, task_id, query_display_name, 'ERROR', f'Ошибка обновления ref_link для arXiv: {str(e_ref)}', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
 
-            final_message = f'Статья arXiv "{article.title[:30]}..." {"создана" if created else "обновлена"}.'
-            send_user_notification(user_id, task_id, query_display_name, 'SUCCESS', final_message, progress_percent=100, article_id=article.id, created=created, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
-            return {'status': 'success', 'message': final_message, 'identifier': query_display_name, 'article_id': article.id}
+        # PDF сохраняется после фиксации транзакции, конвертация идет отдельной задачей
+        if pdf_to_save:
+            _store_source_pdf(article.id, pdf_to_save, user_id, partial(send_user_notification, user_id, task_id, query_display_name, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id))
+
+        final_message = f'Статья arXiv "{article.title[:30]}..." {"создана" if created else "обновлена"}.'
+        send_user_notification(user_id, task_id, query_display_name, 'SUCCESS', final_message, progress_percent=100, article_id=article.id, created=created, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
+        return {'status': 'success', 'message': final_message, 'identifier': query_display_name, 'article_id': article.id}
 
     except db_utils.OperationalError as exc_db:
         if 'database is locked' in str(exc_db).lower():
@@ -906,7 +1421,8 @@ def fetch_data_from_europepmc_task(
     identifier_type: str = 'DOI',
     user_id: int = None,
     originating_reference_link_id: int = None,
-    article_id_to_update: int = None):
+    article_id_to_update: int = None,
+    consolidate: bool = False):
 
     task_id = self.request.id
     query_display_name = f"{identifier_type.upper()}:{identifier_value}"
@@ -933,7 +1449,7 @@ def fetch_data_from_europepmc_task(
 
     try:
         send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', f'Запрос к {api_search_url}', progress_percent=20, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
-        response = requests.get(api_search_url, params=search_params, timeout=45)
+        response = _cached_api_get(self, current_api_name, api_search_url, params=search_params, timeout=45)
         response.raise_for_status()
         data = response.json()
     except requests.exceptions.RequestException as exc:
@@ -951,30 +1467,11 @@ def fetch_data_from_europepmc_task(
     send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', 'Метаданные получены, обработка...', progress_percent=40, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
 
     # Извлечение данных из ответа API EPMC
-    api_title = api_article_data.get('title')
-    api_abstract = api_article_data.get('abstractText')
-    api_doi = api_article_data.get('doi')
-    if api_doi:
-        api_doi = api_doi.lower()
-    api_pmid = api_article_data.get('pmid')
-    api_pmcid = api_article_data.get('pmcid')
-
-    api_pub_date_str = api_article_data.get('firstPublicationDate')
-    api_parsed_date = None
-    if api_pub_date_str:
-        try:
-            api_parsed_date = timezone.datetime.strptime(api_pub_date_str, '%Y-%m-%d').date()
-        except ValueError:
-            pass
-
-    api_journal_name = None
-    journal_info = api_article_data.get('journalInfo')
-    if journal_info and isinstance(journal_info, dict):
-        journal_details = journal_info.get('journal')
-        if journal_details and isinstance(journal_details, dict) and journal_details.get('title'):
-            api_journal_name = journal_details['title']
-
-    api_parsed_authors = parse_europepmc_authors(api_article_data.get('authorList', {}).get('author'))
+    epmc_record = normalize_europepmc_result(api_article_data)
+    api_title = epmc_record['title']
+    api_doi = epmc_record['doi']
+    api_pmid = epmc_record['pubmed_id']
+    api_pmcid = epmc_record['pmc_id']
 
     # --- Загрузка полного текста по PMCID, если он есть ---
     full_text_xml_content = None
@@ -986,17 +1483,26 @@ def fetch_data_from_europepmc_task(
         try:
             # headers={'User-Agent': f'ScientificPapersApp/1.0 ({APP_EMAIL})'}
             headers = {'User-Agent': USER_AGENT_LIST[0]}
-            full_text_response = requests.get(full_text_url, timeout=90, headers=headers)
+            full_text_response = _cached_api_get(self, current_api_name, full_text_url, timeout=90, headers=headers)
             if full_text_response.status_code == 200:
                 full_text_xml_content = full_text_response.text
                 # print(f'******* EUROPEPMC**** pmcid_for_url: {pmcid_for_url}, full_text_xml_content: {full_text_xml_content}')
                 send_user_notification(user_id, task_id, query_display_name, 'INFO', 'Полный текст JATS XML успешно получен из Europe PMC.', source_api=current_api_name)
             else:
                 send_user_notification(user_id, task_id, query_display_name, 'WARNING', f'Не удалось получить полный текст из Europe PMC для {pmcid_for_url} (статус: {full_text_response.status_code}).', source_api=current_api_name)
+        except Retry: # Перепланирование ограничителем частоты - не ошибка запроса
+            raise
         except Exception as exc:
             send_user_notification(user_id, task_id, query_display_name, 'WARNING', f'Ошибка при запросе полного текста из Europe PMC: {exc}', source_api=current_api_name)
 
     try:
+        # Разбор и сжатие полного текста - до транзакции, чтобы она держала блокировку только на время записи
+        structured_data = None
+        full_text_blob = None
+        if full_text_xml_content:
+            structured_data = extract_structured_text_from_jats(full_text_xml_content)
+            full_text_blob = ContentBlob.store(full_text_xml_content)
+
         with transaction.atomic():
             # --- Логика поиска или создания статьи ---
             article = None
@@ -1004,7 +1510,7 @@ def fetch_data_from_europepmc_task(
 
             if article_id_to_update:
                 try:
-                    article = Article.objects.select_for_update().get(id=article_id_to_update, user=article_owner)
+                    article = _get_article_for_source(article_id_to_update, article_owner, consolidate)
                 except Article.DoesNotExist:
                     send_user_notification(user_id, task_id, query_display_name, 'WARNING', f'Статья ID {article_id_to_update} (для обновления) не найдена/не принадлежит пользователю.', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
 
@@ -1049,49 +1555,16 @@ def fetch_data_from_europepmc_task(
                  return {'status': 'error', 'message': f'Could not identify or create article entry for {current_api_name}.'}
 
             # --- Применение логики приоритетов ---
-            priority_list = getattr(settings, 'API_SOURCE_OVERALL_PRIORITY', [])
-            try:
-                current_api_priority = priority_list.index(current_api_name)
-            except ValueError:
-                current_api_priority = float('inf')
-            article_primary_source_priority = float('inf')
-            if article.primary_source_api:
-                try:
-                    article_primary_source_priority = priority_list.index(article.primary_source_api)
-                except ValueError:
-                    pass
-            can_fully_overwrite = (created or not article.primary_source_api or current_api_priority <= article_primary_source_priority)
-
-            if can_fully_overwrite:
-                article.primary_source_api = current_api_name
-            if api_title and (can_fully_overwrite or not article.title):
-                article.title = api_title
-            if api_abstract and (can_fully_overwrite or not article.abstract):
-                article.abstract = api_abstract
-            if api_parsed_date and (can_fully_overwrite or not article.publication_date):
-                article.publication_date = api_parsed_date
-            if api_journal_name and (can_fully_overwrite or not article.journal_name):
-                article.journal_name = api_journal_name
-            if api_doi and not article.doi:
-                article.doi = api_doi
-            if api_pmid and not article.pubmed_id:
-                article.pubmed_id = api_pmid
-            if api_parsed_authors:
-                if can_fully_overwrite or not article.authors.exists():
-                    article.articleauthororder_set.all().delete()
-                    for order, author_obj in enumerate(api_parsed_authors):
-                        ArticleAuthorOrder.objects.create(article=article, author=author_obj, order=order)
+            _handle_source_record(article, current_api_name, epmc_record, created=created)
 
             # Если получен полный текст, он в приоритете
-            if full_text_xml_content:
+            if full_text_blob:
                 # Сохраняем полный XML
                 ArticleContent.objects.update_or_create(
                     article=article, source_api_name=current_api_name, format_type='epmc_fulltext_xml',
-                    defaults={'content': full_text_xml_content}
+                    defaults={'blob': full_text_blob}
                 )
 
-                # Извлекаем структурированный текст
-                structured_data = extract_structured_text_from_jats(full_text_xml_content)
                 if structured_data:
                     article.structured_content = structured_data
                     article.regenerate_cleaned_text_from_structured()
@@ -1102,7 +1575,7 @@ def fetch_data_from_europepmc_task(
             #     if not article.structured_content:
             #         article.structured_content = {'abstract': api_abstract}
 
-            article.save()
+            _save_source_article(article)
             send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', f'Статья {current_api_name} сохранена в БД (до ссылок).', progress_percent=80, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
 
             # Сохраняем сырые метаданные из поиска
@@ -1123,19 +1596,13 @@ def fetch_data_from_europepmc_task(
                 except Exception as e_ref:
                     send_user_notification(user_id, task_id, query_display_name, 'ERROR', f'Ошибка обновления ref_link для {current_api_name}: {str(e_ref)}', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
 
-            # --- ЗАПУСК ЗАДАЧИ СЕГМЕНТАЦИИ И СВЯЗЫВАНИЯ ---
-            if article.is_user_initiated and full_text_xml_content:
-                process_full_text_and_create_segments_task.delay(
-                    article_id=article.id,
-                    user_id=user_id
-                )
-                send_user_notification(user_id, task_id, query_display_name, 'INFO', 'Поставлена задача на автоматическое связывание текста и ссылок.', source_api=current_api_name)
+            # Сегментация полного текста запускается один раз на этапе финализации конвейера
 
-            final_message = f'Статья {current_api_name} "{article.title[:30]}..." {"создана" if created else "обновлена"}.'
-            if full_text_xml_content:
-                final_message += " Получен полный текст, запущена сегментация."
-            send_user_notification(user_id, task_id, query_display_name, 'SUCCESS', final_message, progress_percent=100, article_id=article.id, created=created, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
-            return {'status': 'success', 'message': final_message, 'identifier': query_display_name, 'article_id': article.id}
+        final_message = f'Статья {current_api_name} "{article.title[:30]}..." {"создана" if created else "обновлена"}.'
+        if full_text_xml_content:
+            final_message += " Получен полный текст."
+        send_user_notification(user_id, task_id, query_display_name, 'SUCCESS', final_message, progress_percent=100, article_id=article.id, created=created, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
+        return {'status': 'success', 'message': final_message, 'identifier': query_display_name, 'article_id': article.id}
 
     except db_utils.OperationalError as exc_db:
         send_user_notification(user_id, task_id, query_display_name, 'FAILURE', f'Операционная ошибка БД ({current_api_name}): {str(exc_db)}', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
@@ -1156,7 +1623,8 @@ def fetch_data_from_s2_task(
     identifier_type: str = 'DOI',
     user_id: int = None,
     originating_reference_link_id: int = None,
-    article_id_to_update: int = None):
+    article_id_to_update: int = None,
+    consolidate: bool = False):
 
     task_id = self.request.id
     current_api_name = settings.API_SOURCE_NAMES['SEMANTICSCHOLAR']
@@ -1182,40 +1650,17 @@ def fetch_data_from_s2_task(
         send_user_notification(user_id, task_id, query_display_name, 'FAILURE', 'Идентификатор не указан.', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
         return {'status': 'error', 'message': 'Идентификатор не указан.'}
 
-    # --- ИЗМЕНЕННЫЙ СПИСОК ПОЛЕЙ ---
-    s2_fields = [
-        'externalIds',
-        'url',
-        'title',
-        'abstract',
-        'venue',
-        'year',
-        'referenceCount',
-        'citationCount',
-        'influentialCitationCount',
-        'isOpenAccess',
-        'openAccessPdf',
-        'fieldsOfStudy',
-        'publicationTypes',
-        'publicationDate',
-        'journal',
-        'authors',
-        'tldr',
-        'references.paperId', 'references.title', 'references.year', # Запрашиваем paperId, title, year для ссылок
-        'citations.paperId', 'citations.title'  # Запрашиваем paperId, title для цитирующих статей (год удален из-за ошибки)
-    ]
-    # из-за ошибкит не запрашиваем 'references.doi', 'citations.doi', 'citations.year'
-
-    params = {'fields': ",".join(s2_fields)}
-    # headers = {'User-Agent': f'ScientificPapersApp/1.0 (mailto:{APP_EMAIL})'}
+    # Списки references/citations не запрашиваем: они объемные и загружаются постранично
+    # по запросу интерфейса (ArticleS2LinksAPIView -> fetch_s2_linked_papers)
+    params = {'fields': S2_PAPER_FIELDS}
     headers = {'User-Agent': USER_AGENT_LIST[0]}
-    # Если есть API ключ S2: headers['x-api-key'] = 'YOUR_S2_API_KEY_HERE'
 
-    api_url = f"https://api.semanticscholar.org/graph/v1/paper/{s2_paper_id_for_api.replace(' ', '%20')}"
+    api_url = f"{S2_GRAPH_API_URL}/paper/{s2_paper_id_for_api.replace(' ', '%20')}"
 
     try:
         send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', f'Запрос к {api_url}', progress_percent=20, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
-        response = requests.get(api_url, params=params, headers=headers, timeout=45)
+        _prefetch_pending_s2(self, s2_paper_id_for_api)
+        response = _cached_api_get(self, current_api_name, api_url, params=params, headers=headers, timeout=45)
         if response.status_code == 404:
             send_user_notification(user_id, task_id, query_display_name, 'NOT_FOUND', f'Статья не найдена в {current_api_name}.', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
             return {'status': 'not_found', 'message': f'Статья не найдена в {current_api_name}.'}
@@ -1236,7 +1681,7 @@ def fetch_data_from_s2_task(
     send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', f'Данные {current_api_name} получены, обработка...', progress_percent=40, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
 
     pdf_to_save = None
-    api_oa_pdf_url = api_data.get('openAccessPdf', {}).get('url') if isinstance(api_data.get('openAccessPdf'), dict) else None
+    # api_oa_pdf_url = s2_record['best_oa_pdf_url'] # URL открытого PDF разбирает normalize_s2_paper
     # if api_oa_pdf_url:
     #     send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', f'Для: {identifier_value} найден PDF URL: {api_oa_pdf_url}. Начало получния PDF файла...', source_api=current_api_name)
     #     try:
@@ -1260,34 +1705,13 @@ def fetch_data_from_s2_task(
                     return {'status': 'error', 'message': f'User with ID {user_id} not found.'}
 
             # Извлечение данных из ответа API S2
-            api_title = api_data.get('title')
-            api_abstract = api_data.get('abstract')
-            api_pub_date_str = api_data.get('publicationDate')
-            api_parsed_date = None
-            if api_pub_date_str:
-                try:
-                    api_parsed_date = timezone.datetime.strptime(api_pub_date_str, '%Y-%m-%d').date()
-                except (ValueError, TypeError):
-                    pass
-
-            api_journal_info = api_data.get('journal')
-            api_journal_name = None
-            if api_journal_info and isinstance(api_journal_info, dict) and api_journal_info.get('name'):
-                api_journal_name = api_journal_info['name']
-            elif api_data.get('venue'): # Иногда S2 использует 'venue'
-                api_journal_name = api_data.get('venue')
-
-            api_parsed_authors = parse_s2_authors(api_data.get('authors'))
-
-            ext_ids = api_data.get('externalIds', {})
-            api_doi = ext_ids.get('DOI')
-            if api_doi:
-                api_doi = api_doi.lower()
-            api_arxiv_id = ext_ids.get('ArXiv') # S2 использует 'ArXiv'
-            api_pmid = ext_ids.get('PubMed')
-
-            s2_tldr_data = api_data.get('tldr')
-            api_tldr_text = s2_tldr_data.get('text') if isinstance(s2_tldr_data, dict) else None
+            s2_record = normalize_s2_paper(api_data)
+            api_title = s2_record['title']
+            api_abstract = s2_record['abstract']
+            api_doi = s2_record['doi']
+            api_arxiv_id = s2_record['arxiv_id']
+            api_pmid = s2_record['pubmed_id']
+            api_tldr_text = s2_record['tldr']
 
             # api_oa_pdf_url = api_data.get('openAccessPdf', {}).get('url') if isinstance(api_data.get('openAccessPdf'), dict) else None
 
@@ -1297,7 +1721,7 @@ def fetch_data_from_s2_task(
 
             if article_id_to_update:
                 try:
-                    article = Article.objects.select_for_update().get(id=article_id_to_update, user=article_owner)
+                    article = _get_article_for_source(article_id_to_update, article_owner, consolidate)
                 except Article.DoesNotExist:
                     send_user_notification(user_id, task_id, query_display_name, 'WARNING', f'Статья ID {article_id_to_update} (для обновления) не найдена/не принадлежит пользователю.', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
 
@@ -1347,45 +1771,8 @@ def fetch_data_from_s2_task(
                  send_user_notification(user_id, task_id, query_display_name, 'FAILURE', 'Не удалось идентифицировать или создать запись для статьи S2.', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
                  return {'status': 'error', 'message': 'Could not identify or create article entry for S2.'}
 
-            # --- Применение логики приоритетов ---
-            priority_list = getattr(settings, 'API_SOURCE_OVERALL_PRIORITY', [])
-            try:
-                current_api_priority = priority_list.index(current_api_name)
-            except ValueError:
-                current_api_priority = float('inf')
-            article_primary_source_priority = float('inf')
-            if article.primary_source_api:
-                try:
-                    article_primary_source_priority = priority_list.index(article.primary_source_api)
-                except ValueError:
-                    pass
-            can_fully_overwrite = (created or not article.primary_source_api or current_api_priority <= article_primary_source_priority)
-
-            if can_fully_overwrite:
-                article.primary_source_api = current_api_name
-
-            if api_title and (can_fully_overwrite or not article.title):
-                article.title = api_title
-            if api_abstract and (can_fully_overwrite or not article.abstract):
-                article.abstract = api_abstract
-            if api_parsed_date and (can_fully_overwrite or not article.publication_date):
-                article.publication_date = api_parsed_date
-            if api_journal_name and (can_fully_overwrite or not article.journal_name):
-                article.journal_name = api_journal_name
-
-            # Идентификаторы (добавляем, если отсутствуют)
-            if api_doi and not article.doi:
-                article.doi = api_doi
-            if api_arxiv_id and not article.arxiv_id:
-                article.arxiv_id = api_arxiv_id
-            if api_pmid and not article.pubmed_id:
-                article.pubmed_id = api_pmid
-
-            if api_parsed_authors:
-                if can_fully_overwrite or not article.authors.exists():
-                    article.articleauthororder_set.all().delete()
-                    for order, author_obj in enumerate(api_parsed_authors):
-                        ArticleAuthorOrder.objects.create(article=article, author=author_obj, order=order)
+            # --- Применение логики приоритетов (включая OA PDF ссылку) ---
+            _handle_source_record(article, current_api_name, s2_record, created=created)
 
             # cleaned_text_for_llm (S2 дает абстракт или TLDR)
             text_for_llm_candidate = api_abstract
@@ -1400,10 +1787,6 @@ def fetch_data_from_s2_task(
             #    (can_fully_overwrite and article.primary_source_api == current_api_name)):
             #     article.cleaned_text_for_llm = text_for_llm_candidate
 
-            # OA PDF ссылка
-            if api_oa_pdf_url and (not article.best_oa_pdf_url or can_fully_overwrite):
-                article.best_oa_pdf_url = api_oa_pdf_url
-
                 # if pdf_to_save and not article.pdf_file:
                 #     extracted_markitdown_text = None
                 #     try:
@@ -1431,7 +1814,7 @@ def fetch_data_from_s2_task(
                 #     except Exception as err:
                 #         send_user_notification(user_id, task_id, query_display_name, 'FAILURE', f'MarkItDown: {identifier_value} для PDF файла: {pdf_file_path}. Ошибка: {str(err)}.', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
 
-            article.save()
+            _save_source_article(article)
             send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', f'Статья {current_api_name} сохранена в БД.', progress_percent=60, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
 
             ArticleContent.objects.update_or_create(
@@ -1475,7 +1858,8 @@ def fetch_data_from_pubmed_task(
     identifier_type: str = 'PMID',
     user_id: int = None,
     originating_reference_link_id: int = None,
-    article_id_to_update: int = None):
+    article_id_to_update: int = None,
+    consolidate: bool = False):
 
     task_id = self.request.id
     query_display_name = f"{identifier_type.upper()}:{identifier_value}"
@@ -1501,172 +1885,73 @@ def fetch_data_from_pubmed_task(
         common_params['api_key'] = NCBI_API_KEY
 
     pmid_to_fetch = None
-    original_doi = None
-    if identifier_type.upper() == 'DOI':
-        send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', f'Поиск PMID для DOI {identifier_value} через ESearch...', progress_percent=10, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
-        esearch_params = {**common_params, 'db': 'pubmed', 'term': f"{identifier_value}[DOI]", 'retmode': 'json'}
-        try:
-            # if not NCBI_API_KEY: time.sleep(0.35)
-            time.sleep(0.35)
-            esearch_response = requests.get(f"{eutils_base}esearch.fcgi", params=esearch_params, timeout=30)
-            esearch_response.raise_for_status()
-            esearch_data = esearch_response.json()
-            if esearch_data.get('esearchresult', {}).get('idlist') and len(esearch_data['esearchresult']['idlist']) > 0:
-                pmid_to_fetch = esearch_data['esearchresult']['idlist'][0]
-                query_display_name = f"PMID:{pmid_to_fetch} (найден по DOI:{identifier_value})"
-                send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', f'PMID {pmid_to_fetch} найден. Запрос EFetch...', progress_percent=20, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
-            else:
-                send_user_notification(user_id, task_id, query_display_name, 'NOT_FOUND', 'PMID не найден для указанного DOI.', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
-                return {'status': 'not_found', 'message': 'PMID not found for DOI.'}
-        except requests.exceptions.RequestException as exc:
-            send_user_notification(user_id, task_id, query_display_name, 'RETRYING', f'Ошибка ESearch {current_api_name}: {str(exc)}. Повтор...', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
-            raise self.retry(exc=exc)
-        except json.JSONDecodeError as json_exc:
-            send_user_notification(user_id, task_id, query_display_name, 'FAILURE', f'Ошибка декодирования JSON от ESearch {current_api_name}: {str(json_exc)}.', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
-            return {'status': 'error', 'message': f'ESearch JSON Decode Error: {str(json_exc)}'}
-    elif identifier_type.upper() == 'PMID':
-        pmid_to_fetch = identifier_value
-    else:
-        send_user_notification(user_id, task_id, query_display_name, 'FAILURE', f'Неподдерживаемый тип идентификатора для {current_api_name}: {identifier_type}.', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
-        return {'status': 'error', 'message': f'Unsupported identifier type for {current_api_name}: {identifier_type}.'}
-
     pmcid_to_fetch = None
-    pmc_esearch_data = {}
-    if identifier_type.upper() == 'DOI':
-        send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', f'Поиск PMCID для DOI {identifier_value} через ESearch...', progress_percent=15, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
-        pmc_esearch_params = {**common_params, 'db': 'pmc', 'term': f"{identifier_value}[DOI]", 'retmode': 'json'}
-        try:
-            time.sleep(0.35)
-            pmc_esearch_response = requests.get(f"{eutils_base}esearch.fcgi", params=pmc_esearch_params, timeout=30)
-            pmc_esearch_response.raise_for_status()
-            pmc_esearch_data = pmc_esearch_response.json()
-            if pmc_esearch_data.get('esearchresult', {}).get('idlist') and len(pmc_esearch_data['esearchresult']['idlist']) > 0:
-                pmcid_to_fetch = esearch_data['esearchresult']['idlist'][0]
-                query_display_name = f"PMCID:{pmid_to_fetch} (найден по DOI:{identifier_value})"
-                send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', f'PMCID {pmid_to_fetch} найден. Запрос EFetch...', progress_percent=20, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
-            else:
-                send_user_notification(user_id, task_id, query_display_name, 'NOT_FOUND', 'PMCID не найден для указанного DOI.', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
-                return {'status': 'not_found', 'message': 'PMCID not found for DOI.'}
-        except requests.exceptions.RequestException as exc:
-            send_user_notification(user_id, task_id, query_display_name, 'RETRYING', f'Ошибка ESearch {current_api_name}: {str(exc)}. Повтор...', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
-            raise self.retry(exc=exc)
-        except json.JSONDecodeError as json_exc:
-            send_user_notification(user_id, task_id, query_display_name, 'FAILURE', f'Ошибка декодирования JSON от ESearch {current_api_name}: {str(json_exc)}.', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
-            return {'status': 'error', 'message': f'ESearch JSON Decode Error: {str(json_exc)}'}
-    elif identifier_type.upper() == 'PMID':
-        pmc_esearch_from_pmid_params = {**common_params, 'db': 'pmc', 'term': f"{pmid_to_fetch}[PMID]", 'retmode': 'json'}
-        try:
-            time.sleep(0.35)
-            pmc_esearch_from_pmid_response = requests.get(f"{eutils_base}esearch.fcgi", params=pmc_esearch_from_pmid_params, timeout=30)
-            pmc_esearch_from_pmid_response.raise_for_status()
-            pmc_esearch_from_pmid_data = pmc_esearch_from_pmid_response.json()
-            if pmc_esearch_from_pmid_data.get('esearchresult', {}).get('idlist') and len(pmc_esearch_from_pmid_data['esearchresult']['idlist']) > 0:
-                pmcid_to_fetch = pmc_esearch_from_pmid_data['esearchresult']['idlist'][0]
-                query_display_name = f"PMCID:{pmid_to_fetch} (найден по DOI:{identifier_value})"
-                send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', f'PMCID {pmid_to_fetch} найден. Запрос EFetch...', progress_percent=20, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
-        except requests.exceptions.RequestException as exc:
-            send_user_notification(user_id, task_id, query_display_name, 'RETRYING', f'Ошибка ESearch {current_api_name}: {str(exc)}. Повтор...', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
-            raise self.retry(exc=exc)
-        except json.JSONDecodeError as json_exc:
-            send_user_notification(user_id, task_id, query_display_name, 'FAILURE', f'Ошибка декодирования JSON от ESearch {current_api_name}: {str(json_exc)}.', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
-            return {'status': 'error', 'message': f'ESearch JSON Decode Error: {str(json_exc)}'}
-    else:
+    original_doi = None
+    if identifier_type.upper() not in ('DOI', 'PMID'):
         send_user_notification(user_id, task_id, query_display_name, 'FAILURE', f'Неподдерживаемый тип идентификатора для {current_api_name}: {identifier_type}.', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
         return {'status': 'error', 'message': f'Unsupported identifier type for {current_api_name}: {identifier_type}.'}
 
-    if not pmid_to_fetch and not pmcid_to_fetch:
-        # ESearch не нашёл PMID и PMCID
+    # PMID/PMCID берем из этапа разрешения идентификаторов (локальная таблица + NCBI ID Converter + OpenAlex)
+    # вместо отдельных запросов ESearch к db=pubmed и db=pmc.
+    send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', 'Сопоставление идентификаторов (DOI/PMID/PMCID)...', progress_percent=10, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
+    lookup_key = 'doi' if identifier_type.upper() == 'DOI' else 'pubmed_id'
+    try:
+        resolved_ids = resolve_identifiers_batch([{lookup_key: identifier_value}])[0]
+    except RateLimitExceeded as exc:
+        raise _rate_limit_retry(self, exc)
+    pmid_to_fetch = identifier_value if lookup_key == 'pubmed_id' else resolved_ids.get('pubmed_id')
+    pmcid_to_fetch = resolved_ids.get('pmc_id')
+
+    if not pmid_to_fetch and resolved_ids.get('external_lookup_failed'):
+        # NCBI ID Converter и OpenAlex не ответили: PMID неизвестен, а не отсутствует
+        send_user_notification(user_id, task_id, query_display_name, 'RETRYING', 'Сервисы сопоставления идентификаторов недоступны. Повтор...', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
+        raise self.retry(exc=requests.exceptions.RequestException(f'Identifier lookup failed for {query_display_name}'))
+
+    if not pmid_to_fetch:
         send_user_notification(user_id, task_id, query_display_name, 'NOT_FOUND', 'PMID не найден для указанного DOI.', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
-        return {'status': 'not_found', 'message': 'PMID and PMCID not found for DOI.'}
+        return {'status': 'not_found', 'message': 'PMID not found for DOI.'}
+
+    if lookup_key == 'doi':
+        original_doi = identifier_value
+    send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', f'PMID {pmid_to_fetch}{f", PMCID {pmcid_to_fetch}" if pmcid_to_fetch else ""}. Запрос EFetch...', progress_percent=20, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
 
     # Обновляем имя для отображения, если нашли PMID
     if original_doi:
         query_display_name = f"PMID:{pmid_to_fetch} (из DOI:{original_doi})"
 
+    # PMID/PMCID, накопленные в очереди другими конвейерами, загружаются одним EFetch вместе с текущим
+    _prefetch_pending_pubmed(self, pmid_to_fetch, pmcid_to_fetch)
+
     # Запрос метаданных и PMCID из db=pubmed
     efetch_params = {**common_params, 'db': 'pubmed', 'id': pmid_to_fetch, 'retmode': 'xml', 'rettype': 'abstract'}
     xml_content_pubmed = None
     try:
-        # if not NCBI_API_KEY: time.sleep(0.35)
-        time.sleep(0.35)
         send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', 'Запрос метаданных из PubMed...', progress_percent=25, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
-        efetch_response = requests.get(f"{eutils_base}efetch.fcgi", params=efetch_params, timeout=45)
+        efetch_response = _cached_api_get(self, current_api_name, f"{eutils_base}efetch.fcgi", params=efetch_params, timeout=45)
         efetch_response.raise_for_status()
         xml_content_pubmed = efetch_response.text
+    except Retry: # Перепланирование ограничителем частоты - не ошибка запроса
+        raise
     except Exception as exc:
         send_user_notification(user_id, task_id, query_display_name, 'RETRYING', f'Ошибка EFetch (db=pubmed): {exc}. Повтор...', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
         raise self.retry(exc=exc)
 
     # Парсинг метаданных из ответа 'pubmed'
-    api_title, api_abstract, api_journal_title, api_doi, api_pmcid = None, None, None, None, None
-    api_parsed_authors, api_mesh_terms = [], []
-    api_parsed_publication_date = None
-
     try:
         root = ET.fromstring(xml_content_pubmed)
         pubmed_article_node = root.find('.//PubmedArticle')
         if pubmed_article_node is None:
             raise ValueError("Структура PubmedArticle не найдена в XML.")
-        article_node = pubmed_article_node.find('.//Article')
-        if article_node is None:
-            send_user_notification(user_id, task_id, query_display_name, 'NOT_FOUND', 'Тег Article не найден в PubmedArticle.', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
-            # return {'status': 'not_found', 'message': 'Article tag not found in PubmedArticle.'}
-            raise ValueError("Тег Article не найден в PubmedArticle.")
-
-        title_el = article_node.find('.//ArticleTitle')
-        api_title = title_el.text.strip() if title_el is not None and title_el.text else None
-
-        abstract_text_parts = []
-        for abst_text_node in article_node.findall('.//AbstractText'):
-            if abst_text_node.text:
-                label = abst_text_node.get('Label')
-                if label:
-                    abstract_text_parts.append(f"{label.upper()}: {abst_text_node.text.strip()}")
-                else:
-                    abstract_text_parts.append(abst_text_node.text.strip())
-        api_abstract = "\n\n".join(abstract_text_parts) if abstract_text_parts else None # Разделяем параграфы абстракта
-
-        api_parsed_authors = parse_pubmed_authors(article_node.find('.//AuthorList'))
-
-        journal_node = article_node.find('.//Journal')
-        if journal_node is not None:
-            journal_title_el = journal_node.find('./Title')
-            if journal_title_el is not None and journal_title_el.text:
-                api_journal_title = journal_title_el.text.strip()
-
-        pubdate_node = article_node.find('.//Journal/JournalIssue/PubDate')
-        if pubdate_node is not None:
-            year_el, month_el, day_el = pubdate_node.find('./Year'), pubdate_node.find('./Month'), pubdate_node.find('./Day')
-            if year_el is not None and year_el.text:
-                try:
-                    year = int(year_el.text)
-                    month_str = month_el.text if month_el is not None and month_el.text else "1"
-                    day_str = day_el.text if day_el is not None and day_el.text else "1"
-                    month_map = {'jan':1,'feb':2,'mar':3,'apr':4,'may':5,'jun':6,'jul':7,'aug':8,'sep':9,'oct':10,'nov':11,'dec':12}
-                    month = int(month_str) if month_str.isdigit() else month_map.get(month_str.lower()[:3], 1)
-                    api_parsed_publication_date = timezone.datetime(year, month, int(day_str)).date()
-                except (ValueError, TypeError):
-                    pass
-
-        # ВАЖНО: ищем PMCID именно для основной статьи
-        pmcid_node = pubmed_article_node.find(".//PubmedData/ArticleIdList/ArticleId[@IdType='pmc']")
-        if pmcid_node is not None and pmcid_node.text:
-            api_pmcid = pmcid_node.text.strip() # Получаем полный PMCID, например "PMC1234567"
-
-        doi_node = pubmed_article_node.find(".//ArticleIdList/ArticleId[@IdType='doi']")
-        if doi_node is not None and doi_node.text:
-            api_doi = doi_node.text.strip().lower()
-
-        mesh_list_node = pubmed_article_node.find('.//MeshHeadingList')
-        if mesh_list_node is not None:
-            for mesh_node in mesh_list_node.findall('./MeshHeading'):
-                desc_el = mesh_node.find('./DescriptorName')
-                if desc_el is not None and desc_el.text:
-                    api_mesh_terms.append(desc_el.text.strip())
+        pubmed_record = normalize_pubmed_article(pubmed_article_node)
     except Exception as e_xml:
         send_user_notification(user_id, task_id, query_display_name, 'FAILURE', f'Ошибка парсинга XML PubMed: {e_xml}', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
         return {'status': 'error', 'message': f'Error parsing PubMed XML: {e_xml}'}
 
+    api_title = pubmed_record['title']
+    api_doi = pubmed_record['doi']
+    api_pmcid = pubmed_record['pmc_id']
+    api_mesh_terms = pubmed_record['mesh_terms']
+
     # --- ЭТАП 2: ПОЛУЧЕНИЕ ПОЛНОГО ТЕКСТА ИЗ PMC (db=pmc), ЕСЛИ ЕСТЬ PMCID ---
     if not api_pmcid and pmcid_to_fetch:
         api_pmcid = pmcid_to_fetch
@@ -1679,40 +1964,53 @@ def fetch_data_from_pubmed_task(
         api_pmcid = api_pmcid if api_pmcid.upper().startswith('PMC') else f"PMC{api_pmcid}"
         pmc_efetch_params = {**common_params, 'db': 'pmc', 'id': api_pmcid, 'retmode': 'xml'} # rettype не нужен, вернет полный XML
         try:
-            # if not NCBI_API_KEY: time.sleep(0.35)
-            time.sleep(0.35)
-            pmc_response = requests.get(f"{eutils_base}efetch.fcgi", params=pmc_efetch_params, timeout=90)
+            pmc_response = _cached_api_get(self, current_api_name, f"{eutils_base}efetch.fcgi", params=pmc_efetch_params, timeout=90)
             if pmc_response.status_code == 200:
                 full_text_xml_pmc = pmc_response.text
                 # print(f'******** PUBMED *** api_pmcid: {api_pmcid}, \nfull_text_xml_pmc: {full_text_xml_pmc}')
                 send_user_notification(user_id, task_id, query_display_name, 'INFO', 'Полный текст JATS XML успешно получен из PMC.', source_api=current_api_name)
             else:
                 send_user_notification(user_id, task_id, query_display_name, 'WARNING', f'Не удалось получить полный текст из PMC для {api_pmcid} (статус: {pmc_response.status_code}).', source_api=current_api_name)
+        except Retry: # Перепланирование ограничителем частоты - не ошибка запроса
+            raise
         except Exception as exc:
             send_user_notification(user_id, task_id, query_display_name, 'WARNING', f'Ошибка при запросе полного текста из PMC: {exc}', source_api=current_api_name)
 
-        send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', f'Найден PMCID: {api_pmcid}. Начало получния PDF файла...', progress_percent=55, source_api=current_api_name)
-        try:
-            time.sleep(5)
-            pdf_file_name = f"article_{api_pmcid}_{timezone.now().strftime('%Y%m%d%H%M%S')}.pdf"
-            pmc_pdf_url = f'https://pmc.ncbi.nlm.nih.gov/articles/{api_pmcid}/pdf/'
-            pdf_to_save = download_pdf(pmc_pdf_url, identifier_value)
-            if pdf_to_save:
-                send_user_notification(user_id, task_id, query_display_name, 'INFO', 'PDF файл успешно получен из PMC.', source_api=current_api_name)
-            else:
-                send_user_notification(user_id, task_id, query_display_name, 'WARNING', f'Не удалось получить PDF из PMC для {api_pmcid}.', source_api=current_api_name)
-        except Exception as exc:
-            send_user_notification(user_id, task_id, query_display_name, 'WARNING', f'Ошибка при запросе PDF файла из PMC: {exc}', source_api=current_api_name)
+        if _article_pdf_present(id=article_id_to_update, doi=api_doi, pubmed_id=pmid_to_fetch, pmc_id=api_pmcid):
+            send_user_notification(user_id, task_id, query_display_name, 'INFO', f'PDF файл для {api_pmcid} уже загружен, повторная загрузка пропущена.', progress_percent=55, source_api=current_api_name)
+        else:
+            send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', f'Найден PMCID: {api_pmcid}. Начало получния PDF файла...', progress_percent=55, source_api=current_api_name)
+            _wait_for_api_token(self, current_api_name)
+            try:
+                pmc_pdf_url = f'https://pmc.ncbi.nlm.nih.gov/articles/{api_pmcid}/pdf/'
+                pdf_to_save = download_pdf(pmc_pdf_url, identifier_value)
+                if pdf_to_save:
+                    send_user_notification(user_id, task_id, query_display_name, 'INFO', 'PDF файл успешно получен из PMC.', source_api=current_api_name)
+                else:
+                    send_user_notification(user_id, task_id, query_display_name, 'WARNING', f'Не удалось получить PDF из PMC для {api_pmcid}.', source_api=current_api_name)
+            except Exception as exc:
+                send_user_notification(user_id, task_id, query_display_name, 'WARNING', f'Ошибка при запросе PDF файла из PMC: {exc}', source_api=current_api_name)
 
-    # --- ЭТАП 3: СОХРАНЕНИЕ В БД ---
+    # --- ЭТАП 3: РАЗБОР И СОХРАНЕНИЕ В БД ---
     try:
+        # Разбор JATS и сжатие ответов - до транзакции, чтобы она держала блокировку только на время записи
+        structured_data = None
+        parsed_references = None
+        full_text_blob = None
+        if full_text_xml_pmc:
+            structured_data = extract_structured_text_from_jats(full_text_xml_pmc)
+            if originating_reference_link_id is None:
+                parsed_references = parse_references_from_jats(full_text_xml_pmc)
+            full_text_blob = ContentBlob.store(full_text_xml_pmc)
+        pubmed_entry_blob = ContentBlob.store(xml_content_pubmed) if xml_content_pubmed else None
+
         with transaction.atomic():
             article = None
             created = False
 
             if article_id_to_update:
                 try:
-                    article = Article.objects.select_for_update().get(id=article_id_to_update, user=article_owner)
+                    article = _get_article_for_source(article_id_to_update, article_owner, consolidate)
                 except Article.DoesNotExist:
                     send_user_notification(user_id, task_id, query_display_name, 'WARNING', f'Статья ID {article_id_to_update} (для обновления) не найдена/не принадлежит пользователю.', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
 
@@ -1744,128 +2042,34 @@ def fetch_data_from_pubmed_task(
                 send_user_notification(user_id, task_id, query_display_name, 'FAILURE', f'Не удалось создать/найти запись для {current_api_name} статьи.', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
                 return {'status': 'error', 'message': f'Failed to create/find article entry for {current_api_name}.'}
 
-            # Применение логики приоритетов
-            priority_list = getattr(settings, 'API_SOURCE_OVERALL_PRIORITY', [])
-            try:
-                current_api_priority = priority_list.index(current_api_name)
-            except ValueError:
-                current_api_priority = float('inf')
-            article_primary_source_priority = float('inf')
-            if article.primary_source_api:
-                try:
-                    article_primary_source_priority = priority_list.index(article.primary_source_api)
-                except ValueError:
-                    pass
-            can_fully_overwrite = (created or not article.primary_source_api or current_api_priority <= article_primary_source_priority)
-
-            if can_fully_overwrite:
-                article.primary_source_api = current_api_name
-
-            # Обновляем метаданные из 'pubmed' (EFetch)
-            if api_title and (can_fully_overwrite or not article.title):
-                article.title = api_title
-            if api_abstract and (can_fully_overwrite or not article.abstract):
-                article.abstract = api_abstract
-            if api_parsed_publication_date and (can_fully_overwrite or not article.publication_date):
-                article.publication_date = api_parsed_publication_date
-            if api_journal_title and (can_fully_overwrite or not article.journal_name):
-                article.journal_name = api_journal_title
-
-            if api_doi and not article.doi:
-                article.doi = api_doi
-            if not article.pubmed_id:
-                article.pubmed_id = pmid_to_fetch
-            if api_pmcid and not article.pmc_id:
-                article.pmc_id = api_pmcid
-
-            if api_parsed_authors:
-                if can_fully_overwrite or not article.authors.exists():
-                    article.articleauthororder_set.all().delete()
-                    for order, author_obj in enumerate(api_parsed_authors):
-                        ArticleAuthorOrder.objects.create(article=article, author=author_obj, order=order)
+            # Применение логики приоритетов и обновление метаданных из 'pubmed' (EFetch)
+            pubmed_record['pmc_id'] = api_pmcid
+            if not pubmed_record.get('pubmed_id'):
+                pubmed_record['pubmed_id'] = pmid_to_fetch
+            _handle_source_record(article, current_api_name, pubmed_record, created=created)
 
             # Если получен полный текст из PMC, он имеет приоритет
             if full_text_xml_pmc:
-                structured_data = extract_structured_text_from_jats(full_text_xml_pmc)
                 if structured_data:
                     article.structured_content = structured_data
                     article.regenerate_cleaned_text_from_structured() # Вызываем метод модели для обновления cleaned_text_for_llm
 
-                # --- Парсинг и сохранение ссылок из полного текста ---
+                # --- Сохранение ссылок из полного текста ---
                 process_references_flag = (originating_reference_link_id is None)
-                if process_references_flag and full_text_xml_pmc:
+                if process_references_flag:
                     send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', 'Извлечение ссылок из полного текста PMC...', progress_percent=85, source_api=current_api_name)
 
-                    print('******** pubmed > parse_references_from_jats')
-                    parsed_references = parse_references_from_jats(full_text_xml_pmc)
                     if parsed_references:
                         send_user_notification(user_id, task_id, query_display_name, 'INFO', f'Найдено {len(parsed_references)} ссылок в полном тексте. Обработка...', source_api=current_api_name)
 
-                        processed_jats_ref_count = 0
-                        for ref_data in parsed_references:
-
-                            ref_doi_jats = ref_data.get('doi')
-                            ref_raw_text_jats = ref_data.get('raw_text')
-                            jats_ref_id = ref_data.get('jats_ref_id')
-
-                            # Нам нужен хотя бы какой-то идентификатор для ссылки (DOI, текст или внутренний ID)
-                            if not (ref_doi_jats or ref_raw_text_jats or jats_ref_id):
-                                continue
-
-                            # Готовим данные для сохранения
-                            ref_link_defaults = {
-                                'raw_reference_text': ref_raw_text_jats,
-                                'manual_data_json': { # Сохраняем все, что распарсили
-                                    'jats_ref_id': jats_ref_id,
-                                    'title': ref_data.get('title'),
-                                    'year': ref_data.get('year'),
-                                    'authors_str': ref_data.get('authors_str'),
-                                    'journal_title': ref_data.get('journal_title'),
-                                    'doi_from_source': ref_doi_jats # DOI, извлеченный из JATS
-                                }
-                            }
-                            # Удаляем None значения из manual_data_json
-                            ref_link_defaults['manual_data_json'] = {k: v for k, v in ref_link_defaults['manual_data_json'].items() if v is not None}
-                            if not ref_link_defaults['manual_data_json']:
-                                ref_link_defaults['manual_data_json'] = None
-
-                            # Определяем параметры для поиска существующей ссылки (чтобы избежать дублей)
-                            lookup_params = {'source_article': article}
-                            if ref_doi_jats:
-                                lookup_params['target_article_doi'] = ref_doi_jats
-                            # Если нет DOI, но есть jats_ref_id, можно искать по нему (требует поддержки БД для JSON-поиска)
-                            # Для PostgreSQL можно так:
-                            elif jats_ref_id:
-                                lookup_params['manual_data_json__jats_ref_id'] = jats_ref_id
-                            # Если нет ни DOI, ни jats_ref_id, используем сырой текст как последний вариант
-                            elif ref_raw_text_jats:
-                                lookup_params['raw_reference_text'] = ref_raw_text_jats
-                            else:
-                                continue # Пропускаем, если не за что зацепиться
-
-                            # Устанавливаем статус и DOI в defaults
-                            if ref_doi_jats:
-                                ref_link_defaults['target_article_doi'] = ref_doi_jats
-                                ref_link_defaults['status'] = ReferenceLink.StatusChoices.DOI_PROVIDED_NEEDS_LOOKUP
-                            else:
-                                ref_link_defaults['status'] = ReferenceLink.StatusChoices.PENDING_DOI_INPUT
-
-                            # Создаем или обновляем объект ReferenceLink
-                            ref_obj, ref_created = ReferenceLink.objects.update_or_create(
-                                **lookup_params,
-                                defaults=ref_link_defaults
-                            )
-                            processed_jats_ref_count += 1
-
-                            # Если у ссылки есть DOI, ставим в очередь на обработку
-                            if ref_doi_jats:
-                                send_user_notification(user_id, task_id, query_display_name, 'INFO', f'PMC JATS: Найдена ссылка {ref_obj.id} с DOI: {ref_doi_jats}. Запуск конвейера.', source_api=current_api_name)
-                                process_article_pipeline_task.delay(
-                                    identifier_value=ref_doi_jats,
-                                    identifier_type='DOI',
-                                    user_id=user_id,
-                                    originating_reference_link_id=ref_obj.id # Передаем ID созданной/обновленной ссылки
-                                )
+                        # Все ссылки статьи - одним bulk_create/bulk_update вместо update_or_create на каждую
+                        upserted_references = upsert_article_references(article, parsed_references)
+                        processed_jats_ref_count = len(upserted_references)
+                        # Каждый DOI загружается один раз: уже известные статьи связываются сразу,
+                        # DOI, которые загружает другой конвейер, ждут его результата
+                        crawl_stats = schedule_reference_crawl([ref_obj for _, ref_obj, _ in upserted_references], user_id)
+                        if crawl_stats['linked'] or crawl_stats['queued_dois']:
+                            send_user_notification(user_id, task_id, query_display_name, 'INFO', f'PMC JATS: Связано с существующими статьями: {crawl_stats["linked"]}, DOI в очереди на загрузку: {crawl_stats["queued_dois"]}.', source_api=current_api_name)
 
                         if processed_jats_ref_count > 0:
                             send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', f'PMC JATS: Обработано {processed_jats_ref_count} ссылок.', progress_percent=90, source_api=current_api_name)
@@ -1876,44 +2080,18 @@ def fetch_data_from_pubmed_task(
             #     if not article.structured_content: # Если нет и структурированного контента
             #         article.structured_content = {'abstract': api_abstract}
 
-            extracted_markitdown_text = None
-            if pdf_to_save and not article.pdf_file:
-                try:
-                    article.pdf_file.save(pdf_file_name, ContentFile(pdf_to_save), save=False)
-                    markitdown_service_url = 'http://localhost:8181/convert-document/'
-                    pdf_file_path = article.pdf_file.path
-                    if pdf_file_path:
-                        send_user_notification(user_id, task_id, query_display_name, 'INFO', f'MarkItDown: Начало конвертации: {api_pmcid} PDF файла: {pdf_file_path} в текст...', source_api=current_api_name)
-                        with open(pdf_file_path, 'rb') as pdf_file_content_stream:
-                            files = {'file': (os.path.basename(pdf_file_path), pdf_file_content_stream, 'application/pdf')}
-                            time.sleep(1)
-                            response = requests.post(markitdown_service_url, files=files, timeout=310)
-                            response.raise_for_status()
-                            data = response.json()
-                            extracted_markitdown_text = data.get("markdown_text")
-                            # source_version_info = data.get("source_tool", "markitdown_service_1.0")
-                            if extracted_markitdown_text:
-                                send_user_notification(user_id, task_id, query_display_name, 'SUCCESS', f'MarkItDown: {api_pmcid} для PDF файла: {pdf_file_path} верунл текст длинной: {len(extracted_markitdown_text)}.', source_api=current_api_name)
-                                article.pdf_text = extracted_markitdown_text
-                            else:
-                                send_user_notification(user_id, task_id, query_display_name, 'INFO', f'MarkItDown: {api_pmcid} для PDF файла: {pdf_file_path} не вернул текст. Ответ: {data}', source_api=current_api_name)
-                except requests.exceptions.RequestException as exc:
-                    send_user_notification(user_id, task_id, query_display_name, 'RETRYING', f'MarkItDown: {api_pmcid} для PDF файла: {pdf_file_path}. Ошибка Сети/API: {str(exc)}. Повтор...', source_api=current_api_name, riginating_reference_link_id=originating_reference_link_id)
-                except Exception as err:
-                    send_user_notification(user_id, task_id, query_display_name, 'FAILURE', f'MarkItDown: {api_pmcid} для PDF файла: {pdf_file_path}. Ошибка: {str(err)}.', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
-
-            article.save()
+            _save_source_article(article)
 
             # сохранение ArticleContent для pubmed_entry, pmc_fulltext_xml, mesh_terms
-            if xml_content_pubmed:
+            if pubmed_entry_blob:
                 ArticleContent.objects.update_or_create(
                     article=article, source_api_name=current_api_name, format_type='xml_pubmed_entry',
-                    defaults={'content': xml_content_pubmed}
+                    defaults={'blob': pubmed_entry_blob}
                 )
-            if full_text_xml_pmc:
+            if full_text_blob:
                 ArticleContent.objects.update_or_create(
                     article=article, source_api_name=current_api_name, format_type='pmc_fulltext_xml',
-                    defaults={'content': full_text_xml_pmc}
+                    defaults={'blob': full_text_blob}
                 )
             if api_mesh_terms:
                 ArticleContent.objects.update_or_create(
@@ -1939,22 +2117,18 @@ def fetch_data_from_pubmed_task(
                 except Exception as e_ref:
                     send_user_notification(user_id, task_id, query_display_name, 'ERROR', f'Ошибка обновления ref_link для {current_api_name}: {str(e_ref)}', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
 
-            # Если был получен полный текст из PMC, запускаем задачу для его анализа и связывания
-            # if full_text_xml_pmc:
-            if article.is_user_initiated and full_text_xml_pmc:
-                # Мы передаем ID статьи и ID пользователя
-                process_full_text_and_create_segments_task.delay(
-                    article_id=article.id,
-                    user_id=user_id
-                )
-                send_user_notification(user_id, task_id, query_display_name, 'INFO', 'Поставлена задача на автоматическое связывание текста и ссылок.', source_api=current_api_name)
+            # Сегментация полного текста запускается один раз на этапе финализации конвейера
 
-            # финальное уведомление
-            final_message = f'Статья {current_api_name} "{article.title[:30]}..." {"создана" if created else "обновлена"}.'
-            if full_text_xml_pmc:
-                final_message += " Получен полный текст, запущена сегментация."
-            send_user_notification(user_id, task_id, query_display_name, 'SUCCESS', final_message, progress_percent=100, article_id=article.id, created=created, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
-            return {'status': 'success', 'message': final_message, 'identifier': query_display_name, 'article_id': article.id}
+        # PDF сохраняется после фиксации транзакции, конвертация идет отдельной задачей
+        if pdf_to_save:
+            _store_source_pdf(article.id, pdf_to_save, user_id, partial(send_user_notification, user_id, task_id, query_display_name, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id))
+
+        # финальное уведомление
+        final_message = f'Статья {current_api_name} "{article.title[:30]}..." {"создана" if created else "обновлена"}.'
+        if full_text_xml_pmc:
+            final_message += " Получен полный текст."
+        send_user_notification(user_id, task_id, query_display_name, 'SUCCESS', final_message, progress_percent=100, article_id=article.id, created=created, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
+        return {'status': 'success', 'message': final_message, 'identifier': query_display_name, 'article_id': article.id}
 
     except db_utils.OperationalError as exc_db:
         send_user_notification(user_id, task_id, query_display_name, 'FAILURE', f'Операционная ошибка БД ({current_api_name}): {str(exc_db)}', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
@@ -1974,7 +2148,8 @@ def fetch_data_from_rxiv_task(
     doi: str,
     user_id: int = None,
     originating_reference_link_id: int = None,
-    article_id_to_update: int = None):
+    article_id_to_update: int = None,
+    consolidate: bool = False):
 
     task_id = self.request.id
     clean_doi_for_query = doi.replace('DOI:', '').strip().lower()
@@ -1999,7 +2174,7 @@ def fetch_data_from_rxiv_task(
         send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', f'Попытка запроса к {server_name_attempt.upper()}: {temp_api_url}', progress_percent=10, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
 
         try:
-            response = requests.get(temp_api_url, headers=headers, timeout=30)
+            response = _cached_api_get(self, current_api_name, temp_api_url, headers=headers, timeout=30)
             if response.status_code == 200:
                 data = response.json()
                 if data and data.get('collection') and isinstance(data['collection'], list) and data['collection']:
@@ -2027,17 +2202,16 @@ def fetch_data_from_rxiv_task(
             send_user_notification(user_id, task_id, query_display_name, 'WARNING', f'Ошибка сети/API {server_name_attempt.upper()}: {str(exc)}.', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
             if server_name_attempt == servers_to_try[-1]: # Если это последняя попытка
                 raise self.retry(exc=exc) # Повторяем задачу целиком
-            time.sleep(1) # Пауза перед попыткой следующего сервера
         except json.JSONDecodeError as json_exc:
             send_user_notification(user_id, task_id, query_display_name, 'WARNING', f'Ошибка декодирования JSON от {server_name_attempt.upper()}: {str(json_exc)}.', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
             if server_name_attempt == servers_to_try[-1]:
                  return {'status': 'error', 'message': f'{server_name_attempt.upper()} JSON Decode Error: {str(json_exc)}'}
-            time.sleep(1)
+        except Retry: # Перепланирование ограничителем частоты - не ошибка запроса
+            raise
         except Exception as e_inner:
             send_user_notification(user_id, task_id, query_display_name, 'WARNING', f'Неожиданная ошибка при запросе к {server_name_attempt.upper()}: {str(e_inner)}.', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
             if server_name_attempt == servers_to_try[-1]:
                  return {'status': 'error', 'message': f'Unexpected error during {server_name_attempt.upper()} request: {str(e_inner)}'}
-            time.sleep(1)
 
     if not api_preprint_data_collection:
         send_user_notification(user_id, task_id, query_display_name, 'NOT_FOUND', f'Препринт не найден ни на одном из Rxiv серверов ({", ".join(servers_to_try)}).', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
@@ -2056,10 +2230,12 @@ def fetch_data_from_rxiv_task(
 
     if api_server_name_from_data and api_doi_from_rxiv:
         api_pdf_link = f"https://{api_server_name_from_data}.org/content/{api_doi_from_rxiv}v{version_str}.full.pdf"
-        if api_pdf_link:
+        if _article_pdf_present(id=article_id_to_update, doi=api_doi_from_rxiv):
+            send_user_notification(user_id, task_id, query_display_name, 'INFO', f'PDF файл для: {doi} уже загружен, повторная загрузка пропущена.', source_api=current_api_name)
+        elif api_pdf_link:
             send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', f'Для: {doi} найден PDF URL: {api_pdf_link}. Начало получния PDF файла...', source_api=current_api_name)
+            _wait_for_api_token(self, current_api_name)
             try:
-                time.sleep(5)
                 pdf_to_save = download_pdf(api_pdf_link, doi)
                 if pdf_to_save:
                     send_user_notification(user_id, task_id, query_display_name, 'INFO', f'PDF файл для: {doi} успешно получен из: {api_pdf_link}.', source_api=current_api_name)
@@ -2068,7 +2244,31 @@ def fetch_data_from_rxiv_task(
             except Exception as exc:
                 send_user_notification(user_id, task_id, query_display_name, 'WARNING', f'Ошибка при запросе PDF файла для: {doi} из: {api_pdf_link}. \nError: {exc}', source_api=current_api_name)
 
+    # --- Загрузка полного текста JATS XML (до транзакции: сетевой запрос не должен держать блокировку) ---
+    full_text_xml_content = None
+    api_jats_xml_url = api_data.get('jatsxml')
+    if api_jats_xml_url:
+        send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', 'Найден JATS XML Rxiv. Загрузка...', progress_percent=60, source_api=current_api_name)
+        try:
+            # headers={'User-Agent': f'ScientificPapersApp/1.0 ({APP_EMAIL})'}
+            headers = {'User-Agent': f'{USER_AGENT_LIST[0]} (mailto:{APP_EMAIL})'}
+            jats_response = cached_get(current_api_name, api_jats_xml_url, timeout=60, headers=headers)
+            jats_response.raise_for_status()
+            full_text_xml_content = jats_response.text
+        except Exception as e_jats:
+            send_user_notification(user_id, task_id, query_display_name, 'WARNING', f'Ошибка при обработке JATS XML от Rxiv: {str(e_jats)}', source_api=current_api_name)
+
     try:
+        # Разбор JATS и сжатие полного текста - до транзакции, чтобы она держала блокировку только на время записи
+        structured_data = None
+        parsed_references = None
+        full_text_blob = None
+        if full_text_xml_content:
+            structured_data = extract_structured_text_from_jats(full_text_xml_content)
+            if originating_reference_link_id is None:
+                parsed_references = parse_references_from_jats(full_text_xml_content)
+            full_text_blob = ContentBlob.store(full_text_xml_content)
+
         with transaction.atomic():
             article_owner = None
             if user_id:
@@ -2095,7 +2295,6 @@ def fetch_data_from_rxiv_task(
             api_journal_name_construct = f"{api_server_name_from_data.upper()} ({api_category or 'N/A'})" if api_server_name_from_data else None
 
             api_parsed_authors = parse_rxiv_authors(api_data.get('authors'))
-            api_jats_xml_url = api_data.get('jatsxml')
 
             # --- Логика поиска или создания статьи ---
             article = None
@@ -2103,7 +2302,7 @@ def fetch_data_from_rxiv_task(
 
             if article_id_to_update:
                 try:
-                    article = Article.objects.select_for_update().get(id=article_id_to_update, user=article_owner)
+                    article = _get_article_for_source(article_id_to_update, article_owner, consolidate)
                 except Article.DoesNotExist:
                     send_user_notification(user_id, task_id, query_display_name, 'WARNING', f'Статья ID {article_id_to_update} (для обновления) не найдена/не принадлежит пользователю.', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
 
@@ -2135,144 +2334,44 @@ def fetch_data_from_rxiv_task(
                 return {'status': 'error', 'message': f'Failed to create/find article entry for {current_api_name}.'}
 
             # --- Применение логики приоритетов ---
-            priority_list = getattr(settings, 'API_SOURCE_OVERALL_PRIORITY', [])
-            try:
-                current_api_priority = priority_list.index(current_api_name)
-            except ValueError:
-                current_api_priority = float('inf')
-            article_primary_source_priority = float('inf')
-            if article.primary_source_api:
-                try:
-                    article_primary_source_priority = priority_list.index(article.primary_source_api)
-                except ValueError:
-                    pass
-
-            can_fully_overwrite = (created or not article.primary_source_api or current_api_priority <= article_primary_source_priority)
-
-            if can_fully_overwrite:
-                article.primary_source_api = current_api_name
-            if api_title and (can_fully_overwrite or not article.title):
-                article.title = api_title
-            if api_abstract and (can_fully_overwrite or not article.abstract):
-                article.abstract = api_abstract
-            if api_parsed_date and (can_fully_overwrite or not article.publication_date):
-                article.publication_date = api_parsed_date
-            if api_journal_name_construct and (can_fully_overwrite or not article.journal_name):
-                article.journal_name = api_journal_name_construct
-
-            if not article.doi:
-                article.doi = api_doi_from_rxiv # Убедимся, что DOI сохранен
-
-            if api_parsed_authors:
-                if can_fully_overwrite or not article.authors.exists():
-                    article.articleauthororder_set.all().delete()
-                    for order, author_obj in enumerate(api_parsed_authors):
-                        ArticleAuthorOrder.objects.create(article=article, author=author_obj, order=order)
-
-            # --- Обработка полного текста JATS XML ---
-            full_text_xml_content = None
-            api_jats_xml_url = api_data.get('jatsxml')
-            if api_jats_xml_url:
-                send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', 'Найден JATS XML Rxiv. Загрузка...', progress_percent=60, source_api=current_api_name)
-                try:
-                    # headers={'User-Agent': f'ScientificPapersApp/1.0 ({APP_EMAIL})'}
-                    headers = {'User-Agent': f'{USER_AGENT_LIST[0]} (mailto:{APP_EMAIL})'}
-                    jats_response = requests.get(api_jats_xml_url, timeout=60, headers=headers)
-                    print(f'**** RXIV headers: {headers} \napi_jats_xml_url: {api_jats_xml_url} \njats_response: {jats_response}')
-                    jats_response.raise_for_status()
-                    full_text_xml_content = jats_response.text
-                    print(f'****** RXIV * api_jats_xml_url: {api_jats_xml_url}, \nfull_text_xml_content: {full_text_xml_content}')
-                except Exception as e_jats:
-                    send_user_notification(user_id, task_id, query_display_name, 'WARNING', f'Ошибка при обработке JATS XML от Rxiv: {str(e_jats)}', source_api=current_api_name)
+            rxiv_record = {
+                'title': api_title,
+                'abstract': api_abstract,
+                'publication_date': api_parsed_date,
+                'journal_name': api_journal_name_construct,
+                'doi': api_doi_from_rxiv,
+                'best_oa_pdf_url': api_pdf_link,
+                'authors': api_parsed_authors,
+            }
+            can_fully_overwrite = _handle_source_record(article, current_api_name, rxiv_record, created=created)
 
             # Если получен полный текст, он в приоритете
             if full_text_xml_content:
                 ArticleContent.objects.update_or_create(
                     article=article, source_api_name=current_api_name, format_type='rxiv_jats_xml_fulltext',
-                    defaults={'content': full_text_xml_content}
+                    defaults={'blob': full_text_blob}
                 )
-                structured_data = extract_structured_text_from_jats(full_text_xml_content)
                 if structured_data:
                     article.structured_content = structured_data
                     article.regenerate_cleaned_text_from_structured() # Обновляем cleaned_text_for_llm
 
 
-                # --- Парсинг и сохранение ссылок из полного текста ---
+                # --- Сохранение ссылок из полного текста ---
                 process_references_flag = (originating_reference_link_id is None)
-                if process_references_flag and not article.references_made.all():
+                if process_references_flag and not article.references_made.exists():
                     send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', 'Извлечение ссылок из полного текста RXIV...', source_api=current_api_name)
 
-                    print('******** rxiv > parse_references_from_jats')
-                    parsed_references = parse_references_from_jats(full_text_xml_content)
                     if parsed_references:
                         send_user_notification(user_id, task_id, query_display_name, 'INFO', f'RXIV: Найдено {len(parsed_references)} ссылок в полном тексте. Обработка...', source_api=current_api_name)
 
-                        processed_jats_ref_count = 0
-                        for ref_data in parsed_references:
-
-                            ref_doi_jats = ref_data.get('doi')
-                            ref_raw_text_jats = ref_data.get('raw_text')
-                            jats_ref_id = ref_data.get('jats_ref_id')
-
-                            # Нам нужен хотя бы какой-то идентификатор для ссылки (DOI, текст или внутренний ID)
-                            if not (ref_doi_jats or ref_raw_text_jats or jats_ref_id):
-                                continue
-
-                            # Готовим данные для сохранения
-                            ref_link_defaults = {
-                                'raw_reference_text': ref_raw_text_jats,
-                                'manual_data_json': { # Сохраняем все, что распарсили
-                                    'jats_ref_id': jats_ref_id,
-                                    'title': ref_data.get('title'),
-                                    'year': ref_data.get('year'),
-                                    'authors_str': ref_data.get('authors_str'),
-                                    'journal_title': ref_data.get('journal_title'),
-                                    'doi_from_source': ref_doi_jats # DOI, извлеченный из JATS
-                                }
-                            }
-                            print(f'********* RXIV ref_link_defaults: {ref_link_defaults}')
-                            # Удаляем None значения из manual_data_json
-                            ref_link_defaults['manual_data_json'] = {k: v for k, v in ref_link_defaults['manual_data_json'].items() if v is not None}
-                            if not ref_link_defaults['manual_data_json']:
-                                ref_link_defaults['manual_data_json'] = None
-
-                            # Определяем параметры для поиска существующей ссылки (чтобы избежать дублей)
-                            lookup_params = {'source_article': article}
-                            if ref_doi_jats:
-                                lookup_params['target_article_doi'] = ref_doi_jats
-                            # Если нет DOI, но есть jats_ref_id, можно искать по нему (требует поддержки БД для JSON-поиска)
-                            # Для PostgreSQL можно так:
-                            elif jats_ref_id:
-                                lookup_params['manual_data_json__jats_ref_id'] = jats_ref_id
-                            # Если нет ни DOI, ни jats_ref_id, используем сырой текст как последний вариант
-                            elif ref_raw_text_jats:
-                                lookup_params['raw_reference_text'] = ref_raw_text_jats
-                            else:
-                                continue # Пропускаем, если не за что зацепиться
-
-                            # Устанавливаем статус и DOI в defaults
-                            if ref_doi_jats:
-                                ref_link_defaults['target_article_doi'] = ref_doi_jats
-                                ref_link_defaults['status'] = ReferenceLink.StatusChoices.DOI_PROVIDED_NEEDS_LOOKUP
-                            else:
-                                ref_link_defaults['status'] = ReferenceLink.StatusChoices.PENDING_DOI_INPUT
-
-                            # Создаем или обновляем объект ReferenceLink
-                            ref_obj, ref_created = ReferenceLink.objects.update_or_create(
-                                **lookup_params,
-                                defaults=ref_link_defaults
-                            )
-                            processed_jats_ref_count += 1
-
-                            # Если у ссылки есть DOI, ставим в очередь на обработку
-                            if ref_doi_jats:
-                                send_user_notification(user_id, task_id, query_display_name, 'INFO', f'RXIV JATS: Найдена ссылка {ref_obj.id} с DOI: {ref_doi_jats}. Запуск конвейера.', source_api=current_api_name)
-                                process_article_pipeline_task.delay(
-                                    identifier_value=ref_doi_jats,
-                                    identifier_type='DOI',
-                                    user_id=user_id,
-                                    originating_reference_link_id=ref_obj.id # Передаем ID созданной/обновленной ссылки
-                                )
+                        # Все ссылки статьи - одним bulk_create/bulk_update вместо update_or_create на каждую
+                        upserted_references = upsert_article_references(article, parsed_references)
+                        processed_jats_ref_count = len(upserted_references)
+                        # Каждый DOI загружается один раз: уже известные статьи связываются сразу,
+                        # DOI, которые загружает другой конвейер, ждут его результата
+                        crawl_stats = schedule_reference_crawl([ref_obj for _, ref_obj, _ in upserted_references], user_id)
+                        if crawl_stats['linked'] or crawl_stats['queued_dois']:
+                            send_user_notification(user_id, task_id, query_display_name, 'INFO', f'RXIV JATS: Связано с существующими статьями: {crawl_stats["linked"]}, DOI в очереди на загрузку: {crawl_stats["queued_dois"]}.', source_api=current_api_name)
 
                         if processed_jats_ref_count > 0:
                             send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', f'RXIV JATS: Обработано {processed_jats_ref_count} ссылок.', source_api=current_api_name)
@@ -2296,34 +2395,7 @@ def fetch_data_from_rxiv_task(
                     defaults={'content': api_pdf_link}
                 )
 
-            if pdf_to_save and not article.pdf_file:
-                extracted_markitdown_text = None
-                try:
-                    pdf_file_name = f"article_{doi}_{timezone.now().strftime('%Y%m%d%H%M%S')}.pdf"
-                    article.pdf_file.save(pdf_file_name, ContentFile(pdf_to_save), save=False)
-                    markitdown_service_url = 'http://localhost:8181/convert-document/'
-                    pdf_file_path = article.pdf_file.path
-                    if pdf_file_path:
-                        send_user_notification(user_id, task_id, query_display_name, 'INFO', f'MarkItDown: Начало конвертации: {doi} PDF файла: {pdf_file_path} в текст...', source_api=current_api_name)
-                        with open(pdf_file_path, 'rb') as pdf_file_content_stream:
-                            files = {'file': (os.path.basename(pdf_file_path), pdf_file_content_stream, 'application/pdf')}
-                            time.sleep(1)
-                            response = requests.post(markitdown_service_url, files=files, timeout=310)
-                            response.raise_for_status()
-                            data = response.json()
-                            extracted_markitdown_text = data.get("markdown_text")
-                            # source_version_info = data.get("source_tool", "markitdown_service_1.0")
-                            if extracted_markitdown_text:
-                                send_user_notification(user_id, task_id, query_display_name, 'SUCCESS', f'MarkItDown: {doi} для PDF файла: {pdf_file_path} верунл текст длинной: {len(extracted_markitdown_text)}.', source_api=current_api_name)
-                                article.pdf_text = extracted_markitdown_text
-                            else:
-                                send_user_notification(user_id, task_id, query_display_name, 'INFO', f'MarkItDown: {doi} для PDF файла: {pdf_file_path} не вернул текст. Ответ: {data}', source_api=current_api_name)
-                except requests.exceptions.RequestException as exc:
-                    send_user_notification(user_id, task_id, query_display_name, 'RETRYING', f'MarkItDown: {doi} для PDF файла: {pdf_file_path}. Ошибка Сети/API: {str(exc)}. Повтор...', source_api=current_api_name, riginating_reference_link_id=originating_reference_link_id)
-                except Exception as err:
-                    send_user_notification(user_id, task_id, query_display_name, 'FAILURE', f'MarkItDown: {doi} для PDF файла: {pdf_file_path}. Ошибка: {str(err)}.', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
-
-            article.save()
+            _save_source_article(article)
             send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', f'Препринт {current_api_name} сохранен.', progress_percent=80, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
 
             # Сохраняем сырые метаданные из API
@@ -2344,17 +2416,15 @@ def fetch_data_from_rxiv_task(
                 except Exception as e_ref:
                     send_user_notification(user_id, task_id, query_display_name, 'ERROR', f'Ошибка обновления ref_link для {current_api_name}: {str(e_ref)}', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
 
-            # --- ЗАПУСК ЗАДАЧИ СЕГМЕНТАЦИИ И СВЯЗЫВАНИЯ ---
-            if article.is_user_initiated and full_text_xml_content:
-                process_full_text_and_create_segments_task.delay(
-                    article_id=article.id,
-                    user_id=user_id
-                )
-                send_user_notification(user_id, task_id, query_display_name, 'INFO', 'Поставлена задача на автоматическое связывание текста и ссылок.', source_api=current_api_name)
+            # Сегментация полного текста запускается один раз на этапе финализации конвейера
 
-            final_message = f'Препринт {current_api_name} ({api_server_name_from_data}) "{article.title[:30]}..." {"создана" if created else "обновлена"}.'
-            send_user_notification(user_id, task_id, query_display_name, 'SUCCESS', final_message, progress_percent=100, article_id=article.id, created=created, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
-            return {'status': 'success', 'message': final_message, 'identifier': query_display_name, 'article_id': article.id}
+        # PDF сохраняется после фиксации транзакции, конвертация идет отдельной задачей
+        if pdf_to_save:
+            _store_source_pdf(article.id, pdf_to_save, user_id, partial(send_user_notification, user_id, task_id, query_display_name, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id))
+
+        final_message = f'Препринт {current_api_name} ({api_server_name_from_data}) "{article.title[:30]}..." {"создана" if created else "обновлена"}.'
+        send_user_notification(user_id, task_id, query_display_name, 'SUCCESS', final_message, progress_percent=100, article_id=article.id, created=created, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
+        return {'status': 'success', 'message': final_message, 'identifier': query_display_name, 'article_id': article.id}
 
     except db_utils.OperationalError as exc_db:
         if 'database is locked' in str(exc_db).lower():
@@ -2398,7 +2468,7 @@ def fetch_data_from_unpaywall_task(
 
     try:
         send_user_notification(user_id, task_id, doi, 'PROGRESS', f'Запрос к {api_url}', progress_percent=30, source_api=settings.API_SOURCE_NAMES['UNPAYWALL'])
-        response = requests.get(api_url, timeout=30)
+        response = _cached_api_get(self, settings.API_SOURCE_NAMES['UNPAYWALL'], api_url, timeout=30)
 
         if response.status_code == 404:
             send_user_notification(user_id, task_id, doi, 'NOT_FOUND', 'DOI не найден в Unpaywall.', source_api=settings.API_SOURCE_NAMES['UNPAYWALL'])
@@ -2506,7 +2576,8 @@ def fetch_data_from_openalex_task(
     identifier_type: str = 'DOI',
     user_id: int = None,
     originating_reference_link_id: int = None,
-    article_id_to_update: int = None):
+    article_id_to_update: int = None,
+    consolidate: bool = False):
 
     task_id = self.request.id
     current_api_name = settings.API_SOURCE_NAMES['OPENALEX']
@@ -2551,7 +2622,9 @@ def fetch_data_from_openalex_task(
 
     try:
         send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', f'Запрос к {api_url}', progress_percent=20, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
-        response = requests.get(api_url, headers=headers, timeout=45)
+        if id_type_upper in ('DOI', 'PMID'):
+            _prefetch_pending_openalex(self, identifier_value.lower() if id_type_upper == 'DOI' else None, identifier_value if id_type_upper == 'PMID' else None)
+        response = _cached_api_get(self, current_api_name, api_url, headers=headers, timeout=45)
         if response.status_code == 404:
             send_user_notification(user_id, task_id, query_display_name, 'NOT_FOUND', f'Статья не найдена в {current_api_name}.', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
             return {'status': 'not_found', 'message': f'Article not found in {current_api_name}.'}
@@ -2581,58 +2654,10 @@ def fetch_data_from_openalex_task(
                     return {'status': 'error', 'message': f'User with ID {user_id} not found.'}
 
             # Извлечение данных из ответа OpenAlex
-            api_title = api_data.get('display_name') or api_data.get('title') # display_name предпочтительнее
-
-            api_abstract = None
-            abstract_inverted_index = api_data.get('abstract_inverted_index')
-            if abstract_inverted_index:
-                # Пытаемся получить длину абстракта из поля 'abstract_length', если оно есть,
-                # или считаем по максимальному индексу + 1.
-                # OpenAlex API должен предоставлять `counts_by_year` и другие мета, но не `abstract_length` напрямую в `work` объекте.
-                # Длину нужно вычислять по самому инвертированному индексу, если это возможно.
-                # Простой способ: найти максимальный индекс в значениях inverted_index.
-                max_pos = -1
-                if isinstance(abstract_inverted_index, dict):
-                    for word_positions in abstract_inverted_index.values():
-                        if isinstance(word_positions, list) and word_positions:
-                            max_pos = max(max_pos, max(word_positions))
-                abstract_len_calculated = max_pos + 1 if max_pos != -1 else 0
-
-                if abstract_len_calculated > 0:
-                    api_abstract = reconstruct_abstract_from_inverted_index(abstract_inverted_index, abstract_len_calculated)
-
-            api_doi = api_data.get('doi') # URL вида https://doi.org/DOI
-            if api_doi and api_doi.startswith('https://doi.org/'):
-                api_doi = api_doi[len('https://doi.org/'):].lower()
-            elif api_doi: # Если вдруг другой формат
-                api_doi = api_doi.lower()
-
-            api_ids = api_data.get('ids', {})
-            api_pmid = api_ids.get('pmid')
-            if api_pmid and api_pmid.startswith('https://pubmed.ncbi.nlm.nih.gov/'):
-                api_pmid = api_pmid.split('/')[-1]
-
-            api_pmcid = api_ids.get('pmcid') # Уже должен быть без префикса 'PMC' здесь
-            if api_pmcid and api_pmcid.startswith('PMC'):
-                api_pmcid = api_pmcid[3:]
-
-            api_arxiv_id = None # OpenAlex может хранить arXiv ID в 'ids' или в 'locations'
-            # Для простоты, пока не будем глубоко искать arXiv ID здесь.
-
-            api_publication_date_str = api_data.get('publication_date')
-            api_parsed_date = None
-            if api_publication_date_str:
-                try:
-                    api_parsed_date = timezone.datetime.strptime(api_publication_date_str, '%Y-%m-%d').date()
-                except ValueError:
-                    pass
-
-            api_journal_name = None
-            host_venue = api_data.get('host_venue')
-            if host_venue and isinstance(host_venue, dict):
-                api_journal_name = host_venue.get('display_name') or host_venue.get('publisher')
-
-            api_parsed_authors = parse_openalex_authors(api_data.get('authorships'))
+            openalex_record = normalize_openalex_work(api_data)
+            api_title = openalex_record['title']
+            api_doi = openalex_record['doi']
+            api_pmid = openalex_record['pubmed_id']
 
             # --- Логика поиска или создания статьи ---
             article = None
@@ -2640,7 +2665,7 @@ def fetch_data_from_openalex_task(
 
             if article_id_to_update:
                 try:
-                    article = Article.objects.select_for_update().get(id=article_id_to_update, user=article_owner)
+                    article = _get_article_for_source(article_id_to_update, article_owner, consolidate)
                 except Article.DoesNotExist:
                     pass # Продолжаем поиск по идентификаторам
 
@@ -2682,54 +2707,10 @@ def fetch_data_from_openalex_task(
                  send_user_notification(user_id, task_id, query_display_name, 'FAILURE', f'Не удалось идентифицировать или создать запись для статьи {current_api_name}.', source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
                  return {'status': 'error', 'message': f'Could not identify or create article entry for {current_api_name}.'}
 
-            # --- Применение логики приоритетов ---
-            priority_list = getattr(settings, 'API_SOURCE_OVERALL_PRIORITY', [])
-            try:
-                current_api_priority = priority_list.index(current_api_name)
-            except ValueError:
-                current_api_priority = float('inf')
-            article_primary_source_priority = float('inf')
-            if article.primary_source_api:
-                try:
-                    article_primary_source_priority = priority_list.index(article.primary_source_api)
-                except ValueError:
-                    pass
-            can_fully_overwrite = (created or not article.primary_source_api or current_api_priority <= article_primary_source_priority)
-
-            if can_fully_overwrite:
-                article.primary_source_api = current_api_name
-
-            if api_title and (can_fully_overwrite or not article.title):
-                article.title = api_title
-            if api_abstract and (can_fully_overwrite or not article.abstract):
-                article.abstract = api_abstract
-            if api_parsed_date and (can_fully_overwrite or not article.publication_date):
-                article.publication_date = api_parsed_date
-            if api_journal_name and (can_fully_overwrite or not article.journal_name):
-                article.journal_name = api_journal_name
-
-            if api_doi and not article.doi:
-                article.doi = api_doi
-            if api_pmid and not article.pubmed_id:
-                article.pubmed_id = api_pmid
-            # if api_arxiv_id and not article.arxiv_id: article.arxiv_id = api_arxiv_id (если будем извлекать)
-
-            if api_parsed_authors:
-                if can_fully_overwrite or not article.authors.exists():
-                    article.articleauthororder_set.all().delete()
-                    for order, author_obj in enumerate(api_parsed_authors):
-                        ArticleAuthorOrder.objects.create(article=article, author=author_obj, order=order)
-
-            # if api_abstract and (not article.cleaned_text_for_llm or len(api_abstract) > len(article.cleaned_text_for_llm or "") + 50): # Упрощенное сравнение
-            #     article.cleaned_text_for_llm = api_abstract
-
-            # OA информация от OpenAlex (если есть и Unpaywall еще не дал более точную)
-            if api_data.get('open_access', {}).get('oa_url') and (not article.best_oa_url or can_fully_overwrite):
-                article.best_oa_url = api_data['open_access']['oa_url']
-            if api_data.get('open_access', {}).get('oa_status') and (not article.oa_status or can_fully_overwrite):
-                article.oa_status = api_data['open_access']['oa_status']
+            # --- Применение логики приоритетов (включая OA информацию, если Unpaywall еще не дал более точную) ---
+            _handle_source_record(article, current_api_name, openalex_record, created=created)
 
-            article.save()
+            _save_source_article(article)
             send_user_notification(user_id, task_id, query_display_name, 'PROGRESS', f'Статья {current_api_name} сохранена в БД.', progress_percent=70, source_api=current_api_name, originating_reference_link_id=originating_reference_link_id)
 
             ArticleContent.objects.update_or_create(
@@ -2774,7 +2755,19 @@ def analyze_segment_with_llm_task(self, analyzed_segment_id: int, user_id: int):
     send_user_notification(user_id, task_id, display_identifier, 'PENDING', 'Начинаем LLM анализ сегмента...', progress_percent=0, source_api=current_api_name)
 
     try:
-        segment = AnalyzedSegment.objects.select_related('article__user').prefetch_related('cited_references__resolved_article').get(id=analyzed_segment_id)
+        # Из текстов цитируемых статей для промпта нужны первые 500 символов - обрезаем их в БД,
+        # а не загружаем полные cleaned_text_for_llm/abstract
+        cited_references_qs = ReferenceLink.objects.select_related('resolved_article').defer(
+            *article_heavy_fields('resolved_article__')
+        ).annotate(
+            resolved_article_excerpt=Substr(
+                Coalesce(NullIf(F('resolved_article__cleaned_text_for_llm'), Value('')), F('resolved_article__abstract')),
+                1, 501
+            )
+        )
+        segment = AnalyzedSegment.objects.select_related('article').defer(*article_heavy_fields('article__')).prefetch_related(
+            Prefetch('cited_references', queryset=cited_references_qs)
+        ).get(id=analyzed_segment_id)
     except AnalyzedSegment.DoesNotExist:
         send_user_notification(user_id, task_id, display_identifier, 'FAILURE', 'Анализируемый сегмент не найден.', source_api=current_api_name)
         return {'status': 'error', 'message': 'AnalyzedSegment not found.'}
@@ -2813,7 +2806,7 @@ def analyze_segment_with_llm_task(self, analyzed_segment_id: int, user_id: int):
         ref_abstract = "N/A"
         if ref_link.resolved_article:
             ref_title = ref_link.resolved_article.title
-            ref_abstract = ref_link.resolved_article.cleaned_text_for_llm or ref_link.resolved_article.abstract
+            ref_abstract = ref_link.resolved_article_excerpt
             if ref_abstract and len(ref_abstract) > 500: # Ограничиваем длину
                 ref_abstract = ref_abstract[:500] + "..."
         elif ref_link.manual_data_json and ref_link.manual_data_json.get('title'):
@@ -2916,6 +2909,63 @@ def analyze_segment_with_llm_task(self, analyzed_segment_id: int, user_id: int):
         return {'status': 'error', 'message': f'LLM analysis failed: {str(e)}'}
 
 
+def _sync_system_segments(article, parsed_segments) -> tuple[int, int, int]:
+    """
+    Приводит системные сегменты статьи (user=None) к parsed_segments [(section_key, segment_text, markers, cited_ref_ids)]
+    без удаления и пересоздания всего списка: совпадающие по (секция, текст) сегменты сохраняются вместе с результатами
+    LLM-анализа, новые создаются одним bulk_create, связи с ссылками добавляются/удаляются пакетно через through-модель.
+    Возвращает (создано, обновлено, удалено).
+    """
+    through_model = AnalyzedSegment.cited_references.through
+    existing_by_key = {}
+    for segment in AnalyzedSegment.objects.filter(article=article, user__isnull=True).only('id', 'section_key', 'segment_text', 'inline_citation_markers').order_by('id'):
+        existing_by_key.setdefault((segment.section_key, segment.segment_text), []).append(segment)
+    existing_links = {}
+    for segment_id, reference_id in through_model.objects.filter(analyzedsegment__article=article, analyzedsegment__user__isnull=True).values_list('analyzedsegment_id', 'referencelink_id'):
+        existing_links.setdefault(segment_id, set()).add(reference_id)
+
+    to_create, new_links, to_update, links_to_add, links_to_remove = [], [], [], [], [] # links_to_remove: [(segment_id, {ref_id, ...})]
+    for section_key, segment_text, markers, cited_ref_ids in parsed_segments:
+        matches = existing_by_key.get((section_key, segment_text))
+        if not matches:
+            segment = AnalyzedSegment(article=article, section_key=section_key, segment_text=segment_text, inline_citation_markers=markers, user=None)
+            to_create.append(segment)
+            new_links.append(cited_ref_ids)
+            continue
+        segment = matches.pop(0)
+        if segment.inline_citation_markers != markers:
+            segment.inline_citation_markers = markers
+            to_update.append(segment)
+        current_ids = existing_links.get(segment.id, set())
+        links_to_add.extend((segment.id, ref_id) for ref_id in cited_ref_ids - current_ids)
+        if current_ids - cited_ref_ids:
+            links_to_remove.append((segment.id, current_ids - cited_ref_ids))
+
+    stale_ids = [segment.id for segments in existing_by_key.values() for segment in segments]
+    with transaction.atomic():
+        if stale_ids:
+            AnalyzedSegment.objects.filter(id__in=stale_ids).delete()
+        if to_create:
+            AnalyzedSegment.objects.bulk_create(to_create, batch_size=500)
+            links_to_add.extend((segment.id, ref_id) for segment, ref_ids in zip(to_create, new_links) for ref_id in ref_ids)
+        if to_update:
+            now = timezone.now()
+            for segment in to_update:
+                segment.updated_at = now # bulk_update не обновляет auto_now поля
+            AnalyzedSegment.objects.bulk_update(to_update, ['inline_citation_markers', 'updated_at'], batch_size=500)
+        if links_to_remove:
+            removal_filter = Q()
+            for segment_id, ref_ids in links_to_remove:
+                removal_filter |= Q(analyzedsegment_id=segment_id, referencelink_id__in=ref_ids)
+            through_model.objects.filter(removal_filter).delete()
+        if links_to_add:
+            through_model.objects.bulk_create(
+                [through_model(analyzedsegment_id=segment_id, referencelink_id=ref_id) for segment_id, ref_id in links_to_add],
+                batch_size=1000, ignore_conflicts=True
+            )
+    return len(to_create), len(to_update), len(stale_ids)
+
+
 @shared_task(bind=True, max_retries=2, default_retry_delay=180)
 def process_full_text_and_create_segments_task(self, article_id: int, user_id: int):
     """
@@ -2950,51 +3000,22 @@ def process_full_text_and_create_segments_task(self, article_id: int, user_id: i
         if not parsed_references:
             send_user_notification(user_id, task_id, display_identifier, 'WARNING', 'Не удалось извлечь ссылки из JATS XML. Связывание будет неполным.', source_api=current_api_name)
 
-        for ref_data in parsed_references:
-            if not ref_data.get('jats_ref_id'):
-                continue # Пропускаем ссылки без внутреннего ID, их не связать
-
-            defaults = {
-                'raw_reference_text': ref_data.get('raw_text'),
-                'manual_data_json': { # Сохраняем все, что распарсили
-                    'jats_ref_id': ref_data.get('jats_ref_id'),
-                    'title': ref_data.get('title'),
-                    'year': ref_data.get('year'),
-                    'doi_from_source': ref_data.get('doi')
-                }
-            }
-            if ref_data.get('doi'):
-                defaults['target_article_doi'] = ref_data['doi']
-                defaults['status'] = ReferenceLink.StatusChoices.DOI_PROVIDED_NEEDS_LOOKUP
-            else:
-                defaults['status'] = ReferenceLink.StatusChoices.PENDING_DOI_INPUT
-
-            # Ищем/создаем ссылку по ее JATS ID, который уникален в рамках статьи
-            ReferenceLink.objects.update_or_create(
-                source_article=article,
-                manual_data_json__jats_ref_id=ref_data.get('jats_ref_id'),
-                defaults=defaults
-            )
+        # Полный список, как в задачах источников: позиция в нем - порядок ссылки в библиографии (order).
+        # С текстом связываются только ссылки с JATS ID (см. ref_map ниже)
+        upsert_article_references(article, parsed_references)
 
         # --- Этап Б: Создание карты ссылок для быстрого сопоставления ---
-        ref_map = {
-            ref.manual_data_json['jats_ref_id']: ref
-            for ref in ReferenceLink.objects.filter(source_article=article)
-            if ref.manual_data_json and 'jats_ref_id' in ref.manual_data_json
-        }
+        ref_map = dict(ReferenceLink.objects.filter(source_article=article, jats_ref_id__isnull=False).values_list('jats_ref_id', 'id'))
 
         # --- Этап В: Парсинг тела статьи, создание и связывание сегментов ---
         send_user_notification(user_id, task_id, display_identifier, 'PROGRESS', 'Анализ текста и создание сегментов...', progress_percent=50, source_api=current_api_name)
 
-        # Удаляем существующие автоматически созданные сегменты, чтобы избежать дублей при перезапуске
-        # Мы договорились, что у системных сегментов user=None
-        AnalyzedSegment.objects.filter(article=article, user__isnull=True).delete()
-
         xml_string_no_ns = re.sub(r'\sxmlns="[^"]+"', '', xml_string, count=1)
         root = ET.fromstring(xml_string_no_ns)
         body_node = root.find('.//body')
 
-        segments_created = 0
+        # Сначала собираем все сегменты в памяти: (section_key, segment_text, маркеры, ID цитируемых ссылок)
+        parsed_segments = []
         if body_node is not None:
             # Итерация по секциям для определения section_key
             for sec_node in body_node.findall('.//sec'): # Ищем все секции рекурсивно
@@ -3006,37 +3027,24 @@ def process_full_text_and_create_segments_task(self, article_id: int, user_id: i
                     if not segment_text or len(segment_text) < 50: # Пропускаем очень короткие параграфы
                         continue
 
-                    inline_xrefs = p_node.findall('.//xref[@ref-type="bibr"]')
-                    cited_ref_links_for_segment = set() # Используем set для автоматического исключения дублей
+                    cited_ref_ids = set() # Используем set для автоматического исключения дублей
                     inline_markers_in_segment = []
+                    for xref in p_node.findall('.//xref[@ref-type="bibr"]'):
+                        # Атрибут `rid` может содержать несколько ID, разделенных пробелами (например, "CR1 CR5")
+                        for rid in xref.get('rid', '').split():
+                            if rid in ref_map:
+                                cited_ref_ids.add(ref_map[rid])
+                        if xref.text:
+                            inline_markers_in_segment.append(xref.text.strip())
 
-                    if inline_xrefs:
-                        for xref in inline_xrefs:
-                            # Атрибут `rid` может содержать несколько ID, разделенных пробелами (например, "CR1 CR5")
-                            rids = xref.get('rid', '').split()
-                            for rid in rids:
-                                if rid in ref_map:
-                                    cited_ref_links_for_segment.add(ref_map[rid])
-                            if xref.text:
-                                inline_markers_in_segment.append(xref.text.strip())
-
-                    # Создаем сегмент. Он создается всегда, даже если в нем нет ссылок, так как он является логической частью текста.
-                    segment = AnalyzedSegment.objects.create(
-                        article=article,
-                        section_key=section_key,
-                        segment_text=segment_text,
-                        inline_citation_markers=list(set(inline_markers_in_segment)) or None, # Сохраняем уникальные маркеры
-                        user=None # Системное создание
-                    )
-
-                    # Устанавливаем M2M связь
-                    if cited_ref_links_for_segment:
-                        segment.cited_references.set(list(cited_ref_links_for_segment))
+                    # Сегмент создается всегда, даже если в нем нет ссылок, так как он является логической частью текста.
+                    # Уникальные маркеры в порядке появления (порядок стабилен между запусками)
+                    parsed_segments.append((section_key, segment_text, list(dict.fromkeys(inline_markers_in_segment)) or None, cited_ref_ids))
 
-                    segments_created += 1
+        segments_created, segments_updated, segments_deleted = _sync_system_segments(article, parsed_segments)
 
-        send_user_notification(user_id, task_id, display_identifier, 'SUCCESS', f'Автоматическое связывание завершено. Создано {segments_created} сегментов.', progress_percent=100, source_api=current_api_name)
-        return {'status': 'success', 'message': f'Created {segments_created} segments.'}
+        send_user_notification(user_id, task_id, display_identifier, 'SUCCESS', f'Автоматическое связывание завершено. Сегментов: новых {segments_created}, обновлено {segments_updated}, удалено {segments_deleted}.', progress_percent=100, source_api=current_api_name)
+        return {'status': 'success', 'message': f'Created {segments_created}, updated {segments_updated}, deleted {segments_deleted} segments.'}
 
     except Article.DoesNotExist:
         send_user_notification(user_id, task_id, display_identifier, 'FAILURE', 'Статья для анализа не найдена.', source_api=current_api_name)
@@ -3045,4 +3053,945 @@ def process_full_text_and_create_segments_task(self, article_id: int, user_id: i
         error_message_for_user = f'Ошибка при автоматическом связывании: {type(e).__name__} - {str(e)}'
         send_user_notification(user_id, task_id, display_identifier, 'FAILURE', error_message_for_user, source_api=current_api_name)
         self.update_state(state='FAILURE', meta={'identifier': display_identifier, 'error': error_message_for_user, 'traceback': self.request.exc_info if hasattr(self.request, 'exc_info') else str(e)})
-        return {'status': 'error', 'message': error_message_for_user}
\ No newline at end of file
+        return {'status': 'error', 'message': error_message_for_user}
+
+# --- Массовая загрузка статей по списку идентификаторов ---
+BULK_INGESTION_SOURCE_NAME = 'BulkIngestion'
+BULK_INGESTION_CHUNK_SIZE = getattr(settings, 'BULK_INGESTION_CHUNK_SIZE', 200)
+CROSSREF_BATCH_SIZE = getattr(settings, 'CROSSREF_BATCH_SIZE', 50)
+EUROPEPMC_BATCH_SIZE = getattr(settings, 'EUROPEPMC_BATCH_SIZE', 100)
+
+
+def _record_bulk_batch(job_id: int, failed: bool = False):
+    """
+    Атомарно отмечает завершение одного пакетного запроса задания (пакеты выполняются параллельно)
+    и отправляет пользователю общий прогресс задания.
+    """
+    if not job_id:
+        return
+    counter = 'failed_batches' if failed else 'completed_batches'
+    BulkIngestionJob.objects.filter(id=job_id).update(**{counter: F(counter) + 1, 'updated_at': timezone.now()})
+    job = BulkIngestionJob.objects.filter(id=job_id).only('id', 'user_id', 'celery_task_id', 'status', 'total_batches', 'completed_batches', 'failed_batches').first()
+    if job:
+        message = f'Обработано пакетов: {job.completed_batches + job.failed_batches} из {job.total_batches}' + (f' (с ошибкой: {job.failed_batches})' if job.failed_batches else '') + '.'
+        send_user_notification(job.user_id, job.celery_task_id, f"BulkJob:{job.id}", 'PROGRESS', message, progress_percent=job.progress_percent, source_api=BULK_INGESTION_SOURCE_NAME)
+
+
+def _store_batch_records(current_api_name: str, records_by_article: dict) -> tuple[int, list]:
+    """
+    Сохраняет результаты пакетного запроса: {article_id: (нормализованная запись, {format_type: содержимое})}.
+    Сырые данные пишутся в ArticleContent, structured_content из записи (полный текст) - в статью.
+    Каждая статья пишется в своей короткой транзакции, чтобы ошибка одной записи не откатывала весь пакет.
+    Идентификаторы, уже принадлежащие другой статье, не записываются (попадают в список ошибок),
+    остальные данные статьи сохраняются. Возвращает (число обновленных статей, список ошибок).
+    """
+    updated, errors = 0, []
+    # Авторы всего пакета создаются заранее одним bulk_create, дальше статьи берут их ID из кэша процесса
+    get_author_ids([name for record, _ in records_by_article.values() for name in record.get('authors') or []])
+    # Занятые идентификаторы проверяются для всего пакета сразу; конфликтующие пропускаются, остальное сохраняется
+    current_identifiers = Article.objects.filter(id__in=records_by_article).only('id', *ARTICLE_IDENTIFIER_FIELDS).in_bulk()
+    taken_identifiers = _taken_identifier_values([
+        (current_identifiers[article_id], record) for article_id, (record, _) in records_by_article.items() if article_id in current_identifiers
+    ])
+    for article_id, (record, contents) in records_by_article.items():
+        conflicts = []
+        try:
+            with transaction.atomic():
+                article = Article.objects.select_for_update().get(id=article_id)
+                _apply_source_record(article, current_api_name, record, taken_identifiers=taken_identifiers, conflicts=conflicts)
+                if record.get('structured_content'):
+                    article.structured_content = record['structured_content']
+                article.save()
+                for format_type, content in contents.items():
+                    ArticleContent.objects.update_or_create(
+                        article=article, source_api_name=current_api_name, format_type=format_type,
+                        defaults={'content': content}
+                    )
+            updated += 1
+            errors.extend(f'ArticleID:{article_id}: {conflict} уже принадлежит другой статье' for conflict in conflicts)
+        except Article.DoesNotExist:
+            continue
+        except db_utils.IntegrityError as e:
+            errors.append(f'ArticleID:{article_id}: {str(e)[:200]}')
+    return updated, errors
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def fetch_crossref_batch_task(self, article_ids: list, job_id: int = None):
+    """
+    Метаданные CrossRef для пакета статей: один запрос /works?filter=doi:a,doi:b,... на CROSSREF_BATCH_SIZE DOI
+    вместо запроса на статью. Статьи без DOI пропускаются.
+    """
+    current_api_name = settings.API_SOURCE_NAMES['CROSSREF']
+    doi_to_article = {
+        doi.lower(): article_id
+        for article_id, doi in Article.objects.filter(id__in=article_ids, doi__isnull=False).values_list('id', 'doi')
+        if doi and ',' not in doi # Запятая в DOI ломает синтаксис filter
+    }
+    dois = list(doi_to_article.keys())
+    headers = {'User-Agent': USER_AGENT_LIST[0]}
+
+    found = {}
+    try:
+        for start in range(0, len(dois), CROSSREF_BATCH_SIZE):
+            doi_chunk = dois[start:start + CROSSREF_BATCH_SIZE]
+            params = {
+                'filter': ','.join(f'doi:{doi}' for doi in doi_chunk),
+                'rows': len(doi_chunk),
+                'mailto': APP_EMAIL,
+            }
+            response = _cached_api_get(self, current_api_name, 'https://api.crossref.org/works', params=params, headers=headers, timeout=60)
+            response.raise_for_status()
+            for item in response.json().get('message', {}).get('items', []):
+                article_id = doi_to_article.get((item.get('DOI') or '').lower())
+                if article_id and article_id not in found:
+                    found[article_id] = (normalize_crossref_work(item), {'json_metadata': json.dumps(item)})
+    except (requests.exceptions.RequestException, json.JSONDecodeError) as exc:
+        # Уже полученные пакеты при повторе берутся из кэша ответов
+        if self.request.retries >= self.max_retries:
+            _record_bulk_batch(job_id, failed=True)
+            return {'status': 'error', 'message': f'{current_api_name} batch error: {str(exc)}', 'source_api': current_api_name}
+        raise self.retry(exc=exc)
+
+    updated, errors = _store_batch_records(current_api_name, found)
+    _record_bulk_batch(job_id)
+    return {
+        'status': 'success', 'source_api': current_api_name,
+        'requested': len(dois), 'found': len(found), 'updated': updated, 'errors': errors,
+    }
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=120)
+def fetch_europepmc_batch_task(self, article_ids: list, job_id: int = None):
+    """
+    Метаданные Europe PMC для пакета статей: один поисковый запрос с OR по EUROPEPMC_BATCH_SIZE
+    идентификаторам (DOI, иначе PMID, иначе PMCID). Полный текст в пакетном режиме не загружается.
+    """
+    current_api_name = settings.API_SOURCE_NAMES['EUROPEPMC']
+    terms, index = [], {}
+    for article_id, doi, pmid, pmcid in Article.objects.filter(id__in=article_ids).values_list('id', 'doi', 'pubmed_id', 'pmc_id'):
+        if doi:
+            terms.append(f'DOI:"{doi}"')
+        elif pmid:
+            terms.append(f'EXT_ID:{pmid} AND SRC:MED')
+        elif pmcid:
+            terms.append(f'PMCID:{pmcid}')
+        else:
+            continue
+        for key, value in (('doi', doi.lower() if doi else None), ('pmid', pmid), ('pmcid', pmcid)):
+            if value:
+                index[(key, value)] = article_id
+
+    found = {}
+    api_search_url = "https://www.ebi.ac.uk/europepmc/webservices/rest/search"
+    try:
+        for start in range(0, len(terms), EUROPEPMC_BATCH_SIZE):
+            terms_chunk = terms[start:start + EUROPEPMC_BATCH_SIZE]
+            params = {
+                'query': ' OR '.join(f'({term})' for term in terms_chunk),
+                'format': 'json',
+                'resultType': 'core',
+                'pageSize': 1000,
+                'email': APP_EMAIL,
+            }
+            response = _cached_api_get(self, current_api_name, api_search_url, params=params, timeout=90)
+            response.raise_for_status()
+            for result in response.json().get('resultList', {}).get('result', []):
+                article_id = (
+                    index.get(('doi', (result.get('doi') or '').lower()))
+                    or index.get(('pmid', result.get('pmid')))
+                    or index.get(('pmcid', result.get('pmcid')))
+                )
+                if article_id and article_id not in found:
+                    found[article_id] = (normalize_europepmc_result(result), {'json_metadata': json.dumps(result)})
+    except (requests.exceptions.RequestException, json.JSONDecodeError) as exc:
+        if self.request.retries >= self.max_retries:
+            _record_bulk_batch(job_id, failed=True)
+            return {'status': 'error', 'message': f'{current_api_name} batch error: {str(exc)}', 'source_api': current_api_name}
+        raise self.retry(exc=exc)
+
+    updated, errors = _store_batch_records(current_api_name, found)
+    _record_bulk_batch(job_id)
+    return {
+        'status': 'success', 'source_api': current_api_name,
+        'requested': len(terms), 'found': len(found), 'updated': updated, 'errors': errors,
+    }
+
+
+# --- Пакетные запросы к NCBI E-utilities (EFetch) ---
+EUTILS_EFETCH_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
+PUBMED_EFETCH_BATCH_SIZE = getattr(settings, 'PUBMED_EFETCH_BATCH_SIZE', 200)
+PMC_EFETCH_BATCH_SIZE = getattr(settings, 'PMC_EFETCH_BATCH_SIZE', 20) # Полные тексты объемные
+PUBMED_PENDING_PMIDS_KEY = 'pubmed:pending:pmids'
+PUBMED_PENDING_PMCIDS_KEY = 'pubmed:pending:pmcids'
+PUBMED_PENDING_TTL = 3600 # Очередь не живет дольше часа, если задачи PubMed так и не запустились
+
+
+def _ncbi_common_params() -> dict:
+    params = {'tool': NCBI_TOOL_NAME, 'email': NCBI_ADMIN_EMAIL}
+    if NCBI_API_KEY:
+        params['api_key'] = NCBI_API_KEY
+    return params
+
+
+def _efetch_pubmed_batch(task, pmids: list) -> dict:
+    """
+    EFetch db=pubmed для списка PMID пачками по PUBMED_EFETCH_BATCH_SIZE (ID через запятую).
+    PubmedArticleSet разбивается на статьи, и каждая кладется в кэш ответов под ключом одиночного
+    запроса fetch_data_from_pubmed_task. Возвращает {PMID: элемент PubmedArticle}. Сетевые ошибки пробрасываются.
+    """
+    current_api_name = settings.API_SOURCE_NAMES['PUBMED']
+    common_params = _ncbi_common_params()
+    found = {}
+    for start in range(0, len(pmids), PUBMED_EFETCH_BATCH_SIZE):
+        pmid_chunk = pmids[start:start + PUBMED_EFETCH_BATCH_SIZE]
+        params = {**common_params, 'db': 'pubmed', 'id': ','.join(pmid_chunk), 'retmode': 'xml', 'rettype': 'abstract'}
+        response = _cached_api_get(task, current_api_name, EUTILS_EFETCH_URL, params=params, timeout=90)
+        response.raise_for_status()
+        for pmid, pubmed_article_node in split_pubmed_article_set(response.text).items():
+            found[pmid] = pubmed_article_node
+            if len(pmid_chunk) > 1:
+                single_params = {**common_params, 'db': 'pubmed', 'id': pmid, 'retmode': 'xml', 'rettype': 'abstract'}
+                single_xml = f'<?xml version="1.0" ?>\n<PubmedArticleSet>{ET.tostring(pubmed_article_node, encoding="unicode")}</PubmedArticleSet>'
+                store_response(current_api_name, EUTILS_EFETCH_URL, single_params, single_xml)
+    return found
+
+
+def _efetch_pmc_batch(task, pmcids: list) -> dict:
+    """
+    EFetch db=pmc для списка PMCID пачками по PMC_EFETCH_BATCH_SIZE. Возвращает {PMCID: JATS XML статьи};
+    каждая статья также кладется в кэш ответов под ключом одиночного запроса полного текста.
+    """
+    current_api_name = settings.API_SOURCE_NAMES['PUBMED']
+    common_params = _ncbi_common_params()
+    found = {}
+    for start in range(0, len(pmcids), PMC_EFETCH_BATCH_SIZE):
+        pmcid_chunk = pmcids[start:start + PMC_EFETCH_BATCH_SIZE]
+        params = {**common_params, 'db': 'pmc', 'id': ','.join(pmcid_chunk), 'retmode': 'xml'}
+        response = _cached_api_get(task, current_api_name, EUTILS_EFETCH_URL, params=params, timeout=180)
+        response.raise_for_status()
+        for pmcid, article_xml in split_pmc_article_set(response.text).items():
+            found[pmcid] = f'<pmc-articleset>{article_xml}</pmc-articleset>'
+            if len(pmcid_chunk) > 1:
+                single_params = {**common_params, 'db': 'pmc', 'id': pmcid, 'retmode': 'xml'}
+                store_response(current_api_name, EUTILS_EFETCH_URL, single_params, f'<?xml version="1.0" ?>\n{found[pmcid]}')
+    return found
+
+
+def _queue_batch_prefetch(queue_key: str, values: list, ttl: int = PUBMED_PENDING_TTL):
+    """Добавляет идентификаторы в общую очередь Redis (множество) для накопительной пакетной загрузки."""
+    values = [value for value in values if value]
+    if not values:
+        return
+    try:
+        with get_redis_client().pipeline() as pipe:
+            pipe.sadd(queue_key, *values)
+            pipe.expire(queue_key, ttl)
+            pipe.execute()
+    except redis.exceptions.RedisError:
+        pass # Без очереди каждая задача просто загрузит свою статью сама
+
+
+def _pop_batch_prefetch(queue_key: str, own_id: str, batch_size: int) -> list:
+    """
+    Забирает из очереди до batch_size - 1 ожидающих идентификаторов других статей (свой удаляется из очереди).
+    Возвращает [own_id, ...] или пустой список, если ждущих нет или Redis недоступен.
+    """
+    try:
+        client = get_redis_client()
+        client.srem(queue_key, own_id)
+        pending_ids = [value.decode() for value in (client.spop(queue_key, batch_size - 1) or [])]
+    except redis.exceptions.RedisError:
+        return []
+    return [own_id] + pending_ids if pending_ids else []
+
+
+def _queue_pubmed_prefetch(pmid: str = None, pmcid: str = None):
+    """Ставит PMID/PMCID статьи в общую очередь Redis для накопительной загрузки (_prefetch_pending_pubmed)."""
+    _queue_batch_prefetch(PUBMED_PENDING_PMIDS_KEY, [pmid])
+    _queue_batch_prefetch(PUBMED_PENDING_PMCIDS_KEY, [pmcid])
+
+
+def _prefetch_pending_pubmed(task, pmid: str = None, pmcid: str = None):
+    """
+    Накопительный режим для потоков конвейеров (например, загрузка списка литературы): задача забирает из очереди
+    до PUBMED_EFETCH_BATCH_SIZE ожидающих PMID (и PMCID) других статей и загружает их одним EFetch вместе со своим.
+    Статьи попадают в кэш ответов, и задачи этих статей не обращаются к NCBI повторно.
+    Ошибки очереди и пакетного запроса не мешают обычной одиночной загрузке.
+    """
+    if pmcid:
+        pmcid = pmcid if pmcid.upper().startswith('PMC') else f"PMC{pmcid}"
+    for queue_key, own_id, batch_size, efetch_batch in (
+        (PUBMED_PENDING_PMIDS_KEY, pmid, PUBMED_EFETCH_BATCH_SIZE, _efetch_pubmed_batch),
+        (PUBMED_PENDING_PMCIDS_KEY, pmcid, PMC_EFETCH_BATCH_SIZE, _efetch_pmc_batch),
+    ):
+        if not own_id:
+            continue
+        batch_ids = _pop_batch_prefetch(queue_key, own_id, batch_size)
+        if not batch_ids:
+            continue
+        try:
+            efetch_batch(task, batch_ids)
+        except (requests.exceptions.RequestException, ET.ParseError):
+            continue # Статьи из очереди загрузят свои задачи по одной
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=120)
+def fetch_pubmed_batch_task(self, article_ids: list, job_id: int = None):
+    """
+    Метаданные PubMed и полные тексты PMC для пакета статей: EFetch db=pubmed с PUBMED_EFETCH_BATCH_SIZE PMID
+    в одном запросе, затем EFetch db=pmc для найденных PMCID. Статьи без PMID пропускаются.
+    Список литературы и PDF в пакетном режиме не обрабатываются (доступны при переобработке статьи).
+    """
+    current_api_name = settings.API_SOURCE_NAMES['PUBMED']
+    pmid_to_article, known_pmcids = {}, {}
+    for article_id, pmid, pmcid in Article.objects.filter(id__in=article_ids, pubmed_id__isnull=False).values_list('id', 'pubmed_id', 'pmc_id'):
+        pmid_to_article[pmid] = article_id
+        if pmcid:
+            known_pmcids[article_id] = pmcid
+
+    found = {}
+    try:
+        for pmid, pubmed_article_node in _efetch_pubmed_batch(self, list(pmid_to_article.keys())).items():
+            article_id = pmid_to_article.get(pmid)
+            if not article_id:
+                continue
+            try:
+                record = normalize_pubmed_article(pubmed_article_node)
+            except ValueError:
+                continue
+            contents = {'xml_pubmed_entry': ET.tostring(pubmed_article_node, encoding='unicode')}
+            if record['mesh_terms']:
+                contents['mesh_terms'] = json.dumps(record['mesh_terms'])
+            found[article_id] = (record, contents)
+
+        pmcid_to_article = {}
+        for article_id, (record, _) in found.items():
+            pmcid = record.get('pmc_id') or known_pmcids.get(article_id)
+            if pmcid:
+                pmcid_to_article[pmcid if pmcid.upper().startswith('PMC') else f"PMC{pmcid}"] = article_id
+        full_texts = _efetch_pmc_batch(self, list(pmcid_to_article.keys())) if pmcid_to_article else {}
+    except (requests.exceptions.RequestException, ET.ParseError) as exc:
+        if self.request.retries >= self.max_retries:
+            _record_bulk_batch(job_id, failed=True)
+            return {'status': 'error', 'message': f'{current_api_name} batch error: {str(exc)}', 'source_api': current_api_name}
+        raise self.retry(exc=exc)
+
+    for pmcid, full_text_xml in full_texts.items():
+        article_id = pmcid_to_article.get(pmcid)
+        if article_id not in found:
+            continue
+        record, contents = found[article_id]
+        contents['pmc_fulltext_xml'] = full_text_xml
+        record['structured_content'] = extract_structured_text_from_jats(full_text_xml)
+
+    updated, errors = _store_batch_records(current_api_name, found)
+    _record_bulk_batch(job_id)
+    return {
+        'status': 'success', 'source_api': current_api_name,
+        'requested': len(pmid_to_article), 'found': len(found), 'full_texts': len(full_texts), 'updated': updated, 'errors': errors,
+    }
+
+
+# --- Пакетные запросы к OpenAlex (filter=doi:a|b|...) ---
+OPENALEX_WORKS_URL = "https://api.openalex.org/works"
+OPENALEX_BATCH_SIZE = getattr(settings, 'OPENALEX_BATCH_SIZE', 50) # Максимум значений в одном OR-фильтре OpenAlex
+OPENALEX_PENDING_DOIS_KEY = 'openalex:pending:dois'
+OPENALEX_PENDING_PMIDS_KEY = 'openalex:pending:pmids'
+
+
+def _fetch_openalex_batch(task, values: list, id_type: str = 'doi') -> dict:
+    """
+    Работы OpenAlex по списку DOI (id_type='doi') или PMID (id_type='pmid'): один запрос
+    /works?filter=doi:a|b|...&select=... на OPENALEX_BATCH_SIZE значений, только сохраняемые поля.
+    Каждая работа кладется в кэш ответов под ключом одиночного запроса fetch_data_from_openalex_task.
+    Возвращает {значение идентификатора: работа}. Сетевые ошибки пробрасываются.
+    """
+    current_api_name = settings.API_SOURCE_NAMES['OPENALEX']
+    headers = {'User-Agent': USER_AGENT_LIST[0]}
+    found = {}
+    for start in range(0, len(values), OPENALEX_BATCH_SIZE):
+        values_chunk = values[start:start + OPENALEX_BATCH_SIZE]
+        params = {
+            'filter': f"{id_type}:{'|'.join(values_chunk)}",
+            'select': OPENALEX_SELECT_FIELDS,
+            'per-page': OPENALEX_BATCH_SIZE,
+            'mailto': APP_EMAIL,
+        }
+        response = _cached_api_get(task, current_api_name, OPENALEX_WORKS_URL, params=params, headers=headers, timeout=60)
+        response.raise_for_status()
+        for work in response.json().get('results', []):
+            record = normalize_openalex_work(work)
+            value = record['doi'] if id_type == 'doi' else record['pubmed_id']
+            if not value or value in found:
+                continue
+            found[value] = work
+            store_response(current_api_name, f"{OPENALEX_WORKS_URL}/{id_type}:{value}", None, json.dumps(work), 'application/json')
+    return found
+
+
+def _queue_openalex_prefetch(doi: str = None, pmid: str = None):
+    """Ставит DOI (или PMID, если DOI нет) статьи в очередь накопительной загрузки OpenAlex."""
+    if doi and '|' not in doi:
+        _queue_batch_prefetch(OPENALEX_PENDING_DOIS_KEY, [doi.lower()])
+    elif pmid:
+        _queue_batch_prefetch(OPENALEX_PENDING_PMIDS_KEY, [pmid])
+
+
+def _prefetch_pending_openalex(task, doi: str = None, pmid: str = None):
+    """
+    Аналог _prefetch_pending_pubmed для OpenAlex: когда список литературы запускает много конвейеров,
+    первая задача OpenAlex загружает ожидающие DOI/PMID пачкой, остальные получают свои работы из кэша.
+    """
+    for queue_key, own_id, id_type in (
+        (OPENALEX_PENDING_DOIS_KEY, doi, 'doi'),
+        (OPENALEX_PENDING_PMIDS_KEY, pmid, 'pmid'),
+    ):
+        if not own_id:
+            continue
+        batch_ids = _pop_batch_prefetch(queue_key, own_id, OPENALEX_BATCH_SIZE)
+        if not batch_ids:
+            continue
+        try:
+            _fetch_openalex_batch(task, batch_ids, id_type)
+        except (requests.exceptions.RequestException, json.JSONDecodeError):
+            continue
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def fetch_openalex_batch_task(self, article_ids: list, job_id: int = None):
+    """
+    Метаданные OpenAlex для пакета статей: запросы по DOI, для статей без DOI - по PMID,
+    OPENALEX_BATCH_SIZE значений в одном фильтре. Статьи без DOI и PMID пропускаются.
+    """
+    current_api_name = settings.API_SOURCE_NAMES['OPENALEX']
+    doi_to_article, pmid_to_article = {}, {}
+    for article_id, doi, pmid in Article.objects.filter(id__in=article_ids).values_list('id', 'doi', 'pubmed_id'):
+        if doi and '|' not in doi: # Вертикальная черта в DOI ломает синтаксис OR-фильтра
+            doi_to_article[doi.lower()] = article_id
+        elif pmid:
+            pmid_to_article[pmid] = article_id
+
+    found = {}
+    try:
+        for id_type, value_to_article in (('doi', doi_to_article), ('pmid', pmid_to_article)):
+            if not value_to_article:
+                continue
+            for value, work in _fetch_openalex_batch(self, list(value_to_article.keys()), id_type).items():
+                article_id = value_to_article.get(value)
+                if article_id and article_id not in found:
+                    found[article_id] = (normalize_openalex_work(work), {'json_metadata': json.dumps(work)})
+    except (requests.exceptions.RequestException, json.JSONDecodeError) as exc:
+        if self.request.retries >= self.max_retries:
+            _record_bulk_batch(job_id, failed=True)
+            return {'status': 'error', 'message': f'{current_api_name} batch error: {str(exc)}', 'source_api': current_api_name}
+        raise self.retry(exc=exc)
+
+    updated, errors = _store_batch_records(current_api_name, found)
+    _record_bulk_batch(job_id)
+    return {
+        'status': 'success', 'source_api': current_api_name,
+        'requested': len(doi_to_article) + len(pmid_to_article), 'found': len(found), 'updated': updated, 'errors': errors,
+    }
+
+
+# --- Пакетные запросы к Semantic Scholar (POST /paper/batch) ---
+S2_BATCH_SIZE = getattr(settings, 'S2_BATCH_SIZE', 500) # Максимум ID в одном запросе /paper/batch
+S2_PENDING_IDS_KEY = 's2:pending:ids'
+
+
+def _fetch_s2_batch(task, paper_ids: list) -> dict:
+    """
+    Статьи S2 по списку ID вида DOI:..., ARXIV:..., PMID:... одним POST /paper/batch на S2_BATCH_SIZE ID
+    с проекцией полей S2_PAPER_FIELDS. Каждая найденная статья кладется в кэш ответов под ключом одиночного
+    запроса fetch_data_from_s2_task. Возвращает {запрошенный ID: статья}. Сетевые ошибки пробрасываются.
+    """
+    current_api_name = settings.API_SOURCE_NAMES['SEMANTICSCHOLAR']
+    headers = {'User-Agent': USER_AGENT_LIST[0]}
+    found = {}
+    for start in range(0, len(paper_ids), S2_BATCH_SIZE):
+        ids_chunk = paper_ids[start:start + S2_BATCH_SIZE]
+        _wait_for_api_token(task, current_api_name)
+        response = http_post(f"{S2_GRAPH_API_URL}/paper/batch", params={'fields': S2_PAPER_FIELDS}, json={'ids': ids_chunk}, headers=headers, timeout=90)
+        try:
+            raise_if_rate_limited(current_api_name, response)
+        except RateLimitExceeded as exc:
+            raise _rate_limit_retry(task, exc)
+        response.raise_for_status()
+        # Ответ - список в порядке запрошенных ID, null для ненайденных
+        for paper_id, paper in zip(ids_chunk, response.json()):
+            if not paper:
+                continue
+            found[paper_id] = paper
+            store_response(current_api_name, f"{S2_GRAPH_API_URL}/paper/{paper_id.replace(' ', '%20')}", {'fields': S2_PAPER_FIELDS}, json.dumps(paper), 'application/json')
+    return found
+
+
+def _prefetch_pending_s2(task, paper_id: str):
+    """Аналог _prefetch_pending_pubmed для Semantic Scholar: ожидающие ID статей загружаются одним /paper/batch."""
+    batch_ids = _pop_batch_prefetch(S2_PENDING_IDS_KEY, paper_id, S2_BATCH_SIZE)
+    if not batch_ids:
+        return
+    try:
+        _fetch_s2_batch(task, batch_ids)
+    except (requests.exceptions.RequestException, json.JSONDecodeError):
+        pass # Статьи из очереди загрузят свои задачи по одной
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=180)
+def fetch_s2_batch_task(self, article_ids: list, job_id: int = None):
+    """
+    Метаданные Semantic Scholar для пакета статей через POST /paper/batch (до S2_BATCH_SIZE ID в запросе).
+    Списки цитирований и ссылок не загружаются - они доступны постранично через ArticleS2LinksAPIView.
+    """
+    current_api_name = settings.API_SOURCE_NAMES['SEMANTICSCHOLAR']
+    paper_id_to_article = {}
+    for article in Article.objects.filter(id__in=article_ids).only('id', 'doi', 'arxiv_id', 'pubmed_id'):
+        s2_paper_id = s2_paper_id_for_article(article)
+        if s2_paper_id:
+            paper_id_to_article[s2_paper_id] = article.id
+
+    found = {}
+    try:
+        for paper_id, paper in _fetch_s2_batch(self, list(paper_id_to_article.keys())).items():
+            found[paper_id_to_article[paper_id]] = (normalize_s2_paper(paper), {'json_metadata': json.dumps(paper)})
+    except (requests.exceptions.RequestException, json.JSONDecodeError) as exc:
+        if self.request.retries >= self.max_retries:
+            _record_bulk_batch(job_id, failed=True)
+            return {'status': 'error', 'message': f'{current_api_name} batch error: {str(exc)}', 'source_api': current_api_name}
+        raise self.retry(exc=exc)
+
+    updated, errors = _store_batch_records(current_api_name, found)
+    _record_bulk_batch(job_id)
+    return {
+        'status': 'success', 'source_api': current_api_name,
+        'requested': len(paper_id_to_article), 'found': len(found), 'updated': updated, 'errors': errors,
+    }
+
+
+def _build_bulk_source_signatures(article_ids: list, job_id: int) -> list:
+    """Пакетные задачи источников для одного фрагмента статей задания массовой загрузки."""
+    return [
+        fetch_crossref_batch_task.si(article_ids, job_id=job_id),
+        fetch_europepmc_batch_task.si(article_ids, job_id=job_id),
+        fetch_openalex_batch_task.si(article_ids, job_id=job_id),
+        fetch_s2_batch_task.si(article_ids, job_id=job_id),
+        fetch_pubmed_batch_task.si(article_ids, job_id=job_id),
+    ]
+
+
+BULK_ARTICLE_IDENTIFIER_FIELDS = ('doi', 'pubmed_id', 'pmc_id', 'arxiv_id')
+
+
+def _article_ids_by_identifiers(articles: list) -> set:
+    """ID статей в базе, у которых совпадает хотя бы один идентификатор с переданными (несохраненными) статьями."""
+    condition = Q()
+    for field in BULK_ARTICLE_IDENTIFIER_FIELDS:
+        values = [getattr(article, field) for article in articles if getattr(article, field)]
+        if values:
+            condition |= Q(**{f'{field}__in': values})
+    if not condition:
+        return set()
+    return set(Article.objects.filter(condition).values_list('id', flat=True))
+
+
+def _bulk_create_articles(articles: list) -> tuple[list, int]:
+    """
+    Создает пакет статей массовой загрузки в отдельной точке сохранения.
+    Если параллельная загрузка успела создать статью с тем же идентификатором, пакет повторяется
+    с ignore_conflicts и ID перечитываются по идентификаторам. Возвращает (ID созданных статей, число совпавших).
+    """
+    try:
+        with transaction.atomic():
+            return [article.id for article in Article.objects.bulk_create(articles)], 0
+    except db_utils.IntegrityError:
+        pass
+    with transaction.atomic():
+        existing_ids = _article_ids_by_identifiers(articles)
+        Article.objects.bulk_create(articles, ignore_conflicts=True)
+        created_ids = sorted(_article_ids_by_identifiers(articles) - existing_ids)
+    return created_ids, len(articles) - len(created_ids)
+
+
+@shared_task(bind=True)
+def bulk_ingest_identifiers_task(self, job_id: int):
+    """
+    Массовая загрузка: сверяет идентификаторы задания с существующими статьями (с учетом локальной
+    таблицы сопоставлений), создает недостающие статьи пакетами bulk_create и запускает по фрагментам
+    (BULK_INGESTION_CHUNK_SIZE статей) пакетное разрешение идентификаторов и пакетные запросы к источникам.
+    """
+    try:
+        job = BulkIngestionJob.objects.get(id=job_id)
+    except BulkIngestionJob.DoesNotExist:
+        return {'status': 'error', 'message': f'BulkIngestionJob {job_id} not found.'}
+
+    job.status = BulkIngestionJob.StatusChoices.RUNNING
+    job.celery_task_id = self.request.id
+    job.save(update_fields=['status', 'celery_task_id', 'updated_at'])
+    try:
+        send_user_notification(job.user_id, job.celery_task_id, f"BulkJob:{job.id}", 'PENDING', f'Массовая загрузка: {len(job.identifiers)} идентификаторов, сверка с базой...', progress_percent=0, source_api=BULK_INGESTION_SOURCE_NAME)
+
+        identifier_fields = BULK_ARTICLE_IDENTIFIER_FIELDS
+        # Дополняем идентификаторы только из локальной таблицы сопоставлений, чтобы найти статьи,
+        # уже сохраненные под другим идентификатором (например, PMID из списка и DOI в базе)
+        records = resolve_identifiers_batch(
+            [{IDENTIFIER_TYPE_FIELDS[entry['type']]: entry['value']} for entry in job.identifiers],
+            use_external=False
+        )
+
+        existing = set()
+        for field in identifier_fields:
+            values = list({record[field] for record in records if record.get(field)})
+            for start in range(0, len(values), 1000):
+                existing.update(
+                    (field, value) for value in Article.objects.filter(**{f'{field}__in': values[start:start + 1000]}).values_list(field, flat=True)
+                )
+
+        new_articles, seen = [], set()
+        existing_count = duplicate_count = 0
+        for entry, record in zip(job.identifiers, records):
+            keys = {(field, record[field]) for field in identifier_fields if record.get(field)}
+            if keys & existing:
+                existing_count += 1
+                continue
+            if keys & seen: # Разные идентификаторы одной статьи в одном списке
+                duplicate_count += 1
+                continue
+            seen.update(keys)
+            new_articles.append(Article(
+                user_id=job.user_id,
+                title=f"Загрузка: {entry['type']}:{entry['value']}",
+                is_user_initiated=True,
+                **{field: record[field] for field in identifier_fields if record.get(field)}
+            ))
+
+        article_ids = []
+        for start in range(0, len(new_articles), 500):
+            created_ids, clashes = _bulk_create_articles(new_articles[start:start + 500])
+            article_ids.extend(created_ids)
+            existing_count += clashes
+        chunks = [article_ids[i:i + BULK_INGESTION_CHUNK_SIZE] for i in range(0, len(article_ids), BULK_INGESTION_CHUNK_SIZE)]
+        headers, total_batches = [], 0
+        for chunk in chunks:
+            source_signatures = _build_bulk_source_signatures(chunk, job.id)
+            total_batches += len(source_signatures)
+            headers.append(chain(resolve_identifiers_batch_task.si(chunk), *source_signatures))
+
+        job.article_ids = article_ids
+        job.existing_count = existing_count
+        job.duplicate_count += duplicate_count
+        job.created_count = len(article_ids)
+        job.total_batches = total_batches
+        job.save(update_fields=['article_ids', 'existing_count', 'duplicate_count', 'created_count', 'total_batches', 'updated_at'])
+
+        if not headers:
+            _finalize_bulk_ingestion(job.id)
+            return {'status': 'success', 'message': 'Все статьи уже есть в базе.', 'job_id': job.id}
+
+        chord(headers)(
+            finalize_bulk_ingestion_task.si(job.id).on_error(bulk_ingestion_error_task.s(job_id=job.id))
+        )
+    except Exception as e:
+        # Задание не должно остаться в RUNNING; до запуска аккорда его errback еще не подключен
+        return _finalize_bulk_ingestion(job_id, error_message=f'{type(e).__name__}: {e}')
+
+    message = f'Создано статей: {len(article_ids)}, уже в базе: {existing_count}. Запущено пакетов: {job.total_batches}.'
+    send_user_notification(job.user_id, job.celery_task_id, f"BulkJob:{job.id}", 'PROGRESS', message, progress_percent=0, source_api=BULK_INGESTION_SOURCE_NAME)
+    return {'status': 'success', 'message': message, 'job_id': job.id}
+
+
+def _finalize_bulk_ingestion(job_id: int, error_message: str = None):
+    job = BulkIngestionJob.objects.filter(id=job_id).first()
+    if not job:
+        return {'status': 'error', 'message': f'BulkIngestionJob {job_id} not found.'}
+    # Статья считается найденной, если хотя бы один источник записал в нее метаданные
+    enriched_count = 0
+    for start in range(0, len(job.article_ids), 1000):
+        enriched_count += Article.objects.filter(id__in=job.article_ids[start:start + 1000], primary_source_api__isnull=False).count()
+    job.enriched_count = enriched_count
+    job.not_found_count = len(job.article_ids) - enriched_count
+    job.status = BulkIngestionJob.StatusChoices.FAILED if error_message else BulkIngestionJob.StatusChoices.COMPLETED
+    job.error_message = error_message
+    job.finished_at = timezone.now()
+    job.save(update_fields=['enriched_count', 'not_found_count', 'status', 'error_message', 'finished_at', 'updated_at'])
+
+    message = f'Массовая загрузка завершена: создано {job.created_count}, с метаданными {enriched_count}, не найдено {job.not_found_count}, уже в базе {job.existing_count}.'
+    if error_message:
+        message += f' Ошибка: {error_message}'
+    send_user_notification(job.user_id, job.celery_task_id, f"BulkJob:{job.id}", 'FAILURE' if error_message else 'SUCCESS', message, progress_percent=100, source_api=BULK_INGESTION_SOURCE_NAME)
+    return {'status': 'error' if error_message else 'success', 'message': message, 'job_id': job.id}
+
+
+@shared_task(bind=True)
+def finalize_bulk_ingestion_task(self, job_id: int):
+    return _finalize_bulk_ingestion(job_id)
+
+
+@shared_task
+def bulk_ingestion_error_task(request, exc, traceback, job_id: int):
+    """Errback аккорда массовой загрузки: задание завершается с ошибкой, но уже загруженные статьи учитываются."""
+    return _finalize_bulk_ingestion(job_id, error_message=f'{type(exc).__name__}: {exc}')
+
+
+# --- Обход цитирований в ширину (CitationCrawlJob) ---
+CITATION_CRAWL_SOURCE_NAME = 'CitationCrawl'
+CITATION_CRAWL_WAVE_SIZE = getattr(settings, 'CITATION_CRAWL_WAVE_SIZE', 100)
+CITATION_CRAWL_REFERENCES_PAGE_SIZE = getattr(settings, 'CITATION_CRAWL_REFERENCES_PAGE_SIZE', 1000)
+
+
+def _citation_crawl_batch_sources() -> list:
+    """(имя источника, пакетная задача, размеры пакетов ее запросов) для загрузки волны обхода."""
+    return [
+        (settings.API_SOURCE_NAMES['CROSSREF'], fetch_crossref_batch_task, (CROSSREF_BATCH_SIZE,)),
+        (settings.API_SOURCE_NAMES['EUROPEPMC'], fetch_europepmc_batch_task, (EUROPEPMC_BATCH_SIZE,)),
+        (settings.API_SOURCE_NAMES['OPENALEX'], fetch_openalex_batch_task, (OPENALEX_BATCH_SIZE,)),
+        (settings.API_SOURCE_NAMES['SEMANTICSCHOLAR'], fetch_s2_batch_task, (S2_BATCH_SIZE,)),
+        (settings.API_SOURCE_NAMES['PUBMED'], fetch_pubmed_batch_task, (PUBMED_EFETCH_BATCH_SIZE, PMC_EFETCH_BATCH_SIZE)),
+    ]
+
+
+def _charge_citation_crawl_requests(job, requests_by_source: dict):
+    """Учитывает запросы к источникам в бюджете задания (строка блокируется, счетчики пишутся в job)."""
+    requests_by_source = {name: count for name, count in requests_by_source.items() if count}
+    if not requests_by_source:
+        return
+    with transaction.atomic():
+        source_requests = CitationCrawlJob.objects.select_for_update().values_list('source_requests', flat=True).get(id=job.id) or {}
+        for name, count in requests_by_source.items():
+            source_requests[name] = source_requests.get(name, 0) + count
+        CitationCrawlJob.objects.filter(id=job.id).update(source_requests=source_requests, updated_at=timezone.now())
+    job.source_requests = source_requests
+
+
+def _citation_crawl_references(job, article) -> dict:
+    """
+    Цитируемые статьей DOI: {doi: число цитирований или None}. Берутся из уже разобранного списка
+    литературы (ReferenceLink) и, пока позволяет бюджет, из S2 /paper/{id}/references (одна страница),
+    откуда же приходит число цитирований для приоритета. RateLimitExceeded пробрасывается.
+    """
+    references = {
+        doi.strip().lower(): None
+        for doi in ReferenceLink.objects.filter(source_article_id=article.id, target_article_doi__isnull=False).values_list('target_article_doi', flat=True)
+        if doi and doi.strip()
+    }
+    s2_api_name = settings.API_SOURCE_NAMES['SEMANTICSCHOLAR']
+    s2_paper_id = s2_paper_id_for_article(article)
+    if s2_paper_id and job.remaining_budget(s2_api_name) != 0:
+        try:
+            page = fetch_s2_linked_papers(s2_paper_id, 'references', limit=CITATION_CRAWL_REFERENCES_PAGE_SIZE)
+        except (requests.exceptions.RequestException, ValueError):
+            page = {'results': []} # Остаются ссылки из списка литературы
+        _charge_citation_crawl_requests(job, {s2_api_name: 1})
+        for item in page['results']:
+            if item['doi']:
+                references[item['doi']] = item['citation_count']
+    return references
+
+
+def _settle_citation_crawl_wave(job, node_ids: list):
+    """
+    Итог волны: узлы с метаданными - загружены, остальные - не найдены. Ссылки цитирующих статей
+    на загруженные DOI связываются со статьями одним bulk_update.
+    """
+    wave_nodes = job.nodes.filter(id__in=node_ids, status=CitationCrawlNode.StatusChoices.SCHEDULED)
+    wave_nodes.filter(article__primary_source_api__isnull=False).update(status=CitationCrawlNode.StatusChoices.FETCHED)
+    wave_nodes.update(status=CitationCrawlNode.StatusChoices.NOT_FOUND)
+
+    fetched = job.nodes.filter(id__in=node_ids, status=CitationCrawlNode.StatusChoices.FETCHED).values_list('doi', 'article_id', 'parent_article_id')
+    article_by_doi = {doi: article_id for doi, article_id, _ in fetched}
+    parent_ids = {parent_id for _, _, parent_id in fetched if parent_id}
+    if not parent_ids:
+        return
+    now = timezone.now()
+    links_to_update = []
+    for link in ReferenceLink.objects.filter(source_article_id__in=parent_ids, resolved_article__isnull=True, target_article_doi__isnull=False).only('id', 'target_article_doi'):
+        article_id = article_by_doi.get(link.target_article_doi.strip().lower())
+        if article_id:
+            link.resolved_article_id = article_id
+            link.status = ReferenceLink.StatusChoices.ARTICLE_LINKED
+            link.updated_at = now
+            links_to_update.append(link)
+    ReferenceLink.objects.bulk_update(links_to_update, ['resolved_article', 'status', 'updated_at'], batch_size=500)
+
+
+def _schedule_citation_crawl_wave(job) -> dict:
+    """
+    Берет из границы обхода следующую волну: узлы наименьшей глубины, по убыванию числа цитирований,
+    не больше CITATION_CRAWL_WAVE_SIZE и оставшегося лимита статей. Уже обогащенные статьи не загружаются,
+    для остальных создаются записи и запускается одна цепочка пакетных задач источников, укладывающихся
+    в бюджет. Следующая волна ставится только после обработки текущей, поэтому в брокере одна цепочка на задание.
+    """
+    queued_nodes = job.nodes.filter(status=CitationCrawlNode.StatusChoices.QUEUED)
+    remaining_articles = job.max_articles - job.scheduled_count
+    if remaining_articles <= 0:
+        return _finish_citation_crawl(job.id, stop_reason=CitationCrawlJob.StopReasonChoices.MAX_ARTICLES)
+    next_depth = queued_nodes.aggregate(Min('depth'))['depth__min']
+    if next_depth is None:
+        return _finish_citation_crawl(job.id, stop_reason=CitationCrawlJob.StopReasonChoices.FRONTIER_EXHAUSTED)
+
+    wave = list(
+        queued_nodes.filter(depth=next_depth)
+        .order_by(F('citation_count').desc(nulls_last=True), 'id')
+        .only('id', 'doi', 'status', 'article')[:min(CITATION_CRAWL_WAVE_SIZE, remaining_articles)]
+    )
+    dois = [node.doi for node in wave]
+    known_articles = {doi.lower(): (article_id, source) for doi, article_id, source in Article.objects.filter(doi__in=dois).values_list('doi', 'id', 'primary_source_api')}
+    fetch_count = sum(1 for doi in dois if not (known_articles.get(doi) or (None, None))[1])
+
+    signatures, charges = [], {}
+    for source_name, batch_task, batch_sizes in _citation_crawl_batch_sources():
+        cost = sum(-(-fetch_count // batch_size) for batch_size in batch_sizes)
+        remaining_budget = job.remaining_budget(source_name)
+        if remaining_budget is not None and remaining_budget < cost:
+            continue
+        charges[source_name] = cost
+        signatures.append(batch_task)
+    if fetch_count and not signatures:
+        return _finish_citation_crawl(job.id, stop_reason=CitationCrawlJob.StopReasonChoices.BUDGET_EXHAUSTED)
+
+    # Статьи, которых еще нет: DOI уникален, поэтому созданные параллельно записи просто пропускаются
+    Article.objects.bulk_create(
+        [Article(user_id=job.user_id, title=f"Загрузка: DOI:{doi}", doi=doi) for doi in dois if doi not in known_articles],
+        batch_size=500, ignore_conflicts=True
+    )
+    if len(known_articles) < len(dois):
+        known_articles = {doi.lower(): (article_id, source) for doi, article_id, source in Article.objects.filter(doi__in=dois).values_list('doi', 'id', 'primary_source_api')}
+
+    article_ids_to_fetch = []
+    for node in wave:
+        article_id, source = known_articles.get(node.doi, (None, None))
+        node.article_id = article_id
+        if source:
+            node.status = CitationCrawlNode.StatusChoices.FETCHED
+        elif article_id:
+            node.status = CitationCrawlNode.StatusChoices.SCHEDULED
+            article_ids_to_fetch.append(article_id)
+        else:
+            node.status = CitationCrawlNode.StatusChoices.NOT_FOUND
+    CitationCrawlNode.objects.bulk_update(wave, ['article', 'status'], batch_size=500)
+
+    _charge_citation_crawl_requests(job, charges if article_ids_to_fetch else {})
+    job.scheduled_count += len(wave)
+    job.current_depth = next_depth
+    job.save(update_fields=['scheduled_count', 'current_depth', 'updated_at'])
+
+    wave_node_ids = [node.id for node in wave]
+    if article_ids_to_fetch:
+        chain(
+            resolve_identifiers_batch_task.si(article_ids_to_fetch, user_id=job.user_id),
+            *[batch_task.si(article_ids_to_fetch) for batch_task in signatures],
+            expand_citation_crawl_task.si(job.id, wave_node_ids),
+        ).on_error(citation_crawl_error_task.s(job_id=job.id)).apply_async()
+    else:
+        expand_citation_crawl_task.delay(job.id, wave_node_ids)
+
+    message = f'Глубина {next_depth}: в обработке {len(wave)} статей, загружается {len(article_ids_to_fetch)} (всего {job.scheduled_count} из {job.max_articles}).'
+    send_user_notification(job.user_id, job.celery_task_id, f"CrawlJob:{job.id}", 'PROGRESS', message, progress_percent=job.progress_percent, source_api=CITATION_CRAWL_SOURCE_NAME)
+    return {'status': 'success', 'message': message, 'job_id': job.id}
+
+
+def _finish_citation_crawl(job_id: int, stop_reason: str = None, error_message: str = None):
+    job = CitationCrawlJob.objects.filter(id=job_id).first()
+    if not job:
+        return {'status': 'error', 'message': f'CitationCrawlJob {job_id} not found.'}
+    # Все, что осталось в границе обхода, не будет загружено в этом задании
+    job.nodes.filter(status__in=[CitationCrawlNode.StatusChoices.QUEUED, CitationCrawlNode.StatusChoices.SCHEDULED]).update(status=CitationCrawlNode.StatusChoices.SKIPPED)
+    crawled_nodes = job.nodes.filter(depth__gt=0)
+    job.discovered_count = crawled_nodes.count()
+    job.fetched_count = crawled_nodes.filter(status=CitationCrawlNode.StatusChoices.FETCHED).count()
+    job.not_found_count = crawled_nodes.filter(status=CitationCrawlNode.StatusChoices.NOT_FOUND).count()
+    job.stop_reason = stop_reason
+    job.status = CitationCrawlJob.StatusChoices.FAILED if error_message else CitationCrawlJob.StatusChoices.COMPLETED
+    job.error_message = error_message
+    job.finished_at = timezone.now()
+    job.save(update_fields=['discovered_count', 'fetched_count', 'not_found_count', 'stop_reason', 'status', 'error_message', 'finished_at', 'updated_at'])
+
+    message = f'Обход цитирований завершен: найдено {job.discovered_count}, загружено {job.fetched_count}, не найдено {job.not_found_count}.'
+    if stop_reason:
+        message += f' Причина остановки: {job.get_stop_reason_display()}.'
+    if error_message:
+        message += f' Ошибка: {error_message}'
+    send_user_notification(job.user_id, job.celery_task_id, f"CrawlJob:{job.id}", 'FAILURE' if error_message else 'SUCCESS', message, progress_percent=100, source_api=CITATION_CRAWL_SOURCE_NAME)
+    return {'status': 'error' if error_message else 'success', 'message': message, 'job_id': job.id}
+
+
+@shared_task(bind=True)
+def start_citation_crawl_task(self, job_id: int):
+    """Запуск обхода цитирований: корневая статья становится узлом глубины 0 и первой раскрывается."""
+    try:
+        job = CitationCrawlJob.objects.select_related('root_article').get(id=job_id)
+    except CitationCrawlJob.DoesNotExist:
+        return {'status': 'error', 'message': f'CitationCrawlJob {job_id} not found.'}
+
+    job.status = CitationCrawlJob.StatusChoices.RUNNING
+    job.celery_task_id = self.request.id
+    job.save(update_fields=['status', 'celery_task_id', 'updated_at'])
+    root = job.root_article
+    # Без DOI корень не попадет в границу по уникальности DOI, поэтому узел создается с его ID
+    CitationCrawlNode.objects.get_or_create(
+        job=job, doi=(root.doi or f'article:{root.id}').lower(),
+        defaults={'depth': 0, 'article': root, 'status': CitationCrawlNode.StatusChoices.FETCHED}
+    )
+    send_user_notification(job.user_id, job.celery_task_id, f"CrawlJob:{job.id}", 'PENDING', f'Обход цитирований статьи ID {root.id}: глубина до {job.max_depth}, не более {job.max_articles} статей.', progress_percent=0, source_api=CITATION_CRAWL_SOURCE_NAME)
+    expand_citation_crawl_task.delay(job.id)
+    return {'status': 'success', 'message': 'Citation crawl started.', 'job_id': job.id}
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def expand_citation_crawl_task(self, job_id: int, wave_node_ids: list = None):
+    """
+    Шаг обхода после волны: подводит итог загрузки волны, раскрывает списки литературы загруженных
+    статей (новые DOI добавляются в границу на следующей глубине) и ставит следующую волну.
+    """
+    job = CitationCrawlJob.objects.filter(id=job_id).first()
+    if not job or job.status != CitationCrawlJob.StatusChoices.RUNNING:
+        return {'status': 'skipped', 'message': f'CitationCrawlJob {job_id} is not running.'}
+    if wave_node_ids:
+        _settle_citation_crawl_wave(job, wave_node_ids)
+
+    nodes_to_expand = job.nodes.filter(
+        status=CitationCrawlNode.StatusChoices.FETCHED, expanded=False, depth__lt=job.max_depth, article__isnull=False
+    ).select_related('article').only('id', 'depth', 'article__id', 'article__doi', 'article__arxiv_id', 'article__pubmed_id')
+    if job.scheduled_count >= job.max_articles:
+        nodes_to_expand = [] # Новые узлы уже не будут загружены, запросы к S2 не тратим
+    for node in nodes_to_expand:
+        try:
+            references = _citation_crawl_references(job, node.article)
+        except RateLimitExceeded as exc:
+            raise _rate_limit_retry(self, exc) # Раскрытые узлы отмечены и при повторе пропускаются
+        with transaction.atomic():
+            CitationCrawlNode.objects.bulk_create(
+                [
+                    CitationCrawlNode(job=job, doi=doi, depth=node.depth + 1, citation_count=citation_count, parent_article=node.article)
+                    for doi, citation_count in references.items()
+                ],
+                batch_size=500, ignore_conflicts=True # DOI, уже найденный на меньшей глубине, остается там
+            )
+            CitationCrawlNode.objects.filter(id=node.id).update(expanded=True)
+
+    return _schedule_citation_crawl_wave(job)
+
+
+@shared_task
+def citation_crawl_error_task(request, exc, traceback, job_id: int):
+    """Errback цепочки волны: задание завершается с ошибкой, уже загруженные статьи учитываются."""
+    return _finish_citation_crawl(job_id, error_message=f'{type(exc).__name__}: {exc}')
+
+
+@shared_task
+def prune_orphan_content_blobs_task(batch_size: int = 1000):
+    """
+    Удаляет блоки ContentBlob, на которые больше не ссылается ни один ArticleContent
+    (после перезаписи контента или удаления статей). Предназначена для периодического запуска (celery beat).
+    """
+    deleted_total = 0
+    while True:
+        orphan_ids = list(ContentBlob.objects.filter(article_contents__isnull=True).values_list('id', flat=True)[:batch_size])
+        if not orphan_ids:
+            break
+        # Повторная проверка в том же запросе: блок мог получить ссылку между выборкой и удалением
+        deleted, _details = ContentBlob.objects.filter(id__in=orphan_ids, article_contents__isnull=True).delete()
+        deleted_total += deleted
+        if len(orphan_ids) < batch_size:
+            break
+    return {'status': 'success', 'message': f'Deleted {deleted_total} orphan content blobs.', 'deleted': deleted_total}
@@ -1,3 +1,625 @@
-from django.test import TestCase
+from unittest import mock, skipIf
 
-# Create your tests here.
+import redis
+import requests
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db.models import Q
+from django.test import TestCase, SimpleTestCase, override_settings
+
+from . import api_cache, content_store, helpers, rate_limit, tasks
+from .helpers import upsert_article_references, parse_bulk_identifiers, parse_identifier_records, resolve_identifiers_batch
+from .models import Article, ArticleContent, ArticleSourceRecord, ContentBlob, ReferenceLink, AnalyzedSegment, IdentifierMapping, pdf_store_name
+from .tasks import (
+    _merge_source_records, consolidate_article_sources, _sync_system_segments, _bulk_create_articles,
+    _article_pdf_present, _store_source_pdf,
+)
+
+
+CROSSREF = settings.API_SOURCE_NAMES['CROSSREF']
+OPENALEX = settings.API_SOURCE_NAMES['OPENALEX']
+SEMANTICSCHOLAR = settings.API_SOURCE_NAMES['SEMANTICSCHOLAR']
+
+
+class MergeSourceRecordsTests(TestCase):
+    """Объединение записей источников по API_SOURCE_OVERALL_PRIORITY."""
+
+    def test_field_taken_from_highest_priority_source_that_has_it(self):
+        top_source, merged = _merge_source_records({
+            SEMANTICSCHOLAR: {'title': 'S2 title', 'abstract': 'S2 abstract', 'pubmed_id': '111'},
+            CROSSREF: {'title': 'CrossRef title', 'abstract': None, 'journal_name': 'Journal'},
+            OPENALEX: {'title': 'OpenAlex title', 'abstract': 'OpenAlex abstract'},
+        })
+        self.assertEqual(top_source, CROSSREF)
+        self.assertEqual(merged['title'], 'CrossRef title')
+        self.assertEqual(merged['abstract'], 'OpenAlex abstract') # Пустое поле CrossRef не перекрывает другие источники
+        self.assertEqual(merged['journal_name'], 'Journal')
+        self.assertEqual(merged['pubmed_id'], '111')
+
+    def test_empty_records(self):
+        self.assertEqual(_merge_source_records({}), (None, {}))
+
+
+class ConsolidateArticleSourcesTests(TestCase):
+    """Запись объединенных данных источников в статью на финализации конвейера."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='consolidation')
+        self.article = Article.objects.create(user=self.user, title='Статья в обработке: DOI:10.1/a', doi='10.1/a')
+
+    def add_record(self, source_api_name, record):
+        ArticleSourceRecord.objects.create(article=self.article, source_api_name=source_api_name, record=record)
+
+    def test_merged_metadata_written_once(self):
+        self.add_record(CROSSREF, {'title': 'Real title', 'journal_name': 'Journal', 'authors': ['Consolidation Alpha', 'Consolidation Beta']})
+        self.add_record(OPENALEX, {'title': 'OpenAlex title', 'pubmed_id': '111', 'pmc_id': 'PMC111'})
+
+        self.assertEqual(consolidate_article_sources(self.article.id), [])
+
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.title, 'Real title')
+        self.assertEqual(self.article.journal_name, 'Journal')
+        self.assertEqual(self.article.primary_source_api, CROSSREF)
+        self.assertEqual((self.article.pubmed_id, self.article.pmc_id), ('111', 'PMC111'))
+        self.assertEqual(
+            list(self.article.articleauthororder_set.order_by('order').values_list('author__full_name', flat=True)),
+            ['Consolidation Alpha', 'Consolidation Beta'],
+        )
+
+    def test_identifier_owned_by_other_article_is_skipped(self):
+        Article.objects.create(user=self.user, title='Other', pubmed_id='222')
+        self.add_record(CROSSREF, {'title': 'Real title', 'journal_name': 'Journal', 'authors': ['Consolidation Gamma']})
+        self.add_record(OPENALEX, {'pubmed_id': '222', 'pmc_id': 'PMC222'})
+
+        self.assertEqual(consolidate_article_sources(self.article.id), ['pubmed_id=222'])
+
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.title, 'Real title') # Остальные данные сохранены, а не откачены
+        self.assertEqual(self.article.journal_name, 'Journal')
+        self.assertIsNone(self.article.pubmed_id)
+        self.assertEqual(self.article.pmc_id, 'PMC222')
+        self.assertEqual(self.article.articleauthororder_set.count(), 1)
+
+    def test_existing_identifiers_are_kept(self):
+        self.add_record(CROSSREF, {'doi': '10.1/other', 'title': 'Real title'})
+
+        consolidate_article_sources(self.article.id)
+
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.doi, '10.1/a')
+
+    def test_no_records(self):
+        self.assertIsNone(consolidate_article_sources(self.article.id))
+
+
+def make_response(status_code, body=b'', headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = body
+    response.headers.update(headers or {})
+    response.url = 'https://api.example.org/works'
+    response.encoding = 'utf-8'
+    return response
+
+
+@override_settings(
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'api_responses': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'api-responses-tests'},
+    },
+    API_RESPONSE_CACHE_TTLS={'TestAPI': 60},
+    API_RESPONSE_CACHE_ENABLED=True,
+)
+class CachedGetTests(SimpleTestCase):
+    """Кэш ответов внешних API: попадание, промах и условная перепроверка устаревшей записи."""
+
+    url = 'https://api.example.org/works'
+
+    def setUp(self):
+        caches['api_responses'].clear()
+
+    def stat(self, name):
+        return api_cache.get_cache_stats()['TestAPI'][name]
+
+    def test_fresh_entry_is_served_without_request(self):
+        with mock.patch.object(api_cache, 'http_get', return_value=make_response(200, b'{"ok": 1}')) as http_get:
+            first = api_cache.cached_get('TestAPI', self.url, params={'doi': '10.1/a', 'mailto': 'a@b.c'})
+            # Контактные параметры не входят в ключ кэша
+            second = api_cache.cached_get('TestAPI', self.url, params={'doi': '10.1/a', 'mailto': 'x@y.z'})
+        self.assertEqual(http_get.call_count, 1)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual((self.stat('miss'), self.stat('hit')), (1, 1))
+
+    def test_throttle_called_only_for_network_request(self):
+        throttle = mock.Mock()
+        with mock.patch.object(api_cache, 'http_get', return_value=make_response(200, b'{}')):
+            api_cache.cached_get('TestAPI', self.url, throttle=throttle)
+            api_cache.cached_get('TestAPI', self.url, throttle=throttle)
+        throttle.assert_called_once_with()
+
+    def test_stale_entry_revalidated_with_304(self):
+        stored = make_response(200, b'{"v": 1}', {'ETag': '"abc"', 'Last-Modified': 'Wed, 01 Jan 2025 00:00:00 GMT'})
+        with mock.patch.object(api_cache, 'http_get', return_value=stored):
+            api_cache.cached_get('TestAPI', self.url)
+
+        with mock.patch.object(api_cache.time, 'time', return_value=api_cache.time.time() + 120), \
+                mock.patch.object(api_cache, 'http_get', return_value=make_response(304)) as http_get:
+            revalidated = api_cache.cached_get('TestAPI', self.url)
+            # После 304 запись снова свежая: следующий запрос в сеть не идет
+            api_cache.cached_get('TestAPI', self.url)
+
+        http_get.assert_called_once()
+        request_headers = http_get.call_args.kwargs['headers']
+        self.assertEqual(request_headers['If-None-Match'], '"abc"')
+        self.assertEqual(request_headers['If-Modified-Since'], 'Wed, 01 Jan 2025 00:00:00 GMT')
+        self.assertEqual(revalidated.status_code, 200)
+        self.assertEqual(revalidated.json(), {'v': 1})
+        self.assertEqual((self.stat('revalidated'), self.stat('hit')), (1, 1))
+
+    def test_stale_entry_replaced_by_new_body(self):
+        with mock.patch.object(api_cache, 'http_get', return_value=make_response(200, b'{"v": 1}', {'ETag': '"abc"'})):
+            api_cache.cached_get('TestAPI', self.url)
+        with mock.patch.object(api_cache.time, 'time', return_value=api_cache.time.time() + 120), \
+                mock.patch.object(api_cache, 'http_get', return_value=make_response(200, b'{"v": 2}', {'ETag': '"def"'})):
+            self.assertEqual(api_cache.cached_get('TestAPI', self.url).json(), {'v': 2})
+            self.assertEqual(api_cache.cached_get('TestAPI', self.url).json(), {'v': 2})
+
+    @override_settings(API_RESPONSE_CACHE_NOT_FOUND_TTL=10)
+    def test_not_found_expires_before_source_ttl(self):
+        with mock.patch.object(api_cache, 'http_get', side_effect=[make_response(404), make_response(200, b'{}')]) as http_get:
+            api_cache.cached_get('TestAPI', self.url)
+            api_cache.cached_get('TestAPI', f'{self.url}/other')
+            self.assertEqual(api_cache.cached_get('TestAPI', self.url).status_code, 404) # Еще свежая
+            with mock.patch.object(api_cache.time, 'time', return_value=api_cache.time.time() + 30):
+                api_cache.cached_get('TestAPI', f'{self.url}/other') # 200 живет полный TTL источника
+                http_get.side_effect = [make_response(200, b'{"found": 1}')]
+                self.assertEqual(api_cache.cached_get('TestAPI', self.url).json(), {'found': 1})
+        self.assertEqual(http_get.call_count, 3)
+
+    def test_error_responses_are_not_cached(self):
+        with mock.patch.object(api_cache, 'http_get', return_value=make_response(500)) as http_get:
+            api_cache.cached_get('TestAPI', self.url)
+            api_cache.cached_get('TestAPI', self.url)
+        self.assertEqual(http_get.call_count, 2)
+
+
+class UpsertArticleReferencesTests(TestCase):
+    """Пакетное сохранение ссылок из JATS: сопоставление с существующими по jats_ref_id, DOI и тексту."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='references')
+        self.article = Article.objects.create(user=self.user, title='Source', doi='10.1/source')
+
+    def upsert(self, parsed_references):
+        return [(link.id, created) for _, link, created in upsert_article_references(self.article, parsed_references)]
+
+    def test_creates_links_in_order_and_skips_empty(self):
+        results = upsert_article_references(self.article, [
+            {'jats_ref_id': 'r1', 'doi': '10.1/a', 'raw_text': 'Ref A', 'title': 'A'},
+            {'title': 'Нет ни DOI, ни текста, ни ID'},
+            {'jats_ref_id': 'r2', 'raw_text': 'Ref B'},
+        ])
+        self.assertEqual([created for _, _, created in results], [True, True])
+        first, second = ReferenceLink.objects.filter(source_article=self.article).order_by('order')
+        self.assertEqual((first.jats_ref_id, first.target_article_doi, first.status), ('r1', '10.1/a', ReferenceLink.StatusChoices.DOI_PROVIDED_NEEDS_LOOKUP))
+        self.assertEqual(first.manual_data_json, {'jats_ref_id': 'r1', 'title': 'A', 'doi_from_source': '10.1/a'})
+        self.assertEqual((second.jats_ref_id, second.status), ('r2', ReferenceLink.StatusChoices.PENDING_DOI_INPUT))
+        self.assertEqual(second.order, 2) # Позиция в исходном списке ссылок
+
+    def test_repeated_upsert_matches_existing_links_without_writes(self):
+        parsed = [{'jats_ref_id': 'r1', 'doi': '10.1/a', 'raw_text': 'Ref A'}, {'jats_ref_id': 'r2', 'raw_text': 'Ref B'}]
+        created_ids = [link_id for link_id, _ in self.upsert(parsed)]
+        ReferenceLink.objects.filter(source_article=self.article).update(status=ReferenceLink.StatusChoices.ARTICLE_LINKED)
+
+        with self.assertNumQueries(1): # Только чтение существующих ссылок
+            self.assertEqual(self.upsert(parsed), [(created_ids[0], False), (created_ids[1], False)])
+        self.assertFalse(ReferenceLink.objects.exclude(status=ReferenceLink.StatusChoices.ARTICLE_LINKED).exists())
+
+    def test_changed_doi_resets_status(self):
+        link_id = self.upsert([{'jats_ref_id': 'r1', 'doi': '10.1/old', 'raw_text': 'Ref A'}])[0][0]
+        ReferenceLink.objects.filter(id=link_id).update(status=ReferenceLink.StatusChoices.ARTICLE_LINKED)
+
+        self.assertEqual(self.upsert([{'jats_ref_id': 'r1', 'doi': '10.1/new', 'raw_text': 'Ref A'}]), [(link_id, False)])
+        link = ReferenceLink.objects.get(id=link_id)
+        self.assertEqual((link.target_article_doi, link.status), ('10.1/new', ReferenceLink.StatusChoices.DOI_PROVIDED_NEEDS_LOOKUP))
+
+    def test_legacy_links_matched_by_doi_then_text(self):
+        by_doi = ReferenceLink.objects.create(source_article=self.article, target_article_doi='10.1/a', raw_reference_text='Old text A')
+        by_text = ReferenceLink.objects.create(source_article=self.article, raw_reference_text='Ref B')
+
+        results = self.upsert([
+            {'jats_ref_id': 'r1', 'doi': '10.1/a', 'raw_text': 'Ref A'},
+            {'jats_ref_id': 'r2', 'raw_text': 'Ref B'},
+        ])
+
+        self.assertEqual(results, [(by_doi.id, False), (by_text.id, False)])
+        by_doi.refresh_from_db()
+        self.assertEqual((by_doi.jats_ref_id, by_doi.raw_reference_text), ('r1', 'Ref A'))
+        self.assertEqual(ReferenceLink.objects.get(id=by_text.id).jats_ref_id, 'r2')
+
+    def test_reordered_list_updates_order(self):
+        first_id, second_id = (link_id for link_id, _ in self.upsert([
+            {'jats_ref_id': 'r1', 'raw_text': 'Ref A'}, {'jats_ref_id': 'r2', 'raw_text': 'Ref B'},
+        ]))
+        ReferenceLink.objects.filter(source_article=self.article).update(order=0) # Ссылки, созданные до появления order
+
+        self.upsert([{'jats_ref_id': 'r2', 'raw_text': 'Ref B'}, {'jats_ref_id': 'r1', 'raw_text': 'Ref A'}])
+
+        self.assertEqual(
+            list(ReferenceLink.objects.filter(source_article=self.article).order_by('order', 'id').values_list('id', flat=True)),
+            [second_id, first_id],
+        )
+        self.assertEqual(ReferenceLink.objects.get(id=first_id).order, 1)
+
+    def test_existing_link_matched_only_once(self):
+        existing = ReferenceLink.objects.create(source_article=self.article, target_article_doi='10.1/a')
+
+        results = self.upsert([{'jats_ref_id': 'r1', 'doi': '10.1/a'}, {'jats_ref_id': 'r2', 'doi': '10.1/a'}])
+
+        self.assertEqual(results[0], (existing.id, False))
+        self.assertNotEqual(results[1][0], existing.id)
+        self.assertTrue(results[1][1])
+        self.assertEqual(ReferenceLink.objects.filter(source_article=self.article).count(), 2)
+
+
+class SyncSystemSegmentsTests(TestCase):
+    """Синхронизация системных сегментов с результатом разбора JATS по разнице, а не пересозданием."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='segments')
+        self.article = Article.objects.create(user=self.user, title='Source')
+        self.ref1, self.ref2, self.ref3 = (
+            ReferenceLink.objects.create(source_article=self.article, raw_reference_text=f'Ref {i}') for i in range(1, 4)
+        )
+
+    def segment_refs(self, segment):
+        return set(segment.cited_references.values_list('id', flat=True))
+
+    def test_initial_sync_creates_segments_with_links(self):
+        counts = _sync_system_segments(self.article, [
+            ('introduction', 'Text one', ['[1]'], {self.ref1.id}),
+            ('methods', 'Text two', [], set()),
+        ])
+        self.assertEqual(counts, (2, 0, 0))
+        first = AnalyzedSegment.objects.get(article=self.article, segment_text='Text one')
+        self.assertEqual(self.segment_refs(first), {self.ref1.id})
+        self.assertEqual(first.inline_citation_markers, ['[1]'])
+
+    def test_resync_keeps_matching_segments_and_applies_diff(self):
+        _sync_system_segments(self.article, [
+            ('introduction', 'Kept', ['[1]'], {self.ref1.id, self.ref2.id}),
+            ('methods', 'Removed', [], set()),
+        ])
+        kept = AnalyzedSegment.objects.get(article=self.article, segment_text='Kept')
+        AnalyzedSegment.objects.filter(id=kept.id).update(llm_analysis_notes='LLM result')
+        user_segment = AnalyzedSegment.objects.create(article=self.article, user=self.user, section_key='methods', segment_text='Removed')
+
+        counts = _sync_system_segments(self.article, [
+            ('introduction', 'Kept', ['[1]', '[3]'], {self.ref1.id, self.ref3.id}),
+            ('results', 'Added', [], {self.ref2.id}),
+        ])
+
+        self.assertEqual(counts, (1, 1, 1))
+        kept.refresh_from_db()
+        self.assertEqual(kept.llm_analysis_notes, 'LLM result') # Сегмент не пересоздан - анализ LLM сохранен
+        self.assertEqual(kept.inline_citation_markers, ['[1]', '[3]'])
+        self.assertEqual(self.segment_refs(kept), {self.ref1.id, self.ref3.id})
+        added = AnalyzedSegment.objects.get(article=self.article, segment_text='Added')
+        self.assertEqual(self.segment_refs(added), {self.ref2.id})
+        self.assertFalse(AnalyzedSegment.objects.filter(article=self.article, user__isnull=True, segment_text='Removed').exists())
+        self.assertTrue(AnalyzedSegment.objects.filter(id=user_segment.id).exists()) # Сегменты пользователя не трогаются
+
+    def test_unchanged_resync_writes_nothing(self):
+        parsed = [('introduction', 'Text', ['[1]'], {self.ref1.id})]
+        _sync_system_segments(self.article, parsed)
+        self.assertEqual(_sync_system_segments(self.article, parsed), (0, 0, 0))
+
+    def test_duplicate_texts_are_matched_one_to_one(self):
+        _sync_system_segments(self.article, [('introduction', 'Same', [], set())] * 2)
+
+        counts = _sync_system_segments(self.article, [('introduction', 'Same', [], set())] * 3)
+
+        self.assertEqual(counts, (1, 0, 0))
+        self.assertEqual(AnalyzedSegment.objects.filter(article=self.article, segment_text='Same').count(), 3)
+
+
+class ResolveIdentifiersBatchTests(TestCase):
+    """Пакетное разрешение идентификаторов при ошибках внешних сервисов."""
+
+    def resolve(self, ncbi, openalex):
+        with mock.patch.object(helpers, 'fetch_ncbi_id_mappings', **ncbi), \
+                mock.patch.object(helpers, 'fetch_openalex_id_mappings', **openalex):
+            return resolve_identifiers_batch([{'doi': '10.1000/A'}])[0]
+
+    def test_all_lookups_failed_is_flagged_and_not_cached(self):
+        error = {'side_effect': requests.exceptions.ConnectionError('down')}
+        record = self.resolve(ncbi=error, openalex=error)
+        self.assertTrue(record['external_lookup_failed'])
+        self.assertIsNone(record['pubmed_id'])
+        self.assertFalse(IdentifierMapping.objects.exists()) # Иначе "не найдено" закэшировалось бы на TTL
+
+    def test_partial_failure_is_not_flagged(self):
+        found = {'10.1000/a': {'doi': '10.1000/a', 'pmid': '123', 'pmcid': None, 'openalex_id': 'W1'}}
+        record = self.resolve(ncbi={'side_effect': requests.exceptions.Timeout('slow')}, openalex={'return_value': found})
+        self.assertNotIn('external_lookup_failed', record)
+        self.assertEqual(record['pubmed_id'], '123')
+
+    def test_not_found_is_not_flagged(self):
+        record = self.resolve(ncbi={'return_value': {}}, openalex={'return_value': {}})
+        self.assertNotIn('external_lookup_failed', record)
+        self.assertTrue(IdentifierMapping.objects.filter(doi='10.1000/a').exists())
+
+
+class ParseBulkIdentifiersTests(SimpleTestCase):
+    """Разбор списка идентификаторов для массовой загрузки."""
+
+    def test_plain_text_detects_types_and_normalizes(self):
+        entries, invalid, duplicates = parse_bulk_identifiers(
+            'https://doi.org/10.1000/ABC\n12345\npmc777\narXiv:2101.00001v2\nnot an id\n\n'
+        )
+        self.assertEqual(entries, [
+            {'type': 'DOI', 'value': '10.1000/abc'},
+            {'type': 'PMID', 'value': '12345'},
+            {'type': 'PMCID', 'value': 'PMC777'},
+            {'type': 'ARXIV', 'value': '2101.00001'},
+        ])
+        self.assertEqual(invalid, ['not an id'])
+        self.assertEqual(duplicates, 0)
+
+    def test_csv_with_header_columns(self):
+        content = 'doi,pmid\n10.1000/a,\n,42\n10.1000/A,\n'
+        entries, invalid, duplicates = parse_bulk_identifiers(content, 'list.csv')
+        self.assertEqual(entries, [{'type': 'DOI', 'value': '10.1000/a'}, {'type': 'PMID', 'value': '42'}])
+        self.assertEqual(duplicates, 1) # DOI нормализуется к нижнему регистру
+
+    def test_csv_without_header_uses_first_column(self):
+        entries, invalid, _ = parse_bulk_identifiers('10.1000/a;comment\nbad;x\n', 'list.csv')
+        self.assertEqual(entries, [{'type': 'DOI', 'value': '10.1000/a'}])
+        self.assertEqual(invalid, ['bad'])
+
+    def test_jsonl_records_and_broken_lines(self):
+        content = '{"doi": "10.1000/a"}\n{"identifier": "99", "type": "pmid"}\n{broken\n"PMC5"\n'
+        entries, invalid, duplicates = parse_bulk_identifiers(content, 'list.jsonl')
+        self.assertEqual(entries, [
+            {'type': 'DOI', 'value': '10.1000/a'}, {'type': 'PMID', 'value': '99'}, {'type': 'PMCID', 'value': 'PMC5'},
+        ])
+        self.assertEqual(invalid, ['{broken'])
+        self.assertEqual(duplicates, 0)
+
+    def test_records_invalid_and_duplicates(self):
+        entries, invalid, duplicates = parse_identifier_records(
+            ['10.1000/a', {'doi': 'doi:10.1000/A'}, {'pmid': 'abc'}, {'type': 'PMID', 'identifier': '7'}, '  ', None]
+        )
+        self.assertEqual(entries, [{'type': 'DOI', 'value': '10.1000/a'}, {'type': 'PMID', 'value': '7'}])
+        self.assertEqual(invalid, ["{'pmid': 'abc'}", 'None'])
+        self.assertEqual(duplicates, 1)
+
+    def test_empty_content(self):
+        self.assertEqual(parse_bulk_identifiers(' \n\n'), ([], [], 0))
+
+
+class BulkCreateArticlesTests(TestCase):
+    """Создание статей массовой загрузки при совпадении идентификаторов с параллельной загрузкой."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('bulk')
+
+    def make(self, **identifiers):
+        return Article(user=self.user, title='Загрузка', is_user_initiated=True, **identifiers)
+
+    def test_creates_batch(self):
+        created_ids, clashes = _bulk_create_articles([self.make(doi='10.1000/a'), self.make(pubmed_id='1')])
+        self.assertEqual(clashes, 0)
+        self.assertCountEqual(
+            created_ids, Article.objects.filter(Q(doi='10.1000/a') | Q(pubmed_id='1')).values_list('id', flat=True)
+        )
+
+    def test_clashing_articles_counted_and_rest_created(self):
+        existing = Article.objects.create(user=self.user, title='Уже в базе', pubmed_id='2')
+
+        created_ids, clashes = _bulk_create_articles([self.make(doi='10.1000/b'), self.make(pubmed_id='2')])
+
+        self.assertEqual(clashes, 1)
+        self.assertEqual(created_ids, [Article.objects.get(doi='10.1000/b').id])
+        self.assertNotIn(existing.id, created_ids)
+        self.assertEqual(Article.objects.filter(pubmed_id='2').count(), 1)
+
+
+@override_settings(API_RATE_LIMITS={'TestAPI': 2}, RATE_LIMIT_MAX_INLINE_WAIT=0.5)
+class WaitForTokenTests(SimpleTestCase):
+    """Ограничитель частоты: ожидание токена на месте, перепланирование и работа без Redis."""
+
+    def run_with_script(self, *script_results, api_name='TestAPI'):
+        script = mock.Mock(side_effect=list(script_results))
+        with mock.patch.object(rate_limit, '_get_script', return_value=script), \
+                mock.patch.object(rate_limit.time, 'sleep') as sleep:
+            try:
+                rate_limit.wait_for_token(api_name)
+            finally:
+                self.script, self.sleep = script, sleep
+
+    def test_token_available(self):
+        self.run_with_script('0')
+        self.sleep.assert_not_called()
+        self.assertEqual(self.script.call_args.kwargs['keys'], ['ratelimit:bucket:TestAPI'])
+
+    def test_short_wait_is_done_inline(self):
+        self.run_with_script('0.2', '0')
+        self.sleep.assert_called_once_with(0.2)
+        self.assertEqual(self.script.call_count, 2)
+
+    def test_long_wait_raises_with_retry_after(self):
+        with self.assertRaises(rate_limit.RateLimitExceeded) as ctx:
+            self.run_with_script('3.5')
+        self.assertEqual((ctx.exception.api_name, ctx.exception.retry_after), ('TestAPI', 3.5))
+        self.sleep.assert_not_called()
+
+    def test_inline_waits_are_cumulative(self):
+        with self.assertRaises(rate_limit.RateLimitExceeded):
+            self.run_with_script('0.3', '0.3')
+        self.sleep.assert_called_once_with(0.3)
+
+    def test_redis_unavailable_fails_open(self):
+        self.run_with_script(redis.exceptions.ConnectionError('refused'))
+        self.sleep.assert_not_called()
+
+    def test_api_without_limit_is_not_throttled(self):
+        self.run_with_script(api_name='OtherAPI')
+        self.script.assert_not_called()
+
+
+@override_settings(RATE_LIMIT_DEFAULT_RETRY_AFTER=30, RATE_LIMIT_MAX_RETRY_AFTER=600)
+class RetryAfterSecondsTests(SimpleTestCase):
+    """Разбор заголовка Retry-After в ответе 429."""
+
+    def retry_after(self, value=None):
+        return rate_limit.retry_after_seconds(make_response(429, headers={'Retry-After': value} if value is not None else {}))
+
+    def test_seconds(self):
+        self.assertEqual(self.retry_after('12'), 12.0)
+
+    def test_http_date(self):
+        with mock.patch.object(rate_limit.time, 'time', return_value=1735689600.0): # 2025-01-01 00:00:00 GMT
+            self.assertEqual(self.retry_after('Wed, 01 Jan 2025 00:01:30 GMT'), 90.0)
+            self.assertEqual(self.retry_after('Tue, 31 Dec 2024 23:00:00 GMT'), 0.0) # Дата в прошлом
+
+    def test_missing_or_invalid_uses_default(self):
+        self.assertEqual(self.retry_after(), 30.0)
+        self.assertEqual(self.retry_after('soon'), 30.0)
+
+    def test_capped_at_max(self):
+        self.assertEqual(self.retry_after('86400'), 600.0)
+
+    def test_raise_if_rate_limited(self):
+        with self.assertRaises(rate_limit.RateLimitExceeded) as ctx:
+            rate_limit.raise_if_rate_limited('TestAPI', make_response(429, headers={'Retry-After': '5'}))
+        self.assertEqual(ctx.exception.retry_after, 5.0)
+        rate_limit.raise_if_rate_limited('TestAPI', make_response(200))
+
+
+@override_settings(
+    STORAGES={**settings.STORAGES, 'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'}},
+    CONTENT_STORE_OFFLOAD_MIN_BYTES=None,
+)
+class ContentBlobTests(TestCase):
+    """Сжатое хранилище контента: чтение записанного, дедупликация и вынос крупных блоков в хранилище."""
+
+    text = '<article><body>Текст статьи</body></article>' * 50
+
+    def test_round_trip_in_database(self):
+        blob = ContentBlob.store(self.text)
+        blob = ContentBlob.objects.get(pk=blob.pk)
+        self.assertEqual(blob.read_text(), self.text)
+        self.assertEqual(blob.codec, content_store.default_codec())
+        self.assertEqual(blob.size, len(self.text.encode('utf-8')))
+        self.assertLess(blob.compressed_size, blob.size)
+        self.assertIsNone(blob.storage_name)
+
+    def test_same_content_stored_once(self):
+        first = ContentBlob.store(self.text)
+        second = ContentBlob.store(self.text)
+        self.assertEqual(first.pk, second.pk)
+        self.assertNotEqual(ContentBlob.store(self.text + '!').pk, first.pk)
+        self.assertEqual(ContentBlob.objects.count(), 2)
+
+    def test_zlib_without_zstandard(self):
+        with mock.patch.object(content_store, 'zstandard', None):
+            blob = ContentBlob.store(self.text)
+        self.assertEqual(blob.codec, content_store.CODEC_ZLIB)
+        self.assertEqual(ContentBlob.objects.get(pk=blob.pk).read_text(), self.text)
+
+    @skipIf(content_store.zstandard is None, 'zstandard не установлен')
+    def test_zstd_round_trip(self):
+        blob = ContentBlob.store(self.text)
+        self.assertEqual(blob.codec, content_store.CODEC_ZSTD)
+        self.assertEqual(ContentBlob.objects.get(pk=blob.pk).read_text(), self.text)
+
+    def test_zstd_blob_unreadable_without_package(self):
+        blob = ContentBlob(codec=content_store.CODEC_ZSTD, size=1, compressed_size=1, data=b'x')
+        with mock.patch.object(content_store, 'zstandard', None):
+            with self.assertRaises(content_store.ContentStoreError):
+                blob.read_text()
+
+    @override_settings(CONTENT_STORE_OFFLOAD_MIN_BYTES=1)
+    def test_large_blob_offloaded_to_storage(self):
+        blob = ContentBlob.store(self.text)
+        blob = ContentBlob.objects.get(pk=blob.pk)
+        self.assertIsNone(blob.data)
+        self.assertEqual(blob.storage_name, content_store.storage_name_for(blob.sha256, blob.codec))
+        self.assertEqual(blob.read_text(), self.text)
+
+        blob.delete() # Файл удаляется вместе с блоком
+        self.assertFalse(content_store.default_storage.exists(blob.storage_name))
+
+    def test_article_content_reads_and_writes_blob(self):
+        article = Article.objects.create(user=User.objects.create_user('content'), title='Content')
+        ArticleContent.objects.create(article=article, source_api_name='TestAPI', format_type='jats_xml', content=self.text)
+        ArticleContent.objects.create(article=article, source_api_name='OtherAPI', format_type='jats_xml', content=self.text)
+
+        stored = ArticleContent.objects.filter(article=article)
+        self.assertEqual([item.content for item in stored], [self.text, self.text])
+        self.assertEqual(len({item.blob_id for item in stored}), 1)
+
+
+@override_settings(STORAGES={**settings.STORAGES, 'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'}})
+class SourcePdfTests(TestCase):
+    """PDF задач источников: пропуск повторной загрузки, хранение по хешу и переиспользование pdf_text."""
+
+    pdf_bytes = b'%PDF-1.4 test content'
+
+    def setUp(self):
+        self.user = User.objects.create_user('pdf')
+        self.notify = mock.Mock()
+
+    def make_article(self, **fields):
+        return Article.objects.create(user=self.user, title='PDF', **fields)
+
+    def pdf_file(self):
+        return helpers._stream_to_pdf_file([self.pdf_bytes], max_bytes=1024)
+
+    def store(self, article):
+        with mock.patch.object(tasks.convert_pdf_task, 'delay') as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            _store_source_pdf(article.id, self.pdf_file(), self.user.id, self.notify)
+        return delay
+
+    def test_pdf_present_by_any_identifier(self):
+        self.make_article(doi='10.1000/pdf', pdf_file='articles_pdf/ab/existing.pdf')
+        without_pdf = self.make_article(pubmed_id='55')
+        self.assertTrue(_article_pdf_present(id=without_pdf.id, doi='10.1000/pdf'))
+        self.assertFalse(_article_pdf_present(id=without_pdf.id, pubmed_id='55'))
+        self.assertFalse(_article_pdf_present(id=None, doi=None))
+
+    def test_new_pdf_stored_by_hash_and_conversion_queued(self):
+        article = self.make_article()
+        delay = self.store(article)
+
+        article.refresh_from_db()
+        self.assertEqual(article.pdf_file.name, pdf_store_name(article.pdf_sha256))
+        self.assertEqual(article.pdf_file.read(), self.pdf_bytes)
+        delay.assert_called_once_with(article_id=article.id, user_id=self.user.id)
+
+    def test_known_pdf_text_reused_without_conversion(self):
+        first = self.make_article()
+        self.store(first)
+        Article.objects.filter(id=first.id).update(pdf_text='Текст PDF')
+
+        second = self.make_article()
+        delay = self.store(second)
+
+        second.refresh_from_db()
+        self.assertEqual(second.pdf_text, 'Текст PDF')
+        self.assertEqual(second.pdf_file.name, Article.objects.get(id=first.id).pdf_file.name) # Один файл на оба
+        delay.assert_not_called()
+
+    def test_article_with_pdf_is_not_overwritten(self):
+        article = self.make_article(pdf_file='articles_pdf/ab/existing.pdf')
+        delay = self.store(article)
+
+        article.refresh_from_db()
+        self.assertEqual(article.pdf_file.name, 'articles_pdf/ab/existing.pdf')
+        self.assertIsNone(article.pdf_sha256)
+        delay.assert_not_called()
+        self.notify.assert_not_called()
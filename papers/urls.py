@@ -1,7 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
-    AuthorViewSet, ArticleViewSet, ArticleContentViewSet, ReferenceLinkViewSet, StartArticleProcessingView, LoadReferencedArticleAPIView, FindDoiForReferenceAPIView, FindAllReferenceDoisAPIView, LoadAllLinkedReferencesAPIView, ReprocessArticleAPIView, AnalyzedSegmentViewSet, RunLLMAnalysisForSegmentAPIView
+    AuthorViewSet, ArticleViewSet, ArticleContentViewSet, ReferenceLinkViewSet, StartArticleProcessingView, LoadReferencedArticleAPIView, FindDoiForReferenceAPIView, FindAllReferenceDoisAPIView, LoadAllLinkedReferencesAPIView, ReprocessArticleAPIView, AnalyzedSegmentViewSet, RunLLMAnalysisForSegmentAPIView, ApiCacheStatsAPIView, BulkIngestionAPIView, ArticleS2LinksAPIView, BulkIngestionJobViewSet, CitationCrawlAPIView, CitationCrawlJobViewSet
 )
 
 
@@ -12,6 +12,8 @@ router.register(r'articles', ArticleViewSet, basename='article')
 router.register(r'articlecontents', ArticleContentViewSet, basename='articlecontent')
 router.register(r'referencelinks', ReferenceLinkViewSet, basename='referencelink')
 router.register(r'analyzed-segments', AnalyzedSegmentViewSet, basename='analyzedsegment')
+router.register(r'bulk-ingestion-jobs', BulkIngestionJobViewSet, basename='bulkingestionjob')
+router.register(r'citation-crawl-jobs', CitationCrawlJobViewSet, basename='citationcrawljob')
 
 
 # API URLs теперь автоматически определяются роутером.
@@ -27,6 +29,10 @@ urlpatterns = [
     path('articles/<int:pk>/find-all-reference-dois/', FindAllReferenceDoisAPIView.as_view(), name='find_all_reference_dois'),
     path('articles/<int:pk>/load-all-linked-references/', LoadAllLinkedReferencesAPIView.as_view(), name='load_all_linked_references'),
     path('articles/<int:pk>/reprocess/', ReprocessArticleAPIView.as_view(), name='reprocess_article'),
+    path('articles/<int:pk>/s2/<str:kind>/', ArticleS2LinksAPIView.as_view(), name='article_s2_links'),
     path('analyzed-segments/<int:pk>/run-llm-analysis/', RunLLMAnalysisForSegmentAPIView.as_view(), name='run_llm_analysis_for_segment'),
+    path('bulk-ingest/', BulkIngestionAPIView.as_view(), name='bulk_ingest'),
+    path('articles/<int:pk>/citation-crawl/', CitationCrawlAPIView.as_view(), name='citation_crawl'),
+    path('api-cache-stats/', ApiCacheStatsAPIView.as_view(), name='api_cache_stats'),
     path('', include(router.urls)),
 ]
@@ -1,19 +1,28 @@
 from rest_framework import viewsets, permissions, status
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse
 from django.views import View
-from django.db.models import Q
+from django.db.models import F, Q, Prefetch
 from rest_framework.views import APIView
+from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
-
-from .tasks import process_article_pipeline_task, find_doi_for_reference_task, analyze_segment_with_llm_task
-from .models import Author, Article, ArticleContent, ReferenceLink, AnalyzedSegment
+from django.conf import settings
+import requests
+
+from .tasks import process_article_pipeline_task, schedule_reference_crawl, find_doi_for_reference_task, analyze_segment_with_llm_task, bulk_ingest_identifiers_task, start_citation_crawl_task
+from .api_cache import get_cache_stats
+from .helpers import parse_bulk_identifiers, parse_identifier_records, fetch_s2_linked_papers, s2_paper_id_for_article, S2_LINK_KINDS
+from .rate_limit import RateLimitExceeded
+from .content_store import ContentStoreError
+from .models import Author, Article, ArticleContent, ReferenceLink, AnalyzedSegment, BulkIngestionJob, CitationCrawlJob, ARTICLE_HEAVY_FIELDS, article_heavy_fields
 from .serializers import (
-    AuthorSerializer, ArticleSerializer,
+    AuthorSerializer, ArticleSerializer, ArticleListSerializer,
     ArticleContentSerializer, ReferenceLinkSerializer,
-    AnalyzedSegmentSerializer
+    AnalyzedSegmentSerializer, BulkIngestionJobSerializer,
+    CitationCrawlJobSerializer, CitationCrawlNodeSerializer
 )
 
 
@@ -39,6 +48,13 @@ class AuthorViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
 
+class ArticleSubResourcePagination(CursorPagination):
+    """Курсорная пагинация подресурсов статьи (/articles/{id}/references/ и т.п.); ordering задает действие."""
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
 class ArticleViewSet(viewsets.ModelViewSet):
     """
     API endpoint, который позволяет просматривать и редактировать статьи.
@@ -50,16 +66,100 @@ class ArticleViewSet(viewsets.ModelViewSet):
     # ).select_related('user').all()
     serializer_class = ArticleSerializer
     permission_classes = [permissions.IsAuthenticated] # Или IsAuthenticatedOrReadOnly
+    # Подресурсы статьи: им от самой статьи нужна только проверка доступа
+    SUB_RESOURCE_ACTIONS = ('references', 'contents', 'segments')
+
+    def uses_compact_list(self) -> bool:
+        """Список без ?fields=/?expand= отдается компактным ArticleListSerializer."""
+        params = self.request.query_params
+        return self.action == 'list' and not params.get('fields') and not params.get('expand')
+
+    def get_serializer_class(self):
+        if self.uses_compact_list():
+            return ArticleListSerializer
+        return super().get_serializer_class()
+
+    def get_selected_fields(self):
+        """
+        Поля ответа ArticleSerializer: ?fields=id,title,doi сужает набор, ?expand=abstract,contents добавляет
+        тяжелые поля. В списке тяжелые поля (ArticleSerializer.EXPANDABLE_FIELDS) по умолчанию не отдаются,
+        вложенные коллекции (COLLECTION_FIELDS) не отдаются нигде - для них есть постраничные подресурсы.
+        """
+        if not hasattr(self, '_selected_fields'):
+            self._selected_fields = ArticleSerializer.resolve_selected_fields(
+                self.request.query_params.get('fields'),
+                self.request.query_params.get('expand'),
+                omit_expandable=self.action == 'list',
+            )
+        return self._selected_fields
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['selected_fields'] = self.get_selected_fields()
+        return context
 
     def get_queryset(self):
         user = self.request.user
-        if user.is_authenticated:
-            # Админы видят всё, обычные пользователи - только свои статьи
-            # Это также неявно защитит от удаления чужих статей через стандартный `destroy`
-            if user.is_staff:
-                return Article.objects.prefetch_related('articleauthororder_set__author', 'contents', 'references_made').select_related('user').all()
-            return Article.objects.filter(user=user).prefetch_related('articleauthororder_set__author', 'contents', 'references_made').select_related('user')
-        return Article.objects.none()
+        if not user.is_authenticated:
+            return Article.objects.none()
+        # Админы видят всё, обычные пользователи - только свои статьи
+        # Это также неявно защитит от удаления чужих статей через стандартный `destroy`
+        queryset = Article.objects.all() if user.is_staff else Article.objects.filter(user=user)
+        if self.action in self.SUB_RESOURCE_ACTIONS:
+            return queryset.only('id', 'user_id')
+        if self.uses_compact_list():
+            return queryset.light().prefetch_related('articleauthororder_set__author')
+
+        selected_fields = self.get_selected_fields()
+        # Не читаем из БД тяжелые колонки, которые не попадут в ответ (при записи нужна полная строка),
+        # и не предзагружаем лишние связи
+        deferred_fields = [name for name in ARTICLE_HEAVY_FIELDS if name not in selected_fields]
+        if deferred_fields and self.request.method in permissions.SAFE_METHODS:
+            queryset = queryset.defer(*deferred_fields)
+        if 'user' in selected_fields:
+            queryset = queryset.select_related('user')
+        if 'article_authors' in selected_fields:
+            queryset = queryset.prefetch_related('articleauthororder_set__author')
+        if 'contents' in selected_fields:
+            queryset = queryset.prefetch_related(Prefetch('contents', queryset=ArticleContent.objects.with_blob_meta()))
+        if 'references_made' in selected_fields:
+            queryset = queryset.prefetch_related(Prefetch(
+                'references_made',
+                queryset=ReferenceLink.objects.select_related('resolved_article').defer(*article_heavy_fields('resolved_article__')),
+            ))
+        return queryset
+
+    def _paginated_sub_resource(self, queryset, serializer_class, ordering):
+        paginator = ArticleSubResourcePagination()
+        paginator.ordering = ordering
+        page = paginator.paginate_queryset(queryset, self.request, view=self)
+        serializer = serializer_class(page, many=True, context={'request': self.request, 'view': self})
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def references(self, request, pk=None):
+        """Библиографические ссылки статьи (курсорная пагинация, в порядке списка литературы)."""
+        article = self.get_object()
+        queryset = ReferenceLink.objects.filter(source_article=article).select_related('source_article', 'resolved_article').defer(
+            *article_heavy_fields('source_article__'), *article_heavy_fields('resolved_article__')
+        )
+        return self._paginated_sub_resource(queryset, ReferenceLinkSerializer, ('order', 'id'))
+
+    @action(detail=True, methods=['get'])
+    def contents(self, request, pk=None):
+        """Сырой контент статьи: только метаданные и download_url, без самих данных."""
+        article = self.get_object()
+        queryset = ArticleContent.objects.filter(article=article).with_blob_meta()
+        return self._paginated_sub_resource(queryset, ArticleContentSerializer, 'id')
+
+    @action(detail=True, methods=['get'])
+    def segments(self, request, pk=None):
+        """Проанализированные сегменты текста статьи."""
+        article = self.get_object()
+        queryset = AnalyzedSegment.objects.filter(article=article).select_related('user').prefetch_related(
+            Prefetch('cited_references', queryset=ReferenceLink.objects.only('id'))
+        )
+        return self._paginated_sub_resource(queryset, AnalyzedSegmentSerializer, 'id')
 
     # def get_queryset(self):
     #     # Показываем пользователю только его статьи (если не админ)
@@ -97,10 +197,29 @@ class ArticleContentViewSet(viewsets.ModelViewSet):
     API endpoint для контента статей.
     Обычно управляется через инлайны статьи, но может быть полезен для прямого доступа.
     """
-    queryset = ArticleContent.objects.all()
+    queryset = ArticleContent.objects.with_blob_meta()
     serializer_class = ArticleContentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
+    @action(detail=True, methods=['get'])
+    def raw(self, request, pk=None):
+        """Распакованное содержимое записи (в списках и статьях отдаются только метаданные и ссылка сюда)."""
+        content_item = self.get_object()
+        try:
+            payload = content_item.blob.read_bytes()
+        except ContentStoreError as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        format_type = content_item.format_type.lower()
+        if 'xml' in format_type:
+            content_type = 'application/xml; charset=utf-8'
+        elif 'json' in format_type:
+            content_type = 'application/json; charset=utf-8'
+        else:
+            content_type = 'text/plain; charset=utf-8'
+        response = HttpResponse(payload, content_type=content_type)
+        response['ETag'] = f'"{content_item.blob.sha256}"'
+        return response
+
 
 # class ReferenceLinkViewSet(viewsets.ModelViewSet):
 #     """
@@ -114,7 +233,9 @@ class ReferenceLinkViewSet(viewsets.ModelViewSet):
     """
     API endpoint для библиографических ссылок.
     """
-    queryset = ReferenceLink.objects.select_related('source_article', 'resolved_article').all()
+    queryset = ReferenceLink.objects.select_related('source_article', 'resolved_article').defer(
+        *article_heavy_fields('source_article__'), *article_heavy_fields('resolved_article__')
+    )
     serializer_class = ReferenceLinkSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOfSourceArticle] # IsAuthenticated нужен, чтобы request.user был доступен
     # ------------------
@@ -159,6 +280,161 @@ class StartArticleProcessingView(View): # Переименовать бы во 
 # Теперь URL может быть: /api/papers/process-article/?identifier=10.1000/xyz123&type=DOI
 
 
+class BulkIngestionAPIView(APIView):
+    """
+    Массовая загрузка статей. Принимает файл (поле 'file': CSV, JSONL или текст по одному ID в строке)
+    либо 'identifiers' в теле запроса (список строк/объектов или текст). Создает BulkIngestionJob
+    и запускает одну задачу массовой загрузки вместо конвейера на каждый идентификатор.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, format=None):
+        upload = request.FILES.get('file')
+        if upload:
+            max_upload_bytes = getattr(settings, 'BULK_INGESTION_MAX_UPLOAD_MB', 10) * 1024 * 1024
+            if upload.size > max_upload_bytes:
+                return Response({"error": f"Файл слишком большой (максимум {max_upload_bytes // (1024 * 1024)} МБ)."}, status=status.HTTP_400_BAD_REQUEST)
+            content = upload.read().decode('utf-8-sig', errors='replace')
+            entries, invalid, duplicates = parse_bulk_identifiers(content, upload.name)
+            source_name = upload.name[:255]
+        else:
+            raw_identifiers = request.data.get('identifiers')
+            if isinstance(raw_identifiers, str):
+                entries, invalid, duplicates = parse_bulk_identifiers(raw_identifiers)
+            elif isinstance(raw_identifiers, list):
+                entries, invalid, duplicates = parse_identifier_records(raw_identifiers)
+            else:
+                return Response({"error": "Передайте файл ('file') или список идентификаторов ('identifiers')."}, status=status.HTTP_400_BAD_REQUEST)
+            source_name = 'request'
+
+        if not entries:
+            return Response({"error": "Не найдено ни одного распознанного идентификатора.", "invalid_identifiers": invalid[:100]}, status=status.HTTP_400_BAD_REQUEST)
+        max_identifiers = getattr(settings, 'BULK_INGESTION_MAX_IDENTIFIERS', 10000)
+        if len(entries) > max_identifiers:
+            return Response({"error": f"Слишком много идентификаторов: {len(entries)} (максимум {max_identifiers})."}, status=status.HTTP_400_BAD_REQUEST)
+
+        job = BulkIngestionJob.objects.create(
+            user=request.user,
+            source_name=source_name,
+            identifiers=entries,
+            invalid_identifiers=invalid[:1000],
+            total_submitted=len(entries) + len(invalid) + duplicates,
+            duplicate_count=duplicates,
+        )
+        task = bulk_ingest_identifiers_task.delay(job.id)
+
+        return Response(
+            {
+                "message": f"Массовая загрузка запущена: {len(entries)} идентификаторов.",
+                "job_id": job.id,
+                "task_id": task.id,
+                "accepted": len(entries),
+                "invalid": len(invalid),
+                "duplicates": duplicates,
+            },
+            status=status.HTTP_202_ACCEPTED
+        )
+
+
+class BulkIngestionJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Прогресс и результаты заданий массовой загрузки текущего пользователя.
+    """
+    serializer_class = BulkIngestionJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        user = self.request.user
+        queryset = BulkIngestionJob.objects.defer('identifiers', 'article_ids')
+        if user.is_staff:
+            return queryset.all()
+        return queryset.filter(user=user)
+
+
+class CitationCrawlAPIView(APIView):
+    """
+    Запуск обхода цитирований от статьи: в ширину по спискам литературы, наиболее цитируемые первыми.
+    Параметры: max_depth, max_articles и source_budgets ({имя источника: максимум запросов},
+    дополняет CITATION_CRAWL_DEFAULT_SOURCE_BUDGETS).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk, format=None):
+        article = get_object_or_404(Article.objects.light(), pk=pk, user=request.user)
+
+        max_depth_limit = getattr(settings, 'CITATION_CRAWL_MAX_DEPTH', 3)
+        max_articles_limit = getattr(settings, 'CITATION_CRAWL_MAX_ARTICLES', 2000)
+        try:
+            max_depth = int(request.data.get('max_depth', 1))
+            max_articles = int(request.data.get('max_articles', 100))
+        except (TypeError, ValueError):
+            return Response({"error": "max_depth и max_articles должны быть целыми числами."}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= max_depth <= max_depth_limit:
+            return Response({"error": f"max_depth должен быть от 1 до {max_depth_limit}."}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= max_articles <= max_articles_limit:
+            return Response({"error": f"max_articles должен быть от 1 до {max_articles_limit}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        source_budgets = dict(getattr(settings, 'CITATION_CRAWL_DEFAULT_SOURCE_BUDGETS', {}))
+        requested_budgets = request.data.get('source_budgets') or {}
+        if not isinstance(requested_budgets, dict):
+            return Response({"error": "source_budgets должен быть объектом {источник: число запросов}."}, status=status.HTTP_400_BAD_REQUEST)
+        known_sources = set(settings.API_SOURCE_NAMES.values())
+        for source_name, budget in requested_budgets.items():
+            if source_name not in known_sources:
+                return Response({"error": f"Неизвестный источник: {source_name}."}, status=status.HTTP_400_BAD_REQUEST)
+            if budget is None:
+                source_budgets.pop(source_name, None)
+                continue
+            if not isinstance(budget, int) or budget < 0:
+                return Response({"error": f"Бюджет источника {source_name} должен быть неотрицательным целым числом."}, status=status.HTTP_400_BAD_REQUEST)
+            source_budgets[source_name] = budget
+
+        job = CitationCrawlJob.objects.create(
+            user=request.user,
+            root_article=article,
+            max_depth=max_depth,
+            max_articles=max_articles,
+            source_budgets=source_budgets,
+        )
+        task = start_citation_crawl_task.delay(job.id)
+        return Response(
+            {
+                "message": f"Обход цитирований запущен: глубина до {max_depth}, не более {max_articles} статей.",
+                "job_id": job.id,
+                "task_id": task.id,
+            },
+            status=status.HTTP_202_ACCEPTED
+        )
+
+
+class CitationCrawlJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Прогресс заданий обхода цитирований текущего пользователя; /nodes/ - граница обхода по уровням.
+    """
+    serializer_class = CitationCrawlJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        user = self.request.user
+        queryset = CitationCrawlJob.objects.all()
+        if user.is_staff:
+            return queryset
+        return queryset.filter(user=user)
+
+    @action(detail=True, methods=['get'])
+    def nodes(self, request, pk=None):
+        job = self.get_object()
+        queryset = job.nodes.order_by('depth', F('citation_count').desc(nulls_last=True), 'id')
+        node_status = request.query_params.get('status')
+        if node_status:
+            queryset = queryset.filter(status=node_status)
+        page = self.paginate_queryset(queryset)
+        serializer = CitationCrawlNodeSerializer(page if page is not None else queryset, many=True)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
+
 class LoadReferencedArticleAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -248,7 +524,7 @@ class FindAllReferenceDoisAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, pk, format=None): # pk здесь - это ID статьи
-        article = get_object_or_404(Article, pk=pk)
+        article = get_object_or_404(Article.objects.light(), pk=pk)
 
         if article.user != request.user:
             return Response(
@@ -307,7 +583,7 @@ class LoadAllLinkedReferencesAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, pk, format=None): # pk здесь - это ID статьи
-        article = get_object_or_404(Article, pk=pk)
+        article = get_object_or_404(Article.objects.light(), pk=pk)
 
         if article.user != request.user:
             return Response(
@@ -337,22 +613,14 @@ class LoadAllLinkedReferencesAPIView(APIView):
                 status=status.HTTP_200_OK
             )
 
-        tasks_queued_count = 0
-        for ref_link in references_to_load:
-            if ref_link.target_article_doi: # Дополнительная проверка на всякий случай
-                ref_link.status = ReferenceLink.StatusChoices.ARTICLE_FETCH_IN_PROGRESS
-                ref_link.save(update_fields=['status', 'updated_at'])
-
-                process_article_pipeline_task.delay(
-                    identifier_value=ref_link.target_article_doi,
-                    identifier_type='DOI',
-                    user_id=request.user.id,
-                    originating_reference_link_id=ref_link.id
-                )
-                tasks_queued_count += 1
+        # Один конвейер на DOI: уже загруженные статьи связываются сразу, повторяющиеся DOI ждут общего результата
+        crawl_stats = schedule_reference_crawl(
+            references_to_load.only('id', 'target_article_doi', 'resolved_article', 'status'),
+            request.user.id
+        )
 
         return Response(
-            {"message": f"Запущено {tasks_queued_count} задач по загрузке цитируемых статей."},
+            {"message": f"Связано с существующими статьями: {crawl_stats['linked']}, DOI поставлено в очередь на загрузку: {crawl_stats['queued_dois']}."},
             status=status.HTTP_202_ACCEPTED
         )
 
@@ -361,7 +629,7 @@ class ReprocessArticleAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, pk, format=None): # pk здесь - это ID статьи
-        article = get_object_or_404(Article, pk=pk)
+        article = get_object_or_404(Article.objects.light(), pk=pk)
 
         if article.user != request.user:
             return Response(
@@ -433,7 +701,7 @@ class AnalyzedSegmentViewSet(viewsets.ModelViewSet):
         if not article_id:
             raise serializer.ValidationError({"article_id": "Это поле обязательно."})
         try:
-            article = Article.objects.get(pk=article_id, user=self.request.user)
+            article = Article.objects.light().get(pk=article_id, user=self.request.user)
         except Article.DoesNotExist:
             raise serializer.ValidationError({"article_id": "Указанная статья не найдена или не принадлежит вам."})
 
@@ -482,4 +750,53 @@ class RunLLMAnalysisForSegmentAPIView(APIView):
         return Response(
             {"message": f"LLM анализ для сегмента ID {segment.id} поставлен в очередь.", "task_id": llm_task.id},
             status=status.HTTP_202_ACCEPTED
-        )
\ No newline at end of file
+        )
+
+
+class ArticleS2LinksAPIView(APIView):
+    """
+    Цитирующие (kind='citations') или цитируемые (kind='references') статьи из Semantic Scholar,
+    загружаемые постранично по запросу интерфейса: ?offset=0&limit=100 (limit до 1000).
+    Для статей, которые уже есть у пользователя, в результате указан article_id.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk, kind, format=None):
+        if kind not in S2_LINK_KINDS:
+            return Response({"error": "Неизвестный тип списка."}, status=status.HTTP_404_NOT_FOUND)
+        article = get_object_or_404(Article.objects.light(), pk=pk, user=request.user)
+        s2_paper_id = s2_paper_id_for_article(article)
+        if not s2_paper_id:
+            return Response({"error": "У статьи нет DOI, arXiv ID или PMID для запроса к Semantic Scholar."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            offset = max(0, int(request.query_params.get('offset', 0)))
+            limit = min(1000, max(1, int(request.query_params.get('limit', 100))))
+        except ValueError:
+            return Response({"error": "offset и limit должны быть целыми числами."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            page = fetch_s2_linked_papers(s2_paper_id, kind, offset=offset, limit=limit)
+        except RateLimitExceeded as exc:
+            return Response(
+                {"error": "Превышен лимит запросов к Semantic Scholar, повторите позже."},
+                status=status.HTTP_429_TOO_MANY_REQUESTS, headers={'Retry-After': str(int(exc.retry_after) + 1)}
+            )
+        except (requests.exceptions.RequestException, ValueError) as exc:
+            return Response({"error": f"Ошибка Semantic Scholar: {str(exc)}"}, status=status.HTTP_502_BAD_GATEWAY)
+
+        dois = [item['doi'] for item in page['results'] if item['doi']]
+        local_articles = dict(Article.objects.filter(user=request.user, doi__in=dois).values_list('doi', 'id')) if dois else {}
+        for item in page['results']:
+            item['article_id'] = local_articles.get(item['doi'])
+        return Response(page, status=status.HTTP_200_OK)
+
+
+class ApiCacheStatsAPIView(APIView):
+    """
+    Статистика кэша ответов внешних API (hit/miss/revalidated по источникам). Только для администраторов.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, format=None):
+        return Response(get_cache_stats(), status=status.HTTP_200_OK)
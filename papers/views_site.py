@@ -1,6 +1,7 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from .models import Article, ArticleContent, ReferenceLink, AnalyzedSegment
+from django.db.models import Prefetch
+from .models import Article, ArticleContent, ReferenceLink, AnalyzedSegment, article_heavy_fields
 
 
 @login_required
@@ -41,9 +42,13 @@ def article_submission_page(request):
 @login_required
 def article_detail_page(request, pk):
     article = get_object_or_404(Article, pk=pk, user=request.user)
-    contents = ArticleContent.objects.filter(article=article).order_by('source_api_name', 'format_type')
-    references_made = ReferenceLink.objects.filter(source_article=article).select_related('resolved_article').order_by('id')
-    analyzed_segments = AnalyzedSegment.objects.filter(article=article).select_related('user').prefetch_related('cited_references__resolved_article').order_by('created_at')
+    # Сырые данные подгружаются на странице по запросу через API (raw), здесь только метаданные
+    contents = ArticleContent.objects.filter(article=article).with_blob_meta().order_by('source_api_name', 'format_type')
+    # Для связанных статей нужны только заголовки и идентификаторы - тяжелые тексты не читаем
+    references_made = ReferenceLink.objects.filter(source_article=article).select_related('resolved_article').defer(*article_heavy_fields('resolved_article__')).order_by('id')
+    analyzed_segments = AnalyzedSegment.objects.filter(article=article).select_related('user').prefetch_related(
+        Prefetch('cited_references', queryset=ReferenceLink.objects.select_related('resolved_article').defer(*article_heavy_fields('resolved_article__')))
+    ).order_by('created_at')
     context = {
         'article': article,
         'contents': contents,
@@ -58,14 +63,17 @@ def article_detail_page(request, pk):
 @login_required
 def article_list_page(request):
     # Получаем ТОЛЬКО основные статьи пользователя (где is_user_initiated = True)
+    # Шаблон списка показывает только метаданные, поэтому тяжелые тексты статей не загружаем
     primary_articles_qs = Article.objects.filter(
         user=request.user,
         is_user_initiated=True
-    ).prefetch_related(
-        'authors',
-        'references_made',
-        'references_made__resolved_article',
-        'references_made__resolved_article__authors'
+    ).light().prefetch_related(
+        Prefetch(
+            'references_made',
+            queryset=ReferenceLink.objects.filter(resolved_article__isnull=False).select_related('resolved_article').only(
+                'id', 'source_article', 'resolved_article', 'resolved_article__id', 'resolved_article__title', 'resolved_article__doi'
+            )
+        )
     ).order_by('-updated_at')
 
     articles_data_for_template = []
@@ -5,6 +5,24 @@ from celery import Celery
 # Устанавливаем переменную окружения для настроек Django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'scientific_papers_project.settings')
 
+
+def _patch_psycopg_for_gevent():
+    """
+    Воркер с пулом gevent (celery пропатчил stdlib до импорта приложения): переводим psycopg2 в асинхронный
+    режим через psycogreen. Иначе запрос к БД блокирует весь процесс, и гринлет, ждущий select_for_update,
+    не отпускает держателя блокировки, который в это время ждет сетевой ответ.
+    """
+    try:
+        from gevent import monkey
+    except ImportError:
+        return
+    if monkey.is_module_patched('socket'):
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+
+
+_patch_psycopg_for_gevent()
+
 app = Celery('scientific_papers_project')
 
 # Используем конфигурацию из настроек Django.
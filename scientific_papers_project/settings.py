@@ -211,6 +211,39 @@ CELERY_TIMEZONE = 'Europe/Kiev' # часовой пояс
 CELERY_TASK_TRACK_STARTED = True # Чтобы задачи отображали состояние "STARTED"
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler' # Для django-celery-beat
 
+# --- Очереди Celery по классам нагрузки ---
+# Каждая очередь обслуживается своим воркером (python manage.py run_celery_worker <очередь>),
+# поэтому всплеск загрузок PDF или вызовов LLM не занимает воркеры быстрых запросов метаданных.
+CELERY_QUEUE_METADATA_IO = 'metadata-io'        # Короткие запросы к API метаданных, диспетчер конвейера, финализация
+CELERY_QUEUE_FULLTEXT_IO = 'fulltext-io'        # Долгие загрузки полных текстов без PDF (пакетный PMC EFetch, Europe PMC fullTextXML)
+CELERY_QUEUE_PDF_BROWSER = 'pdf-browser'        # Задачи, скачивающие PDF (в т.ч. через Playwright/Chromium)
+CELERY_QUEUE_CONVERSION_CPU = 'conversion-cpu'  # Разбор JATS, сегментация, обслуживание хранилища
+CELERY_QUEUE_PDF_CONVERSION = 'pdf-conversion'  # Конвертация PDF в текст внешним сервисом MarkItDown (долгое ожидание ответа)
+CELERY_QUEUE_LLM = 'llm'                        # Вызовы LLM
+CELERY_TASK_DEFAULT_QUEUE = CELERY_QUEUE_METADATA_IO # Задачи без маршрута (в т.ч. новые) идут в очередь метаданных
+CELERY_TASK_ROUTES = {
+    'papers.tasks.fetch_data_from_europepmc_task': {'queue': CELERY_QUEUE_FULLTEXT_IO},
+    'papers.tasks.fetch_pubmed_batch_task': {'queue': CELERY_QUEUE_FULLTEXT_IO},
+    'papers.tasks.fetch_data_from_pubmed_task': {'queue': CELERY_QUEUE_PDF_BROWSER}, # Скачивает PDF из PMC (обычно через Playwright)
+    'papers.tasks.fetch_data_from_arxiv_task': {'queue': CELERY_QUEUE_PDF_BROWSER},
+    'papers.tasks.fetch_data_from_rxiv_task': {'queue': CELERY_QUEUE_PDF_BROWSER},
+    'papers.tasks.process_full_text_and_create_segments_task': {'queue': CELERY_QUEUE_CONVERSION_CPU},
+    'papers.tasks.prune_orphan_content_blobs_task': {'queue': CELERY_QUEUE_CONVERSION_CPU},
+    'papers.tasks.convert_pdf_task': {'queue': CELERY_QUEUE_PDF_CONVERSION},
+    'papers.tasks.analyze_segment_with_llm_task': {'queue': CELERY_QUEUE_LLM},
+}
+# Параметры воркера каждой очереди: пул, число процессов/гринлетов (None - по числу CPU) и prefetch.
+# gevent - для сетевого ожидания; prefork - для CPU и Playwright (sync API не работает в гринлетах gevent).
+# Долгим задачам prefetch 1, чтобы воркер не держал в резерве задачи, которые могли бы взять свободные воркеры.
+CELERY_WORKER_PROFILES = {
+    CELERY_QUEUE_METADATA_IO: {'pool': 'gevent', 'concurrency': int(os.getenv('CELERY_METADATA_IO_CONCURRENCY', 50)), 'prefetch_multiplier': 4},
+    CELERY_QUEUE_FULLTEXT_IO: {'pool': 'gevent', 'concurrency': int(os.getenv('CELERY_FULLTEXT_IO_CONCURRENCY', 20)), 'prefetch_multiplier': 1},
+    CELERY_QUEUE_PDF_BROWSER: {'pool': 'prefork', 'concurrency': int(os.getenv('CELERY_PDF_BROWSER_CONCURRENCY', 2)), 'prefetch_multiplier': 1},
+    CELERY_QUEUE_CONVERSION_CPU: {'pool': 'prefork', 'concurrency': None, 'prefetch_multiplier': 1},
+    CELERY_QUEUE_PDF_CONVERSION: {'pool': 'threads', 'concurrency': int(os.getenv('CELERY_PDF_CONVERSION_CONCURRENCY', 4)), 'prefetch_multiplier': 1},
+    CELERY_QUEUE_LLM: {'pool': 'threads', 'concurrency': int(os.getenv('CELERY_LLM_CONCURRENCY', 4)), 'prefetch_multiplier': 1},
+}
+
 # --- Django Celery Results ---
 # Уже настроено через CELERY_RESULT_BACKEND = 'django-db'
 # Если используется django-celery-results, то он должен быть в INSTALLED_APPS
@@ -255,6 +288,107 @@ API_SOURCE_OVERALL_PRIORITY = [
 APP_EMAIL = os.getenv('APP_EMAIL', 'example@mail.com')
 NCBI_API_KEY = os.getenv('NCBI_API_KEY', '')   # PubMed
 
+# --- Ограничение частоты запросов к внешним API (papers/rate_limit.py) ---
+# Token bucket в Redis, общий для всех воркеров. Значения - запросов в секунду.
+API_RATE_LIMITS = {
+    API_SOURCE_NAMES['PUBMED']: 10 if NCBI_API_KEY else 3, # NCBI E-utilities: 3 rps без ключа, 10 rps с API ключом
+    API_SOURCE_NAMES['CROSSREF']: 10,          # CrossRef polite pool (запросы с mailto)
+    API_SOURCE_NAMES['SEMANTICSCHOLAR']: 1,    # Semantic Scholar: 1 rps
+    API_SOURCE_NAMES['OPENALEX']: 10,          # OpenAlex: до 10 rps
+    API_SOURCE_NAMES['EUROPEPMC']: 10,
+    API_SOURCE_NAMES['UNPAYWALL']: 10,
+    API_SOURCE_NAMES['ARXIV']: 1 / 3,          # arXiv просит не чаще 1 запроса в 3 секунды
+    API_SOURCE_NAMES['RXIV']: 1,
+}
+# Redis для координации воркеров (papers/redis_client.py): очереди пакетных запросов и т.п.
+COORDINATION_REDIS_URL = os.getenv('COORDINATION_REDIS_URL', CELERY_BROKER_URL)
+RATE_LIMIT_REDIS_URL = os.getenv('RATE_LIMIT_REDIS_URL', COORDINATION_REDIS_URL)
+RATE_LIMIT_MAX_INLINE_WAIT = 0.5   # Ожидание токена до 0.5 сек выполняется на месте, дольше - перепланирование задачи
+RATE_LIMIT_MAX_RESCHEDULES = 20    # Сколько раз задача может быть отложена лимитером сверх своих max_retries
+RATE_LIMIT_DEFAULT_RETRY_AFTER = 30 # Через сколько секунд повторить задачу после ответа 429 без заголовка Retry-After
+RATE_LIMIT_MAX_RETRY_AFTER = 600    # Верхняя граница Retry-After от сервера, сек
+
+# --- Общий HTTP-клиент (papers/http_client.py) ---
+HTTP_CLIENT_POOL_MAXSIZE = 10       # Размер пула соединений для хостов без отдельной настройки
+HTTP_CLIENT_HOST_POOL_SIZES = {}    # Переопределение размеров пулов по хостам, например {'api.crossref.org': 30}
+HTTP_CLIENT_MAX_RETRIES = 3         # Повторы на уровне соединения (ошибки сети, 5xx); 429 перепланирует задачу
+HTTP_CLIENT_BACKOFF_FACTOR = 0.5    # Экспоненциальная задержка между повторами: 0.5, 1, 2... сек
+
+# --- Загрузка PDF (papers/helpers.py download_pdf, пул браузеров papers/browser_pool.py) ---
+PDF_BROWSER_POOL_MAX_CONTEXTS = int(os.getenv('PDF_BROWSER_POOL_MAX_CONTEXTS', 2))  # Открытых контекстов Chromium на поток воркера
+PDF_BROWSER_MAX_DOWNLOADS = int(os.getenv('PDF_BROWSER_MAX_DOWNLOADS', 50))         # После стольких загрузок браузер перезапускается
+# PDF больше этого размера не скачиваются (загрузка идет потоково во временный файл и обрывается на лимите)
+PDF_DOWNLOAD_MAX_BYTES = int(os.getenv('PDF_DOWNLOAD_MAX_MB', 100)) * 1024 * 1024
+
+# --- Конвертация PDF в текст (convert_pdf_task) ---
+# Экземпляры сервиса MarkItDown через запятую; задачи распределяются по ним по кругу
+MARKITDOWN_SERVICE_URLS = [url.strip() for url in os.getenv('MARKITDOWN_SERVICE_URLS', 'http://localhost:8181/convert-document/').split(',') if url.strip()]
+MARKITDOWN_TIMEOUT = int(os.getenv('MARKITDOWN_TIMEOUT', 310))   # Ожидание ответа сервиса на один PDF, сек
+MARKITDOWN_RETRY_BACKOFF = 30                                   # Задержка повтора при недоступности сервиса: 30, 60, 120... сек
+
+# Сколько дней сопоставление идентификаторов (DOI/PMID/PMCID) в IdentifierMapping считается свежим
+IDENTIFIER_MAPPING_TTL_DAYS = int(os.getenv('IDENTIFIER_MAPPING_TTL_DAYS', 30))
+
+# --- Массовая загрузка статей (BulkIngestionAPIView) ---
+BULK_INGESTION_MAX_IDENTIFIERS = 10000  # Максимум идентификаторов в одном задании
+BULK_INGESTION_MAX_UPLOAD_MB = 10       # Максимальный размер загружаемого файла
+BULK_INGESTION_CHUNK_SIZE = 200         # Статей во фрагменте (одна цепочка пакетных задач)
+CROSSREF_BATCH_SIZE = 50                # DOI в одном запросе CrossRef /works?filter=doi:...
+EUROPEPMC_BATCH_SIZE = 100              # Идентификаторов в одном OR-запросе к Europe PMC
+S2_BATCH_SIZE = 500                     # ID в одном POST /paper/batch Semantic Scholar
+OPENALEX_BATCH_SIZE = 50                # DOI/PMID в одном фильтре OpenAlex (filter=doi:a|b|..., максимум API - 50)
+PUBMED_EFETCH_BATCH_SIZE = 200          # PMID в одном запросе EFetch db=pubmed
+PMC_EFETCH_BATCH_SIZE = 20              # PMCID в одном запросе EFetch db=pmc (полные тексты)
+AUTHOR_ID_CACHE_SIZE = 20000            # Размер LRU-кэша "имя автора -> ID" в каждом процессе воркера
+
+# --- Загрузка цитируемых статей по DOI из списков литературы ---
+# Сколько секунд DOI считается "в работе" (ключ crawl:inflight:doi:<doi>): повторные ссылки на него ждут
+# результата первого конвейера; по истечении срока зависший DOI может быть запущен снова
+REFERENCE_CRAWL_INFLIGHT_TTL = int(os.getenv('REFERENCE_CRAWL_INFLIGHT_TTL', 2 * 3600))
+
+# --- Обход цитирований (CitationCrawlJob) ---
+CITATION_CRAWL_MAX_DEPTH = 3            # Верхняя граница глубины, которую можно запросить
+CITATION_CRAWL_MAX_ARTICLES = 2000      # Верхняя граница числа статей в одном задании
+CITATION_CRAWL_WAVE_SIZE = 100          # Статей в одной волне загрузки; следующая волна ставится после завершения текущей
+CITATION_CRAWL_REFERENCES_PAGE_SIZE = 1000  # Ссылок в одном запросе S2 /paper/{id}/references (максимум API - 1000)
+# Бюджет запросов по умолчанию {имя источника: максимум}; источник без записи не ограничен
+CITATION_CRAWL_DEFAULT_SOURCE_BUDGETS = {
+    API_SOURCE_NAMES['SEMANTICSCHOLAR']: 500,
+}
+
+# --- Хранилище сырого контента ArticleContent (papers/content_store.py) ---
+CONTENT_STORE_ZSTD_LEVEL = 10           # Уровень сжатия zstd (без пакета zstandard используется zlib)
+# Блоки от этого размера (после сжатия, байт) выносятся из БД в файловое хранилище (default_storage); None - всегда в БД
+CONTENT_STORE_OFFLOAD_MIN_BYTES = int(os.getenv('CONTENT_STORE_OFFLOAD_MIN_BYTES', 256 * 1024))
+
+# --- Кэш ответов внешних API (papers/api_cache.py) ---
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'api_responses': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('API_CACHE_REDIS_URL', 'redis://localhost:6379/3'),
+        'TIMEOUT': None,
+    },
+}
+API_RESPONSE_CACHE_ENABLED = os.getenv('API_RESPONSE_CACHE_ENABLED', 'True') == 'True'
+# Срок свежести ответа по источнику (сек). Источник без TTL не кэшируется.
+API_RESPONSE_CACHE_TTLS = {
+    API_SOURCE_NAMES['CROSSREF']: 7 * 24 * 3600,
+    API_SOURCE_NAMES['PUBMED']: 7 * 24 * 3600,
+    API_SOURCE_NAMES['EUROPEPMC']: 3 * 24 * 3600,
+    API_SOURCE_NAMES['SEMANTICSCHOLAR']: 24 * 3600,   # Счетчики цитирований меняются часто
+    API_SOURCE_NAMES['OPENALEX']: 24 * 3600,
+    API_SOURCE_NAMES['UNPAYWALL']: 24 * 3600,         # Статус OA может появиться после публикации
+    API_SOURCE_NAMES['ARXIV']: 7 * 24 * 3600,
+    API_SOURCE_NAMES['RXIV']: 24 * 3600,
+}
+# Сколько хранится устаревшая запись для условного запроса (If-None-Match / If-Modified-Since)
+API_RESPONSE_CACHE_STALE_TTL = 30 * 24 * 3600
+# Срок жизни ответа "не найдено" (404): новая статья может появиться в источнике через несколько часов
+API_RESPONSE_CACHE_NOT_FOUND_TTL = 3600
+
 
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
 OPENAI_DEFAULT_MODEL = "gpt-4o-mini"